@@ -0,0 +1,400 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from controller_service import ControllerService
+from control_watchdog import ControlWatchdog
+
+
+class AsyncTelescopeEngine:
+    """
+    基于asyncio的望远镜控制引擎。
+
+    传感器读取、命令输出和遥测发布分别是独立的协程任务，在同一个事件循环上重叠执行：
+    控制周期使用最近一次的姿态采样计算命令，不必等待传感器往返。
+    一个事件循环可以同时运行多个引擎，从而在一个进程内驱动多台设备。
+    """
+    IDLE = ControllerService.IDLE
+    SLEWING = ControllerService.SLEWING
+    ARRIVED = ControllerService.ARRIVED
+    STOPPED = ControllerService.STOPPED
+    ERROR = ControllerService.ERROR
+
+    def __init__(self, controller, period=0.005, max_sample_age=0.5, blocking_sensor=None,
+                 on_state_change=None, watchdog_deadline=None):
+        """
+        :param controller: TelescopeController对象
+        :param period: 控制周期 (秒)
+        :param max_sample_age: 姿态采样的最长有效时间 (秒)，超过则停止运动等待新数据
+        :param blocking_sensor: 陀螺仪读取是否阻塞；默认仿真模式下视为非阻塞，其余在线程池中读取
+        :param on_state_change: 状态变化回调 on_state_change(state)
+        :param watchdog_deadline: 看门狗期限 (秒)，事件循环或传感器卡住时由看门狗线程发送停止命令；None表示不启用
+        """
+        self.controller = controller
+        self.period = period
+        self.max_sample_age = max_sample_age
+        if blocking_sensor is None:
+            blocking_sensor = not (controller.simulation or controller.hybrid_sim)
+        self.blocking_sensor = blocking_sensor
+        # 连接了真实串口时写入可能阻塞，放到执行器中进行
+        self.blocking_writes = (not controller.simulation) or controller.hybrid_sim
+        self.on_state_change = on_state_change
+
+        self.state = self.IDLE
+        self.error = None
+        self.attitude = None       # 最近一次姿态采样 (方位角, 高度角)，传感器读数
+        self.sample_time = 0.0     # 采样时刻 (time.monotonic)
+        self._stale = False        # 是否已因姿态数据过期而松开继电器
+        self.stop_latencies = deque(maxlen=100)
+        # 看门狗在独立线程中运行，不受事件循环阻塞的影响
+        self.watchdog = None
+        if watchdog_deadline:
+            self.watchdog = ControlWatchdog(controller, watchdog_deadline, on_trip=self._on_watchdog_trip)
+
+        self._commands = None      # asyncio.Queue，在事件循环中创建
+        self._loop = None
+        self._subscribers = []
+        self._tasks = []
+        self._done = threading.Event()
+        # 串口写入和阻塞式传感器读取各用一个单线程执行器，保证顺序且不阻塞事件循环
+        self._io_executor = ThreadPoolExecutor(max_workers=1)
+        self._sensor_executor = ThreadPoolExecutor(max_workers=1)
+
+    # ---- 生命周期 ----
+
+    async def start(self):
+        """在当前事件循环中启动传感器、控制和遥测任务"""
+        self._commands = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        connect = getattr(self.controller.gyro, 'connect', None)
+        if connect and asyncio.iscoroutinefunction(connect):
+            await connect()
+        self._tasks = [
+            asyncio.create_task(self._sensor_task()),
+            asyncio.create_task(self._control_task()),
+        ]
+        if self.watchdog:
+            self.watchdog.start()
+        logging.info("异步控制引擎已启动")
+
+    async def shutdown(self):
+        """停止运动并取消所有任务"""
+        await self.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.watchdog:
+            self.watchdog.stop()
+        self._io_executor.shutdown(wait=False)
+        self._sensor_executor.shutdown(wait=False)
+
+    def is_alive(self):
+        return any(not task.done() for task in self._tasks)
+
+    # ---- 命令（在事件循环中调用） ----
+
+    async def set_target(self, *args, **kwargs):
+        """设置新目标，参数与TelescopeController.set_target相同"""
+        self._done.clear()
+        await self._commands.put(('target', args, kwargs, time.perf_counter()))
+
+    async def stop(self):
+        """
+        停止运动：直接发出停止命令，不等待当前控制周期
+
+        :return: 请求到停止命令发出的耗时 (秒)
+        """
+        latency = await self._halt()
+        self._set_state(self.STOPPED)
+        self._done.set()
+        return latency
+
+    async def _halt(self):
+        """发出停止命令并复位各轴状态机（各轴只在事件循环中访问），返回耗时 (秒)"""
+        requested = time.perf_counter()
+        self.controller.stop_requested.set()
+        await self._write("AZ0EL0\n")
+        latency = time.perf_counter() - requested
+        self.stop_latencies.append(latency)
+        self.controller.abort_axes()
+        return latency
+
+    # ---- 遥测 ----
+
+    def subscribe(self, maxsize=100):
+        """订阅遥测，返回asyncio.Queue；消费者跟不上时丢弃最旧的数据"""
+        subscriber = asyncio.Queue(maxsize=maxsize)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    def _publish(self, raw_az, raw_alt):
+        if not self._subscribers:
+            return
+        current_az, current_alt = self.controller.sky_attitude(raw_az, raw_alt)
+        sample = {
+            "time": time.time(),
+            "current_az": current_az,
+            "current_alt": current_alt,
+            "target_az": getattr(self.controller, 'target_azimuth', None),
+            "target_alt": getattr(self.controller, 'target_altitude', None),
+            "state": self.state,
+        }
+        for subscriber in self._subscribers:
+            if subscriber.full():
+                subscriber.get_nowait()
+            subscriber.put_nowait(sample)
+
+    # ---- 内部任务 ----
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                try:
+                    self.on_state_change(state)
+                except Exception as e:
+                    logging.error(f"状态回调出错: {e}")
+
+    def _on_watchdog_trip(self, reason):
+        """看门狗已发送停止命令（在看门狗线程中调用）；各轴状态机在事件循环中复位"""
+        self.error = f"看门狗停止: {reason}"
+        self._set_state(self.ERROR)
+        self._done.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self.controller.abort_axes)
+
+    async def _write(self, cmd):
+        if self.blocking_writes:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._io_executor, self.controller.send_command, cmd)
+        else:
+            self.controller.send_command(cmd)
+
+    async def _read_attitude(self):
+        gyro = self.controller.gyro
+        reader = getattr(gyro, 'get_current_attitude_async', None)
+        if reader:
+            return await reader()
+        if self.blocking_sensor:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._sensor_executor, gyro.get_current_attitude)
+        return gyro.get_current_attitude()
+
+    async def _sensor_task(self):
+        """持续读取姿态，与控制周期并行"""
+        while True:
+            try:
+                attitude = await self._read_attitude()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"读取姿态失败: {e}")
+                await asyncio.sleep(self.period)
+                continue
+            # 阻塞式真实陀螺仪读取失败时返回上一次的有效角度并置过期标志：不刷新采样时刻，控制周期按过期处理
+            is_stale = getattr(self.controller.gyro, 'is_stale', None)
+            if is_stale and is_stale():
+                await asyncio.sleep(self.period)
+                continue
+            self.attitude = attitude
+            self.sample_time = time.monotonic()
+            if not self.blocking_sensor:
+                # 非阻塞传感器按控制周期采样，避免空转占满事件循环
+                await asyncio.sleep(self.period)
+
+    async def _apply(self, command):
+        kind, args, kwargs, requested = command
+        if kind == 'target':
+            try:
+                self.controller.set_target(*args, **kwargs)
+            except Exception as e:
+                self.error = str(e)
+                logging.error(f"设置目标失败: {e}")
+                self._set_state(self.ERROR)
+                self._done.set()
+                return
+            self.error = None
+            self._set_state(self.SLEWING)
+
+    async def _control_task(self):
+        """按控制周期使用最新采样计算并输出命令"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            while not self._commands.empty():
+                await self._apply(self._commands.get_nowait())
+
+            if self.state == self.SLEWING:
+                try:
+                    await self._control_tick()
+                except Exception as e:
+                    self.error = str(e)
+                    logging.error(f"控制异常: {e}")
+                    await self._halt()
+                    # 先设置错误状态再通知等待方，control_loop返回1而不是2
+                    self._set_state(self.ERROR)
+                    self._done.set()
+            elif self.attitude is not None:
+                self._publish(*self.attitude)
+
+            next_tick += self.period
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick = loop.time()
+                delay = 0
+            try:
+                # 等待下一个周期，期间到达的命令立即处理
+                command = await asyncio.wait_for(self._commands.get(), delay)
+                await self._apply(command)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _control_tick(self):
+        if self.attitude is None or time.monotonic() - self.sample_time > self.max_sample_age:
+            # 没有有效姿态数据时不运动：进入过期状态时松开继电器一次，之后等待新数据
+            if not self._stale:
+                self._stale = True
+                logging.warning("姿态数据过期，停止运动等待新数据")
+                await self._write("AZ0EL0\n")
+                self.controller.abort_axes()
+            return
+        self._stale = False
+        current_az, current_alt = self.attitude
+        reached, cmd = self.controller.compute_command(current_az, current_alt, self.sample_time)
+        if self.controller.history is not None:
+            self.controller.record_history(*self.controller.sky_attitude(current_az, current_alt))
+        self._publish(current_az, current_alt)
+        if reached:
+            logging.info("到达目标位置，停止所有运动")
+            for _ in range(10):
+                await self._write(cmd)
+                await asyncio.sleep(0.005)
+            self._set_state(self.ARRIVED)
+            self._done.set()
+            return
+        if self.state == self.SLEWING and not self.controller.stop_requested.is_set() and cmd.strip():
+            await self._write(cmd)
+
+
+class EngineHandle:
+    """
+    异步引擎的同步包装，接口与ControllerService一致（set_target/stop/wait/control_loop），
+    便于Web线程和observation_plan.execute_plan直接使用。
+    """
+    def __init__(self, host, engine, stop_deadline=0.02):
+        """
+        :param host: 承载引擎的AsyncEngineHost
+        :param engine: AsyncTelescopeEngine实例
+        :param stop_deadline: 停止请求的最长等待时间 (秒)，事件循环或串口写入超时未完成时由调用线程直接发送停止命令
+        """
+        self.host = host
+        self.engine = engine
+        self.stop_deadline = stop_deadline
+
+    @property
+    def state(self):
+        return self.engine.state
+
+    @property
+    def error(self):
+        return self.engine.error
+
+    @property
+    def stop_latencies(self):
+        return self.engine.stop_latencies
+
+    @property
+    def watchdog(self):
+        return self.engine.watchdog
+
+    def is_alive(self):
+        return self.host.is_alive() and self.engine.is_alive()
+
+    def set_target(self, *args, **kwargs):
+        self.engine._done.clear()
+        self.host.call(self.engine.set_target(*args, **kwargs))
+
+    def stop(self):
+        """
+        停止运动。若停止命令在stop_deadline内未能发出（例如I/O线程正阻塞在串口写入中），
+        则由调用线程绕过写入锁直接发送，各轴状态机仍交给事件循环复位。
+
+        :return: 本次停止请求到停止命令发出的耗时 (秒)
+        """
+        requested = time.perf_counter()
+        try:
+            return self.host.call(self.engine.stop(), self.stop_deadline)
+        except TimeoutError:
+            pass
+        engine = self.engine
+        engine.controller.emergency_stop()
+        self.host.loop.call_soon_threadsafe(engine.controller.abort_axes)
+        latency = time.perf_counter() - requested
+        engine.stop_latencies.append(latency)
+        engine._set_state(engine.STOPPED)
+        engine._done.set()
+        logging.error(f"事件循环发送停止命令超时，已绕过写入锁直接发送，延迟 {latency * 1000:.2f} ms")
+        return latency
+
+    def wait(self, timeout=None):
+        return self.engine._done.wait(timeout)
+
+    def control_loop(self):
+        self.engine._done.wait()
+        if self.engine.state == AsyncTelescopeEngine.ARRIVED:
+            return 0
+        if self.engine.state == AsyncTelescopeEngine.STOPPED:
+            return 2
+        return 1
+
+    def shutdown(self, timeout=1.0):
+        if self.host.is_alive():
+            self.host.call(self.engine.shutdown(), timeout)
+
+
+class AsyncEngineHost:
+    """在后台线程中运行事件循环，承载任意数量的异步控制引擎"""
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        if self.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="telescope-asyncio")
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ready.set()
+        self.loop.run_forever()
+
+    def is_alive(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def call(self, coro, timeout=None):
+        """在事件循环中执行协程并等待结果（从其他线程调用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def add(self, controller, stop_deadline=0.02, **kwargs):
+        """为控制器创建并启动一个异步引擎，返回同步句柄（stop_deadline见EngineHandle）"""
+        self.start()
+        engine = AsyncTelescopeEngine(controller, **kwargs)
+        self.call(engine.start())
+        return EngineHandle(self, engine, stop_deadline)
+
+    def close(self):
+        if self.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(1.0)
@@ -0,0 +1,331 @@
+from collections import deque
+import numpy as np
+
+
+class CoastEstimator:
+    """
+    单轴刹车距离估计：松开继电器后轴还会转过 延迟×转速 + 滑行距离，
+    由实际观测到的停止过程学习这两个参数。
+
+    继电器只有开/关，整速停止时转速基本不变，此时两者无法区分，
+    只按先验延迟估计滑行距离，合计的提前量仍然准确；
+    有不同转速的停止样本（例如短脉冲）时用最小二乘同时拟合。
+    """
+    def __init__(self, latency=0.05, coast=0.0, memory=20):
+        """
+        :param latency: 延迟先验值 (秒)，包括串口、继电器和传感器延迟
+        :param coast: 滑行距离初始值 (度)
+        :param memory: 参与拟合的最近停止样本数
+        """
+        self.latency = float(latency)
+        self.coast = float(coast)
+        self.samples = deque(maxlen=memory)  # [(松开时转速, 松开后转过的角度)]
+
+    def predict(self, speed):
+        """以speed (度/秒) 转动时松开继电器，预计还会转过的角度 (度)"""
+        return max(0.0, self.latency * speed + self.coast)
+
+    def observe(self, speed, overshoot):
+        """记录一次停止：松开时的转速和之后沿运动方向转过的角度"""
+        self.samples.append((float(speed), float(overshoot)))
+        speeds = np.array([sample[0] for sample in self.samples])
+        distances = np.array([sample[1] for sample in self.samples])
+        if len(speeds) >= 3 and np.ptp(speeds) > 0.2 * np.mean(speeds):
+            design = np.column_stack([speeds, np.ones_like(speeds)])
+            (latency, coast), _, _, _ = np.linalg.lstsq(design, distances, rcond=None)
+            self.latency, self.coast = max(0.0, float(latency)), max(0.0, float(coast))
+        else:
+            self.coast = max(0.0, float(np.mean(distances - self.latency * speeds)))
+
+    def to_dict(self):
+        return {"latency": self.latency, "coast": self.coast, "samples": len(self.samples)}
+
+
+class AxisFault(RuntimeError):
+    """轴故障：目标超出限位、读数无效或转动停滞，由控制线程向上报告"""
+
+
+class AxisController:
+    """
+    单轴开关量（bang-bang）控制状态机，两轴各自独立运行，到位的轴自行停止。
+
+    状态：
+      idle      等待决策
+      slewing   继电器吸合，转向目标
+      pulsing   定时短脉冲（刹车模式下的最后修正）
+      settling  已松开继电器，等待轴停稳
+      holding   停在容差内；误差超出保持带才重新转动，按较慢的周期检查
+      fault     故障，继电器保持松开，直到设置新目标
+
+    刹车模式（braking=True）下，转动中剩余误差小于预计刹车距离时提前松开继电器，
+    停稳后记录实际转过的角度更新估计；仍在容差外且误差较小时用短脉冲修正。
+    非刹车模式下进入容差即松开继电器，与原来的1°停止带一致。
+    """
+    IDLE = 'idle'
+    SLEWING = 'slewing'
+    PULSING = 'pulsing'
+    SETTLING = 'settling'
+    HOLDING = 'holding'
+    FAULT = 'fault'
+
+    def __init__(self, name, tolerance=0.5, hold_band=None, limits=None, braking=True, coast=None,
+                 pulse_range=3.0, min_pulse=0.02, max_pulse=0.5, settle_speed=0.5, settle_time=0.1,
+                 velocity_window=0.1, period=0.0, hold_period=0.1, stall_timeout=5.0,
+                 timed_pulses=False, pulse_margin=0.02):
+        """
+        :param name: 轴名称，用于日志和故障信息
+        :param tolerance: 到位容差 (度)
+        :param hold_band: 保持带 (度)，保持状态下误差超出该值才重新转动；None表示2倍容差
+        :param limits: 目标位置范围 (下限, 上限)，None表示不限制
+        :param braking: 是否学习刹车距离并提前松开继电器
+        :param coast: 刹车距离估计 (CoastEstimator)，None时新建
+        :param pulse_range: 停稳后误差小于该值时用短脉冲修正 (度)
+        :param min_pulse: 最短脉冲 (秒)
+        :param max_pulse: 最长脉冲 (秒)
+        :param settle_speed: 转速低于该值视为静止 (度/秒)
+        :param settle_time: 持续静止该时间后视为停稳 (秒)
+        :param velocity_window: 转速估计的时间窗口 (秒)
+        :param period: 转动和停稳阶段的决策周期 (秒)，0表示每个控制周期都决策
+        :param hold_period: 保持阶段的检查周期 (秒)
+        :param stall_timeout: 继电器吸合但位置无变化超过该时间视为故障 (秒)，None表示不检查
+        :param timed_pulses: 短脉冲由继电器固件计时（一次发送 "AZ1T120" 形式的命令），
+                             否则由主机在脉冲结束时发送停止命令
+        :param pulse_margin: 固件计时的脉冲结束后，主机再等待的时间 (秒)，之后才视为松开
+        """
+        self.name = name
+        self.tolerance = tolerance
+        self.hold_band = 2 * tolerance if hold_band is None else hold_band
+        self.limits = limits
+        self.braking = braking
+        self.coast = coast or CoastEstimator()
+        self.pulse_range = pulse_range
+        self.min_pulse = min_pulse
+        self.max_pulse = max_pulse
+        self.settle_speed = settle_speed
+        self.settle_time = settle_time
+        self.velocity_window = velocity_window
+        self.period = period
+        self.hold_period = hold_period
+        self.stall_timeout = stall_timeout
+        self.timed_pulses = timed_pulses
+        self.pulse_margin = pulse_margin
+
+        self.goal = None
+        self.state = self.IDLE
+        self.fault = None         # 故障信息
+        self.direction = 0        # 当前输出方向 1/-1/0
+        self.toggles = 0          # 继电器动作次数
+        self.rate = None          # 学习到的整速转速 (度/秒)
+        self.pulse_gain = None    # 短脉冲每秒转过的角度 (度/秒)
+        self.velocity = 0.0
+        self._history = deque()   # [(时刻, 位置)]
+        self._still_since = None
+        self._next_update = 0.0
+        self._pulse_end = 0.0
+        self._pulse_duration = 0.0
+        self._release = None      # (位置, 转速, 方向, 是否用于学习刹车距离)
+        self._pulse_start = None  # 脉冲开始时的位置
+        self._pulse_request = None  # 待发送给固件的脉冲时长 (毫秒)
+        self._progress = None     # (时刻, 位置)：最近一次确认轴在转动
+
+    def set_goal(self, goal):
+        """
+        设置新的目标位置；停稳阶段保持不变，停稳后再按新目标决策
+
+        :raises AxisFault: 目标超出限位
+        """
+        goal = float(goal)
+        if self.limits:
+            low, high = self.limits
+            if not low - self.tolerance <= goal <= high + self.tolerance:
+                self._set_fault(f"目标 {goal:.2f}° 超出范围 [{low:g}°, {high:g}°]")
+                raise AxisFault(self.fault)
+            # 容差以内的越限（例如指向模型修正后略超90°）按限位处理
+            goal = min(high, max(low, goal))
+        self.goal = goal
+        self.fault = None
+        self._next_update = 0.0
+        if self.state in (self.IDLE, self.HOLDING, self.FAULT):
+            self.state = self.IDLE
+        elif self.state == self.PULSING:
+            # 脉冲中改为整速转动，按新目标判断何时松开
+            self.state = self.SLEWING
+            self._progress = None
+
+    def track_goal(self, goal):
+        """
+        跟踪移动目标：只更新目标位置，不重置状态，保持带和决策周期照常生效；
+        超出限位的部分按限位处理（跟踪路径在设置时已整体检查）
+        """
+        goal = float(goal)
+        if self.limits:
+            goal = min(self.limits[1], max(self.limits[0], goal))
+        self.goal = goal
+
+    def update(self, position, now):
+        """
+        用新的位置读数更新状态机
+
+        :param position: 当前位置 (度)，方位轴为展开方位角
+        :param now: 读数时刻 (time.monotonic)
+        :return: 输出方向 1（正向）、-1（反向）或 0（停止）
+        :raises AxisFault: 读数无效或转动停滞
+        """
+        if self.state == self.FAULT:
+            self._output(0)
+            raise AxisFault(self.fault)
+        if position is None or not np.isfinite(position):
+            self._set_fault("位置读数无效")
+            raise AxisFault(self.fault)
+        self._track(position, now)
+        if now < self._next_update:
+            return self.direction
+        self._next_update = now + (self.hold_period if self.state == self.HOLDING else self.period)
+
+        error = self.goal - position
+        speed = abs(self.velocity)
+
+        if self.state == self.SLEWING:
+            self._check_progress(position, now)
+            if self.velocity * self.direction > 0:
+                self.rate = speed if self.rate is None else max(0.9 * self.rate + 0.1 * speed, speed)
+            release_at = self.coast.predict(speed) if self.braking else self.tolerance
+            if self.direction * error > release_at:
+                return self.direction
+            self._release_relay(position, speed, learn=self.braking)
+
+        if self.state == self.PULSING:
+            # 固件计时的脉冲到时自行停止，主机稍后再转入停稳阶段，避免提前截断
+            pulse_end = self._pulse_end + (self.pulse_margin if self.timed_pulses else 0.0)
+            if now < pulse_end and self.direction * error > 0:
+                return self.direction
+            self._release_relay(position, speed, learn=False)
+
+        if self.state == self.SETTLING:
+            if self.braking:
+                if not self._settled(now):
+                    return self._output(0)
+                self._learn(position)
+            self.state = self.IDLE
+
+        if self.state == self.HOLDING and abs(error) <= self.hold_band:
+            return self._output(0)
+        return self._decide(error, position, now)
+
+    def _decide(self, error, position, now):
+        """静止时决策：进入保持、整速转动或短脉冲"""
+        if abs(error) <= self.tolerance:
+            self.state = self.HOLDING
+            self._next_update = now + self.hold_period
+            return self._output(0)
+        direction = 1 if error > 0 else -1
+        if self.braking and self.rate and abs(error) <= self.pulse_range:
+            gain = self.pulse_gain or self.rate
+            self._pulse_duration = min(self.max_pulse, max(self.min_pulse, abs(error) / gain))
+            if self.timed_pulses:
+                self._pulse_request = max(1, round(self._pulse_duration * 1000))
+                self._pulse_duration = self._pulse_request / 1000.0
+            self._pulse_end = now + self._pulse_duration
+            self._pulse_start = position
+            self.state = self.PULSING
+        else:
+            self._enter_slewing(position, now)
+        return self._output(direction)
+
+    def take_pulse(self):
+        """
+        取出待发送的固件脉冲时长 (毫秒)；每个脉冲只返回一次，
+        脉冲执行期间返回None，此时命令中不应包含该轴，以免打断固件计时
+        """
+        request, self._pulse_request = self._pulse_request, None
+        return request
+
+    def abort(self):
+        """外部停止（停止请求或另一轴故障）：松开继电器，停稳后再按目标决策"""
+        if self.state in (self.SLEWING, self.PULSING):
+            self._pulse_start = None
+            self._pulse_request = None
+            self._release_relay(None, 0.0, learn=False)
+
+    def is_holding(self):
+        return self.state == self.HOLDING
+
+    def is_fault(self):
+        return self.state == self.FAULT
+
+    def _enter_slewing(self, position, now):
+        self.state = self.SLEWING
+        self._progress = (now, position)
+
+    def _check_progress(self, position, now):
+        """继电器吸合后位置长时间不变，说明电机或传感器异常"""
+        if self.stall_timeout is None:
+            return
+        if self._progress is None:
+            self._progress = (now, position)
+        since, start = self._progress
+        if abs(position - start) > self.settle_speed * self.velocity_window:
+            self._progress = (now, position)
+        elif now - since > self.stall_timeout:
+            self._set_fault(f"继电器吸合 {self.stall_timeout:g} 秒后位置仍无变化")
+            raise AxisFault(self.fault)
+
+    def _set_fault(self, message):
+        self.fault = f"{self.name}轴故障: {message}"
+        self.state = self.FAULT
+        self._output(0)
+
+    def _output(self, direction):
+        if direction != self.direction:
+            self.toggles += 1
+        self.direction = direction
+        return direction
+
+    def _release_relay(self, position, speed, learn):
+        self._release = (position, speed, self.direction, learn)
+        self._still_since = None
+        self.state = self.SETTLING
+        self._output(0)
+
+    def _learn(self, position):
+        """停稳后按实际转过的角度更新刹车距离或脉冲增益"""
+        release_position, speed, direction, learn = self._release
+        if learn:
+            self.coast.observe(speed, direction * (position - release_position))
+        elif self._pulse_start is not None:
+            moved = direction * (position - self._pulse_start)
+            if moved > 0:
+                gain = moved / self._pulse_duration
+                self.pulse_gain = gain if self.pulse_gain is None else 0.5 * (self.pulse_gain + gain)
+        self._pulse_start = None
+
+    def _track(self, position, now):
+        """按时间窗口内的首末读数估计转速；同一时刻的重复读数忽略"""
+        if self._history and now <= self._history[-1][0]:
+            return
+        self._history.append((now, position))
+        while len(self._history) > 2 and now - self._history[1][0] >= self.velocity_window:
+            self._history.popleft()
+        t0, p0 = self._history[0]
+        if now > t0:
+            self.velocity = (position - p0) / (now - t0)
+        if abs(self.velocity) < self.settle_speed:
+            if self._still_since is None:
+                self._still_since = now
+        else:
+            self._still_since = None
+
+    def _settled(self, now):
+        return self._still_since is not None and now - self._still_since >= self.settle_time
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "goal": self.goal,
+            "direction": self.direction,
+            "fault": self.fault,
+            "toggles": self.toggles,
+            "rate": self.rate,
+            "pulse_gain": self.pulse_gain,
+            "coast": self.coast.to_dict(),
+        }
@@ -0,0 +1,85 @@
+from functools import lru_cache
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import EarthLocation, SkyCoord, AltAz
+from astropy.time import Time
+
+
+@lru_cache(maxsize=64)
+def get_location(lat, lon):
+    """
+    获取观测地点对象（按经纬度缓存，避免每次转换都重新构造）
+
+    :param lat: 观测点纬度 (度)
+    :param lon: 观测点经度 (度)
+    :return: EarthLocation对象
+    """
+    return EarthLocation(lat=lat*u.deg, lon=lon*u.deg)
+
+
+def to_time(times):
+    """
+    将datetime、datetime列表或astropy Time统一转换为astropy Time
+
+    :param times: 观测时间
+    :return: astropy Time对象
+    """
+    if isinstance(times, Time):
+        return times
+    return Time(times)
+
+
+def equatorial_to_horizontal_batch(ra, dec, lat, lon, times, refraction=None):
+    """
+    批量将赤道坐标转换为地平坐标，一次astropy变换完成所有计算。
+
+    ra/dec 与 times 按NumPy广播规则组合，例如：
+    - N个目标、单个时间 -> 形状 (N,)
+    - N个目标、T个时间 -> ra/dec传入 (N, 1)，times传入 (T,)，结果形状 (N, T)
+
+    :param ra: 赤经 (小时)，标量或数组
+    :param dec: 赤纬 (度)，标量或数组
+    :param lat: 观测点纬度 (度)，也可以是与ra/dec可广播的数组
+    :param lon: 观测点经度 (度)，也可以是与ra/dec可广播的数组
+    :param times: 观测时间 (datetime、datetime列表或astropy Time)
+    :param refraction: 大气折射表 (RefractionTable)，None表示不做折射修正（返回几何高度角）
+    :return: (方位角数组, 高度角数组) 单位：度
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    if np.ndim(lat) or np.ndim(lon):
+        # 多个观测地点（例如多台望远镜），与ra/dec逐元素对应
+        location = EarthLocation(lat=np.asarray(lat, dtype=float)*u.deg,
+                                 lon=np.asarray(lon, dtype=float)*u.deg)
+    else:
+        location = get_location(float(lat), float(lon))
+    astropy_time = to_time(times)
+    equatorial_coord = SkyCoord(ra=ra*15*u.deg, dec=dec*u.deg)
+    altaz_frame = AltAz(obstime=astropy_time, location=location)
+    altaz_coord = equatorial_coord.transform_to(altaz_frame)
+    altitude = altaz_coord.alt.deg
+    if refraction is not None:
+        altitude = refraction.apparent(altitude)
+    return altaz_coord.az.deg, altitude
+
+
+def horizontal_to_equatorial_batch(az, alt, lat, lon, times, refraction=None):
+    """
+    批量将地平坐标转换为赤道坐标（equatorial_to_horizontal_batch的逆变换）
+
+    :param az: 方位角 (度)，标量或数组
+    :param alt: 高度角 (度)，标量或数组
+    :param lat: 观测点纬度 (度)
+    :param lon: 观测点经度 (度)
+    :param times: 观测时间 (datetime、datetime列表或astropy Time)
+    :param refraction: 大气折射表 (RefractionTable)，给出时alt视为视高度角
+    :return: (赤经数组 (小时), 赤纬数组 (度))
+    """
+    az = np.asarray(az, dtype=float)
+    alt = np.asarray(alt, dtype=float)
+    if refraction is not None:
+        alt = refraction.true(alt)
+    altaz_frame = AltAz(obstime=to_time(times), location=get_location(float(lat), float(lon)))
+    horizontal_coord = SkyCoord(az=az*u.deg, alt=alt*u.deg, frame=altaz_frame)
+    equatorial_coord = horizontal_coord.transform_to('icrs')
+    return equatorial_coord.ra.deg / 15.0, equatorial_coord.dec.deg
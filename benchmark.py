@@ -0,0 +1,229 @@
+"""
+性能基准测试：坐标转换、控制周期、寄存器解析、MPU6050帧解析和/status接口。
+
+全部离线运行（虚拟陀螺仪、完全仿真模式、Flask测试客户端），结果与保存的基准比较，
+变慢超过阈值时返回非0退出码。
+
+用法：
+    python benchmark.py                      # 运行全部用例并与基准比较
+    python benchmark.py transform_batch      # 只运行指定用例
+    python benchmark.py --update-baseline    # 用本次结果更新基准文件
+"""
+import io
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import importlib.util
+import contextlib
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+DEFAULT_THRESHOLD = 0.5  # 比基准慢50%以上视为退化
+
+# 名称 -> (准备函数, 每轮调用次数, 阈值, 说明)；准备函数返回无参数的被测函数
+BENCHMARKS = {}
+
+
+def benchmark(name, number, threshold=None, description=""):
+    """注册基准用例"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, number, threshold, description)
+        return setup
+    return register
+
+
+def measure(func, number, repeat):
+    """重复repeat轮、每轮调用number次，返回单次调用的最短平均耗时 (秒)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+# 赤道坐标转换：同样50个时刻，逐个转换与一次批量转换
+TRANSFORM_POINTS = 50
+
+
+def _transform_times():
+    start = datetime(2024, 3, 15, 12, 0, 0)
+    return [start + timedelta(minutes=i) for i in range(TRANSFORM_POINTS)]
+
+
+@benchmark('transform_scalar', number=1, description=f"逐个转换{TRANSFORM_POINTS}个时刻的赤道坐标")
+def setup_transform_scalar():
+    from gyroscope import VirtualGyroscope
+    from transform_control import TelescopeController
+    controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+    times = _transform_times()
+    return lambda: [controller.equatorial_to_horizontal(5.5, 20.0, 40.0, 116.0, t) for t in times]
+
+
+@benchmark('transform_batch', number=5, description=f"批量转换{TRANSFORM_POINTS}个时刻的赤道坐标")
+def setup_transform_batch():
+    from batch_transform import equatorial_to_horizontal_batch
+    times = _transform_times()
+    return lambda: equatorial_to_horizontal_batch(5.5, 20.0, 40.0, 116.0, times)
+
+
+@benchmark('control_tick', number=200, description="仿真模式下一个控制周期（读姿态、计算、发送命令）")
+def setup_control_tick():
+    from gyroscope import VirtualGyroscope
+    from transform_control import TelescopeController
+    controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+    sink = io.StringIO()
+
+    def tick():
+        # 目标远离当前位置，每个周期都输出运动命令
+        if controller.gyro.current_alt > 80.0:
+            controller.gyro.current_alt = 20.0
+        with contextlib.redirect_stdout(sink):
+            controller.control_step()
+        sink.seek(0)
+        sink.truncate()
+
+    controller.set_target(180.0, 85.0, coordinate_type='horizontal')
+    return tick
+
+
+@benchmark('decode_angles', number=20000, description="Modbus角度寄存器解码")
+def setup_decode_angles():
+    from gyroscope import decode_angles
+    registers = [65436, 455, 1200]
+    return lambda: decode_angles(registers)
+
+
+@benchmark('parse_mpu6050_frame', number=5000, description="MPU6050数据帧解析 (6050_test.parse_sensor_data)")
+def setup_parse_mpu6050_frame():
+    # 文件名以数字开头，不能直接import
+    spec = importlib.util.spec_from_file_location('mpu6050_test', os.path.join(BASE_DIR, '6050_test.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    frame = ['5a', '4a', '01', '02', '03', '04', '05',
+             'ff', '9c', '00', '64', '40', '00', '03', 'e8', 'fc', '18', '00', '00',
+             '00', 'aa', '55']
+    return lambda: module.parse_sensor_data(frame)
+
+
+@benchmark('status_request', number=200, description="/status 接口请求（Flask测试客户端）")
+def setup_status_request():
+    with contextlib.redirect_stdout(io.StringIO()):
+        import telescope_web
+    client = telescope_web.app.test_client()
+
+    def request():
+        response = client.get('/status')
+        assert response.status_code == 200
+    return request
+
+
+def run(names=None, repeat=5):
+    """
+    运行基准用例
+
+    :param names: 用例名称列表，None表示全部
+    :param repeat: 每个用例的重复轮数
+    :return: {名称: {"seconds": 单次耗时, "ops_per_second": 每秒次数}}
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise ValueError(f"未知的基准用例: {name}")
+        setup, number, _, _ = BENCHMARKS[name]
+        func = setup()
+        func()  # 预热：加载星表、建立缓存等一次性开销不计入
+        seconds = measure(func, number, repeat)
+        results[name] = {"seconds": seconds, "ops_per_second": 1.0 / seconds if seconds else None}
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    与基准比较
+
+    :param results: run()的结果
+    :param baseline: 基准数据（结构与results相同）
+    :param threshold: 默认退化阈值，用例注册时指定的阈值优先
+    :return: [(名称, 本次耗时/基准耗时 或 None, 是否退化)]
+    """
+    report = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            report.append((name, None, False))
+            continue
+        limit = BENCHMARKS[name][2] if name in BENCHMARKS and BENCHMARKS[name][2] is not None else threshold
+        ratio = result["seconds"] / reference["seconds"]
+        report.append((name, ratio, ratio > 1.0 + limit))
+    return report
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    data = {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def format_report(results, report):
+    lines = [f"{'用例':<22}{'单次耗时':>14}{'每秒次数':>14}{'与基准比':>10}"]
+    for name, ratio, regressed in report:
+        seconds = results[name]["seconds"]
+        ratio_text = "-" if ratio is None else f"{ratio:.2f}x"
+        flag = "  退化" if regressed else ""
+        lines.append(f"{name:<22}{seconds * 1e6:>12.1f}us{results[name]['ops_per_second']:>14.0f}{ratio_text:>10}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="望远镜控制软件性能基准测试")
+    parser.add_argument('names', nargs='*', help="只运行指定的用例")
+    parser.add_argument('--repeat', type=int, default=5, help="每个用例的重复轮数")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="退化阈值（相对基准变慢的比例）")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="基准文件路径")
+    parser.add_argument('--update-baseline', action='store_true', help="用本次结果更新基准文件")
+    parser.add_argument('--output', help="同时把报告写入该文件")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    results = run(args.names or None, repeat=args.repeat)
+    baseline = load_baseline(args.baseline)
+    report = compare(results, baseline, args.threshold)
+    text = format_report(results, report)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+    if args.update_baseline:
+        baseline.update(results)
+        save_baseline(baseline, args.baseline)
+        print(f"基准已更新: {args.baseline}")
+        return 0
+    regressions = [name for name, _, regressed in report if regressed]
+    if regressions:
+        print(f"性能退化: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
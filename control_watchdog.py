@@ -0,0 +1,106 @@
+import time
+import logging
+import threading
+from collections import deque
+
+
+class ControlWatchdog:
+    """
+    控制看门狗：在独立线程中监视控制周期心跳和姿态数据的新鲜度。
+
+    继电器处于吸合状态时，若控制决策（心跳）或有效姿态超过期限没有更新——传感器读取卡住、
+    控制线程异常退出等——看门狗直接发送停止命令，不经过控制线程。
+    继电器松开时控制线程可以空闲或等待，看门狗不做检查。
+    """
+    def __init__(self, controller, deadline=0.5, max_attitude_age=None, period=None, on_trip=None):
+        """
+        :param controller: TelescopeController对象
+        :param deadline: 心跳停止到停止命令发出的最长时间 (秒)
+        :param max_attitude_age: 有效姿态的最长使用时间 (秒)，默认与deadline相同
+        :param period: 检查周期 (秒)，默认deadline的四分之一
+        :param on_trip: 触发回调 on_trip(原因)，在看门狗线程中调用
+        """
+        self.controller = controller
+        self.deadline = float(deadline)
+        self.max_attitude_age = self.deadline if max_attitude_age is None else float(max_attitude_age)
+        self.period = self.deadline / 4 if period is None else float(period)
+        self.on_trip = on_trip
+        # 最近若干次触发：{'time', 'reason', 'latency'}，latency为心跳（或姿态）最后更新到停止命令发出的耗时
+        self.trips = deque(maxlen=100)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动看门狗线程"""
+        if self.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telescope-watchdog", daemon=True)
+        self._thread.start()
+        logging.info(f"控制看门狗已启动: 期限 {self.deadline * 1000:.0f} ms")
+
+    def is_alive(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"看门狗检查出错: {e}")
+
+    def check(self, now=None):
+        """
+        检查一次，超时则发送停止命令
+
+        按检查周期留出余量：时间戳超过 (期限 - 检查周期) 即触发，停止命令在期限内发出。
+
+        :return: 触发原因，未触发返回None
+        """
+        controller = self.controller
+        if not controller.relays_active:
+            return None
+        now = time.monotonic() if now is None else now
+        margin = self.period
+        heartbeat_age = now - controller.last_heartbeat
+        attitude_age = now - controller.last_attitude_time
+        if heartbeat_age > self.deadline - margin:
+            reason, since = f"控制周期 {heartbeat_age * 1000:.0f} ms 没有心跳", controller.last_heartbeat
+        elif attitude_age > self.max_attitude_age - margin:
+            reason, since = f"姿态数据 {attitude_age * 1000:.0f} ms 没有更新", controller.last_attitude_time
+        else:
+            return None
+        self.trip(reason, since)
+        return reason
+
+    def trip(self, reason, since=None):
+        """发送停止命令并记录触发"""
+        controller = self.controller
+        controller.emergency_stop()
+        latency = time.monotonic() - (controller.last_heartbeat if since is None else since)
+        self.trips.append({'time': time.time(), 'reason': reason, 'latency': latency})
+        logging.error(f"看门狗触发: {reason}，已发送停止命令（距最后一次更新 {latency * 1000:.0f} ms）")
+        if self.on_trip:
+            try:
+                self.on_trip(reason)
+            except Exception as e:
+                logging.error(f"看门狗回调出错: {e}")
+
+    def status(self):
+        last = self.trips[-1] if self.trips else None
+        return {
+            "running": self.is_alive(),
+            "deadline": self.deadline,
+            "trips": len(self.trips),
+            "last_trip": {
+                "time": last['time'],
+                "reason": last['reason'],
+                "latency": round(last['latency'], 4),
+            } if last else None,
+        }
@@ -0,0 +1,224 @@
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from control_watchdog import ControlWatchdog
+
+
+class _StopRequest:
+    """一次停止请求；控制线程和调用线程谁先认领谁发送停止命令"""
+    def __init__(self):
+        self.requested = time.perf_counter()
+        self.claimed = False
+        self.latency = None
+        self.done = threading.Event()
+
+
+class ControllerService:
+    """
+    常驻控制线程。
+
+    控制器和串口连接在整个会话期间保持不变，新目标和停止请求通过线程安全的
+    命令队列送入，在下一个控制周期之前生效（等待周期时也会被命令立即唤醒）。
+    """
+    IDLE = 'idle'
+    SLEWING = 'slewing'
+    ARRIVED = 'arrived'
+    STOPPED = 'stopped'
+    ERROR = 'error'
+
+    def __init__(self, controller, period=0.005, stop_deadline=0.02, on_state_change=None, watchdog_deadline=None):
+        """
+        :param controller: TelescopeController对象
+        :param period: 控制周期 (秒)
+        :param stop_deadline: 停止请求的最长等待时间 (秒)，控制线程超时未响应时由调用线程直接发送停止命令
+        :param on_state_change: 状态变化回调 on_state_change(state)
+        :param watchdog_deadline: 看门狗期限 (秒)，运动中控制周期卡住超过该时间时由看门狗线程发送停止命令；None表示不启用
+        """
+        self.controller = controller
+        self.period = period
+        self.stop_deadline = stop_deadline
+        self.on_state_change = on_state_change
+        self.state = self.IDLE
+        self.error = None
+        # 最近若干次停止请求到继电器停止命令发出的耗时 (秒)
+        self.stop_latencies = deque(maxlen=100)
+        self.watchdog = None
+        if watchdog_deadline:
+            self.watchdog = ControlWatchdog(controller, watchdog_deadline, on_trip=self._on_watchdog_trip)
+
+        self._commands = queue.Queue()
+        self._done = threading.Event()      # 当前目标结束（到达、停止或出错）
+        self._claim_lock = threading.Lock()
+        self._thread = None
+
+    # ---- 对外接口（任意线程调用） ----
+
+    def start(self):
+        """启动控制线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="telescope-control")
+        self._thread.daemon = True
+        self._thread.start()
+        if self.watchdog:
+            self.watchdog.start()
+        logging.info("常驻控制线程已启动")
+
+    def is_alive(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def set_target(self, *args, **kwargs):
+        """设置新目标，参数与TelescopeController.set_target相同；运动中也可直接切换目标"""
+        self._done.clear()
+        self._commands.put(('target', args, kwargs, None))
+
+    def stop(self):
+        """
+        停止运动。停止命令在控制线程的下一个周期之前发出；若控制线程正阻塞在
+        传感器读取等操作中超过stop_deadline，则由调用线程直接发送停止命令。
+
+        :return: 本次停止请求到停止命令发出的耗时 (秒)
+        """
+        request = _StopRequest()
+        self._commands.put(('stop', (), {}, request))
+        if request.done.wait(self.stop_deadline):
+            return request.latency
+        if self._execute_stop(request, in_control_thread=False):
+            logging.warning("控制线程未及时响应停止请求，已直接发送停止命令")
+            return request.latency
+        if request.done.wait(self.stop_deadline):
+            return request.latency
+        # 控制线程已认领请求，但卡在串口写入中（写入锁被占用）：绕过写入锁直接发送
+        self.controller.emergency_stop()
+        self._commands.put(('abort', (), {}, None))
+        latency = time.perf_counter() - request.requested
+        self.stop_latencies.append(latency)
+        self._set_state(self.STOPPED)
+        self._done.set()
+        logging.error(f"控制线程发送停止命令超时，已绕过写入锁直接发送，延迟 {latency * 1000:.2f} ms")
+        return latency
+
+    def shutdown(self, timeout=1.0):
+        """停止运动并结束控制线程（不关闭控制器）"""
+        if not self.is_alive():
+            return
+        self._commands.put(('shutdown', (), {}, _StopRequest()))
+        self._thread.join(timeout)
+        if self.watchdog:
+            self.watchdog.stop()
+
+    def wait(self, timeout=None):
+        """等待当前目标结束，返回是否在超时前结束"""
+        return self._done.wait(timeout)
+
+    def control_loop(self):
+        """
+        阻塞直到当前目标结束，返回值与TelescopeController.control_loop一致，
+        使observation_plan.execute_plan等调用方可以直接使用本服务。
+
+        :return: 0 到达目标，1 控制失败，2 被停止
+        """
+        self._done.wait()
+        if self.state == self.ARRIVED:
+            return 0
+        if self.state == self.STOPPED:
+            return 2
+        return 1
+
+    # ---- 控制线程 ----
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                try:
+                    self.on_state_change(state)
+                except Exception as e:
+                    logging.error(f"状态回调出错: {e}")
+
+    def _execute_stop(self, request, in_control_thread=True):
+        """
+        认领并执行停止请求，返回False表示已被另一线程执行
+
+        :param in_control_thread: 是否在控制线程中执行；调用线程使用不等待写入锁的紧急停止，
+                                  以免控制线程卡在串口写入时一起被卡住
+        """
+        with self._claim_lock:
+            if request.claimed:
+                return False
+            request.claimed = True
+        if in_control_thread:
+            self.controller.request_stop()
+        else:
+            self.controller.emergency_stop()
+            # 各轴状态机由控制线程复位
+            self._commands.put(('abort', (), {}, None))
+        request.latency = time.perf_counter() - request.requested
+        self.stop_latencies.append(request.latency)
+        self._set_state(self.STOPPED)
+        self._done.set()
+        request.done.set()
+        logging.info(f"停止命令已发出，延迟 {request.latency * 1000:.2f} ms")
+        return True
+
+    def _on_watchdog_trip(self, reason):
+        """看门狗已发送停止命令（在看门狗线程中调用）：当前目标以失败结束，各轴状态机由控制线程复位"""
+        self.error = f"看门狗停止: {reason}"
+        self._set_state(self.ERROR)
+        self._done.set()
+        self._commands.put(('abort', (), {}, None))
+
+    def _apply(self, command):
+        """在控制线程中执行一条命令，返回False表示线程应退出"""
+        kind, args, kwargs, request = command
+        if kind == 'target':
+            try:
+                self.controller.set_target(*args, **kwargs)
+            except Exception as e:
+                self.error = str(e)
+                logging.error(f"设置目标失败: {e}")
+                self._set_state(self.ERROR)
+                self._done.set()
+                return True
+            self.error = None
+            self._set_state(self.SLEWING)
+        elif kind == 'stop':
+            self._execute_stop(request)
+        elif kind == 'abort':
+            self.controller.abort_axes()
+        elif kind == 'shutdown':
+            self._execute_stop(request)
+            return False
+        return True
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while True:
+            # 空闲时阻塞等待命令；运动中最多等待到下一个控制周期
+            timeout = None if self.state != self.SLEWING else max(0.0, next_tick - time.perf_counter())
+            try:
+                command = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                if not self._apply(command):
+                    logging.info("常驻控制线程已退出")
+                    return
+                continue
+
+            next_tick = time.perf_counter() + self.period
+            try:
+                reached = self.controller.control_step()
+                # 控制周期卡住期间看门狗可能已结束当前目标
+                if reached and self.state == self.SLEWING:
+                    self._set_state(self.ARRIVED)
+                    self._done.set()
+            except Exception as e:
+                self.error = str(e)
+                logging.error(f"控制异常: {e}")
+                self.controller.request_stop()
+                self._set_state(self.ERROR)
+                self._done.set()
@@ -1,11 +1,135 @@
 from abc import ABC, abstractmethod
+import itertools
+import inspect
+import functools
+import re
 import time
-from pymodbus.client import ModbusSerialClient
+import logging
+import threading
+from pymodbus.client import ModbusSerialClient, AsyncModbusSerialClient
+from pymodbus.exceptions import ModbusException
 from typing import Tuple, Optional
 import numpy as np
 
+def decode_angles(registers) -> Tuple[float, float, float]:
+    """
+    将角度寄存器原始值转换为三轴角度
+    Args:
+        registers: 3个寄存器值（16位有符号整数，放大10倍）
+    Returns:
+        tuple: (x角度, y角度, z角度) 单位：度
+    """
+    angles = []
+    for raw in registers[:3]:
+        signed = raw - 65536 if raw > 32767 else raw
+        angles.append(signed / 10.0)
+    return angles[0], angles[1], angles[2]
+
+# 陀螺仪波特率配置寄存器及取值（485ug说明书），出厂默认4800
+BAUD_REGISTER = 0x07D1
+BAUD_CODES = {2400: 0, 4800: 1, 9600: 2, 19200: 3, 38400: 4, 57600: 5, 115200: 6, 1200: 7}
+
+
+# 零点校准（485ug说明书6.3节）：向校准寄存器写入固定的命令值，校准时传感器需保持静止
+CALIBRATION_COMMANDS = {'xy': (0x0053, 0x0067), 'z': (0x0054, 0x0052)}
+
+
+class StaleSampleError(IOError):
+    """陀螺仪没有有效采样：从未读到数据，或连续读取失败超过允许时间"""
+
+
+class RoundTripTimer:
+    """
+    按测得的往返时间调整Modbus响应超时：timeout = srtt + 4·rttvar（与TCP重传超时的算法相同），
+    超时后加倍退避。正常时超时只比实际往返时间略长，一次丢帧只损失几十毫秒而不是1秒。
+    """
+    def __init__(self, initial=1.0, minimum=0.05, maximum=1.0):
+        """
+        Args:
+            initial: 尚无测量值时的超时 (秒)
+            minimum: 超时下限 (秒)
+            maximum: 超时上限 (秒)
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = min(maximum, max(minimum, initial))
+
+    def observe(self, rtt):
+        """记录一次成功读取的往返时间，返回新的超时"""
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.timeout = min(self.maximum, max(self.minimum, self.srtt + 4 * self.rttvar))
+        return self.timeout
+
+    def backoff(self):
+        """读取超时后加倍超时，返回新的超时"""
+        self.timeout = min(self.maximum, self.timeout * 2)
+        return self.timeout
+
+
+def set_client_timeout(client, timeout):
+    """修改pymodbus客户端的响应超时（客户端、事务层和串口各持有一份参数）"""
+    owners = [client, getattr(client, 'transaction', None), getattr(client, 'ctx', None)]
+    for owner in owners:
+        params = getattr(owner, 'comm_params', None)
+        if params is not None:
+            params.timeout_connect = timeout
+    port = getattr(client, 'socket', None)
+    if port is not None and hasattr(port, 'timeout'):
+        port.timeout = timeout
+
+# 可重试的通信错误（超时、无应答、CRC错误等）；其他异常是程序错误，不按读取失败重试
+TRANSIENT_ERRORS = (ModbusException, OSError)
+
+
+@functools.lru_cache(maxsize=None)
+def _unit_keyword(function):
+    parameters = inspect.signature(function).parameters
+    for name in ('device_id', 'slave', 'unit'):
+        if name in parameters:
+            return name
+    return 'device_id'
+
+
+def unit_argument(method, unit):
+    """
+    pymodbus客户端方法的从站地址参数：3.10起由slave改名为device_id，更早的版本为slave，按方法签名选择
+
+    :param method: 客户端方法，如 client.read_holding_registers
+    :param unit: 从站地址
+    :return: 关键字参数字典
+    """
+    return {_unit_keyword(getattr(method, '__func__', method)): unit}
+
+# 继电器命令中的轴字段：AZ/EL + 方向(0停止 1顺时针/升高 2逆时针/降低)，可选 T<毫秒> 表示定时脉冲
+RELAY_FIELD = re.compile(r'(AZ|EL)([012])(?:T(\d+))?')
+DIRECTIONS = {'0': 0, '1': 1, '2': -1}
+
+
+def parse_relay_command(cmd):
+    """
+    解析继电器命令，与relay_control.cpp的解析规则一致
+    Args:
+        cmd: 命令字符串，例如 "AZ1EL0"、"AZ1T120"（方位轴顺时针转动120毫秒后自动停止）
+    Returns:
+        dict: {'AZ'/'EL': (方向 1/-1/0, 脉冲时长 (秒) 或 None)}，命令中没有出现的轴保持不变
+    """
+    fields = {}
+    for axis, direction, duration in RELAY_FIELD.findall(cmd):
+        fields[axis] = (DIRECTIONS[direction], int(duration) / 1000.0 if duration else None)
+    return fields
+
 class GyroscopeBase(ABC):
     """陀螺仪基类，定义统一接口"""
+
+    def is_stale(self) -> bool:
+        """最近一次返回的姿态是否过期（读取失败时沿用的旧数据）"""
+        return False
     
     @abstractmethod
     def get_current_attitude(self) -> Tuple[float, float]:
@@ -34,33 +158,115 @@ class VirtualGyroscope(GyroscopeBase):
         return self.current_az, self.current_alt
         
     def process_command(self, cmd: str) -> None:
-        """处理控制命令，更新虚拟陀螺仪状态"""
+        """处理控制命令，更新虚拟陀螺仪状态；定时脉冲直接按脉冲时长转动"""
         current_time = time.time()
         dt = current_time - self.last_update
         self.last_update = current_time
         
         # 模拟运动速度（度/秒）
         speed = 10.0
+        fields = parse_relay_command(cmd)
         
-        if "AZ1" in cmd:  # 顺时针
-            self.current_az = (self.current_az + speed * dt) % 360
-        elif "AZ2" in cmd:  # 逆时针
-            self.current_az = (self.current_az - speed * dt) % 360
+        direction, duration = fields.get('AZ', (0, None))
+        self.current_az = (self.current_az + direction * speed * (dt if duration is None else duration)) % 360
             
-        if "EL1" in cmd:  # 升高
-            self.current_alt = min(90.0, self.current_alt + speed * dt)
-        elif "EL2" in cmd:  # 降低
-            self.current_alt = max(20.0, self.current_alt - speed * dt)
+        direction, duration = fields.get('EL', (0, None))
+        alt = self.current_alt + direction * speed * (dt if duration is None else duration)
+        self.current_alt = max(20.0, min(90.0, alt))
+
+class InertialVirtualGyroscope(VirtualGyroscope):
+    """
+    带延迟和惯性的虚拟陀螺仪：命令经过latency秒才作用到电机，
+    电机按加速度起步、松开继电器后按减速度滑行，用于仿真刹车距离和超调。
+    """
+    def __init__(self, speed=10.0, latency=0.05, acceleration=100.0, deceleration=50.0, step=0.001):
+        """
+        Args:
+            speed: 最高转速 (度/秒)
+            latency: 命令从发出到生效的延迟 (秒)，包括串口和继电器动作时间
+            acceleration: 起步加速度 (度/秒²)
+            deceleration: 松开继电器后的减速度 (度/秒²)，滑行距离为 speed²/(2·deceleration)
+            step: 积分步长 (秒)
+        """
+        super().__init__()
+        self.speed = speed
+        self.latency = latency
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        self.step = step
+        self.velocity = [0.0, 0.0]   # 方位、高度转速 (度/秒)
+        self.drive = [0, 0]          # 当前生效的继电器方向 1/-1/0
+        self.pending = []            # 按时间排序的 [(生效时刻, 轴序号, 方向)]
+        self.last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get_current_attitude(self) -> Tuple[float, float]:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self.current_az, self.current_alt
+
+    def process_command(self, cmd: str) -> None:
+        """记录命令，延迟latency秒后生效；定时脉冲到时自动停止，新命令取消该轴未执行完的脉冲"""
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            start = now + self.latency
+            for name, (direction, duration) in parse_relay_command(cmd).items():
+                axis = 0 if name == 'AZ' else 1
+                self.pending = [event for event in self.pending if event[1] != axis or event[0] < start]
+                self.pending.append((start, axis, direction))
+                if duration is not None:
+                    self.pending.append((start + duration, axis, 0))
+            self.pending.sort()
+
+    def _advance(self, now):
+        """积分到now时刻，途中按时间顺序应用已生效的命令"""
+        while self.last_update < now:
+            while self.pending and self.pending[0][0] <= self.last_update:
+                _, axis, direction = self.pending.pop(0)
+                self.drive[axis] = direction
+            dt = min(self.step, now - self.last_update)
+            for axis in range(2):
+                target = self.drive[axis] * self.speed
+                v = self.velocity[axis]
+                rate = self.acceleration if self.drive[axis] else self.deceleration
+                if v < target:
+                    v = min(target, v + rate * dt)
+                elif v > target:
+                    v = max(target, v - rate * dt)
+                self.velocity[axis] = v
+            self.current_az = (self.current_az + self.velocity[0] * dt) % 360
+            alt = self.current_alt + self.velocity[1] * dt
+            if alt >= 90.0 or alt <= 20.0:
+                self.velocity[1] = 0.0
+            self.current_alt = max(20.0, min(90.0, alt))
+            self.last_update += dt
+
 
 class RealGyroscope(GyroscopeBase):
-    """真实陀螺仪实现"""
+    """
+    真实陀螺仪实现
+
+    读取失败时快速重试有限次数，仍失败则沿用上一次有效数据并标记为过期（is_stale），
+    不返回伪造的0值；从未读到有效数据时抛出StaleSampleError。
+
+    与其他传感器共用一条RS485总线时传入bus（modbus_bus.ModbusBus），由总线统一占用串口：
+    总线轮询线程运行时只读取采样缓存，不访问总线；否则通过总线同步读取。
+    """
     def __init__(self, 
                  port: str,
                  baudrate: int = 4800,
                  parity: str = 'N',
                  stopbits: int = 1,
                  bytesize: int = 8,
-                 timeout: int = 1):
+                 timeout: int = 1,
+                 retries: int = 2,
+                 slave: int = 1,
+                 max_sample_age: float = 0.5,
+                 target_baudrate: Optional[int] = None,
+                 bus=None,
+                 poll_period: float = 0.02,
+                 priority: int = 10):
         """
         初始化陀螺仪
         Args:
@@ -69,108 +275,213 @@ class RealGyroscope(GyroscopeBase):
             parity: 校验位 ('N' - 无校验, 'E' - 偶校验, 'O' - 奇校验)
             stopbits: 停止位
             bytesize: 数据位
-            timeout: 超时时间(秒)
+            timeout: 初始超时时间(秒)，之后按测得的往返时间自动调整，不超过该值
+            retries: 读取失败后的重试次数
+            slave: Modbus从站地址
+            max_sample_age: 有效数据超过该时间(秒)未更新视为过期
+            target_baudrate: 连接后协商的目标波特率，None表示不修改传感器配置
+            bus: 共用的Modbus总线 (ModbusBus)，None表示独占串口
+            poll_period: 使用总线时的轮询周期(秒)
+            priority: 使用总线时的轮询优先级，默认高于其他传感器
         """
+        self.port = port
+        self.serial_params = {'parity': parity, 'stopbits': stopbits, 'bytesize': bytesize}
+        self.retries = retries
+        self.slave = slave
+        self.max_sample_age = max_sample_age
+        self.rtt = RoundTripTimer(initial=timeout, maximum=timeout)
+
+        self.last_angles = None       # 最近一次有效的三轴角度
+        self.last_sample_time = 0.0   # 最近一次有效读取的时刻 (time.monotonic)
+        self.stale = True
+        self.read_count = 0
+        self.error_count = 0
+        self.calibrating = False
+        # 控制循环的读取和后台校准任务的读写共用一个客户端，每次事务加锁
+        self._io_lock = threading.Lock()
+
+        self.bus = bus
+        if bus is not None:
+            # 总线的串口参数由ModbusBus统一配置
+            if target_baudrate:
+                raise ValueError("共用总线时波特率由总线配置，不能单独协商")
+            self.baudrate = bus.baudrate
+            self.client = None
+            self.device = bus.add_device('陀螺仪', slave, [(3, 3)], period=poll_period, priority=priority,
+                                         max_sample_age=max_sample_age)
+            return
+        self._connect(baudrate)
+        if target_baudrate and target_baudrate != baudrate:
+            self.negotiate_baudrate(target_baudrate)
+
+    def _connect(self, baudrate):
+        """按指定波特率创建并连接客户端（重试由read_angles控制，客户端内部不重试）"""
+        self.baudrate = baudrate
         self.client = ModbusSerialClient(
-            port=port,
+            port=self.port,
             baudrate=baudrate,
-            parity=parity,
-            stopbits=stopbits,
-            bytesize=bytesize,
-            timeout=timeout
+            timeout=self.rtt.timeout,
+            retries=0,
+            **self.serial_params
         )
         
         if not self.client.connect():
             raise ConnectionError("无法连接到陀螺仪设备")
 
+    def _read_registers(self):
+        """读取一次角度寄存器，记录往返时间并调整超时"""
+        if self.bus is not None:
+            return self.bus.read_registers(self.slave, 3, 3)
+        with self._io_lock:
+            start = time.monotonic()
+            try:
+                # 根据说明书，角度寄存器地址为0x0003-0x0005
+                response = self.client.read_holding_registers(
+                    address=3,
+                    count=3,
+                    **unit_argument(self.client.read_holding_registers, self.slave)
+                )
+            except Exception:
+                set_client_timeout(self.client, self.rtt.backoff())
+                raise
+            if response.isError():
+                raise IOError("读取角度数据失败")
+            set_client_timeout(self.client, self.rtt.observe(time.monotonic() - start))
+            return response.registers
+
     def read_angles(self) -> Tuple[float, float, float]:
         """
-        读取三轴角度值
+        读取三轴角度值；通信失败时重试，重试仍失败则返回上一次有效数据并置过期标志
         Returns:
             tuple: (x角度, y角度, z角度) 单位：度
+        Raises:
+            StaleSampleError: 从未读到有效数据
+            其他异常（非通信错误）直接抛出，不当作读取失败
         """
-        try:
-            # 根据说明书，读取寄存器地址为0x0000-0x0005
-            response = self.client.read_holding_registers(
-                address=3,
-                count=3,
-                slave=1
-            )
-            
-            if response.isError():
-                raise Exception("读取角度数据失败")
-                
+        if self.calibrating:
+            # 校准期间读数会跳变，暂停采样，沿用校准前的数据
+            self.stale = True
+            if self.last_angles is None:
+                raise StaleSampleError("陀螺仪正在校准")
+            return self.last_angles
+        if self.bus is not None and self.bus.running:
+            return self._cached_angles()
+        error = None
+        for _ in range(self.retries + 1):
+            self.read_count += 1
+            try:
+                registers = self._read_registers()
+            except TRANSIENT_ERRORS as e:
+                self.error_count += 1
+                error = e
+                continue
             # 将数据转换为实际角度值（除以10，因为数据被放大了10倍）
-            raw_x = response.registers[0]
-            signed_x = raw_x - 65536 if raw_x > 32767 else raw_x
-            x_angle = signed_x / 10.0
-            
-            raw_y = response.registers[1]
-            signed_y = raw_y - 65536 if raw_y > 32767 else raw_y
-            y_angle = signed_y / 10.0
-            
-            raw_z = response.registers[2]
-            signed_z = raw_z - 65536 if raw_z > 32767 else raw_z
-            z_angle = signed_z / 10.0
-            
-            return x_angle, y_angle, z_angle
-            
-        except Exception as e:
-            print(f"读取角度时发生错误: {str(e)}")
-            return 0.0, 0.0, 0.0
+            self.last_angles = decode_angles(registers)
+            self.last_sample_time = time.monotonic()
+            self.stale = False
+            return self.last_angles
 
-    def calibrate_xy(self) -> bool:
+        self.stale = True
+        logging.warning(f"读取角度失败（已重试{self.retries}次）: {error}")
+        if self.last_angles is None:
+            raise StaleSampleError(f"陀螺仪没有有效数据: {error}")
+        return self.last_angles
+
+    def _cached_angles(self) -> Tuple[float, float, float]:
+        """总线轮询线程的最新采样；轮询失败时为上一次有效数据并置过期标志"""
+        self.read_count += 1
+        try:
+            self.last_sample_time, registers = self.device.registers(3, 3)
+        except StaleSampleError:
+            self.stale = True
+            raise
+        self.last_angles = decode_angles(registers)
+        self.stale = self.device.failed
+        return self.last_angles
+
+    def is_stale(self) -> bool:
+        return self.stale or self.calibrating or time.monotonic() - self.last_sample_time > self.max_sample_age
+
+    def negotiate_baudrate(self, baudrate: int) -> bool:
         """
-        校准XY轴
+        通过配置寄存器0x07D1把传感器切换到更高的波特率，并以新波特率读回验证；
+        验证失败时恢复原波特率
+        Args:
+            baudrate: 目标波特率，取值见BAUD_CODES
         Returns:
-            bool: 校准是否成功
+            bool: 是否切换成功
         """
+        if baudrate not in BAUD_CODES:
+            raise ValueError(f"传感器不支持的波特率: {baudrate}")
+        if self.bus is not None:
+            raise ValueError("共用总线时波特率由总线配置，不能单独协商")
+        previous = self.baudrate
         try:
-            # 根据说明书，写入特定值到校准寄存器
-            result = self.client.write_register(
-                address=0x0006,
-                value=1,
-                slave=1
-            )
-            
-            if result.isError():
-                raise Exception("XY轴校准失败")
-                
-            # 等待校准完成
-            time.sleep(2)
-            return True
-            
+            self.client.write_register(address=BAUD_REGISTER, value=BAUD_CODES[baudrate],
+                                       **unit_argument(self.client.write_register, self.slave))
         except Exception as e:
-            print(f"XY轴校准时发生错误: {str(e)}")
+            # 传感器可能已切换波特率，来不及按原波特率应答，以读回结果为准
+            logging.debug(f"写入波特率寄存器无应答: {e}")
+
+        for candidate in (baudrate, previous):
+            self.client.close()
+            self.rtt = RoundTripTimer(initial=self.rtt.maximum, maximum=self.rtt.maximum)
+            self._connect(candidate)
+            try:
+                self._read_registers()
+            except Exception:
+                continue
+            if candidate == baudrate:
+                logging.info(f"陀螺仪波特率已切换为 {baudrate}")
+                return True
+            logging.warning(f"陀螺仪未能切换到波特率 {baudrate}，继续使用 {previous}")
             return False
+        raise ConnectionError(f"波特率协商后陀螺仪无响应（{baudrate}/{previous}）")
+
+    def _write_register(self, address, value):
+        """写传感器的配置寄存器（共用总线时与轮询互斥）"""
+        if self.bus is not None:
+            return self.bus.write_register(self.slave, address, value)
+        with self._io_lock:
+            response = self.client.write_register(address=address, value=value,
+                                                  **unit_argument(self.client.write_register, self.slave))
+        if response.isError():
+            raise IOError(f"写入寄存器 0x{address:04X} 失败")
+        return response
+
+    def calibrate_xy(self) -> bool:
+        """
+        XY轴零点校准，阻塞到读回确认；后台执行使用 start_calibration('xy')
+        Returns:
+            bool: 校准是否成功
+        """
+        return CalibrationJob(self, 'xy').run()
 
     def calibrate_z(self) -> bool:
         """
-        校准Z轴
+        Z轴零点校准，阻塞到读回确认；后台执行使用 start_calibration('z')
         Returns:
             bool: 校准是否成功
         """
-        try:
-            # 根据说明书，写入特定值到校准寄存器
-            result = self.client.write_register(
-                address=0x0007,
-                value=1,
-                slave=1
-            )
-            
-            if result.isError():
-                raise Exception("Z轴校准失败")
-                
-            # 等待校准完成
-            time.sleep(2)
-            return True
-            
-        except Exception as e:
-            print(f"Z轴校准时发生错误: {str(e)}")
-            return False
-            
+        return CalibrationJob(self, 'z').run()
+
+    def start_calibration(self, axes: str, **options) -> 'CalibrationJob':
+        """
+        在后台线程中执行零点校准，立即返回任务（通过to_dict()查询进度）
+        Args:
+            axes: 'xy' 或 'z'
+            options: CalibrationJob的其他参数
+        """
+        return CalibrationJob(self, axes, **options).start()
+
+    def pause_sampling(self, paused: bool) -> None:
+        """暂停/恢复采样：暂停期间不访问总线，沿用之前的数据并标记过期"""
+        self.calibrating = paused
+        if self.bus is not None:
+            self.device.paused = paused
+
     def get_current_attitude(self) -> Tuple[float, float]:
-        """获取真实陀螺仪数据
+        """获取真实陀螺仪数据（读取失败时为上一次有效数据，is_stale()为True）
         Returns:
             Tuple[float, float]: (方位角, 高度角) 单位：度
         """
@@ -186,9 +497,241 @@ class RealGyroscope(GyroscopeBase):
 
     def __del__(self):
         """析构函数，确保关闭串口连接"""
-        if hasattr(self, 'client'):
+        if getattr(self, 'client', None) is not None:
             self.client.close()
 
+class CalibrationJob:
+    """
+    陀螺仪零点校准任务。
+
+    写入校准命令后不固定等待，而是周期性读回角度，连续几次读数都回到零点附近才确认完成，超时则失败。
+    任务期间陀螺仪暂停采样（is_stale()为True，控制器保持停止）；每次读写单独占用串口，
+    两次读回之间不占用，控制循环和总线上的其他设备照常工作。
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    NAMES = {'xy': 'XY轴', 'z': 'Z轴'}
+    _ids = itertools.count(1)
+
+    def __init__(self, gyro, axes, timeout=10.0, tolerance=0.3, settle_samples=3, interval=0.2, on_success=None):
+        """
+        Args:
+            gyro: RealGyroscope
+            axes: 'xy' 或 'z'
+            timeout: 等待读回确认的最长时间(秒)
+            tolerance: 校准后读数与零点的允许偏差(度)
+            settle_samples: 连续多少次读数在允许偏差内视为完成
+            interval: 读回间隔(秒)
+            on_success: 校准成功后、恢复采样之前调用 on_success(job)，
+                例如Z轴校准后按offset平移线缆缠绕的展开方位角
+        """
+        if axes not in CALIBRATION_COMMANDS:
+            raise ValueError(f"未知的校准轴: {axes}")
+        self.id = next(self._ids)
+        self.gyro = gyro
+        self.axes = axes
+        self.timeout = timeout
+        self.tolerance = tolerance
+        self.settle_samples = settle_samples
+        self.interval = interval
+        self.on_success = on_success
+        self.state = self.PENDING
+        self.progress = 0.0
+        self.message = "等待开始"
+        self.readings = None      # 最近一次读回的三轴角度
+        self.before = None        # 写入校准命令前的三轴角度
+        self.offset = None        # Z轴校准成功后方位读数的变化量 (度)：校准后减校准前
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        return self.state in (self.PENDING, self.RUNNING)
+
+    def start(self) -> 'CalibrationJob':
+        """在后台线程中执行"""
+        threading.Thread(target=self.run, name=f"gyro-calibration-{self.id}", daemon=True).start()
+        return self
+
+    def wait(self, timeout=None) -> bool:
+        """等待任务结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+    def run(self) -> bool:
+        """执行校准（阻塞），返回是否成功"""
+        name = self.NAMES[self.axes]
+        address, value = CALIBRATION_COMMANDS[self.axes]
+        self.state, self.started = self.RUNNING, time.time()
+        self.message = f"正在写入{name}校准命令"
+        self.gyro.pause_sampling(True)
+        try:
+            try:
+                self.before = decode_angles(self.gyro._read_registers())
+            except Exception as e:
+                # Z轴校准必须知道方位读数的跳变量，否则线缆缠绕的圈数无法接续
+                if self.axes == 'z':
+                    raise IOError(f"无法读取校准前的方位读数: {e}")
+                logging.debug(f"校准前读数失败: {e}")
+            self.gyro._write_register(address, value)
+            self.progress = 0.1
+            self.message = f"等待{name}读数回到零点"
+            deadline = time.monotonic() + self.timeout
+            settled = 0
+            while time.monotonic() < deadline:
+                time.sleep(self.interval)
+                try:
+                    self.readings = decode_angles(self.gyro._read_registers())
+                except Exception as e:
+                    logging.debug(f"校准读回失败: {e}")
+                    continue
+                x, y, z = self.readings
+                residual = max(abs(x), abs(y)) if self.axes == 'xy' else abs(z)
+                settled = settled + 1 if residual <= self.tolerance else 0
+                self.progress = 0.1 + 0.9 * settled / self.settle_samples
+                if settled >= self.settle_samples:
+                    if self.axes == 'z':
+                        self.offset = z - self.before[2]
+                    self.message = f"{name}校准完成"
+                    if self.on_success:
+                        self.on_success(self)
+                    self.state = self.SUCCEEDED
+                    return True
+            self.state = self.FAILED
+            self.message = f"{name}校准未确认：{self.timeout:g}秒内读数未回到零点（最后读数 {self.readings}）"
+            return False
+        except Exception as e:
+            self.state, self.message = self.FAILED, f"{name}校准失败: {e}"
+            return False
+        finally:
+            self.gyro.pause_sampling(False)
+            self.finished = time.time()
+            self._done.set()
+            if self.state == self.SUCCEEDED:
+                logging.info(self.message)
+            else:
+                logging.error(self.message)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "axes": self.axes,
+            "state": self.state,
+            "progress": round(self.progress, 2),
+            "message": self.message,
+            "readings": list(self.readings) if self.readings else None,
+            "offset": self.offset,
+            "elapsed": round((self.finished or time.time()) - self.started, 1) if self.started else 0.0,
+        }
+
+
+class AsyncRealGyroscope(GyroscopeBase):
+    """
+    基于pymodbus异步客户端的真实陀螺仪，供异步控制引擎使用。
+
+    get_current_attitude()只返回最近一次异步读取的结果，不访问总线，
+    因此Web状态线程等同步调用方不会与控制引擎争用串口。
+    """
+    def __init__(self,
+                 port: str,
+                 baudrate: int = 4800,
+                 parity: str = 'N',
+                 stopbits: int = 1,
+                 bytesize: int = 8,
+                 timeout: int = 1,
+                 retries: int = 2,
+                 slave: int = 1,
+                 max_sample_age: float = 0.5):
+        """
+        初始化陀螺仪（需在事件循环中调用connect()后才能读取）
+        Args:
+            port: 串口设备地址
+            baudrate: 波特率
+            parity: 校验位 ('N' - 无校验, 'E' - 偶校验, 'O' - 奇校验)
+            stopbits: 停止位
+            bytesize: 数据位
+            timeout: 初始超时时间(秒)，之后按测得的往返时间自动调整
+            retries: 读取失败后的重试次数
+            slave: Modbus从站地址
+            max_sample_age: 有效数据超过该时间(秒)未更新视为过期
+        """
+        self.rtt = RoundTripTimer(initial=timeout, maximum=timeout)
+        self.client = AsyncModbusSerialClient(
+            port=port,
+            baudrate=baudrate,
+            parity=parity,
+            stopbits=stopbits,
+            bytesize=bytesize,
+            timeout=timeout,
+            retries=0
+        )
+        self.retries = retries
+        self.slave = slave
+        self.max_sample_age = max_sample_age
+        self.last_attitude = None     # 还没有读到有效数据
+        self.last_update = 0.0
+        self.last_sample_time = None  # 最近一次有效读取的时刻 (time.monotonic)
+
+    async def connect(self) -> None:
+        if not await self.client.connect():
+            raise ConnectionError("无法连接到陀螺仪设备")
+
+    async def read_angles(self) -> Tuple[float, float, float]:
+        """
+        异步读取三轴角度值，失败时快速重试，仍失败则抛出异常（由调用方决定如何处理）
+        Returns:
+            tuple: (x角度, y角度, z角度) 单位：度
+        """
+        error = None
+        for _ in range(self.retries + 1):
+            start = time.monotonic()
+            try:
+                response = await self.client.read_holding_registers(
+                    address=3,
+                    count=3,
+                    **unit_argument(self.client.read_holding_registers, self.slave)
+                )
+            except TRANSIENT_ERRORS as e:
+                set_client_timeout(self.client, self.rtt.backoff())
+                error = e
+                continue
+            if response.isError():
+                error = IOError("读取角度数据失败")
+                continue
+            set_client_timeout(self.client, self.rtt.observe(time.monotonic() - start))
+            return decode_angles(response.registers)
+        raise IOError(f"读取角度失败（已重试{self.retries}次）: {error}")
+
+    async def get_current_attitude_async(self) -> Tuple[float, float]:
+        """异步读取当前姿态并更新缓存"""
+        x, y, z = await self.read_angles()
+        self.last_attitude = (z % 360, y)
+        self.last_update = time.time()
+        self.last_sample_time = time.monotonic()
+        return self.last_attitude
+
+    def is_stale(self) -> bool:
+        return self.last_sample_time is None or time.monotonic() - self.last_sample_time > self.max_sample_age
+
+    def get_current_attitude(self) -> Tuple[float, float]:
+        """
+        返回最近一次读取的姿态（不访问总线）
+
+        :raises StaleSampleError: 还没有读到有效数据
+        """
+        if self.last_attitude is None:
+            raise StaleSampleError("陀螺仪还没有有效数据")
+        return self.last_attitude
+
+    def process_command(self, cmd: str) -> None:
+        """真实陀螺仪不需要处理命令"""
+        pass
+
+    def close(self) -> None:
+        self.client.close()
+
 # 测试代码
 if __name__ == "__main__":
     try:
@@ -0,0 +1,190 @@
+import math
+import logging
+import numpy as np
+
+
+class HorizonMask:
+    """
+    地平遮挡掩码。
+
+    方位角×高度角平面按固定分辨率划分为稠密布尔网格（True表示可见），
+    建筑物等遮挡在加载时一次写入网格，之后每次判断只是一次数组下标访问：
+    set_target的单点检查、控制周期的姿态检查和计划的批量查询都不需要再插值。
+
+    掩码文件为文本，每行一条记录，'#'之后为注释，数值用逗号或空白分隔：
+        方位角 高度角                    地平轮廓点：该方位高度角以下被遮挡，相邻点之间线性插值
+        方位起 方位止 高度起 高度止       矩形遮挡区域（如屋檐、树冠），方位起>方位止表示跨越0°
+    """
+    def __init__(self, resolution=0.5, floor=20.0):
+        """
+        :param resolution: 网格分辨率 (度)
+        :param floor: 高度角下限 (度)，低于该高度角一律视为遮挡，默认与高度轴限位一致
+        """
+        self.resolution = float(resolution)
+        self.floor = float(floor)
+        self.columns = int(round(360.0 / self.resolution))
+        self.rows = int(round(90.0 / self.resolution)) + 1
+        # 第i列第j行覆盖方位角 [i*res, (i+1)*res)、高度角 [j*res, (j+1)*res)
+        self.grid = np.ones((self.columns, self.rows), dtype=bool)
+        self.source = None
+        self._block_below(np.full(self.columns, self.floor))
+
+    @classmethod
+    def load(cls, path, resolution=0.5, floor=20.0):
+        """
+        从掩码文件加载
+
+        :raises ValueError: 文件格式错误
+        """
+        mask = cls(resolution, floor)
+        profile = []
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                line = line.split('#', 1)[0].replace(',', ' ').strip()
+                if not line:
+                    continue
+                try:
+                    values = [float(v) for v in line.split()]
+                except ValueError:
+                    raise ValueError(f"{path} 第{number}行格式错误: {line}")
+                if len(values) == 2:
+                    profile.append(values)
+                elif len(values) == 4:
+                    mask.add_region(*values)
+                else:
+                    raise ValueError(f"{path} 第{number}行应为2个或4个数值: {line}")
+        if profile:
+            mask.add_profile(*zip(*profile))
+        mask.source = path
+        logging.info(f"已加载地平遮挡掩码 {path}: 轮廓点 {len(profile)} 个")
+        return mask
+
+    def _block_below(self, heights):
+        """每列遮挡高度角低于heights的网格（与遮挡有交集的网格都算遮挡）"""
+        bottoms = np.arange(self.rows) * self.resolution
+        self.grid &= bottoms[None, :] >= np.asarray(heights, dtype=float)[:, None]
+        self._update_summary()
+
+    def add_profile(self, azimuths, altitudes):
+        """
+        加入地平轮廓：方位角处的遮挡高度，相邻点之间线性插值（首尾跨越0°相连）
+
+        :param azimuths: 方位角 (度)
+        :param altitudes: 遮挡高度角 (度)
+        """
+        azimuths = np.asarray(azimuths, dtype=float) % 360.0
+        altitudes = np.asarray(altitudes, dtype=float)
+        order = np.argsort(azimuths)
+        edges = np.arange(self.columns) * self.resolution
+        # 取每列左右边界处轮廓的较高者，保证整列都在轮廓之上才算可见
+        left = np.interp(edges, azimuths[order], altitudes[order], period=360.0)
+        right = np.interp(edges + self.resolution, azimuths[order], altitudes[order], period=360.0)
+        self._block_below(np.maximum(left, right))
+
+    def add_region(self, az_start, az_end, alt_start, alt_end):
+        """
+        加入矩形遮挡区域
+
+        :param az_start: 起始方位角 (度)
+        :param az_end: 终止方位角 (度)，小于起始方位角时跨越0°
+        :param alt_start: 遮挡下沿高度角 (度)
+        :param alt_end: 遮挡上沿高度角 (度)
+        """
+        span = (az_end - az_start) % 360.0 or 360.0
+        first = int(math.floor(az_start / self.resolution))
+        count = int(math.ceil((az_start + span) / self.resolution)) - first
+        columns = np.arange(first, first + count) % self.columns
+        low = max(0, int(math.floor(alt_start / self.resolution)))
+        high = min(self.rows, int(math.ceil(alt_end / self.resolution)))
+        self.grid[np.ix_(columns, np.arange(low, high))] = False
+        self._update_summary()
+
+    def _update_summary(self):
+        """每列的最低可见高度角（整列遮挡为inf）和遮挡网格的累计计数（用于区间检查）"""
+        any_visible = self.grid.any(axis=1)
+        self.lowest = np.where(any_visible, np.argmax(self.grid, axis=1) * self.resolution, np.inf)
+        self._blocked_count = np.cumsum(~self.grid, axis=1)
+
+    def _row(self, alt):
+        return min(self.rows - 1, max(0, int(math.floor(alt / self.resolution))))
+
+    def is_visible(self, az, alt):
+        """单点是否可见（控制周期中使用，不经过numpy数组运算）"""
+        row = int(math.floor(alt / self.resolution))
+        if row < 0:
+            return False
+        return bool(self.grid[int(math.floor(az / self.resolution)) % self.columns, min(row, self.rows - 1)])
+
+    def visible(self, az, alt):
+        """批量判断是否可见，az、alt为同形数组，返回布尔数组"""
+        az = np.asarray(az, dtype=float)
+        alt = np.asarray(alt, dtype=float)
+        columns = np.floor(az / self.resolution).astype(int) % self.columns
+        rows = np.floor(alt / self.resolution).astype(int)
+        return self.grid[columns, np.clip(rows, 0, self.rows - 1)] & (rows >= 0)
+
+    def horizon(self, az):
+        """方位角处的最低可见高度角 (度)，支持数组；整列遮挡时为inf"""
+        columns = np.floor(np.asarray(az, dtype=float) / self.resolution).astype(int) % self.columns
+        return self.lowest[columns]
+
+    def detour_altitude(self, az_start, alt_start, az_end, alt_end, margin=1.0):
+        """
+        绕行高度：从起点竖直升到该高度、按方位转到终点方位、再竖直降到终点，全程可见的最低高度角
+
+        起点本身在遮挡区域内（如停放位置）时，竖直离开该遮挡的一段不计入检查。
+
+        :param az_start: 起点方位角（展开方位角，与az_end一起决定转动方向）
+        :param alt_start: 起点高度角
+        :param az_end: 终点方位角（展开方位角）
+        :param alt_end: 终点高度角
+        :param margin: 绕行高度上下保留的余量 (度)，应不小于高度轴的到位容差
+        :return: 高度角 (度)，无法绕开时为inf
+        """
+        first = int(math.floor(az_start / self.resolution))
+        last = int(math.floor(az_end / self.resolution))
+        if abs(last - first) + 1 >= self.columns:
+            columns = np.arange(self.columns)
+        else:
+            columns = np.arange(first, last + (1 if last >= first else -1), 1 if last >= first else -1) % self.columns
+        start_column, end_column = columns[0], columns[-1]
+        k = int(math.ceil(margin / self.resolution)) + 1
+        rows = np.arange(self.rows)
+        top = np.minimum(rows + k, self.rows - 1)
+
+        def clear(counts, low):
+            # [low, top] 区间内没有遮挡；low可以是数组
+            before = np.where(low > 0, counts[np.maximum(low - 1, 0)], 0)
+            return counts[top] - before == 0
+
+        escape = self._row(alt_start)
+        while escape < self.rows and not self.grid[start_column, escape]:
+            escape += 1
+        if escape == self.rows:
+            return float('inf')
+        band_count = np.cumsum(~self.grid[columns].all(axis=0))
+        candidates = (clear(self._blocked_count[start_column], escape)
+                      & clear(self._blocked_count[end_column], self._row(alt_end))
+                      & clear(band_count, np.maximum(rows - k, 0))
+                      & (rows >= max(escape, self._row(alt_end))) & (rows - k >= 0))
+        if not candidates.any():
+            return float('inf')
+        return (int(np.argmax(candidates)) + 0.5) * self.resolution
+
+    def slew_path(self, az_start, alt_start, az_end, alt_end):
+        """
+        两轴同速转动的近似路径：先同时转动，较短的一轴到位后另一轴继续，按网格分辨率采样
+
+        :param az_start: 起点方位角（展开方位角）
+        :return: (方位角数组, 高度角数组)
+        """
+        d_az = az_end - az_start
+        d_alt = alt_end - alt_start
+        length = max(abs(d_az), abs(d_alt))
+        steps = np.linspace(0.0, length, max(2, int(math.ceil(length / self.resolution)) + 1))
+        az = az_start + np.sign(d_az) * np.minimum(steps, abs(d_az))
+        alt = alt_start + np.sign(d_alt) * np.minimum(steps, abs(d_alt))
+        return az, alt
+
+    def to_dict(self):
+        return {"resolution": self.resolution, "floor": self.floor, "source": self.source}
@@ -0,0 +1,277 @@
+import time
+import logging
+import threading
+from typing import List, Optional, Tuple
+from pymodbus.client import ModbusSerialClient
+from gyroscope import RoundTripTimer, StaleSampleError, TRANSIENT_ERRORS, set_client_timeout, unit_argument
+
+# Modbus功能码0x03单次最多读取的寄存器数
+MAX_READ_COUNT = 125
+
+
+def merge_ranges(ranges, max_gap=0, max_count=MAX_READ_COUNT) -> List[Tuple[int, int]]:
+    """
+    把寄存器区段合并为尽量少的连续读取块
+
+    多读几个用不到的寄存器比多一次事务（请求帧、应答帧和总线换向）便宜，
+    因此间隔不超过max_gap的区段也合并到同一块。
+
+    :param ranges: [(起始地址, 数量), ...]
+    :param max_gap: 允许一起读出的最大间隔寄存器数
+    :param max_count: 单块最多的寄存器数
+    :return: [(起始地址, 数量), ...]，按地址排序
+    """
+    blocks = []
+    for address, count in sorted((int(a), int(c)) for a, c in ranges):
+        if count <= 0:
+            continue
+        if blocks:
+            start, length = blocks[-1]
+            end = max(start + length, address + count)
+            if address <= start + length + max_gap and end - start <= max_count:
+                blocks[-1] = (start, end - start)
+                continue
+        blocks.append((address, count))
+    return blocks
+
+
+class BusDevice:
+    """
+    总线上的一个从站：需要轮询的寄存器、轮询周期和优先级，以及最近一次采样的缓存。
+
+    采样在轮询线程中整体替换（时刻和寄存器值一起），读取方不需要加锁，也不会访问总线。
+    """
+    def __init__(self, name, slave, ranges, period=0.0, priority=0, max_gap=4, max_sample_age=0.5):
+        """
+        :param name: 设备名称（用于日志和状态）
+        :param slave: Modbus从站地址
+        :param ranges: 需要读取的寄存器区段 [(起始地址, 数量), ...]，相邻区段合并读取
+        :param period: 期望的轮询周期 (秒)，0表示每次轮到即读取
+        :param priority: 优先级，同时到期时优先级高的先读
+        :param max_gap: 合并区段时允许一起读出的最大间隔寄存器数
+        :param max_sample_age: 采样超过该时间 (秒) 未更新视为过期
+        """
+        self.name = name
+        self.slave = slave
+        self.blocks = merge_ranges(ranges, max_gap)
+        self.period = float(period)
+        self.priority = priority
+        self.max_sample_age = max_sample_age
+        self.sample = None        # (读取时刻 time.monotonic, {地址: 寄存器值})
+        self.failed = False       # 最近一次轮询是否失败
+        self.paused = False       # 暂停轮询（例如校准期间），总线继续为其他设备服务
+        self.next_due = 0.0
+        self.last_poll = 0.0
+        self.poll_count = 0
+        self.error_count = 0
+        self.last_error = None
+
+    def registers(self, address, count) -> Tuple[float, List[int]]:
+        """
+        :return: (读取时刻, 寄存器值列表)
+        :raises StaleSampleError: 还没有读到过采样
+        :raises KeyError: 请求的寄存器不在轮询范围内
+        """
+        sample = self.sample
+        if sample is None:
+            raise StaleSampleError(f"{self.name} 还没有有效采样")
+        sample_time, values = sample
+        return sample_time, [values[a] for a in range(address, address + count)]
+
+    def sample_age(self, now=None) -> float:
+        if self.sample is None:
+            return float('inf')
+        return (time.monotonic() if now is None else now) - self.sample[0]
+
+    def is_stale(self) -> bool:
+        return self.failed or self.sample_age() > self.max_sample_age
+
+    def to_dict(self):
+        age = self.sample_age()
+        return {
+            "name": self.name,
+            "slave": self.slave,
+            "blocks": [[address, count] for address, count in self.blocks],
+            "period": self.period,
+            "priority": self.priority,
+            "sample_age": round(age, 3) if age != float('inf') else None,
+            "stale": self.is_stale(),
+            "paused": self.paused,
+            "polls": self.poll_count,
+            "errors": self.error_count,
+            "last_error": self.last_error,
+        }
+
+
+class ModbusBus:
+    """
+    RS485总线管理：独占串口，在一个轮询线程中为总线上的所有从站安排读取。
+
+    调度规则：到期的设备中优先级高的先读，同优先级按到期先后轮流读（轮询）；
+    姿态传感器设置较高优先级和较短周期，其他传感器（倾角仪、环境传感器等）使用总线的空闲时间。
+    读写总线的其他请求（如写配置寄存器）通过read_registers/write_register在同一把锁下进行。
+    """
+    def __init__(self, port: str, baudrate: int = 4800, parity: str = 'N', stopbits: int = 1,
+                 bytesize: int = 8, timeout: float = 1.0, retries: int = 1, client=None):
+        """
+        :param port: 串口设备地址
+        :param baudrate: 波特率（总线上所有设备必须一致）
+        :param parity: 校验位
+        :param stopbits: 停止位
+        :param bytesize: 数据位
+        :param timeout: 初始超时 (秒)，之后按测得的往返时间自动调整
+        :param retries: 轮询读取失败后的重试次数
+        :param client: 已创建的Modbus客户端，None时按串口参数创建
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.retries = retries
+        self.rtt = RoundTripTimer(initial=timeout, maximum=timeout)
+        self.devices: List[BusDevice] = []
+        self.transaction_count = 0
+        self._lock = threading.RLock()  # 串口访问
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.client = client or ModbusSerialClient(port=port, baudrate=baudrate, parity=parity, stopbits=stopbits,
+                                                   bytesize=bytesize, timeout=self.rtt.timeout, retries=0)
+        if not self.client.connect():
+            raise ConnectionError(f"无法连接到Modbus总线: {port}")
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_device(self, name, slave, ranges, **options) -> BusDevice:
+        """
+        添加需要轮询的从站，参数与BusDevice相同
+
+        :return: BusDevice，读取方从其中取最新采样
+        """
+        if any(d.name == name for d in self.devices):
+            raise ValueError(f"总线上已有设备 {name}")
+        device = BusDevice(name, slave, ranges, **options)
+        self.devices.append(device)
+        logging.info(f"总线 {self.port} 添加设备 {device.name}: 从站 {device.slave}, 读取块 {device.blocks}")
+        return device
+
+    def device(self, name) -> BusDevice:
+        for device in self.devices:
+            if device.name == name:
+                return device
+        raise KeyError(f"总线上没有设备: {name}")
+
+    def read_registers(self, slave, address, count) -> List[int]:
+        """读取一次保持寄存器（不重试），记录往返时间并调整超时"""
+        with self._lock:
+            self.transaction_count += 1
+            start = time.monotonic()
+            try:
+                response = self.client.read_holding_registers(
+                    address=address, count=count, **unit_argument(self.client.read_holding_registers, slave))
+            except Exception:
+                set_client_timeout(self.client, self.rtt.backoff())
+                raise
+            if response.isError():
+                raise IOError(f"从站 {slave} 读取寄存器 0x{address:04X} 失败")
+            set_client_timeout(self.client, self.rtt.observe(time.monotonic() - start))
+            return response.registers
+
+    def write_register(self, slave, address, value):
+        """写单个保持寄存器"""
+        with self._lock:
+            self.transaction_count += 1
+            response = self.client.write_register(
+                address=address, value=value, **unit_argument(self.client.write_register, slave))
+            if response.isError():
+                raise IOError(f"从站 {slave} 写入寄存器 0x{address:04X} 失败")
+            return response
+
+    def poll_device(self, device: BusDevice, now=None) -> bool:
+        """
+        读取设备的所有寄存器块，全部成功后整体更新采样缓存
+
+        :return: 是否读取成功
+        """
+        now = time.monotonic() if now is None else now
+        device.last_poll = now
+        device.next_due = now + device.period
+        device.poll_count += 1
+        values = {}
+        for address, count in device.blocks:
+            error = None
+            for _ in range(self.retries + 1):
+                try:
+                    registers = self.read_registers(device.slave, address, count)
+                    break
+                except TRANSIENT_ERRORS as e:
+                    error = e
+            else:
+                device.error_count += 1
+                device.failed = True
+                device.last_error = str(error)
+                logging.warning(f"{device.name} 读取失败（已重试{self.retries}次）: {error}")
+                return False
+            values.update(zip(range(address, address + count), registers))
+        device.sample = (time.monotonic(), values)
+        device.failed = False
+        return True
+
+    def next_device(self, now) -> Optional[BusDevice]:
+        """到期设备中优先级最高的；同优先级按到期时刻、再按上次读取时刻轮流；暂停的设备跳过"""
+        due = [d for d in self.devices if d.next_due <= now and not d.paused]
+        if not due:
+            return None
+        return min(due, key=lambda d: (-d.priority, d.next_due, d.last_poll))
+
+    def poll_once(self, now=None) -> Optional[BusDevice]:
+        """读取下一个到期的设备，没有到期设备时返回None"""
+        device = self.next_device(time.monotonic() if now is None else now)
+        if device is not None:
+            self.poll_device(device, now)
+        return device
+
+    def start(self):
+        """启动轮询线程"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"modbus-bus-{self.port}", daemon=True)
+        self._thread.start()
+        logging.info(f"总线 {self.port} 轮询线程已启动: {len(self.devices)} 个设备")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                polled = self.poll_once()
+            except Exception as e:
+                # 程序错误不是总线故障，重试没有意义：结束轮询，设备改为直接读取并抛出同一错误
+                logging.error(f"总线 {self.port} 轮询出错，停止轮询: {e!r}")
+                return
+            if polled is not None:
+                continue
+            # 没有到期设备：等到最早的到期时刻
+            wait = min((d.next_due for d in self.devices if not d.paused),
+                       default=time.monotonic() + 0.05) - time.monotonic()
+            self._stop.wait(min(0.05, max(0.001, wait)))
+
+    def stop(self):
+        """停止轮询线程（正在进行的读取完成后退出）"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self.client.close()
+
+    def status(self):
+        return {
+            "port": self.port,
+            "baudrate": self.baudrate,
+            "running": self.running,
+            "timeout": round(self.rtt.timeout, 3),
+            "transactions": self.transaction_count,
+            "devices": [device.to_dict() for device in self.devices],
+        }
@@ -0,0 +1,454 @@
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from batch_transform import equatorial_to_horizontal_batch
+from controller_service import ControllerService
+from control_watchdog import ControlWatchdog
+
+
+class SensorReader:
+    """
+    一台望远镜的姿态读取线程。
+
+    阻塞的传感器读取（串口超时和重试）只拖慢这一台望远镜，调度线程只取最新的读数。
+    运动中按控制周期读取，静止时降低读取频率。
+    """
+    def __init__(self, gyro, name, period=0.005, idle_period=0.5):
+        """
+        :param gyro: 陀螺仪对象
+        :param name: 线程名称
+        :param period: 运动中的读取周期 (秒)
+        :param idle_period: 静止时的读取周期 (秒)
+        """
+        self.gyro = gyro
+        self.name = name
+        self.period = period
+        self.idle_period = idle_period
+        self.sample = None      # (方位角读数, 高度角读数, 读取时刻 time.monotonic, 是否过期)，整体替换
+        self.error = None
+        self._active = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def set_active(self, active):
+        """运动开始时立即读取并切换到控制周期"""
+        self._active = active
+        if active:
+            self._wake.set()
+
+    def read(self):
+        """读取一次；失败时保留上一次的读数（其读取时刻不变，由使用方按时间判断过期）"""
+        try:
+            raw_az, raw_alt = self.gyro.get_current_attitude()
+        except Exception as e:
+            if self.error is None:
+                logging.warning(f"{self.name} 读取姿态失败: {e}")
+            self.error = str(e)
+            return
+        # 只有真实陀螺仪提供过期标志，其他陀螺仪对象按鸭子类型使用
+        is_stale = getattr(self.gyro, 'is_stale', None)
+        self.sample = (raw_az, raw_alt, time.monotonic(), bool(is_stale and is_stale()))
+        self.error = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.read()
+            self._wake.wait(self.period if self._active else self.idle_period)
+            self._wake.clear()
+
+
+class Mount:
+    """注册表中的一台望远镜"""
+    def __init__(self, mount_id, controller, lat=None, lon=None, description=""):
+        """
+        :param mount_id: 望远镜编号
+        :param controller: TelescopeController对象（各自持有串口和陀螺仪）
+        :param lat: 默认观测点纬度 (度)
+        :param lon: 默认观测点经度 (度)
+        :param description: 备注
+        """
+        self.mount_id = mount_id
+        self.controller = controller
+        self.lat = lat
+        self.lon = lon
+        self.description = description
+        self.state = ControllerService.IDLE
+        self.error = None
+        self.stop_latencies = deque(maxlen=100)
+        self.done = threading.Event()
+        self.reader = SensorReader(controller.gyro, f"mount-sensor-{mount_id}")
+        self.watchdog = None
+        self.last_sample_time = None  # 调度线程最近一次使用的读数时刻
+        # 目标代数：停止、移除或出错时加1，排队中的旧目标（转换或应用之前）随之作废
+        self.generation = 0
+        self.lock = threading.RLock()   # 保护代数检查与目标应用之间不被停止插入
+
+    def cancel_pending(self):
+        """作废所有排队中的目标"""
+        with self.lock:
+            self.generation += 1
+
+    def set_state(self, state):
+        self.state = state
+        self.reader.set_active(state == ControllerService.SLEWING)
+
+    def to_dict(self):
+        controller = self.controller
+        # 使用读取线程的最新读数，不在调用线程中访问传感器；还没有读数时姿态为None并标记过期
+        sample = self.reader.sample
+        current_az, current_alt = controller.sky_attitude(*sample[:2]) if sample else (None, None)
+        return {
+            "id": self.mount_id,
+            "description": self.description,
+            "state": self.state,
+            "error": self.error,
+            "current_az": None if current_az is None else round(current_az, 2),
+            "current_alt": None if current_alt is None else round(current_alt, 2),
+            "stale": sample is None or sample[3] or self.reader.error is not None,
+            "target_az": round(getattr(controller, 'target_azimuth', 0.0), 2),
+            "target_alt": round(getattr(controller, 'target_altitude', 0.0), 2),
+        }
+
+
+class MountHandle:
+    """单台望远镜的操作句柄，接口与ControllerService一致"""
+    def __init__(self, registry, mount):
+        self.registry = registry
+        self.mount = mount
+
+    @property
+    def state(self):
+        return self.mount.state
+
+    @property
+    def error(self):
+        return self.mount.error
+
+    @property
+    def stop_latencies(self):
+        return self.mount.stop_latencies
+
+    def is_alive(self):
+        return self.registry.is_alive() and self.mount.mount_id in self.registry.mounts
+
+    def set_target(self, *args, **kwargs):
+        self.registry.set_target(self.mount.mount_id, *args, **kwargs)
+
+    def stop(self):
+        return self.registry.stop(self.mount.mount_id)
+
+    def wait(self, timeout=None):
+        return self.mount.done.wait(timeout)
+
+    def control_loop(self):
+        self.mount.done.wait()
+        if self.mount.state == ControllerService.ARRIVED:
+            return 0
+        if self.mount.state == ControllerService.STOPPED:
+            return 2
+        return 1
+
+    def shutdown(self, timeout=1.0):
+        self.registry.remove(self.mount.mount_id)
+
+
+class MountRegistry:
+    """
+    多望远镜注册表：一个调度线程轮流为所有望远镜执行控制周期。
+
+    与每台望远镜一个进程/线程相比，astropy/NumPy只加载一份，观测地点缓存共享；
+    同时等待转换的赤道坐标目标合并为一次批量坐标转换，转换在独立线程中进行，
+    不占用控制周期。
+    每台望远镜的传感器由各自的读取线程读取，调度线程只使用最新读数计算和发送命令，
+    一台望远镜的传感器阻塞不会拖住其他望远镜的控制周期和停止检查。
+    """
+    def __init__(self, period=0.005, max_sample_age=0.5, watchdog_deadline=None):
+        """
+        :param period: 调度周期 (秒)，每个周期依次为所有运动中的望远镜执行一次控制
+        :param max_sample_age: 读数超过该时间 (秒) 没有更新视为过期，停止该望远镜的运动等待新数据
+        :param watchdog_deadline: 每台望远镜的看门狗期限 (秒)，调度线程卡住超过该时间时由看门狗线程发送停止命令；
+                                  None表示不启用
+        """
+        self.period = period
+        self.max_sample_age = max_sample_age
+        self.watchdog_deadline = watchdog_deadline
+        self.mounts = {}
+        self._lock = threading.Lock()
+        self._commands = queue.Queue()      # 地平坐标目标，由调度线程应用
+        self._conversions = queue.Queue()   # 赤道坐标目标，由坐标转换线程批量处理
+        self._thread = None
+        self._convert_thread = None
+        self._running = False
+
+    # ---- 注册管理 ----
+
+    def start(self):
+        if self.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="mount-scheduler")
+        self._thread.daemon = True
+        self._thread.start()
+        self._convert_thread = threading.Thread(target=self._convert_run, name="mount-transform")
+        self._convert_thread.daemon = True
+        self._convert_thread.start()
+        logging.info("多望远镜调度线程已启动")
+
+    def is_alive(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def add(self, mount_id, controller, lat=None, lon=None, description=""):
+        """注册一台望远镜，返回其操作句柄"""
+        with self._lock:
+            if mount_id in self.mounts:
+                raise ValueError(f"望远镜 {mount_id} 已存在")
+            mount = Mount(mount_id, controller, lat, lon, description)
+            self.mounts[mount_id] = mount
+        mount.reader.start()
+        if self.watchdog_deadline:
+            mount.watchdog = ControlWatchdog(
+                controller, self.watchdog_deadline, on_trip=lambda reason: self._on_watchdog_trip(mount, reason))
+            mount.watchdog.start()
+        self.start()
+        logging.info(f"已注册望远镜 {mount_id}")
+        return MountHandle(self, mount)
+
+    def get(self, mount_id):
+        mount = self.mounts.get(mount_id)
+        if mount is None:
+            raise KeyError(f"望远镜 {mount_id} 不存在")
+        return MountHandle(self, mount)
+
+    def remove(self, mount_id):
+        """停止并移除一台望远镜，关闭其串口"""
+        with self._lock:
+            mount = self.mounts.pop(mount_id, None)
+        if mount is None:
+            return
+        mount.cancel_pending()
+        # 已移出注册表，调度线程不会再控制它，不需要排队复位各轴状态机
+        mount.controller.emergency_stop()
+        mount.set_state(ControllerService.STOPPED)
+        mount.done.set()
+        mount.reader.stop()
+        if mount.watchdog:
+            mount.watchdog.stop()
+        mount.controller.close()
+        logging.info(f"已移除望远镜 {mount_id}")
+
+    def shutdown(self):
+        """停止所有望远镜并结束调度线程"""
+        for mount_id in list(self.mounts):
+            self.remove(mount_id)
+        self._running = False
+        self._commands.put(None)
+        self._conversions.put(None)
+        if self._thread:
+            self._thread.join(1.0)
+
+    # ---- 命令（任意线程调用） ----
+
+    def set_target(self, mount_id, *args, **kwargs):
+        """设置目标，参数与TelescopeController.set_target相同；赤道坐标由转换线程批量转换，扫描路径和跟踪星历已是地平坐标"""
+        mount = self.mounts[mount_id]
+        mount.done.clear()
+        # 队列项带上提交时的目标代数，之后的停止会使其作废
+        if kwargs.get('coordinate_type') in ('horizontal', 'scan', 'track'):
+            self._commands.put((mount_id, args, kwargs, mount.generation))
+        else:
+            self._conversions.put((mount_id, args, kwargs, mount.generation))
+
+    def stop(self, mount_id):
+        """
+        立即停止一台望远镜（在调用线程中直接发送停止命令，各轴状态机由调度线程复位）
+
+        :return: 请求到停止命令发出的耗时 (秒)
+        """
+        mount = self.mounts[mount_id]
+        requested = time.perf_counter()
+        mount.cancel_pending()
+        self._halt(mount)
+        latency = time.perf_counter() - requested
+        mount.stop_latencies.append(latency)
+        mount.set_state(ControllerService.STOPPED)
+        mount.done.set()
+        return latency
+
+    def status(self):
+        return [mount.to_dict() for mount in list(self.mounts.values())]
+
+    # ---- 调度线程 ----
+
+    def _convert_batch(self, commands):
+        """将一批赤道坐标目标合并为一次批量转换，结果作为地平坐标目标交给调度线程"""
+        valid = []
+        generations = {}
+        for mount_id, args, kwargs, generation in commands:
+            mount = self.mounts.get(mount_id)
+            if mount is None or generation != mount.generation:
+                continue
+            generations[mount_id] = generation
+            if len(args) >= 5:
+                valid.append((mount, args))
+            else:
+                self._fail(mount, "使用赤道坐标系时，必须提供赤经、赤纬、纬度、经度和时间")
+        if not valid:
+            return
+
+        # 不解算提前量的望远镜合并为一次几何坐标批量转换；折射修正和提前量解算由各控制器自己完成
+        batch = [(mount, args) for mount, args in valid if not mount.controller.lead_solver]
+        geometric = {}
+        if batch:
+            ra = [args[0] for _, args in batch]
+            dec = [args[1] for _, args in batch]
+            lat = [args[2] for _, args in batch]
+            lon = [args[3] for _, args in batch]
+            # 同一批目标使用批次中最新的请求时间
+            obstime = max(args[4] for _, args in batch)
+            try:
+                az, alt = equatorial_to_horizontal_batch(ra, dec, lat, lon, obstime)
+            except Exception as e:
+                for mount, _ in batch:
+                    self._fail(mount, str(e))
+                valid = [item for item in valid if item not in batch]
+            else:
+                for i, (mount, _) in enumerate(batch):
+                    geometric[mount.mount_id] = (float(az[i]), float(alt[i]))
+        for mount, args in valid:
+            sample = mount.reader.sample
+            try:
+                azimuth, altitude, _ = mount.controller.equatorial_target(
+                    *args[:5], raw_attitude=sample[:2] if sample else None,
+                    geometric=geometric.get(mount.mount_id))
+            except Exception as e:
+                self._fail(mount, str(e))
+                continue
+            self._commands.put((mount.mount_id, (azimuth, altitude), {'coordinate_type': 'horizontal'},
+                                generations[mount.mount_id]))
+
+    def _convert_run(self):
+        """坐标转换线程：astropy转换较慢，放在调度线程之外，避免拖慢其他望远镜的控制周期"""
+        while self._running:
+            command = self._conversions.get()
+            if command is None:
+                return
+            commands = [command]
+            # 一次取走队列中所有待转换目标，合并为一次批量转换
+            try:
+                while True:
+                    command = self._conversions.get_nowait()
+                    if command is None:
+                        self._running = False
+                        break
+                    commands.append(command)
+            except queue.Empty:
+                pass
+            self._convert_batch(commands)
+
+    def _set_mount_target(self, mount, args, kwargs, generation):
+        # 使用读取线程的最新读数，调度线程不访问传感器
+        sample = mount.reader.sample
+        if sample is not None:
+            kwargs = dict(kwargs, raw_attitude=sample[:2])
+        with mount.lock:
+            if generation != mount.generation:
+                # 提交之后已被停止：不再应用（set_target会清除停止请求）
+                return
+            try:
+                mount.controller.set_target(*args, **kwargs)
+            except Exception as e:
+                self._fail(mount, str(e))
+                return
+            mount.error = None
+            mount.last_sample_time = None
+            mount.set_state(ControllerService.SLEWING)
+
+    def _fail(self, mount, message):
+        logging.error(f"望远镜 {mount.mount_id} 出错: {message}")
+        mount.cancel_pending()
+        mount.error = message
+        mount.set_state(ControllerService.ERROR)
+        self._halt(mount)
+        mount.done.set()
+
+    def _halt(self, mount):
+        """
+        发送停止命令（可在任意线程调用）。各轴状态机只在调度线程中访问，
+        这里不直接调用abort_axes，而是排队一个复位命令交给调度线程执行。
+        """
+        mount.controller.emergency_stop()
+        self._commands.put((mount.mount_id, None, None, None))
+
+    def _on_watchdog_trip(self, mount, reason):
+        """看门狗已发送停止命令（在看门狗线程中调用）：当前目标以失败结束，各轴状态机由调度线程复位"""
+        mount.error = f"看门狗停止: {reason}"
+        mount.set_state(ControllerService.ERROR)
+        mount.done.set()
+        self._commands.put((mount.mount_id, None, None, None))
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while self._running:
+            slewing = [m for m in list(self.mounts.values()) if m.state == ControllerService.SLEWING]
+            timeout = None if not slewing else max(0.0, next_tick - time.perf_counter())
+            try:
+                command = self._commands.get(timeout=timeout)
+                if command is not None:
+                    mount = self.mounts.get(command[0])
+                    if mount is None:
+                        pass
+                    elif command[1] is None:
+                        # 停止、出错或看门狗触发后复位各轴状态机
+                        mount.controller.abort_axes()
+                    else:
+                        self._set_mount_target(mount, *command[1:])
+                continue
+            except queue.Empty:
+                pass
+
+            next_tick = time.perf_counter() + self.period
+            for mount in slewing:
+                if mount.state != ControllerService.SLEWING:
+                    continue
+                if mount.controller.stop_requested.is_set():
+                    continue
+                try:
+                    if self._control_mount(mount):
+                        mount.set_state(ControllerService.ARRIVED)
+                        mount.done.set()
+                except Exception as e:
+                    self._fail(mount, str(e))
+
+    def _control_mount(self, mount):
+        """
+        用读取线程的最新读数执行一次控制；没有新读数时跳过，读数过期时停止运动等待
+
+        :return: 是否到达目标
+        """
+        sample = mount.reader.sample
+        if sample is None:
+            return mount.controller.apply_sample(None, None, stale=True)
+        raw_az, raw_alt, sample_time, stale = sample
+        if time.monotonic() - sample_time > self.max_sample_age:
+            return mount.controller.apply_sample(raw_az, raw_alt, stale=True)
+        if sample_time == mount.last_sample_time:
+            return False
+        mount.last_sample_time = sample_time
+        return mount.controller.apply_sample(raw_az, raw_alt, sample_time, stale)
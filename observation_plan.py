@@ -0,0 +1,343 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from batch_transform import equatorial_to_horizontal_batch
+
+
+class ObservationTarget:
+    """观测计划中的单个目标"""
+    def __init__(self, name, ra=None, dec=None, azimuth=None, altitude=None, dwell=60.0):
+        """
+        :param name: 目标名称
+        :param ra: 赤经 (小时)，赤道坐标目标使用
+        :param dec: 赤纬 (度)，赤道坐标目标使用
+        :param azimuth: 方位角 (度)，地平坐标目标使用
+        :param altitude: 高度角 (度)，地平坐标目标使用
+        :param dwell: 到达后的驻留时间 (秒)
+        """
+        if ra is not None and dec is not None:
+            self.coordinate_type = 'equatorial'
+        elif azimuth is not None and altitude is not None:
+            self.coordinate_type = 'horizontal'
+        else:
+            raise ValueError(f"目标 {name} 必须提供赤经赤纬或方位角高度角")
+        self.name = name
+        self.ra = ra
+        self.dec = dec
+        self.azimuth = azimuth
+        self.altitude = altitude
+        self.dwell = float(dwell)
+
+    @classmethod
+    def from_dict(cls, data):
+        """从字典（例如Web请求的JSON）创建目标"""
+        def _get(key):
+            value = data.get(key)
+            return None if value is None or value == '' else float(value)
+
+        return cls(
+            name=data.get('name', ''),
+            ra=_get('ra'),
+            dec=_get('dec'),
+            azimuth=_get('az'),
+            altitude=_get('alt'),
+            dwell=_get('dwell') or 0.0
+        )
+
+
+class SlewCostModel:
+    """转动耗时模型：两轴同时运动，耗时取两轴中较慢者再加上稳定时间"""
+    def __init__(self, az_speed=10.0, alt_speed=10.0, settle_time=1.0, shortest_azimuth=True):
+        """
+        :param az_speed: 方位轴转速 (度/秒)
+        :param alt_speed: 高度轴转速 (度/秒)
+        :param settle_time: 每次到达后的稳定时间 (秒)
+        :param shortest_azimuth: 方位轴是否走最短方向；控制器按最短方向转动（仅在线缆缠绕超限时反向），默认True
+        """
+        self.az_speed = az_speed
+        self.alt_speed = alt_speed
+        self.settle_time = settle_time
+        self.shortest_azimuth = shortest_azimuth
+
+    def azimuth_distance(self, az_from, az_to):
+        """方位轴需要转过的角度 (度)，支持数组"""
+        distance = np.mod(np.asarray(az_to) - np.asarray(az_from), 360.0)
+        if self.shortest_azimuth:
+            distance = np.minimum(distance, 360.0 - distance)
+        return distance
+
+    def slew_time(self, az_from, alt_from, az_to, alt_to):
+        """从一个位置转到另一个位置的耗时 (秒)，支持数组"""
+        az_time = self.azimuth_distance(az_from, az_to) / self.az_speed
+        alt_time = np.abs(np.asarray(alt_to) - np.asarray(alt_from)) / self.alt_speed
+        return np.maximum(az_time, alt_time) + self.settle_time
+
+
+class PlannedVisit:
+    """计划中的一次访问"""
+    def __init__(self, target, start_offset, slew_time, azimuth, altitude):
+        self.target = target
+        self.start_offset = start_offset  # 开始转动的时刻，相对计划开始的秒数
+        self.slew_time = slew_time
+        self.arrival_offset = start_offset + slew_time
+        self.azimuth = azimuth            # 预测到达时刻的方位角
+        self.altitude = altitude          # 预测到达时刻的高度角
+
+    def to_dict(self):
+        return {
+            "name": self.target.name,
+            "arrival_offset": round(self.arrival_offset, 1),
+            "slew_time": round(self.slew_time, 1),
+            "az": round(self.azimuth, 2),
+            "alt": round(self.altitude, 2),
+            "dwell": self.target.dwell
+        }
+
+
+class ObservationPlan:
+    """排好序的观测计划"""
+    def __init__(self, start_time, visits, skipped):
+        self.start_time = start_time
+        self.visits = visits
+        self.skipped = skipped  # 在计划时段内无法观测（低于最低高度角）的目标
+
+    @property
+    def total_time(self):
+        if not self.visits:
+            return 0.0
+        last = self.visits[-1]
+        return last.arrival_offset + last.target.dwell
+
+    @property
+    def total_slew_time(self):
+        return sum(visit.slew_time for visit in self.visits)
+
+    def to_dict(self):
+        return {
+            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_time": round(self.total_time, 1),
+            "total_slew_time": round(self.total_slew_time, 1),
+            "visits": [visit.to_dict() for visit in self.visits],
+            "skipped": [target.name for target in self.skipped]
+        }
+
+
+class ObservationPlanner:
+    """
+    观测计划排序器。
+
+    先在覆盖整个计划时段的时间网格上一次性批量计算所有目标的地平坐标，
+    之后任意时刻的目标位置都通过插值得到；再以转动耗时为代价，
+    用最近邻构造初始路线，并用2-opt（TSP启发式）改进访问顺序。
+    """
+    def __init__(self, lat, lon, cost_model=None, min_altitude=20.0, grid_step=300.0, refraction=None,
+                 horizon=None):
+        """
+        :param lat: 观测点纬度 (度)
+        :param lon: 观测点经度 (度)
+        :param cost_model: 转动耗时模型，默认使用SlewCostModel()
+        :param min_altitude: 最低可观测高度角 (度)，与set_target的下限一致
+        :param grid_step: 批量转换的时间网格步长 (秒)
+        :param refraction: 大气折射表，与控制器使用的一致，None表示不修正
+        :param horizon: 地平遮挡掩码 (HorizonMask)，与控制器使用的一致；设置后同时按掩码判断可见性
+        """
+        self.lat = lat
+        self.lon = lon
+        self.cost_model = cost_model or SlewCostModel()
+        self.min_altitude = min_altitude
+        self.grid_step = grid_step
+        self.refraction = refraction
+        self.horizon = horizon
+
+    def _observable(self, az, alt):
+        """目标位置是否可观测，支持数组"""
+        observable = np.asarray(alt) >= self.min_altitude
+        if self.horizon:
+            observable &= self.horizon.visible(az, alt)
+        return observable
+
+    def _build_ephemeris(self, targets, start_time, duration):
+        """在时间网格上批量计算所有目标的地平坐标，返回 (网格偏移, 方位角(N,T), 高度角(N,T))"""
+        steps = max(2, int(np.ceil(duration / self.grid_step)) + 1)
+        offsets = np.arange(steps) * self.grid_step
+        n = len(targets)
+        az = np.zeros((n, steps))
+        alt = np.zeros((n, steps))
+
+        equatorial = [i for i, t in enumerate(targets) if t.coordinate_type == 'equatorial']
+        horizontal = [i for i, t in enumerate(targets) if t.coordinate_type == 'horizontal']
+
+        if equatorial:
+            times = [start_time + timedelta(seconds=float(s)) for s in offsets]
+            ra = np.array([targets[i].ra for i in equatorial])[:, None]
+            dec = np.array([targets[i].dec for i in equatorial])[:, None]
+            eq_az, eq_alt = equatorial_to_horizontal_batch(ra, dec, self.lat, self.lon, times,
+                                                          refraction=self.refraction)
+            # 展开方位角，保证跨越0°/360°时插值正确
+            az[equatorial] = np.unwrap(np.asarray(eq_az), period=360.0, axis=1)
+            alt[equatorial] = eq_alt
+        for i in horizontal:
+            az[i] = targets[i].azimuth
+            alt[i] = targets[i].altitude
+        return offsets, az, alt
+
+    def _interpolate(self, offsets, az, alt, indices, t):
+        """插值得到指定目标在时刻t（相对秒数）的位置"""
+        pos = np.clip(t / self.grid_step, 0, len(offsets) - 1)
+        low = np.minimum(np.floor(pos).astype(int), len(offsets) - 2)
+        frac = pos - low
+        target_az = az[indices, low] * (1 - frac) + az[indices, low + 1] * frac
+        target_alt = alt[indices, low] * (1 - frac) + alt[indices, low + 1] * frac
+        return np.mod(target_az, 360.0), target_alt
+
+    def _simulate(self, order, ephemeris, start_az, start_alt):
+        """按给定顺序模拟执行，返回 (访问列表, 无法观测的目标索引)"""
+        offsets, az, alt = ephemeris
+        t = 0.0
+        cur_az, cur_alt = start_az, start_alt
+        visits = []
+        unobservable = []
+        for i in order:
+            # 到达时刻依赖位置，位置又依赖到达时刻，迭代两次即可收敛
+            arrival = t
+            for _ in range(2):
+                target_az, target_alt = self._interpolate(offsets, az, alt, i, arrival)
+                arrival = t + float(self.cost_model.slew_time(cur_az, cur_alt, target_az, target_alt))
+            if not self._observable(target_az, target_alt):
+                unobservable.append(i)
+                continue
+            visits.append((i, t, arrival - t, float(target_az), float(target_alt)))
+            t = arrival + self.targets[i].dwell
+            cur_az, cur_alt = target_az, target_alt
+        return visits, unobservable
+
+    def _greedy_order(self, ephemeris, start_az, start_alt):
+        """最近邻构造初始顺序：每一步选择从当前位置转动耗时最短的可见目标"""
+        offsets, az, alt = ephemeris
+        remaining = np.arange(len(self.targets))
+        t = 0.0
+        cur_az, cur_alt = start_az, start_alt
+        order = []
+        while len(remaining):
+            target_az, target_alt = self._interpolate(offsets, az, alt, remaining, t)
+            cost = self.cost_model.slew_time(cur_az, cur_alt, target_az, target_alt)
+            cost = np.where(self._observable(target_az, target_alt), cost, np.inf)
+            best = int(np.argmin(cost))
+            if not np.isfinite(cost[best]):
+                # 剩下的目标此刻都不可见，按原顺序放到最后交给模拟阶段判定
+                order.extend(int(i) for i in remaining)
+                break
+            i = int(remaining[best])
+            order.append(i)
+            t += float(cost[best]) + self.targets[i].dwell
+            cur_az, cur_alt = float(target_az[best]), float(target_alt[best])
+            remaining = np.delete(remaining, best)
+        return order
+
+    def _two_opt(self, order, cost_matrix):
+        """
+        用2-opt改进路线。
+
+        cost_matrix[i+1, j+1] 为目标i到目标j的转动耗时（按各自预计访问时刻的位置计算），
+        第0行为起始位置。方位轴单向转动时代价不对称，因此每个候选路线都完整重算总代价。
+        """
+        tour = np.array([0] + [i + 1 for i in order])
+        best_cost = cost_matrix[tour[:-1], tour[1:]].sum()
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, len(tour) - 1):
+                for j in range(i + 1, len(tour)):
+                    candidate = np.concatenate((tour[:i], tour[i:j + 1][::-1], tour[j + 1:]))
+                    cost = cost_matrix[candidate[:-1], candidate[1:]].sum()
+                    if cost < best_cost - 1e-9:
+                        tour, best_cost = candidate, cost
+                        improved = True
+        return [int(i) - 1 for i in tour[1:]]
+
+    def plan(self, targets, start_az, start_alt, start_time=None):
+        """
+        生成观测计划
+
+        :param targets: ObservationTarget列表
+        :param start_az: 望远镜当前方位角 (度)
+        :param start_alt: 望远镜当前高度角 (度)
+        :param start_time: 计划开始时间 (datetime对象)，默认当前时间
+        :return: ObservationPlan
+        """
+        start_time = start_time or datetime.now()
+        self.targets = list(targets)
+        if not self.targets:
+            return ObservationPlan(start_time, [], [])
+
+        # 最坏情况下的计划时长：每个目标都转最大角度再驻留
+        max_slew = float(self.cost_model.slew_time(0.0, 0.0, 359.999, 90.0))
+        duration = sum(t.dwell for t in self.targets) + max_slew * len(self.targets)
+        ephemeris = self._build_ephemeris(self.targets, start_time, duration)
+
+        order = self._greedy_order(ephemeris, start_az, start_alt)
+        visits, unobservable = self._simulate(order, ephemeris, start_az, start_alt)
+
+        if len(visits) > 2:
+            # 以贪心计划的预计访问时刻固定各目标位置，构造代价矩阵
+            positions = [(start_az, start_alt)] + [(v[3], v[4]) for v in visits]
+            pos_az = np.array([p[0] for p in positions])
+            pos_alt = np.array([p[1] for p in positions])
+            cost_matrix = self.cost_model.slew_time(pos_az[:, None], pos_alt[:, None],
+                                                    pos_az[None, :], pos_alt[None, :])
+            improved = self._two_opt(list(range(len(visits))), cost_matrix)
+            candidate_order = [visits[i][0] for i in improved] + unobservable
+            candidate, candidate_unobservable = self._simulate(candidate_order, ephemeris, start_az, start_alt)
+            greedy_end = visits[-1][1] + visits[-1][2]
+            candidate_end = candidate[-1][1] + candidate[-1][2] if candidate else np.inf
+            # 只有在按真实时间重新模拟后更好、且没有丢失目标时才采用
+            if len(candidate) >= len(visits) and candidate_end < greedy_end:
+                visits, unobservable = candidate, candidate_unobservable
+
+        planned = [PlannedVisit(self.targets[i], start, slew, az, alt)
+                   for i, start, slew, az, alt in visits]
+        skipped = [self.targets[i] for i in unobservable]
+        logging.info(f"观测计划生成完成: {len(planned)} 个目标, 跳过 {len(skipped)} 个, "
+                     f"总转动耗时 {sum(v.slew_time for v in planned):.1f} 秒")
+        return ObservationPlan(start_time, planned, skipped)
+
+
+def execute_plan(controller, plan, lat, lon, stop_event=None, on_visit=None):
+    """
+    通过控制器依次执行观测计划（阻塞调用，通常在控制线程中运行）
+
+    赤道坐标目标在开始转动时按当前时间重新换算，不直接使用计划中的预测位置。
+
+    :param controller: TelescopeController对象
+    :param plan: ObservationPlan
+    :param lat: 观测点纬度 (度)
+    :param lon: 观测点经度 (度)
+    :param stop_event: threading.Event，置位后在当前目标结束后停止执行
+    :param on_visit: 回调 on_visit(index, visit)，每个目标开始时调用
+    :return: 成功到达的目标数
+    """
+    stop_event = stop_event or threading.Event()
+    reached = 0
+    for index, visit in enumerate(plan.visits):
+        if stop_event.is_set():
+            logging.info("观测计划被停止")
+            break
+        target = visit.target
+        if on_visit:
+            on_visit(index, visit)
+        logging.info(f"观测计划 {index + 1}/{len(plan.visits)}: {target.name}")
+
+        if target.coordinate_type == 'equatorial':
+            controller.set_target(target.ra, target.dec, lat, lon, datetime.now())
+        else:
+            controller.set_target(target.azimuth, target.altitude, coordinate_type='horizontal')
+
+        if controller.control_loop() != 0:
+            logging.error(f"目标 {target.name} 控制失败，终止观测计划")
+            break
+        reached += 1
+
+        # 驻留期间可被停止
+        stop_event.wait(target.dwell)
+    return reached
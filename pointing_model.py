@@ -0,0 +1,203 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+import numpy as np
+
+# 地平式装置的指向模型项（沿用TPOINT命名），单位：度
+# 模型给出 传感器读数 - 真实天空位置：
+#   dA = -IA - CA·secE - NPAE·tanE - AN·sinA·tanE - AW·cosA·tanE
+#   dE =  IE - AN·cosA + AW·sinA
+TERMS = ('IA', 'IE', 'CA', 'NPAE', 'AN', 'AW')
+TERM_DESCRIPTIONS = {
+    'IA': '方位零点偏差',
+    'IE': '高度零点偏差',
+    'CA': '光轴与高度轴不垂直（准直误差）',
+    'NPAE': '高度轴与方位轴不垂直',
+    'AN': '方位轴南北倾斜',
+    'AW': '方位轴东西倾斜',
+}
+
+# tanE/secE在天顶附近发散，计算基函数时高度角上限
+MAX_MODEL_ALTITUDE = 89.5
+
+
+def _basis(az, alt):
+    """
+    各模型项的基函数
+
+    :return: (方位基函数, 高度基函数)，形状均为 (..., len(TERMS))
+    """
+    a = np.radians(np.asarray(az, dtype=float))
+    e = np.radians(np.minimum(np.asarray(alt, dtype=float), MAX_MODEL_ALTITUDE))
+    tan_e = np.tan(e)
+    zero = np.zeros_like(a + e)
+    one = zero + 1.0
+    basis_az = np.stack([-one, zero, -1.0 / np.cos(e), -tan_e, -np.sin(a) * tan_e, -np.cos(a) * tan_e], axis=-1)
+    basis_alt = np.stack([zero, one, zero, zero, -np.cos(a), np.sin(a)], axis=-1)
+    return basis_az, basis_alt
+
+
+class PointingModel:
+    """
+    指向模型：在真实天空位置和传感器（陀螺仪）读数之间换算。
+
+    装置安装误差和陀螺仪轴向假设（方位=z、高度=y）造成的系统误差用少量参数描述，
+    由多颗星的观测拟合得到。换算只是几次三角函数运算，可以在每个控制周期使用。
+    """
+    def __init__(self, coefficients=None):
+        """
+        :param coefficients: {模型项: 系数 (度)}，缺省项为0
+        """
+        coefficients = coefficients or {}
+        self.coefficients = {term: float(coefficients.get(term, 0.0)) for term in TERMS}
+        self._vector = np.array([self.coefficients[term] for term in TERMS])
+
+    def is_identity(self):
+        return not np.any(self._vector)
+
+    def offsets(self, az, alt):
+        """
+        真实位置处的模型偏差，支持数组
+
+        :return: (方位偏差, 高度偏差) 单位：度
+        """
+        basis_az, basis_alt = _basis(az, alt)
+        return basis_az @ self._vector, basis_alt @ self._vector
+
+    def to_mount(self, az, alt):
+        """真实天空位置 -> 传感器读数（设置目标时使用）"""
+        d_az, d_alt = self.offsets(az, alt)
+        return np.mod(az + d_az, 360.0), alt + d_alt
+
+    def to_sky(self, raw_az, raw_alt, tolerance=1e-8, max_iterations=20):
+        """
+        传感器读数 -> 真实天空位置（to_mount的逆变换，不动点迭代）
+
+        模型偏差通常只有零点几度，一般迭代几次即收敛；高度角较高时tanE项变化较快，收敛稍慢。
+        """
+        if self.is_identity():
+            return raw_az, raw_alt
+        az, alt = raw_az, raw_alt
+        for _ in range(max_iterations):
+            d_az, d_alt = self.offsets(az, alt)
+            new_az = np.mod(raw_az - d_az, 360.0)
+            new_alt = raw_alt - d_alt
+            change = np.max(np.abs((new_az - az + 180.0) % 360.0 - 180.0) + np.abs(new_alt - alt))
+            az, alt = new_az, new_alt
+            if change < tolerance:
+                break
+        return az, alt
+
+    def to_dict(self):
+        return dict(self.coefficients)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
+
+
+def fit_pointing_model(sky_az, sky_alt, raw_az, raw_alt, terms=TERMS):
+    """
+    用最小二乘拟合指向模型
+
+    方位残差乘以cosE，使两个方向的残差都对应天球上的角距离。
+    :param sky_az: 真实方位角数组 (度)
+    :param sky_alt: 真实高度角数组 (度)
+    :param raw_az: 对准时的传感器方位角读数 (度)
+    :param raw_alt: 对准时的传感器高度角读数 (度)
+    :param terms: 参与拟合的模型项
+    :return: (PointingModel, 拟合后残差的均方根 (角秒))
+    """
+    sky_az = np.asarray(sky_az, dtype=float)
+    sky_alt = np.asarray(sky_alt, dtype=float)
+    if len(sky_az) < 3:
+        raise ValueError("拟合指向模型至少需要3组观测")
+    unknown = [term for term in terms if term not in TERMS]
+    if unknown:
+        raise ValueError(f"未知的指向模型项: {', '.join(unknown)}")
+    columns = [TERMS.index(term) for term in terms]
+
+    d_az = (np.asarray(raw_az, dtype=float) - sky_az + 180.0) % 360.0 - 180.0
+    d_alt = np.asarray(raw_alt, dtype=float) - sky_alt
+    cos_e = np.cos(np.radians(sky_alt))
+    basis_az, basis_alt = _basis(sky_az, sky_alt)
+
+    design = np.vstack([basis_az[:, columns] * cos_e[:, None], basis_alt[:, columns]])
+    observed = np.concatenate([d_az * cos_e, d_alt])
+    solution, _, _, _ = np.linalg.lstsq(design, observed, rcond=None)
+    residual = observed - design @ solution
+    rms = float(np.sqrt(np.mean(residual ** 2)) * 3600.0)
+    return PointingModel(dict(zip(terms, solution))), rms
+
+
+class PointingCalibration:
+    """
+    指向校准：记录 (真实位置, 传感器读数) 观测对，拟合模型并保存为JSON文件，
+    下次启动时加载。
+    """
+    def __init__(self, path=None):
+        """
+        :param path: 保存文件路径，None表示不保存
+        """
+        self.path = path
+        self.samples = []  # [真实方位, 真实高度, 传感器方位, 传感器高度, 名称]
+        self.model = PointingModel()
+        self.rms = None
+        self.fitted_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """从文件加载；文件不存在时返回空的校准数据"""
+        calibration = cls(path)
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            calibration.samples = [list(sample) for sample in data.get('samples', [])]
+            calibration.model = PointingModel.from_dict(data.get('terms', {}))
+            calibration.rms = data.get('rms')
+            calibration.fitted_at = data.get('fitted_at')
+            logging.info(f"已加载指向模型 {path}: {calibration.model.to_dict()}")
+        return calibration
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = self.to_dict()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def add_sample(self, sky_az, sky_alt, raw_az, raw_alt, name=""):
+        """记录一次对准观测：星体的真实位置和对准时的传感器读数"""
+        with self._lock:
+            self.samples.append([float(sky_az), float(sky_alt), float(raw_az), float(raw_alt), name])
+        self.save()
+
+    def clear(self):
+        with self._lock:
+            self.samples = []
+        self.save()
+
+    def fit(self, terms=TERMS):
+        """拟合模型并保存，返回新的PointingModel"""
+        with self._lock:
+            samples = np.array([sample[:4] for sample in self.samples], dtype=float).reshape(-1, 4)
+        model, rms = fit_pointing_model(samples[:, 0], samples[:, 1], samples[:, 2], samples[:, 3], terms)
+        with self._lock:
+            self.model = model
+            self.rms = rms
+            self.fitted_at = datetime.now().isoformat(timespec='seconds')
+        self.save()
+        logging.info(f"指向模型拟合完成: {model.to_dict()}，残差 {rms:.1f}″")
+        return model
+
+    def to_dict(self):
+        return {
+            "terms": self.model.to_dict(),
+            "rms": self.rms,
+            "fitted_at": self.fitted_at,
+            "samples": self.samples,
+        }
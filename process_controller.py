@@ -0,0 +1,313 @@
+import time
+import queue
+import logging
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+
+# 共享内存中的遥测记录（单条结构化记录）
+# seq 为顺序锁计数：写入前加1变为奇数，写完再加1变为偶数；读取方据此判断是否读到完整数据
+TELEMETRY_DTYPE = np.dtype([
+    ('seq', 'u8'),
+    ('time', 'f8'),           # 遥测更新时间 (time.time)
+    ('current_az', 'f8'),
+    ('current_alt', 'f8'),
+    ('target_az', 'f8'),
+    ('target_alt', 'f8'),
+    ('tick_time', 'f8'),      # 最近一次控制周期的时间
+    ('state', 'u1'),
+    ('target_id', 'u4'),      # 控制进程已接收的最新目标编号
+    ('stop_count', 'u4'),     # 已完成的停止请求数
+    ('stop_latency', 'f8'),   # 最近一次停止请求的延迟 (秒)
+    ('stale', 'u1'),          # 姿态数据是否过期（陀螺仪尚无有效数据或读取失败），过期时当前姿态为NaN
+    ('error', 'S120'),
+])
+
+STATES = ['idle', 'slewing', 'arrived', 'stopped', 'error']
+
+
+def _publish(record, controller, state, error, attitude, counters, stale=False):
+    """将当前状态写入共享内存（控制进程中调用）"""
+    record['seq'] += 1
+    record['time'] = time.time()
+    record['current_az'], record['current_alt'] = (np.nan, np.nan) if attitude is None else attitude
+    record['stale'] = stale or attitude is None
+    record['target_az'] = getattr(controller, 'target_azimuth', np.nan)
+    record['target_alt'] = getattr(controller, 'target_altitude', np.nan)
+    record['tick_time'] = controller.last_tick_time
+    record['state'] = STATES.index(state)
+    record['target_id'] = counters['target_id']
+    record['stop_count'] = counters['stop_count']
+    record['stop_latency'] = counters['stop_latency']
+    record['error'] = (error or '').encode('utf-8')[:120]
+    record['seq'] += 1
+
+
+def _controller_process(shm_name, commands, config, publish_period):
+    """控制进程入口：创建控制器和常驻控制线程，接收命令并发布遥测"""
+    from transform_control import create_controller
+    from controller_service import ControllerService
+    from gyroscope import StaleSampleError
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    shm = shared_memory.SharedMemory(name=shm_name)
+    record = np.ndarray((1,), dtype=TELEMETRY_DTYPE, buffer=shm.buf)[0]
+
+    controller = None
+    service = None
+    parent = mp.parent_process()
+    try:
+        config = dict(config)
+        watchdog_deadline = config.pop('watchdog_deadline', None)
+        controller = create_controller(**config)
+        service = ControllerService(controller, watchdog_deadline=watchdog_deadline)
+        service.start()
+        counters = {'target_id': 0, 'stop_count': 0, 'stop_latency': 0.0}
+        while True:
+            # Web进程退出后不再有人发送停止请求：停止运动并结束控制进程
+            if parent is not None and not parent.is_alive():
+                logging.error("Web进程已退出，停止运动")
+                break
+            try:
+                command = commands.get(timeout=publish_period)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                kind, args, kwargs, command_id = command
+                if kind == 'target':
+                    service.set_target(*args, **kwargs)
+                    counters['target_id'] = command_id
+                elif kind == 'configure':
+                    # 更新控制器参数（指向模型、折射表），从下一次设置目标起生效
+                    for name, value in kwargs.items():
+                        setattr(controller, name, value)
+                elif kind == 'stop':
+                    counters['stop_latency'] = service.stop()
+                    counters['stop_count'] = command_id
+                elif kind == 'shutdown':
+                    break
+
+            # 已提交但控制线程尚未应用的目标也视为运动中
+            state = service.state if service.wait(0) else ControllerService.SLEWING
+            # 运动中使用控制周期读到的姿态；静止时控制线程不读取传感器，由本线程读取
+            if state == ControllerService.SLEWING:
+                attitude = controller.last_attitude
+                stale = controller.stale_since is not None
+            else:
+                try:
+                    attitude = controller.get_current_attitude() if controller.gyro else None
+                    is_stale = getattr(controller.gyro, 'is_stale', None)
+                    stale = bool(is_stale and is_stale())
+                except (StaleSampleError, IOError) as e:
+                    # 陀螺仪尚无有效数据或读取失败：发布过期标志，控制进程继续运行
+                    logging.debug(f"读取姿态失败: {e}")
+                    attitude, stale = None, True
+            _publish(record, controller, state, service.error, attitude, counters, stale)
+    except Exception as e:
+        logging.error(f"控制进程异常: {e}")
+        record['seq'] += 1
+        record['state'] = STATES.index('error')
+        record['error'] = str(e).encode('utf-8')[:120]
+        record['seq'] += 1
+    finally:
+        if service:
+            service.shutdown()
+        if controller:
+            controller.close()
+        del record
+        shm.close()
+
+
+class ProcessControllerHost:
+    """
+    在独立进程中运行控制循环。
+
+    Web进程与控制进程不共享GIL，Flask请求处理和状态格式化不会拉长控制周期。
+    遥测通过multiprocessing.shared_memory中的结构化数组发布，命令通过队列发送。
+    接口与ControllerService一致（set_target/stop/wait/control_loop/shutdown）。
+    """
+    def __init__(self, mode, control_port=None, gyro_port=None, publish_period=0.01,
+                 pointing_model=None, refraction=None, lead_solver=None, braking=False,
+                 timed_pulses=False, gyro_baudrate=None, horizon=None, shared_bus=False, watchdog_deadline=None,
+                 cable_wrap=None):
+        """
+        :param mode: 运行模式，与transform_control.create_controller相同
+        :param control_port: 控制器串口
+        :param gyro_port: 陀螺仪串口
+        :param publish_period: 遥测发布周期 (秒)
+        :param pointing_model: 指向模型 (PointingModel)
+        :param refraction: 大气折射表 (RefractionTable)
+        :param lead_solver: 提前量目标解算器 (LeadTargetSolver)
+        :param braking: 是否使用学习刹车距离的控制模式
+        :param timed_pulses: 短脉冲是否由继电器固件计时
+        :param gyro_baudrate: 与陀螺仪协商的波特率
+        :param horizon: 地平遮挡掩码 (HorizonMask)
+        :param shared_bus: 陀螺仪串口是否作为共用的RS485总线
+        :param watchdog_deadline: 控制进程中看门狗的期限 (秒)，None表示不启用
+        :param cable_wrap: 方位轴线缆缠绕跟踪 (CableWrap)，在控制进程中更新和保存
+        """
+        self.config = {'mode': mode, 'control_port': control_port, 'gyro_port': gyro_port,
+                       'pointing_model': pointing_model, 'refraction': refraction,
+                       'lead_solver': lead_solver, 'braking': braking,
+                       'timed_pulses': timed_pulses, 'gyro_baudrate': gyro_baudrate,
+                       'horizon': horizon, 'shared_bus': shared_bus, 'watchdog_deadline': watchdog_deadline,
+                       'cable_wrap': cable_wrap}
+        self.publish_period = publish_period
+        self.stop_latencies = deque(maxlen=100)
+        # 使用spawn启动，子进程不继承Web进程中的线程和锁
+        self._context = mp.get_context('spawn')
+        self._commands = self._context.Queue()
+        self._shm = shared_memory.SharedMemory(create=True, size=TELEMETRY_DTYPE.itemsize)
+        self._telemetry = np.ndarray((1,), dtype=TELEMETRY_DTYPE, buffer=self._shm.buf)
+        self._telemetry[0] = np.zeros((), dtype=TELEMETRY_DTYPE)
+        self._process = None
+        self._last_snapshot = None  # 最近一次读到的完整快照
+        self._target_id = 0
+        self._stop_id = 0
+
+    def start(self, timeout=30.0):
+        """启动控制进程，等待其发布第一条遥测"""
+        if self.is_alive():
+            return
+        self._process = self._context.Process(
+            target=_controller_process,
+            args=(self._shm.name, self._commands, self.config, self.publish_period),
+            name="telescope-control-process",
+            daemon=True
+        )
+        self._process.start()
+        deadline = time.monotonic() + timeout
+        while self.read()['seq'] == 0:
+            if not self._process.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("控制进程启动失败")
+            time.sleep(0.01)
+        if self.state == 'error':
+            raise RuntimeError(self.error)
+        logging.info(f"控制进程已启动 (pid={self._process.pid})")
+
+    def is_alive(self):
+        return bool(self._process and self._process.is_alive())
+
+    def read(self, timeout=0.1):
+        """
+        读取一份完整的遥测快照（顺序锁，写入过程中读到的数据会重试）
+
+        控制进程在写入中途退出或卡住时seq停在奇数：进程已退出或超过timeout仍未写完时不再等待，
+        返回最近一次完整的快照，并把状态置为error。
+
+        :param timeout: 等待写入完成的最长时间 (秒)
+        """
+        record = self._telemetry[0]
+        deadline = None
+        while True:
+            seq = int(record['seq'])
+            if seq % 2 == 0:
+                snapshot = record.copy()
+                if int(record['seq']) == seq:
+                    self._last_snapshot = snapshot
+                    return snapshot
+            elif deadline is None:
+                deadline = time.monotonic() + timeout
+            elif not self.is_alive() or time.monotonic() > deadline:
+                break
+            time.sleep(0)
+        snapshot = (record if self._last_snapshot is None else self._last_snapshot).copy()
+        snapshot['state'] = STATES.index('error')
+        reason = "控制进程已退出" if not self.is_alive() else "控制进程写入遥测超时"
+        snapshot['error'] = f"{reason}，遥测停在写入中途".encode('utf-8')[:120]
+        return snapshot
+
+    def telemetry(self):
+        """以字典形式返回遥测"""
+        snapshot = self.read()
+        stale = bool(snapshot['stale'])
+        return {
+            "time": float(snapshot['time']),
+            "current_az": None if stale and np.isnan(snapshot['current_az']) else float(snapshot['current_az']),
+            "current_alt": None if stale and np.isnan(snapshot['current_alt']) else float(snapshot['current_alt']),
+            "stale": stale,
+            "target_az": float(snapshot['target_az']),
+            "target_alt": float(snapshot['target_alt']),
+            "tick_time": float(snapshot['tick_time']),
+            "state": STATES[snapshot['state']],
+            "error": snapshot['error'].decode('utf-8', errors='replace') or None,
+        }
+
+    @property
+    def state(self):
+        return STATES[self.read()['state']]
+
+    @property
+    def error(self):
+        return self.read()['error'].decode('utf-8', errors='replace') or None
+
+    def set_pointing_model(self, model):
+        """更新控制进程中的指向模型"""
+        self._commands.put(('configure', (), {'pointing_model': model}, 0))
+
+    def set_refraction(self, refraction):
+        """更新控制进程中的大气折射表"""
+        self._commands.put(('configure', (), {'refraction': refraction}, 0))
+
+    def set_target(self, *args, **kwargs):
+        """设置新目标，参数与TelescopeController.set_target相同（需可序列化）"""
+        self._target_id += 1
+        self._commands.put(('target', args, kwargs, self._target_id))
+
+    def stop(self, timeout=1.0):
+        """
+        停止运动，等待控制进程确认
+
+        :return: 控制进程内测得的停止延迟 (秒)；超时未确认返回None
+        """
+        self._stop_id += 1
+        self._commands.put(('stop', (), {}, self._stop_id))
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            snapshot = self.read()
+            if snapshot['stop_count'] >= self._stop_id:
+                latency = float(snapshot['stop_latency'])
+                self.stop_latencies.append(latency)
+                return latency
+            time.sleep(0.001)
+        logging.error("控制进程未确认停止请求")
+        return None
+
+    def wait(self, timeout=None):
+        """等待最近提交的目标结束（到达、停止或出错）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.read()
+            if (snapshot['target_id'] >= self._target_id
+                    and STATES[snapshot['state']] in ('arrived', 'stopped', 'error')):
+                return True
+            if not self.is_alive():
+                return False
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(self.publish_period / 2)
+
+    def control_loop(self):
+        self.wait()
+        state = self.state
+        if state == 'arrived':
+            return 0
+        if state == 'stopped':
+            return 2
+        return 1
+
+    def shutdown(self, timeout=2.0):
+        """停止运动并结束控制进程，释放共享内存"""
+        if self._process:
+            if self._process.is_alive():
+                self._commands.put(('shutdown', (), {}, 0))
+                self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+        del self._telemetry
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,66 @@
+from functools import lru_cache
+import numpy as np
+
+# 标准大气条件
+STANDARD_PRESSURE = 1010.0     # hPa
+STANDARD_TEMPERATURE = 10.0    # 摄氏度
+
+
+def saemundsson(true_alt, pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """
+    Saemundsson公式：由真实（几何）高度角计算大气折射 (度)
+
+    R = 1.02′ / tan(h + 10.3/(h + 5.11))，再按气压和温度缩放
+    :param true_alt: 真实高度角 (度)，标量或数组
+    :param pressure: 气压 (hPa)
+    :param temperature: 气温 (摄氏度)
+    """
+    h = np.asarray(true_alt, dtype=float)
+    refraction = 1.02 / np.tan(np.radians(h + 10.3 / (h + 5.11))) / 60.0
+    return refraction * (pressure / 1010.0) * (283.0 / (273.0 + temperature))
+
+
+class RefractionTable:
+    """
+    大气折射查找表：气象参数变化时按高度角预先计算一次，之后每次修正只做一次线性插值，
+    不走astropy的折射计算路径，可以在控制周期和批量转换中使用。
+    """
+    MIN_ALTITUDE = -2.0
+
+    def __init__(self, pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE, step=0.05):
+        """
+        :param pressure: 气压 (hPa)，0表示不做折射修正
+        :param temperature: 气温 (摄氏度)
+        :param step: 表格高度角间隔 (度)
+        """
+        self.pressure = float(pressure)
+        self.temperature = float(temperature)
+        self.step = float(step)
+        self.true_alt = np.arange(self.MIN_ALTITUDE, 90.0 + self.step / 2, self.step)
+        correction = saemundsson(self.true_alt, self.pressure, self.temperature)
+        # 天顶处公式不严格为0，整体减去天顶值使表格在90°处为0
+        self.correction_table = np.maximum(correction - correction[-1], 0.0)
+        self.apparent_alt = self.true_alt + self.correction_table
+
+    def correction(self, true_alt):
+        """真实高度角处的折射量 (度)，支持数组"""
+        return np.interp(true_alt, self.true_alt, self.correction_table)
+
+    def apparent(self, true_alt):
+        """真实高度角 -> 视高度角（望远镜实际需要指向的高度角）"""
+        return np.asarray(true_alt, dtype=float) + self.correction(true_alt)
+
+    def true(self, apparent_alt):
+        """视高度角 -> 真实高度角（apparent的逆变换，视高度角随真实高度角单调递增）"""
+        return np.interp(apparent_alt, self.apparent_alt, self.true_alt)
+
+    def to_dict(self):
+        return {"pressure": self.pressure, "temperature": self.temperature}
+
+
+@lru_cache(maxsize=16)
+def get_refraction_table(pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """按气象参数缓存折射表，参数不变时重复使用"""
+    if pressure <= 0:
+        return None
+    return RefractionTable(pressure, temperature)
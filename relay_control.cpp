@@ -6,13 +6,23 @@
 #define ALT_UP_PIN 3  // 高度角升高(IO3)
 #define ALT_DOWN_PIN 4 // 高度角降低(IO4)
 
-struct ControlState {
-  bool az_cw;
-  bool az_ccw;
-  bool alt_up;
-  bool alt_down;
+// 命令格式：AZ<方向>EL<方向>，方向 0停止 1顺时针/升高 2逆时针/降低
+// 方向后可跟 T<毫秒>，表示定时脉冲，到时由本程序自动停止，例如 AZ1T120
+// 命令中省略的轴保持当前输出（脉冲执行期间主机不发送该轴）
+// 脉冲计时使用millis()，主循环不阻塞
+
+#define MAX_COMMAND_LENGTH 32
+
+struct AxisPulse {
+  bool active;
+  unsigned long start;     // 脉冲开始时刻 (毫秒)
+  unsigned long duration;  // 脉冲时长 (毫秒)
 };
 
+AxisPulse azPulse = {false, 0, 0};
+AxisPulse altPulse = {false, 0, 0};
+String commandBuffer = "";
+
 void setup() {
   Serial.begin(115200);
   Serial.println("Relay Control Initialized");
@@ -41,63 +51,91 @@ void setup() {
   
 }
 
-ControlState parseCommand(const String& command) {
-  ControlState state = {HIGH, HIGH, HIGH, HIGH};
-  
-  // 解析方位角控制部分 (AZ开头)
-  int azIndex = command.indexOf("AZ");
-  if (azIndex != -1) {
-    char azCmd = command.charAt(azIndex + 2);
-    if (azCmd == '1') {      // 顺时针
-      state.az_cw = LOW;
-      state.az_ccw = HIGH;
-    } else if (azCmd == '2') { // 逆时针
-      state.az_cw = HIGH;
-      state.az_ccw = LOW;
-    } else if (azCmd == '0') { // 停止
-      state.az_cw = LOW;
-      state.az_ccw = LOW;
-    }
+void setAzimuth(char cmd) {
+  if (cmd == '1') {          // 顺时针
+    digitalWrite(AZ_CW_PIN, LOW);
+    digitalWrite(AZ_CCW_PIN, HIGH);
+  } else if (cmd == '2') {   // 逆时针
+    digitalWrite(AZ_CW_PIN, HIGH);
+    digitalWrite(AZ_CCW_PIN, LOW);
+  } else if (cmd == '0') {   // 停止
+    digitalWrite(AZ_CW_PIN, LOW);
+    digitalWrite(AZ_CCW_PIN, LOW);
+  }
+}
+
+void setAltitude(char cmd) {
+  if (cmd == '1') {          // 升高
+    digitalWrite(ALT_UP_PIN, HIGH);
+    digitalWrite(ALT_DOWN_PIN, LOW);
+  } else if (cmd == '2') {   // 降低
+    digitalWrite(ALT_UP_PIN, LOW);
+    digitalWrite(ALT_DOWN_PIN, HIGH);
+  } else if (cmd == '0') {   // 停止
+    digitalWrite(ALT_UP_PIN, LOW);
+    digitalWrite(ALT_DOWN_PIN, LOW);
+  }
+}
+
+// 解析一个轴字段（prefix为"AZ"或"EL"），返回是否找到该字段
+bool parseAxis(const String& command, const char* prefix, void (*setAxis)(char), AxisPulse& pulse) {
+  int index = command.indexOf(prefix);
+  if (index == -1 || index + 2 >= (int)command.length()) {
+    return false;
+  }
+  char cmd = command.charAt(index + 2);
+  if (cmd != '0' && cmd != '1' && cmd != '2') {
+    return false;
   }
 
-  // 解析高度角控制部分 (EL开头)
-  int elIndex = command.indexOf("EL");
-  if (elIndex != -1) {
-    char elCmd = command.charAt(elIndex + 2);
-    if (elCmd == '1') {      // 升高
-      state.alt_up = HIGH;
-      state.alt_down = LOW;
-    } else if (elCmd == '2') { // 降低
-      state.alt_up = LOW;
-      state.alt_down = HIGH;
-    } else if (elCmd == '0') { // 停止
-      state.alt_up = LOW;
-      state.alt_down = LOW;
+  // 新命令取消该轴正在执行的脉冲
+  pulse.active = false;
+  int pos = index + 3;
+  if (pos < (int)command.length() && command.charAt(pos) == 'T') {
+    unsigned long duration = 0;
+    pos++;
+    while (pos < (int)command.length() && isDigit(command.charAt(pos))) {
+      duration = duration * 10 + (command.charAt(pos) - '0');
+      pos++;
+    }
+    if (cmd != '0' && duration > 0) {
+      pulse.active = true;
+      pulse.start = millis();
+      pulse.duration = duration;
     }
   }
-  
-  return state;
+  setAxis(cmd);
+  return true;
+}
+
+void executeCommand(const String& command) {
+  parseAxis(command, "AZ", setAzimuth, azPulse);
+  parseAxis(command, "EL", setAltitude, altPulse);
 }
 
-void executeControl(const ControlState& state) {
-  digitalWrite(AZ_CW_PIN, state.az_cw);
-  digitalWrite(AZ_CCW_PIN, state.az_ccw);
-  digitalWrite(ALT_UP_PIN, state.alt_up);
-  digitalWrite(ALT_DOWN_PIN, state.alt_down);
+// 脉冲到时停止对应的轴
+void updatePulse(AxisPulse& pulse, void (*setAxis)(char)) {
+  if (pulse.active && millis() - pulse.start >= pulse.duration) {
+    pulse.active = false;
+    setAxis('0');
+  }
 }
 
 void loop() {
-  if (Serial.available() > 0) {
-    String command = Serial.readStringUntil('\n');
-    command.trim();
-    Serial.print("Received command: ");
-    Serial.println(command);
-
-    // 解析命令
-    ControlState state = parseCommand(command);
-    
-    // 执行控制
-    executeControl(state);
+  // 逐字节读取，不等待整行，保证脉冲计时不被串口读取阻塞
+  while (Serial.available() > 0) {
+    char c = Serial.read();
+    if (c == '\n') {
+      commandBuffer.trim();
+      Serial.print("Received command: ");
+      Serial.println(commandBuffer);
+      executeCommand(commandBuffer);
+      commandBuffer = "";
+    } else if (commandBuffer.length() < MAX_COMMAND_LENGTH) {
+      commandBuffer += c;
+    }
   }
-  delay(10);
-}
\ No newline at end of file
+
+  updatePulse(azPulse, setAzimuth);
+  updatePulse(altPulse, setAltitude);
+}
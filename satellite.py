@@ -0,0 +1,228 @@
+import logging
+from datetime import datetime, timezone
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import TEME, ITRS, AltAz, CartesianRepresentation, EarthLocation
+from astropy.time import Time
+from batch_transform import get_location
+
+try:
+    from sgp4.api import Satrec, SatrecArray
+except ImportError:  # sgp4只在卫星跟踪时需要
+    Satrec = SatrecArray = None
+
+
+def _require_sgp4():
+    if Satrec is None:
+        raise RuntimeError("卫星跟踪需要安装sgp4: pip install sgp4")
+
+
+def _to_datetime(unix_time):
+    """unix时间戳 -> UTC datetime（不带时区，与项目中的时间约定一致）"""
+    return datetime.fromtimestamp(float(unix_time), tz=timezone.utc).replace(tzinfo=None)
+
+
+class TLE:
+    """一颗卫星的两行轨道根数"""
+    def __init__(self, name, line1, line2):
+        self.name = name
+        self.line1 = line1
+        self.line2 = line2
+        self._satrec = None
+
+    @property
+    def satrec(self):
+        _require_sgp4()
+        if self._satrec is None:
+            self._satrec = Satrec.twoline2rv(self.line1, self.line2)
+        return self._satrec
+
+    def __getstate__(self):
+        # Satrec对象按需重建，序列化（如发送到控制进程）时只保留文本
+        return {"name": self.name, "line1": self.line1, "line2": self.line2, "_satrec": None}
+
+
+def load_tles(path):
+    """
+    读取本地TLE文件，支持带名称的三行格式和不带名称的两行格式（以卫星编号为名称）
+
+    :return: [TLE, ...]
+    :raises ValueError: 文件格式错误
+    """
+    with open(path, encoding='utf-8') as f:
+        lines = [line.rstrip() for line in f if line.strip()]
+    tles = []
+    i = 0
+    while i < len(lines):
+        if lines[i].startswith('1 ') and i + 1 < len(lines) and lines[i + 1].startswith('2 '):
+            name, line1, line2 = lines[i][2:7].strip(), lines[i], lines[i + 1]
+            i += 2
+        elif i + 2 < len(lines) and lines[i + 1].startswith('1 ') and lines[i + 2].startswith('2 '):
+            # 三行格式的名称行可能带 "0 " 前缀
+            name = lines[i][2:] if lines[i].startswith('0 ') else lines[i]
+            name, line1, line2 = name.strip(), lines[i + 1], lines[i + 2]
+            i += 3
+        else:
+            raise ValueError(f"{path} 第{i + 1}行不是有效的TLE记录: {lines[i]}")
+        tles.append(TLE(name, line1, line2))
+    logging.info(f"已加载 {len(tles)} 颗卫星的轨道根数: {path}")
+    return tles
+
+
+class SatelliteEphemeris:
+    """
+    一次过境的稠密地平坐标星历，控制周期中按时刻线性插值，不再做SGP4和坐标转换。
+
+    方位角预先展开，跨越0°/360°时插值正确。
+    """
+    def __init__(self, name, times, azimuth, altitude):
+        """
+        :param name: 卫星名称
+        :param times: unix时间戳数组（递增）
+        :param azimuth: 方位角数组 (度)
+        :param altitude: 高度角数组 (度)
+        """
+        self.name = name
+        self.times = np.asarray(times, dtype=float)
+        self.azimuth = np.asarray(azimuth, dtype=float) % 360.0
+        self.altitude = np.asarray(altitude, dtype=float)
+        self.unwrapped = np.unwrap(self.azimuth, period=360.0)
+
+    @property
+    def start(self):
+        return float(self.times[0])
+
+    @property
+    def end(self):
+        return float(self.times[-1])
+
+    @property
+    def max_altitude(self):
+        return float(self.altitude.max())
+
+    def position(self, unix_time):
+        """插值得到某一时刻的 (方位角, 高度角)；时段之外取端点"""
+        az = float(np.interp(unix_time, self.times, self.unwrapped)) % 360.0
+        return az, float(np.interp(unix_time, self.times, self.altitude))
+
+    def above_horizon(self, horizon, after=None):
+        """
+        按地平遮挡掩码截取星历：after之后第一段连续可见的部分
+
+        :param horizon: 地平遮挡掩码 (HorizonMask)
+        :param after: unix时间，None表示从星历开头
+        :return: SatelliteEphemeris，after之后没有可见部分时为None
+        """
+        # 从after所在的插值区间开始
+        begin = 0 if after is None else max(0, int(np.searchsorted(self.times, after)) - 1)
+        visible = horizon.visible(self.azimuth[begin:], self.altitude[begin:])
+        if not visible.any():
+            return None
+        first = begin + int(np.argmax(visible))
+        blocked = np.flatnonzero(~visible[first - begin:])
+        last = first + int(blocked[0]) - 1 if len(blocked) else len(self.times) - 1
+        if first == begin and last == len(self.times) - 1:
+            return self
+        return SatelliteEphemeris(self.name, self.times[first:last + 1],
+                                  self.azimuth[first:last + 1], self.altitude[first:last + 1])
+
+    def to_dict(self, max_points=200):
+        stride = max(1, int(np.ceil(len(self.times) / max_points)))
+        return {
+            "name": self.name,
+            "start": _to_datetime(self.start).isoformat(timespec='seconds'),
+            "end": _to_datetime(self.end).isoformat(timespec='seconds'),
+            "max_altitude": round(self.max_altitude, 2),
+            "time": np.round(self.times[::stride] - self.start, 1).tolist(),
+            "az": np.round(self.azimuth[::stride], 2).tolist(),
+            "alt": np.round(self.altitude[::stride], 2).tolist(),
+        }
+
+
+class SatellitePredictor:
+    """
+    卫星过境预报。
+
+    多颗卫星、多个时刻的位置由SGP4一次批量外推（TEME坐标），
+    再一次astropy变换 TEME -> ITRS -> AltAz（站心坐标）得到方位角和高度角，全部离线完成。
+    """
+    def __init__(self, lat, lon, height=0.0, min_altitude=20.0, refraction=None):
+        """
+        :param lat: 观测点纬度 (度)
+        :param lon: 观测点经度 (度)
+        :param height: 观测点海拔 (米)
+        :param min_altitude: 过境的最低高度角 (度)，默认与高度轴下限一致
+        :param refraction: 大气折射表，与控制器使用的一致
+        """
+        self.lat = float(lat)
+        self.lon = float(lon)
+        self.height = float(height)
+        self.min_altitude = min_altitude
+        self.refraction = refraction
+        self.location = (EarthLocation.from_geodetic(self.lon * u.deg, self.lat * u.deg, self.height * u.m)
+                         if self.height else get_location(self.lat, self.lon))
+
+    def horizontal(self, tles, unix_times):
+        """
+        :param tles: TLE列表
+        :param unix_times: unix时间戳数组，长度T
+        :return: (方位角, 高度角)，形状 (卫星数, T)；外推失败的位置为NaN
+        """
+        _require_sgp4()
+        times = Time(np.asarray(unix_times, dtype=float), format='unix')
+        satellites = SatrecArray([tle.satrec for tle in tles])
+        errors, position, _ = satellites.sgp4(times.jd1, times.jd2)
+        position = np.where(errors[..., None] == 0, position, np.nan)
+        teme = TEME(CartesianRepresentation(position[..., 0], position[..., 1], position[..., 2], unit=u.km),
+                    obstime=times)
+        itrs = teme.transform_to(ITRS(obstime=times))
+        altaz = itrs.transform_to(AltAz(obstime=times, location=self.location))
+        alt = np.asarray(altaz.alt.deg, dtype=float)
+        if self.refraction is not None:
+            alt = np.asarray(self.refraction.apparent(alt), dtype=float)
+        return np.asarray(altaz.az.deg, dtype=float), alt
+
+    def passes(self, tles, start=None, duration=86400.0, coarse_step=30.0):
+        """
+        各卫星在时段内的下一次过境（粗网格，供列表显示）
+
+        :param start: 开始时间 (datetime)，默认当前时间
+        :return: [(TLE, 升起unix时间, 落下unix时间, 最大高度角) 或 None, ...]，与tles一一对应
+        """
+        start_unix = Time(start or datetime.now(timezone.utc).replace(tzinfo=None)).unix
+        grid = start_unix + np.arange(0.0, duration + coarse_step, coarse_step)
+        _, alt = self.horizontal(tles, grid)
+        result = []
+        for i, tle in enumerate(tles):
+            above = np.nan_to_num(alt[i], nan=-90.0) >= self.min_altitude
+            if not above.any():
+                result.append(None)
+                continue
+            first = int(np.argmax(above))
+            after = np.flatnonzero(~above[first:])
+            last = first + (int(after[0]) - 1 if len(after) else len(above) - first - 1)
+            result.append((tle, float(grid[first]), float(grid[last]), float(alt[i, first:last + 1].max())))
+        return result
+
+    def next_pass(self, tle, start=None, duration=86400.0, coarse_step=30.0, step=0.5):
+        """
+        下一次过境的稠密星历：粗网格找到过境时段，再在时段上按step一次批量计算
+
+        :param tle: TLE
+        :param start: 开始时间 (datetime)，默认当前时间；开始时已过境则从开始时刻算起
+        :param step: 星历时间间隔 (秒)
+        :return: SatelliteEphemeris，时段内没有过境时为None
+        """
+        found = self.passes([tle], start, duration, coarse_step)[0]
+        if found is None:
+            return None
+        _, rise, set_time, _ = found
+        # 向两侧各扩展一个粗网格步长，覆盖真实的升起和落下时刻
+        start_unix = Time(start or datetime.now(timezone.utc).replace(tzinfo=None)).unix
+        times = np.arange(max(start_unix, rise - coarse_step), set_time + coarse_step + step, step)
+        az, alt = self.horizontal([tle], times)
+        valid = np.isfinite(az[0]) & np.isfinite(alt[0])
+        ephemeris = SatelliteEphemeris(tle.name, times[valid], az[0, valid], alt[0, valid])
+        logging.info(f"卫星 {tle.name} 过境: {_to_datetime(rise)} ~ {_to_datetime(set_time)} UTC, "
+                     f"最大高度角 {ephemeris.max_altitude:.1f}°")
+        return ephemeris
@@ -0,0 +1,167 @@
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+from batch_transform import equatorial_to_horizontal_batch
+from observation_plan import SlewCostModel
+
+
+def serpentine_grid(width, height, step, circular=False):
+    """
+    以中心为原点的扫描网格偏移量，按行排列，相邻行反向（蛇形），行间只需转动一个步长
+
+    :param width: 区域宽度 (度)，圆形区域为直径
+    :param height: 区域高度 (度)，圆形区域忽略
+    :param step: 网格间隔 (度)
+    :param circular: 是否为圆形区域（保留距中心不超过半径的网格点）
+    :return: (x偏移数组, y偏移数组)，x沿行方向（赤经/方位角），y沿行间方向（赤纬/高度角）
+    """
+    if step <= 0:
+        raise ValueError("扫描步长必须大于0")
+    if circular:
+        height = width
+    # 网格点关于中心对称
+    nx = int(np.floor(width / step / 2 + 1e-9))
+    ny = int(np.floor(height / step / 2 + 1e-9))
+    x = np.arange(-nx, nx + 1) * step
+    y = np.arange(-ny, ny + 1) * step
+    row, column = np.meshgrid(np.arange(len(y)), np.arange(len(x)), indexing='ij')
+    # 奇数行反向
+    column = np.where(row % 2 == 1, len(x) - 1 - column, column)
+    dx, dy = x[column].ravel(), y[row].ravel()
+    if circular:
+        keep = np.hypot(dx, dy) <= width / 2 + 1e-9
+        dx, dy = dx[keep], dy[keep]
+    return dx, dy
+
+
+class ScanPattern:
+    """
+    矩形或圆形天区扫描。
+
+    网格在赤道坐标（随天球转动）或地平坐标（相对地面固定）中生成，
+    沿行方向的偏移按cos(赤纬/高度角)换算，使网格在天球上间隔均匀。
+    """
+    def __init__(self, center_a, center_b, width, height=None, step=1.0, coordinate_type='horizontal',
+                 circular=False, dwell=5.0):
+        """
+        :param center_a: 中心赤经 (小时) 或方位角 (度)
+        :param center_b: 中心赤纬 (度) 或高度角 (度)
+        :param width: 区域宽度 (度)，圆形区域为直径
+        :param height: 区域高度 (度)，None表示与宽度相同
+        :param step: 网格间隔 (度)
+        :param coordinate_type: 'equatorial' 或 'horizontal'
+        :param circular: 是否为圆形区域
+        :param dwell: 每个网格点的驻留时间 (秒)
+        """
+        if coordinate_type not in ('equatorial', 'horizontal'):
+            raise ValueError(f"未知的坐标类型: {coordinate_type}")
+        self.center_a = float(center_a)
+        self.center_b = float(center_b)
+        self.width = float(width)
+        self.height = self.width if height is None else float(height)
+        self.step = float(step)
+        self.coordinate_type = coordinate_type
+        self.circular = circular
+        self.dwell = float(dwell)
+
+    @classmethod
+    def from_dict(cls, data):
+        """从字典（例如Web请求的JSON）创建扫描"""
+        coordinate_type = data.get('coordinate_type', 'horizontal')
+        keys = ('ra', 'dec') if coordinate_type == 'equatorial' else ('az', 'alt')
+        height = data.get('height')
+        return cls(float(data[keys[0]]), float(data[keys[1]]), float(data['width']),
+                   height=None if height in (None, '') else float(height),
+                   step=float(data.get('step', 1.0)), coordinate_type=coordinate_type,
+                   circular=bool(data.get('circular', False)), dwell=float(data.get('dwell', 5.0)))
+
+    def points(self):
+        """
+        网格点坐标（蛇形顺序）
+
+        :return: (赤经(小时)/方位角(度) 数组, 赤纬/高度角 (度) 数组)
+        """
+        dx, dy = serpentine_grid(self.width, self.height, self.step, self.circular)
+        b = self.center_b + dy
+        scale = np.cos(np.radians(np.clip(b, -89.0, 89.0)))
+        if self.coordinate_type == 'equatorial':
+            return (self.center_a + dx / scale / 15.0) % 24.0, b
+        return (self.center_a + dx / scale) % 360.0, b
+
+    def plan(self, lat=None, lon=None, start_time=None, cost_model=None, refraction=None, min_altitude=20.0,
+             horizon=None):
+        """
+        生成扫描路径：赤道坐标网格按预计到达各点的时刻批量转换为地平坐标
+
+        :param lat: 观测点纬度 (度)，赤道坐标扫描必需
+        :param lon: 观测点经度 (度)，赤道坐标扫描必需
+        :param start_time: 开始时间 (datetime)，默认当前时间
+        :param cost_model: 转动耗时模型，用于估计到达各点的时刻
+        :param refraction: 大气折射表，与控制器使用的一致
+        :param min_altitude: 最低高度角，低于的网格点被跳过
+        :param horizon: 地平遮挡掩码，被遮挡的网格点被跳过
+        :return: ScanPlan
+        """
+        start_time = start_time or datetime.now()
+        cost_model = cost_model or SlewCostModel()
+        a, b = self.points()
+        if self.coordinate_type == 'horizontal':
+            az, alt = a, b
+            arrival = self._arrival_offsets(cost_model, az, alt)
+        else:
+            if lat is None or lon is None:
+                raise ValueError("赤道坐标扫描必须提供观测点经纬度")
+            # 先按开始时刻转换估计到达时刻，再按各点的到达时刻一次批量转换
+            az, alt = equatorial_to_horizontal_batch(a, b, lat, lon, start_time, refraction=refraction)
+            arrival = self._arrival_offsets(cost_model, np.asarray(az), np.asarray(alt))
+            times = [start_time + timedelta(seconds=float(s)) for s in arrival]
+            az, alt = equatorial_to_horizontal_batch(a, b, lat, lon, times, refraction=refraction)
+        az = np.asarray(az, dtype=float) % 360.0
+        alt = np.asarray(alt, dtype=float)
+
+        keep = (alt >= min_altitude) & (alt <= 90.0)
+        if horizon:
+            keep &= horizon.visible(az, alt)
+        skipped = int(np.count_nonzero(~keep))
+        if skipped:
+            logging.warning(f"扫描跳过 {skipped} 个不可观测的网格点")
+        plan = ScanPlan(az[keep], alt[keep], self.dwell, start_time, arrival[keep], skipped)
+        logging.info(f"扫描路径生成完成: {len(plan)} 个网格点, 预计耗时 {plan.total_time:.1f} 秒")
+        return plan
+
+    def _arrival_offsets(self, cost_model, az, alt):
+        """按转动耗时模型累计各点的预计到达时刻（相对开始时刻的秒数，第一点为0）"""
+        slew = cost_model.slew_time(az[:-1], alt[:-1], az[1:], alt[1:])
+        return np.concatenate(([0.0], np.cumsum(slew + self.dwell)))
+
+
+class ScanPlan:
+    """转换好的扫描路径：按执行顺序排列的地平坐标网格点，作为一次目标交给控制器连续执行"""
+    def __init__(self, azimuth, altitude, dwell, start_time, arrival_offsets=None, skipped=0):
+        self.azimuth = np.asarray(azimuth, dtype=float)
+        self.altitude = np.asarray(altitude, dtype=float)
+        self.dwell = float(dwell)
+        self.start_time = start_time
+        self.arrival_offsets = (np.zeros(len(self.azimuth)) if arrival_offsets is None
+                                else np.asarray(arrival_offsets, dtype=float))
+        self.skipped = skipped
+
+    def __len__(self):
+        return len(self.azimuth)
+
+    @property
+    def total_time(self):
+        if not len(self):
+            return 0.0
+        return float(self.arrival_offsets[-1]) + self.dwell
+
+    def to_dict(self):
+        return {
+            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "points": len(self),
+            "skipped": self.skipped,
+            "dwell": self.dwell,
+            "total_time": round(self.total_time, 1),
+            "az": np.round(self.azimuth, 3).tolist(),
+            "alt": np.round(self.altitude, 3).tolist(),
+        }
@@ -0,0 +1,173 @@
+import os
+import json
+import logging
+from datetime import timedelta
+import numpy as np
+from batch_transform import equatorial_to_horizontal_batch
+from observation_plan import SlewCostModel
+
+
+class LeadTargetSolver:
+    """
+    提前量目标解算：赤道坐标目标按预计到达时刻的位置设置，而不是请求时刻的位置。
+
+    先在 [请求时刻, 最长转动时间] 的小时间网格上一次批量计算目标的地平坐标，
+    再用转动耗时模型迭代：到达时刻 -> 该时刻目标位置 -> 转到该位置的耗时 -> 新的到达时刻，
+    每次迭代只做插值，通常两三次即收敛。
+    """
+    def __init__(self, cost_model=None, grid_points=8, max_iterations=4, tolerance=0.1):
+        """
+        :param cost_model: 转动耗时模型 (SlewCostModel)，各轴转速应与实际装置一致
+        :param grid_points: 时间网格点数
+        :param max_iterations: 最大迭代次数
+        :param tolerance: 到达时刻收敛阈值 (秒)
+        """
+        self.cost_model = cost_model or SlewCostModel()
+        self.grid_points = grid_points
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+
+    def max_slew_time(self):
+        """任意两点间转动耗时的上限 (秒)，决定时间网格的范围"""
+        model = self.cost_model
+        az_range = 180.0 if model.shortest_azimuth else 360.0
+        return max(az_range / model.az_speed, 90.0 / model.alt_speed)
+
+    def motion_time(self, current_az, current_alt, az, alt):
+        """转动耗时（不含到达后的稳定时间）"""
+        model = self.cost_model
+        return float(model.slew_time(current_az, current_alt, az, alt)) - model.settle_time
+
+    def solve(self, ra, dec, lat, lon, time, current_az, current_alt, refraction=None, min_altitude=20.0):
+        """
+        :param ra: 赤经 (小时)
+        :param dec: 赤纬 (度)
+        :param lat: 观测点纬度 (度)
+        :param lon: 观测点经度 (度)
+        :param time: 请求时刻 (datetime)
+        :param current_az: 当前方位角 (度)
+        :param current_alt: 当前高度角 (度)
+        :param refraction: 大气折射表
+        :param min_altitude: 高度角下限，与set_target的限制一致
+        :return: (方位角, 高度角, 预计转动时间 (秒))
+        """
+        offsets = np.linspace(0.0, self.max_slew_time(), self.grid_points)
+        times = [time + timedelta(seconds=float(s)) for s in offsets]
+        grid_az, grid_alt = equatorial_to_horizontal_batch(ra, dec, lat, lon, times, refraction=refraction)
+        # 展开方位角，保证跨越0°/360°时插值正确
+        grid_az = np.unwrap(np.asarray(grid_az, dtype=float), period=360.0)
+        grid_alt = np.asarray(grid_alt, dtype=float)
+
+        lead = 0.0
+        for _ in range(self.max_iterations):
+            az = float(np.interp(lead, offsets, grid_az)) % 360.0
+            alt = float(np.interp(lead, offsets, grid_alt))
+            new_lead = self.motion_time(current_az, current_alt, az, max(min_altitude, min(90.0, alt)))
+            converged = abs(new_lead - lead) < self.tolerance
+            lead = new_lead
+            if converged:
+                break
+        az = float(np.interp(lead, offsets, grid_az)) % 360.0
+        alt = float(np.interp(lead, offsets, grid_alt))
+        return az, alt, lead
+
+
+class CableWrap:
+    """
+    方位轴线缆缠绕跟踪。
+
+    陀螺仪方位读数只有0~360°，这里累计每次读数的最短变化量得到展开方位角，
+    据此判断线缆已缠绕的圈数。设置目标时优先选择最短转动方向，
+    只有最短方向会超出缠绕限位时才反向转动（退缠）。
+
+    设置保存文件时展开方位角每变化save_step即写入文件，重新创建控制器或重启后由load恢复，
+    第一次读数按最短变化量接续保存的值，而不是重新换算到 (-180, 180]。
+    """
+    def __init__(self, min_azimuth=-270.0, max_azimuth=270.0, start=None, path=None, save_step=5.0):
+        """
+        :param min_azimuth: 展开方位角下限 (度)
+        :param max_azimuth: 展开方位角上限 (度)，上下限之差至少360°才能到达所有方位
+        :param start: 初始展开方位角；None表示由第一次读数换算到 (-180, 180] 范围内
+        :param path: 保存文件路径 (JSON)，None表示不保存
+        :param save_step: 展开方位角变化超过该值 (度) 时保存，应远小于180°
+        """
+        self.min_azimuth = float(min_azimuth)
+        self.max_azimuth = float(max_azimuth)
+        self.unwrapped = start
+        self.path = path
+        self.save_step = float(save_step)
+        self._saved = start
+
+    @classmethod
+    def load(cls, path, min_azimuth=-270.0, max_azimuth=270.0, **options):
+        """从文件恢复展开方位角；文件不存在或无法读取时由第一次读数初始化"""
+        start = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    start = float(json.load(f)['unwrapped'])
+                logging.info(f"已恢复线缆缠绕状态 {path}: 展开方位角 {start:.1f}°")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logging.error(f"读取线缆缠绕状态失败 {path}: {e}")
+        return cls(min_azimuth, max_azimuth, start=start, path=path, **options)
+
+    def save(self):
+        """写入保存文件（先写临时文件再替换，中途断电不会留下半个文件）"""
+        if not self.path or self.unwrapped is None:
+            return
+        temporary = self.path + '.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logging.error(f"保存线缆缠绕状态失败 {self.path}: {e}")
+            return
+        self._saved = self.unwrapped
+
+    def update(self, azimuth):
+        """用新的方位读数 (0~360°) 更新展开方位角，返回展开方位角"""
+        if self.unwrapped is None:
+            self.unwrapped = (azimuth + 180.0) % 360.0 - 180.0
+            if self.unwrapped == -180.0:
+                self.unwrapped = 180.0
+        else:
+            self.unwrapped += (azimuth - self.unwrapped + 180.0) % 360.0 - 180.0
+        if self.path and (self._saved is None or abs(self.unwrapped - self._saved) >= self.save_step):
+            self.save()
+        return self.unwrapped
+
+    def shift(self, offset):
+        """
+        陀螺仪方位零点改变（Z轴校准）后同一位置的读数变化了offset：展开方位角平移相同的量并立即保存，
+        不让下一次读数按最短变化量猜测圈数
+
+        :param offset: 校准后读数减校准前读数 (度)，不折算到 (-180, 180]
+        """
+        if self.unwrapped is None:
+            return
+        self.unwrapped += offset
+        logging.info(f"方位零点变化 {offset:.2f}°，展开方位角平移为 {self.unwrapped:.1f}°")
+        self.save()
+
+    def plan(self, target_azimuth, current=None):
+        """
+        选择到达目标方位的展开方位角：最短方向优先，超出限位时改走另一方向
+
+        :param target_azimuth: 目标方位角 (0~360°)
+        :param current: 出发位置的展开方位角，None表示当前位置（依次规划多个路径点时传入上一点）
+        :return: 目标展开方位角
+        :raises ValueError: 两个方向都超出限位
+        """
+        if current is None:
+            current = 0.0 if self.unwrapped is None else self.unwrapped
+        delta = (target_azimuth - current + 180.0) % 360.0 - 180.0
+        alternative = delta - 360.0 if delta > 0 else delta + 360.0
+        for candidate in (current + delta, current + alternative):
+            if self.min_azimuth <= candidate <= self.max_azimuth:
+                return candidate
+        raise ValueError(f"目标方位角 {target_azimuth:.2f}° 超出线缆缠绕范围 "
+                         f"[{self.min_azimuth:.0f}°, {self.max_azimuth:.0f}°]")
+
+    def to_dict(self):
+        return {"unwrapped": self.unwrapped, "min": self.min_azimuth, "max": self.max_azimuth}
@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+from astropy.coordinates import AltAz, get_body, solar_system_ephemeris
+from astropy.time import Time
+from batch_transform import get_location
+from satellite import SatelliteEphemeris
+
+# astropy内置星历（builtin，离线可用）支持的天体
+BODY_NAMES = OrderedDict([
+    ('sun', '太阳'),
+    ('moon', '月球'),
+    ('mercury', '水星'),
+    ('venus', '金星'),
+    ('mars', '火星'),
+    ('jupiter', '木星'),
+    ('saturn', '土星'),
+    ('uranus', '天王星'),
+    ('neptune', '海王星'),
+])
+
+
+def parse_body(name):
+    """英文或中文天体名称 -> astropy天体名称"""
+    key = (name or '').strip().lower()
+    if key in BODY_NAMES:
+        return key
+    for body, chinese in BODY_NAMES.items():
+        if key == chinese:
+            return body
+    raise ValueError(f"未知的太阳系天体: {name}")
+
+
+def unit_vectors(az, alt):
+    """地平坐标 -> 站心单位向量 (东, 北, 天顶)，最后一维为3"""
+    az = np.radians(np.asarray(az, dtype=float))
+    alt = np.radians(np.asarray(alt, dtype=float))
+    return np.stack((np.cos(alt) * np.sin(az), np.cos(alt) * np.cos(az), np.sin(alt)), axis=-1)
+
+
+class SolarSystemPredictor:
+    """
+    太阳系天体（太阳、月球、行星）的地平坐标。
+
+    天体位置使用astropy内置星历（builtin，不联网）计算，含周日视差。
+    每个天体按夜（当地平太阳时中午到次日中午）在时间网格上一次批量计算并缓存，
+    之后的查询、跟踪星历和太阳避让检查都只在网格上插值。
+    """
+    def __init__(self, lat, lon, step=60.0, refraction=None, cache_size=32):
+        """
+        :param lat: 观测点纬度 (度)
+        :param lon: 观测点经度 (度)
+        :param step: 时间网格步长 (秒)
+        :param refraction: 大气折射表，与控制器使用的一致
+        :param cache_size: 最多缓存的 (天体, 夜) 网格数
+        """
+        self.lat = float(lat)
+        self.lon = float(lon)
+        self.step = float(step)
+        self.refraction = refraction
+        self.cache_size = cache_size
+        self.location = get_location(self.lat, self.lon)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def night_span(self, night):
+        """一夜的时间范围 (UTC)，与VisibilityPlanner.night_span相同"""
+        start = datetime(night.year, night.month, night.day, 12) - timedelta(hours=self.lon / 15.0)
+        return start, start + timedelta(days=1)
+
+    def night_of(self, unix_time):
+        """unix时间所在的夜（日期）"""
+        local = datetime.fromtimestamp(float(unix_time), tz=timezone.utc) + timedelta(hours=self.lon / 15.0 - 12.0)
+        return local.date()
+
+    def grid(self, body, night):
+        """
+        一夜的网格（缓存）
+
+        :return: (unix时间数组, 方位角数组, 高度角数组, 单位向量数组)
+        """
+        key = (body, night)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        start, _ = self.night_span(night)
+        times = Time(start).unix + np.arange(int(round(86400.0 / self.step)) + 1) * self.step
+        obstime = Time(times, format='unix')
+        with solar_system_ephemeris.set('builtin'):
+            coord = get_body(body, obstime, self.location)
+        altaz = coord.transform_to(AltAz(obstime=obstime, location=self.location))
+        az = np.asarray(altaz.az.deg, dtype=float)
+        alt = np.asarray(altaz.alt.deg, dtype=float)
+        if self.refraction is not None:
+            alt = np.asarray(self.refraction.apparent(alt), dtype=float)
+        entry = (times, az, alt, unit_vectors(az, alt))
+        with self._cache_lock:
+            self._cache[key] = entry
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _series(self, body, start, end):
+        """覆盖 [start, end] 的各夜网格拼接（相邻两夜的公共端点只保留一个）"""
+        night = self.night_of(start)
+        parts = []
+        while True:
+            times, az, alt, vectors = self.grid(body, night)
+            if parts:
+                times, az, alt, vectors = times[1:], az[1:], alt[1:], vectors[1:]
+            parts.append((times, az, alt, vectors))
+            if times[-1] >= end:
+                break
+            night += timedelta(days=1)
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def position(self, body, unix_times=None):
+        """
+        :param body: 天体名称（见BODY_NAMES）
+        :param unix_times: unix时间戳或数组，None表示当前时刻
+        :return: (方位角, 高度角)，与unix_times形状相同
+        """
+        t = np.asarray(time.time() if unix_times is None else unix_times, dtype=float)
+        times, az, alt, _ = self._series(body, t.min(), t.max())
+        az = np.interp(t, times, np.unwrap(az, period=360.0)) % 360.0
+        return az, np.interp(t, times, alt)
+
+    def direction(self, body, unix_times=None):
+        """网格上的单位向量插值后归一化；形状为 unix_times.shape + (3,)"""
+        t = np.asarray(time.time() if unix_times is None else unix_times, dtype=float)
+        times, _, _, vectors = self._series(body, t.min(), t.max())
+        result = np.stack([np.interp(t, times, vectors[:, i]) for i in range(3)], axis=-1)
+        return result / np.linalg.norm(result, axis=-1, keepdims=True)
+
+    def ephemeris(self, body, start=None, duration=None, min_altitude=None):
+        """
+        跟踪用的星历，直接交给 set_target(ephemeris, coordinate_type='track')
+
+        :param body: 天体名称
+        :param start: 开始时间 (unix时间)，默认当前时刻
+        :param duration: 时长 (秒)，默认到当夜结束
+        :param min_altitude: 最低高度角，星历在天体降到其下时结束；None表示不限制
+        :return: SatelliteEphemeris
+        :raises ValueError: 开始时天体低于最低高度角
+        """
+        start = time.time() if start is None else float(start)
+        if duration is None:
+            _, night_end = self.night_span(self.night_of(start))
+            end = Time(night_end).unix
+        else:
+            end = start + float(duration)
+        times, az, alt, _ = self._series(body, start, end)
+        # 首尾各多保留一个网格点，插值覆盖整个时段
+        first = max(int(np.searchsorted(times, start, side='right')) - 1, 0)
+        last = min(int(np.searchsorted(times, end)), len(times) - 1)
+        name = BODY_NAMES.get(body, body)
+        if min_altitude is not None:
+            if np.interp(start, times, alt) < min_altitude:
+                raise ValueError(f"{name} 当前高度角低于 {min_altitude:.0f}°")
+            below = np.flatnonzero(alt[first + 1:last + 1] < min_altitude)
+            if len(below):
+                last = first + 1 + int(below[0])
+        return SatelliteEphemeris(name, times[first:last + 1], az[first:last + 1], alt[first:last + 1])
+
+
+class SunAvoidance:
+    """
+    太阳避让：目标方向与太阳方向的夹角小于避让半径时拒绝。
+
+    太阳方向取自按夜缓存的单位向量网格，判断只需一次点积与cos(半径)比较，可以对整条路径批量检查。
+    """
+    def __init__(self, predictor, radius=30.0):
+        """
+        :param predictor: SolarSystemPredictor
+        :param radius: 避让半径 (度)
+        """
+        self.predictor = predictor
+        self.radius = float(radius)
+        self._cos_radius = np.cos(np.radians(self.radius))
+
+    def _dot(self, az, alt, unix_times):
+        target = unit_vectors(az, alt)
+        sun = self.predictor.direction('sun', unix_times)
+        return np.sum(target * sun, axis=-1)
+
+    def separation(self, az, alt, unix_times=None):
+        """目标与太阳的角距离 (度)"""
+        return np.degrees(np.arccos(np.clip(self._dot(az, alt, unix_times), -1.0, 1.0)))
+
+    def is_safe(self, az, alt, unix_times=None):
+        """
+        :param az: 方位角或数组 (度)
+        :param alt: 高度角或数组 (度)
+        :param unix_times: 对应的unix时间（可与坐标逐元素对应），None表示当前时刻
+        :return: 是否在避让区外（布尔数组）
+        """
+        return self._dot(az, alt, unix_times) < self._cos_radius
+
+    def check(self, az, alt, unix_times=None):
+        """
+        :raises ValueError: 任一位置在避让区内
+        """
+        t = time.time() if unix_times is None else unix_times
+        az, alt, t = np.broadcast_arrays(np.atleast_1d(az), np.atleast_1d(alt), np.atleast_1d(t))
+        safe = self.is_safe(az, alt, t)
+        if safe.all():
+            return
+        i = np.unravel_index(np.argmin(safe), safe.shape)
+        separation = float(self.separation(az[i], alt[i], t[i]))
+        raise ValueError(f"目标 ({az[i]:.2f}°, {alt[i]:.2f}°) 距太阳 {separation:.1f}°，"
+                         f"小于避让半径 {self.radius:.0f}°")
+
+
+@lru_cache(maxsize=8)
+def get_solar_system_predictor(lat, lon, refraction=None):
+    """按观测地点（和折射表）缓存计算器，各天体的网格在其中按夜缓存"""
+    return SolarSystemPredictor(lat, lon, refraction=refraction)
@@ -0,0 +1,326 @@
+import os
+import csv
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from astropy.time import Time
+from batch_transform import equatorial_to_horizontal_batch, horizontal_to_equatorial_batch, to_time
+
+# 内置星表：亮星、梅西耶天体和部分NGC天体 (J2000)
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'star_catalog.csv')
+
+
+def normalize_name(name):
+    """名称归一化：忽略大小写、空格和标点，例如 "M 31"、"m31" 都归一化为 "m31" """
+    return ''.join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+def unit_vectors(ra, dec):
+    """
+    赤道坐标转换为天球单位向量
+
+    :param ra: 赤经 (小时)，标量或数组
+    :param dec: 赤纬 (度)，标量或数组
+    :return: 形状 (..., 3) 的单位向量
+    """
+    ra = np.radians(np.asarray(ra, dtype=float) * 15.0)
+    dec = np.radians(np.asarray(dec, dtype=float))
+    cos_dec = np.cos(dec)
+    return np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+class CatalogObject:
+    """星表中的一个天体"""
+    def __init__(self, name, ra, dec, mag, kind, aliases=()):
+        """
+        :param name: 名称
+        :param ra: 赤经 (小时)
+        :param dec: 赤纬 (度)
+        :param mag: 星等
+        :param kind: 类型 (star/galaxy/nebula/cluster)
+        :param aliases: 别名列表（中文名、编号等）
+        """
+        self.name = name
+        self.ra = float(ra)
+        self.dec = float(dec)
+        self.mag = float(mag)
+        self.kind = kind
+        self.aliases = list(aliases)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "ra": self.ra,
+            "dec": self.dec,
+            "mag": self.mag,
+            "type": self.kind,
+            "aliases": self.aliases,
+        }
+
+
+class SkyIndex:
+    """
+    天球网格索引：按赤纬分带、每个赤纬带再按赤经等宽分格（HEALPix式分桶的简化版本）。
+
+    每格在天球上的大小近似相等，锥形检索只需检查与检索圆相交的格子，
+    再用单位向量点积计算精确角距离。
+    """
+    def __init__(self, ra, dec, cell_size=10.0):
+        """
+        :param ra: 赤经数组 (小时)
+        :param dec: 赤纬数组 (度)
+        :param cell_size: 格子边长 (度)
+        """
+        self.ra_deg = np.asarray(ra, dtype=float) * 15.0
+        self.dec = np.asarray(dec, dtype=float)
+        self.vectors = unit_vectors(ra, dec)
+        self.cell_size = float(cell_size)
+        self.n_bands = int(math.ceil(180.0 / self.cell_size))
+        # 每个赤纬带的赤经格数，与该带中心的纬圈周长成正比
+        centers = -90.0 + (np.arange(self.n_bands) + 0.5) * self.cell_size
+        self.n_ra = np.maximum(1, np.ceil(360.0 * np.cos(np.radians(centers)) / self.cell_size)).astype(int)
+
+        cells = {}
+        for i, (ra_deg, dec) in enumerate(zip(self.ra_deg, self.dec)):
+            cells.setdefault(self._cell(ra_deg, dec), []).append(i)
+        self._cells = {key: np.array(value, dtype=int) for key, value in cells.items()}
+
+    def _band(self, dec):
+        return min(self.n_bands - 1, max(0, int((dec + 90.0) // self.cell_size)))
+
+    def _cell(self, ra_deg, dec):
+        band = self._band(dec)
+        n = self.n_ra[band]
+        return band, int(ra_deg % 360.0 / 360.0 * n) % n
+
+    def _candidates(self, ra_deg, dec, radius):
+        """与检索圆可能相交的格子中的所有天体编号"""
+        if abs(dec) + radius >= 90.0:
+            half_width = 180.0
+        else:
+            # 半径为r的圆在赤纬dec处覆盖的最大赤经半宽
+            half_width = math.degrees(math.asin(math.sin(math.radians(radius)) / math.cos(math.radians(dec))))
+
+        candidates = []
+        for band in range(self._band(dec - radius), self._band(dec + radius) + 1):
+            n = self.n_ra[band]
+            if half_width >= 180.0 or n == 1:
+                bins = range(n)
+            else:
+                width = 360.0 / n
+                first = int(math.floor((ra_deg - half_width) / width))
+                last = int(math.floor((ra_deg + half_width) / width))
+                bins = {b % n for b in range(first, last + 1)}
+            for b in bins:
+                cell = self._cells.get((band, b))
+                if cell is not None:
+                    candidates.append(cell)
+        if not candidates:
+            return np.empty(0, dtype=int)
+        return np.concatenate(candidates)
+
+    def cone(self, ra, dec, radius):
+        """
+        锥形检索
+
+        :param ra: 中心赤经 (小时)
+        :param dec: 中心赤纬 (度)
+        :param radius: 半径 (度)
+        :return: (天体编号数组, 角距离数组 (度))，按角距离升序
+        """
+        candidates = self._candidates(float(ra) * 15.0, float(dec), float(radius))
+        center = unit_vectors(ra, dec)
+        separation = np.degrees(np.arccos(np.clip(self.vectors[candidates] @ center, -1.0, 1.0)))
+        inside = separation <= radius
+        candidates, separation = candidates[inside], separation[inside]
+        order = np.argsort(separation)
+        return candidates[order], separation[order]
+
+    def nearest(self, ra, dec, k=1):
+        """最近的k个天体：从一个格子大小的半径开始检索，不够k个时半径加倍"""
+        radius = self.cell_size
+        while True:
+            indices, separation = self.cone(ra, dec, radius)
+            if len(indices) >= k or radius >= 180.0:
+                return indices[:k], separation[:k]
+            radius = min(180.0, radius * 2)
+
+
+class StarCatalog:
+    """
+    离线星表：名称查询、空间索引和整表地平坐标批量计算。
+
+    整表的地平坐标按 (观测地点, 时间桶) 缓存，同一时间桶内的可见天体、
+    最近天体查询都直接使用缓存结果，不再进行astropy坐标转换。
+    """
+    def __init__(self, objects, cell_size=10.0, time_bucket=60.0, cache_size=32):
+        """
+        :param objects: CatalogObject列表
+        :param cell_size: 空间索引格子大小 (度)
+        :param time_bucket: 地平坐标缓存的时间桶长度 (秒)
+        :param cache_size: 最多缓存的 (地点, 时间桶) 数量
+        """
+        self.objects = list(objects)
+        self.ra = np.array([obj.ra for obj in self.objects], dtype=float)
+        self.dec = np.array([obj.dec for obj in self.objects], dtype=float)
+        self.mag = np.array([obj.mag for obj in self.objects], dtype=float)
+        self.kind = np.array([obj.kind for obj in self.objects])
+        self.index = SkyIndex(self.ra, self.dec, cell_size)
+        self.time_bucket = float(time_bucket)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self._names = {}
+        for i, obj in enumerate(self.objects):
+            for name in [obj.name] + obj.aliases:
+                self._names.setdefault(normalize_name(name), i)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CATALOG, **kwargs):
+        """
+        从CSV文件加载星表
+
+        CSV列：name, ra (小时), dec (度), mag, type, aliases (以分号分隔)
+        """
+        objects = []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                aliases = [alias.strip() for alias in (row.get('aliases') or '').split(';') if alias.strip()]
+                objects.append(CatalogObject(row['name'], row['ra'], row['dec'], row['mag'], row['type'], aliases))
+        return cls(objects, **kwargs)
+
+    def __len__(self):
+        return len(self.objects)
+
+    # ---- 名称查询 ----
+
+    def lookup(self, name):
+        """按名称或别名精确查询，找不到返回None"""
+        i = self._names.get(normalize_name(name))
+        return None if i is None else self.objects[i]
+
+    def search(self, text, limit=10):
+        """按名称或别名模糊查询（包含匹配），精确匹配和前缀匹配优先，其余按星等由亮到暗排序"""
+        key = normalize_name(text)
+        if not key:
+            return []
+        ranks = {}
+        for name, i in self._names.items():
+            if key in name:
+                rank = 0 if name == key else 1 if name.startswith(key) else 2
+                ranks[i] = min(rank, ranks.get(i, rank))
+        matches = sorted(ranks, key=lambda i: (ranks[i], self.mag[i]))
+        return [self.objects[i] for i in matches[:limit]]
+
+    # ---- 空间查询 ----
+
+    def cone_search(self, ra, dec, radius):
+        """
+        锥形检索
+
+        :return: [(CatalogObject, 角距离 (度)), ...]，按角距离升序
+        """
+        indices, separation = self.index.cone(ra, dec, radius)
+        return [(self.objects[i], float(s)) for i, s in zip(indices, separation)]
+
+    def nearest(self, ra, dec, k=1):
+        """距给定赤道坐标最近的k个天体，返回 [(CatalogObject, 角距离 (度)), ...]"""
+        indices, separation = self.index.nearest(ra, dec, k)
+        return [(self.objects[i], float(s)) for i, s in zip(indices, separation)]
+
+    # ---- 地平坐标 ----
+
+    def time_bucket_index(self, time=None):
+        """观测时间所在的时间桶编号，默认当前时间"""
+        return int(to_time(datetime.now() if time is None else time).unix // self.time_bucket)
+
+    def _bucket_time(self, time):
+        """所在时间桶的中间时刻，以及时间桶编号"""
+        bucket = self.time_bucket_index(time)
+        return Time((bucket + 0.5) * self.time_bucket, format='unix'), bucket
+
+    def horizontal(self, lat, lon, time=None):
+        """
+        整表的地平坐标（一次批量转换），按 (观测地点, 时间桶) 缓存
+
+        :param lat: 观测点纬度 (度)
+        :param lon: 观测点经度 (度)
+        :param time: 观测时间，默认当前时间
+        :return: (方位角数组, 高度角数组)，与self.objects一一对应
+        """
+        bucket_time, bucket = self._bucket_time(time)
+        key = (round(float(lat), 6), round(float(lon), 6), bucket)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        az, alt = equatorial_to_horizontal_batch(self.ra, self.dec, lat, lon, bucket_time)
+        az = np.mod(az, 360.0)
+        az.flags.writeable = False
+        alt.flags.writeable = False
+        with self._cache_lock:
+            self._cache[key] = (az, alt)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return az, alt
+
+    def visible(self, lat, lon, time=None, min_alt=20.0, max_mag=None, kind=None, limit=None, horizon=None):
+        """
+        查询当前可见的天体
+
+        :param min_alt: 最低高度角 (度)
+        :param max_mag: 最暗星等，None表示不限
+        :param kind: 天体类型，None表示不限
+        :param limit: 最多返回数量
+        :param horizon: 地平遮挡掩码 (HorizonMask)，设置后排除被遮挡的天体
+        :return: [(CatalogObject, 方位角, 高度角), ...]，按星等由亮到暗排序
+        """
+        az, alt = self.horizontal(lat, lon, time)
+        indices = self._select(alt, min_alt, max_mag, kind)
+        if horizon:
+            indices = indices[horizon.visible(az[indices], alt[indices])]
+        indices = indices[np.argsort(self.mag[indices], kind='stable')][:limit]
+        return [(self.objects[i], float(az[i]), float(alt[i])) for i in indices]
+
+    def sky(self, lat, lon, time=None, min_alt=0.0, max_mag=None, kind=None):
+        """
+        天空图数据：选定子集的地平坐标，按列组织（各列为等长数组，按星表顺序）
+
+        :return: (时间桶编号, {"name", "type", "mag", "az", "alt"})
+        """
+        az, alt = self.horizontal(lat, lon, time)
+        indices = self._select(alt, min_alt, max_mag, kind)
+        columns = {
+            "name": [self.objects[i].name for i in indices],
+            "type": self.kind[indices],
+            "mag": self.mag[indices],
+            "az": az[indices],
+            "alt": alt[indices],
+        }
+        return self.time_bucket_index(time), columns
+
+    def _select(self, alt, min_alt, max_mag, kind):
+        """按高度角、星等和类型筛选，返回天体编号数组"""
+        mask = alt >= min_alt
+        if max_mag is not None:
+            mask &= self.mag <= max_mag
+        if kind:
+            mask &= self.kind == kind
+        return np.flatnonzero(mask)
+
+    def nearest_horizontal(self, az, alt, lat, lon, time=None, k=1):
+        """
+        距给定地平坐标（例如望远镜当前指向）最近的k个天体
+
+        :return: [(CatalogObject, 角距离 (度), 方位角, 高度角), ...]
+        """
+        bucket_time, _ = self._bucket_time(time)
+        ra, dec = horizontal_to_equatorial_batch(az, alt, lat, lon, bucket_time)
+        indices, separation = self.index.nearest(float(ra), float(dec), k)
+        cat_az, cat_alt = self.horizontal(lat, lon, time)
+        return [(self.objects[i], float(s), float(cat_az[i]), float(cat_alt[i]))
+                for i, s in zip(indices, separation)]
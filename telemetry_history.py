@@ -0,0 +1,380 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+import warnings
+import numpy as np
+
+# 默认记录的通道：当前指向和目标 (度)
+CHANNELS = ('current_az', 'current_alt', 'target_az', 'target_alt')
+# 以360°为周期的通道：统计前先沿时间展开，359°与1°的平均值是0°而不是180°
+CIRCULAR = ('current_az', 'target_az')
+# 默认降采样层级：(桶宽 (秒), 保留时长 (秒))
+TIERS = ((1.0, 86400.0), (60.0, 30 * 86400.0))
+# 一次查询最多返回的点数，请求的分辨率更细时自动放宽
+MAX_POINTS = 5000
+
+
+class _Tier:
+    """
+    固定容量的环形缓冲区，按时间顺序保存降采样桶：起始时刻、样本数和各通道的最小/最大/平均值。
+
+    width为0的层级保存原始样本（样本数为1，最小、最大、平均值相同，只存一份）。
+    """
+    def __init__(self, width, size, n_channels):
+        self.width = float(width)
+        self.size = int(size)
+        self.written = 0
+        self.time = np.zeros(self.size)
+        if self.width:
+            self.count = np.zeros(self.size, dtype=np.uint32)
+            self.min = np.zeros((self.size, n_channels), dtype=np.float32)
+            self.max = np.zeros((self.size, n_channels), dtype=np.float32)
+        self.mean = np.zeros((self.size, n_channels), dtype=np.float32)
+        # 正在累积的桶。第一级：[桶编号, 桶内第一个原始样本的写入序号]；
+        # 更粗的层级：[桶编号, 样本数, 最小值, 最大值, 加权和, 有效样本数]
+        self.open = None
+
+    def __len__(self):
+        return min(self.written, self.size)
+
+    @property
+    def arrays(self):
+        return ('time', 'count', 'min', 'max', 'mean') if self.width else ('time', 'mean')
+
+    @property
+    def wrapped(self):
+        """是否已经覆盖过最早的数据"""
+        return self.written > self.size
+
+    def oldest(self):
+        """最早保存的时刻，没有数据时为inf"""
+        if not self.written:
+            return math.inf
+        return float(self.time[self.written % self.size if self.written >= self.size else 0])
+
+    def append(self, t, values, count=1, low=None, high=None):
+        i = self.written % self.size
+        self.time[i] = t
+        self.mean[i] = values
+        if self.width:
+            self.count[i] = count
+            self.min[i] = low
+            self.max[i] = high
+        self.written += 1
+
+    def last(self, n):
+        """最近n个元素的下标（按时间顺序）"""
+        n = min(n, len(self))
+        return np.arange(self.written - n, self.written) % self.size
+
+    def select(self, start, end):
+        """
+        [start, end) 内的元素，统一为 (时刻, 样本数, 最小值, 最大值, 平均值) 并复制出来
+
+        时间按写入顺序递增，用二分查找定位，不扫描整个缓冲区。
+        """
+        order = self.last(self.size)
+        times = self.time[order]
+        lo, hi = np.searchsorted(times, [start, end])
+        index = order[lo:hi]
+        if not self.width:
+            mean = self.mean[index]
+            return times[lo:hi], np.ones(len(index), dtype=np.uint32), mean, mean, mean
+        return times[lo:hi], self.count[index], self.min[index], self.max[index], self.mean[index]
+
+
+class TelemetryHistory:
+    """
+    遥测时间序列存储。
+
+    最近的数据按控制周期原样保存在定长环形缓冲区中；更早的数据逐级降采样为固定宽度的时间桶
+    （每桶保存样本数和各通道的最小/最大/平均值），每一级也是定长环形缓冲区。
+    各级容量在创建时确定，运行多久内存都不增长。
+
+    降采样是级联的：原始样本每满一个第一级桶汇总一次，第一级的桶再合并到第二级，依此类推，
+    记录一个样本只是写入数组，不做逐样本的统计计算。
+
+    方位角等周期通道在统计前沿时间展开，桶的平均值归一化到 [0, 360)，最小/最大值与平均值连续表示
+    （例如359°到1°之间的桶为 最小-1°、平均0°、最大1°），因此可能略超出 [0, 360)。
+    """
+    def __init__(self, channels=CHANNELS, rate=200.0, recent=600.0, tiers=TIERS, path=None, save_interval=300.0,
+                 circular=CIRCULAR):
+        """
+        :param channels: 通道名称
+        :param rate: 预计的记录速率 (次/秒)，用于确定最近数据缓冲区的容量
+        :param recent: 最近数据按原始速率保留的时长 (秒)
+        :param tiers: 降采样层级 [(桶宽 (秒), 保留时长 (秒)), ...]，桶宽从细到粗，后一级桶宽是前一级的整数倍
+        :param path: 持久化文件路径（.npz），None表示只保存在内存中
+        :param save_interval: save_if_due的最短保存间隔 (秒)
+        :param circular: 以360°为周期的通道名称（不在channels中的忽略）
+        """
+        self.channels = tuple(channels)
+        self._circular = np.array([i for i, name in enumerate(self.channels) if name in circular], dtype=np.intp)
+        self.path = path
+        self.save_interval = save_interval
+        n = len(self.channels)
+        self.levels = [_Tier(0.0, int(math.ceil(rate * recent)), n)]
+        for width, span in tiers:
+            previous = self.levels[-1]
+            if previous.width and not float(width / previous.width).is_integer():
+                raise ValueError(f"桶宽 {width:g} 秒不是上一级 {previous.width:g} 秒的整数倍")
+            # 拼接查询时由细的一级衔接粗的一级，细的一级至少要覆盖粗的一级的两个桶
+            covered = recent if not previous.width else previous.width * previous.size
+            if covered < 2 * width:
+                raise ValueError(f"上一级只保留 {covered:g} 秒，不足桶宽 {width:g} 秒的两倍")
+            self.levels.append(_Tier(width, int(math.ceil(span / width)), n))
+        self.last_time = -math.inf
+        self.last_save = time.monotonic()
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    # ---- 记录 ----
+
+    def record(self, t, values):
+        """
+        记录一个样本（控制线程中调用）
+
+        :param t: unix时间 (秒)，早于上一个样本的数据丢弃
+        :param values: 各通道的值，与channels顺序一致；缺失的值用nan
+        """
+        with self._lock:
+            if t <= self.last_time:
+                return
+            raw, first = self.levels[0], self.levels[1] if len(self.levels) > 1 else None
+            if first is not None:
+                key = math.floor(t / first.width)
+                if first.open is None:
+                    first.open = [key, raw.written]
+                elif key != first.open[0]:
+                    self._close_raw_bucket()
+                    first.open = [key, raw.written]
+            raw.append(t, values)
+            self.last_time = t
+
+    def _close_raw_bucket(self):
+        """把当前第一级桶内的原始样本汇总为一个桶"""
+        raw, first = self.levels[0], self.levels[1]
+        key, start = first.open
+        index = raw.last(raw.written - start)
+        if not len(index):
+            return
+        values = raw.mean[index].astype(float)
+        values[:, self._circular] = _unwrap(values[:, self._circular])
+        valid = ~np.isnan(values)
+        with warnings.catch_warnings():
+            # 某个通道全为nan（例如还没有目标）时结果就是nan，不需要警告
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high, mean = np.nanmin(values, axis=0), np.nanmax(values, axis=0), np.nanmean(values, axis=0)
+        _normalize(mean, low, high, self._circular)
+        self._add_bucket(1, key * first.width, len(index), low, high, mean, valid.sum(axis=0))
+
+    def _add_bucket(self, level, t, count, low, high, mean, valid):
+        """保存第level级的一个完整桶，并合并到下一级正在累积的桶"""
+        tier = self.levels[level]
+        tier.append(t, mean, count, low, high)
+        if level + 1 >= len(self.levels):
+            return
+        parent = self.levels[level + 1]
+        key = math.floor(t / parent.width)
+        if parent.open is not None and parent.open[0] != key:
+            self._close_bucket(level + 1)
+        low, high, mean = low.astype(float), high.astype(float), mean.astype(float)
+        if parent.open is not None and len(self._circular):
+            # 周期通道与上一个桶的平均值衔接，整个桶内连续展开
+            last = parent.open[6]
+            shift = np.nan_to_num(np.round((mean[self._circular] - last) / 360.0) * 360.0)
+            for array in (low, high, mean):
+                array[self._circular] -= shift
+        weighted = np.where(valid > 0, mean, 0.0) * valid
+        if parent.open is None:
+            parent.open = [key, count, low, high, weighted, valid.astype(float), mean[self._circular]]
+        else:
+            state = parent.open
+            state[6] = np.where(np.isnan(mean[self._circular]), state[6], mean[self._circular])
+            state[1] += count
+            state[2] = np.fmin(state[2], low)
+            state[3] = np.fmax(state[3], high)
+            state[4] = state[4] + weighted
+            state[5] = state[5] + valid
+
+    def _close_bucket(self, level):
+        tier = self.levels[level]
+        key, count, low, high, weighted, valid, _ = tier.open
+        tier.open = None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(valid > 0, weighted / valid, np.nan)
+        low, high = low.copy(), high.copy()
+        _normalize(mean, low, high, self._circular)
+        self._add_bucket(level, key * tier.width, count, low, high, mean, valid)
+
+    # ---- 查询 ----
+
+    def query(self, start=None, end=None, resolution=None, channels=None, max_points=MAX_POINTS):
+        """
+        按指定分辨率返回一段时间的数据
+
+        最近的部分取自最细的一级，更早的部分依次取自较粗的层级，衔接点对齐到粗一级的桶边界；
+        再按分辨率重新分桶（空桶不返回）。分辨率细于数据来源的桶宽时，该段按来源的桶宽返回。
+
+        :param start: 开始时间 (unix时间)，默认结束前10分钟
+        :param end: 结束时间 (unix时间)，默认当前时刻
+        :param resolution: 分辨率 (秒)，默认把时间段分成约1000个点
+        :param channels: 需要的通道，默认全部
+        :param max_points: 最多返回的点数，超过时放宽分辨率
+        :return: 按列组织的字典：time、count，以及 min/max/mean（每个通道一列）
+        """
+        end = time.time() if end is None else float(end)
+        start = end - 600.0 if start is None else float(start)
+        if end <= start:
+            raise ValueError("结束时间必须晚于开始时间")
+        resolution = (end - start) / 1000 if resolution is None else float(resolution)
+        if resolution <= 0:
+            raise ValueError("分辨率必须大于0")
+        resolution = max(resolution, (end - start) / max_points)
+        names = list(self.channels) if channels is None else list(channels)
+        unknown = [name for name in names if name not in self.channels]
+        if unknown:
+            raise ValueError(f"未知的通道: {', '.join(unknown)}")
+        columns = [self.channels.index(name) for name in names]
+        circular = np.array([i for i, column in enumerate(columns) if column in self._circular], dtype=np.intp)
+
+        # 从细到粗取数据，每一级负责到上一级（更细）最早数据的衔接点为止
+        segments = []
+        cursor = end
+        with self._lock:
+            for level, tier in enumerate(self.levels):
+                if cursor <= start:
+                    break
+                # 没有覆盖过旧数据的层级保存着全部记录，不需要更粗的层级
+                if level + 1 < len(self.levels) and tier.wrapped and tier.oldest() > start:
+                    width = self.levels[level + 1].width
+                    boundary = min(math.ceil(tier.oldest() / width) * width, cursor)
+                else:
+                    boundary = start
+                segment = tier.select(max(start, boundary), cursor)
+                segments.append(tuple(array[:, columns] if array.ndim == 2 else array for array in segment))
+                cursor = boundary
+        segments.reverse()
+        times, count, low, high, mean = (np.concatenate(column) for column in zip(*segments))
+
+        # 按分辨率重新分桶
+        keys = np.floor((times - start) / resolution).astype(np.int64)
+        keys, first = np.unique(keys, return_index=True)
+        if len(times):
+            # 周期通道先沿时间展开，各桶的最小/最大值随平均值一起平移
+            mean, low, high = mean.astype(float), low.astype(float), high.astype(float)
+            shift = np.nan_to_num(_unwrap(mean[:, circular]) - mean[:, circular])
+            for array in (mean, low, high):
+                array[:, circular] += shift
+            valid = ~np.isnan(mean)
+            weights = np.where(valid, count[:, None], 0).astype(float)
+            weighted = np.add.reduceat(np.where(valid, mean, 0.0) * weights, first, axis=0)
+            total = np.add.reduceat(weights, first, axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(total > 0, weighted / total, np.nan)
+            low = np.fmin.reduceat(low, first, axis=0)
+            high = np.fmax.reduceat(high, first, axis=0)
+            count = np.add.reduceat(count.astype(np.int64), first)
+            _normalize(mean, low, high, circular)
+        return {
+            "start": start,
+            "end": end,
+            "resolution": resolution,
+            "channels": names,
+            "time": np.round(start + keys * resolution, 3).tolist(),
+            "count": np.asarray(count, dtype=np.int64).tolist(),
+            "min": _columns(low),
+            "max": _columns(high),
+            "mean": _columns(mean),
+        }
+
+    def status(self):
+        with self._lock:
+            return {
+                "channels": list(self.channels),
+                "path": self.path,
+                "levels": [{"width": tier.width, "size": tier.size, "stored": len(tier),
+                            "oldest": tier.oldest() if tier.written else None} for tier in self.levels],
+                "bytes": sum(getattr(tier, name).nbytes for tier in self.levels for name in tier.arrays),
+            }
+
+    # ---- 持久化 ----
+
+    def _layout(self):
+        return {"channels": list(self.channels), "levels": [[tier.width, tier.size] for tier in self.levels]}
+
+    def save(self):
+        """保存到path（先写临时文件再替换，中途退出不会损坏已有文件）"""
+        if not self.path:
+            return
+        with self._lock:
+            arrays = {f"{level}_{name}": getattr(tier, name).copy()
+                      for level, tier in enumerate(self.levels) for name in tier.arrays}
+            written = [tier.written for tier in self.levels]
+            last_time = self.last_time
+        # 正在累积的桶不保存，恢复后从下一个桶开始
+        meta = dict(self._layout(), written=written, last_time=last_time)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, self.path)
+        self.last_save = time.monotonic()
+
+    def save_if_due(self):
+        """距上次保存超过save_interval时保存（由状态线程等非控制线程调用）"""
+        if self.path and time.monotonic() - self.last_save >= self.save_interval:
+            try:
+                self.save()
+            except OSError as e:
+                logging.error(f"保存遥测历史失败: {e}")
+
+    def load(self):
+        """从path恢复；文件不存在或层级配置不同则从空开始"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                meta = json.loads(str(data['meta']))
+                layout = {"channels": meta["channels"], "levels": meta["levels"]}
+                if layout != self._layout():
+                    logging.warning(f"遥测历史 {self.path} 的通道或层级与当前配置不同，不加载")
+                    return
+                for level, tier in enumerate(self.levels):
+                    for name in tier.arrays:
+                        getattr(tier, name)[...] = data[f"{level}_{name}"]
+                    tier.written = int(meta["written"][level])
+                    tier.open = None
+        except (OSError, KeyError, ValueError) as e:
+            logging.error(f"加载遥测历史 {self.path} 失败: {e}")
+            return
+        self.last_time = float(meta["last_time"])
+        logging.info(f"已加载遥测历史 {self.path}: 原始样本 {len(self.levels[0])} 个")
+
+
+def _unwrap(values):
+    """沿时间（第一维）展开角度：相邻有效值之差折算到 [-180, 180)，nan保持不变"""
+    result = np.full(values.shape, np.nan)
+    for j in range(values.shape[1]):
+        valid = ~np.isnan(values[:, j])
+        if valid.any():
+            result[valid, j] = np.unwrap(values[valid, j], period=360.0)
+    return result
+
+
+def _normalize(mean, low, high, columns):
+    """把周期通道的平均值归一化到 [0, 360)，最小/最大值平移相同的整周（原地修改）"""
+    if not len(columns):
+        return
+    shift = np.nan_to_num(np.floor(mean[..., columns] / 360.0) * 360.0)
+    for array in (mean, low, high):
+        array[..., columns] -= shift
+
+
+def _columns(array):
+    """(点数, 通道数) 数组 -> 每个通道一个列表，nan转为None（JSON中为null）"""
+    array = np.round(np.asarray(array, dtype=float), 4)
+    return [[None if math.isnan(v) else v for v in column] for column in array.T.tolist()]
@@ -1,12 +1,34 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 import serial.tools.list_ports
 import time
 import threading
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 import sys
 import os
-from gyroscope import VirtualGyroscope, RealGyroscope
+import re
+import json
+import atexit
+from collections import OrderedDict
+from functools import partial
+import numpy as np
+from observation_plan import ObservationTarget, ObservationPlanner, execute_plan
+from controller_service import ControllerService
+from async_controller import AsyncEngineHost
+from mount_registry import MountRegistry
+from process_controller import ProcessControllerHost
+from star_catalog import StarCatalog
+from pointing_model import PointingCalibration
+from refraction import get_refraction_table
+from slew_planner import LeadTargetSolver, CableWrap
+from batch_transform import equatorial_to_horizontal_batch
+from visibility import get_visibility_planner, parse_night
+from horizon_mask import HorizonMask
+from scan_pattern import ScanPattern
+from satellite import SatellitePredictor, load_tles
+from solar_system import BODY_NAMES, SunAvoidance, get_solar_system_predictor, parse_body
+from telemetry_history import TelemetryHistory
+from gyroscope import StaleSampleError
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, 
@@ -15,7 +37,7 @@ logging.basicConfig(level=logging.INFO,
 # 导入望远镜控制器
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
-    from transform_control import TelescopeController
+    from transform_control import TelescopeController, create_controller
     logging.info("成功导入望远镜控制模块")
 except Exception as e:
     logging.error(f"导入望远镜控制模块失败: {e}")
@@ -23,16 +45,62 @@ except Exception as e:
 
 app = Flask(__name__)
 
+# 控制引擎：thread（常驻控制线程，默认）、async（asyncio引擎，传感器读取与命令输出重叠执行）
+# 或 process（控制循环运行在独立进程中，Web请求不影响控制周期）
+CONTROL_ENGINE = os.environ.get('TELESCOPE_ENGINE', 'thread')
+async_host = AsyncEngineHost() if CONTROL_ENGINE == 'async' else None
+# 控制模式：设置 TELESCOPE_BRAKING=1 使用学习刹车距离的控制（提前松开继电器，短脉冲修正）
+BRAKING = os.environ.get('TELESCOPE_BRAKING', '0') == '1'
+# 设置 TELESCOPE_TIMED_PULSES=1 时短脉冲由继电器固件计时（需要支持 AZ1T120 命令的relay_control固件）
+TIMED_PULSES = os.environ.get('TELESCOPE_TIMED_PULSES', '0') == '1'
+# 设置 TELESCOPE_GYRO_BAUDRATE（如 115200）时连接后把陀螺仪切换到该波特率，提高采样率
+GYRO_BAUDRATE = int(os.environ['TELESCOPE_GYRO_BAUDRATE']) if os.environ.get('TELESCOPE_GYRO_BAUDRATE') else None
+# 设置 TELESCOPE_SHARED_BUS=1 时陀螺仪串口作为多个传感器共用的RS485总线，由总线轮询线程统一读取
+SHARED_BUS = os.environ.get('TELESCOPE_SHARED_BUS', '0') == '1'
+# 设置 TELESCOPE_HORIZON_MASK 为掩码文件路径时按实际地平遮挡判断目标和转动路径（格式见horizon_mask.py）
+HORIZON_MASK_PATH = os.environ.get('TELESCOPE_HORIZON_MASK')
+horizon = HorizonMask.load(HORIZON_MASK_PATH) if HORIZON_MASK_PATH else None
+# 卫星轨道根数（TLE）文件，离线预报卫星过境
+TLE_PATH = os.environ.get('TELESCOPE_TLE_FILE',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'satellites.tle'))
+# 控制看门狗期限 (秒)：运动中控制周期或姿态数据卡住超过该时间时由看门狗线程发送停止命令，设为0关闭
+WATCHDOG_DEADLINE = float(os.environ.get('TELESCOPE_WATCHDOG_DEADLINE', '0.5')) or None
+# 遥测历史：运动中按控制周期记录，静止时由状态线程记录；设置 TELESCOPE_HISTORY_FILE 时定期保存到该文件（.npz）
+history = TelemetryHistory(path=os.environ.get('TELESCOPE_HISTORY_FILE'))
+atexit.register(history.save)
+# 太阳避让半径 (度)：与太阳夹角小于该值的目标和路径被拒绝，设为0关闭
+SUN_AVOIDANCE = float(os.environ.get('TELESCOPE_SUN_AVOIDANCE', '30'))
+
 # 全局变量
 telescope = None
-control_thread = None
+service = None           # 常驻控制线程，控制器和串口在多次启动/停止之间保持
+telescope_config = None  # 当前控制器的 (模式, 控制器串口, 陀螺仪串口)
+control_thread = None    # 观测计划执行线程
 running = False
+plan_stop_event = threading.Event()
+calibration_job = None   # 最近一次陀螺仪校准任务
+registry = MountRegistry(watchdog_deadline=WATCHDOG_DEADLINE)  # 多望远镜注册表，共用一个调度线程
+catalog = StarCatalog.load()  # 离线星表
+# 指向模型：观测数据和拟合结果保存在JSON文件中，启动时加载
+POINTING_MODEL_PATH = os.environ.get('TELESCOPE_POINTING_MODEL',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pointing_model.json'))
+pointing = PointingCalibration.load(POINTING_MODEL_PATH)
+# 线缆缠绕：真实模式下展开方位角保存在JSON文件中，重新创建控制器或重启后恢复已缠绕的圈数；
+# TELESCOPE_CABLE_WRAP_LIMITS 设置展开方位角的下限和上限（度），如 "-270,270"
+CABLE_WRAP_PATH = os.environ.get('TELESCOPE_CABLE_WRAP_FILE',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cable_wrap.json'))
+CABLE_WRAP_LIMITS = tuple(float(v) for v in os.environ.get('TELESCOPE_CABLE_WRAP_LIMITS', '-270,270').split(','))
+refraction = None  # 大气折射表，通过/weather设置气象参数后启用
+sky_cache = OrderedDict()     # 天空图数据缓存：(查询参数, 时间桶) -> 序列化后的数据
+sky_cache_lock = threading.Lock()
+SKY_CACHE_SIZE = 32
 status = {
     "current_az": 0.0,
     "current_alt": 0.0,
     "target_az": 0.0,
     "target_alt": 0.0,
     "current_time": "",
+    "stale": False,
     "status": "就绪"
 }
 
@@ -53,36 +121,199 @@ def update_status():
     
     while running:
         try:
-            if telescope and telescope.gyro:
-                current_az, current_alt = telescope.gyro.get_current_attitude()
-                status["current_az"] = round(current_az, 2)
-                status["current_alt"] = round(current_alt, 2)
+            if isinstance(service, ProcessControllerHost):
+                # 独立进程模式：从共享内存读取遥测
+                telemetry = service.telemetry()
+                status["stale"] = telemetry["stale"]
+                stale_attitude = telemetry["current_az"] is None
+                status["current_az"] = None if stale_attitude else round(telemetry["current_az"], 2)
+                status["current_alt"] = None if stale_attitude else round(telemetry["current_alt"], 2)
+                status["target_az"] = round(telemetry["target_az"], 2)
+                status["target_alt"] = round(telemetry["target_alt"], 2)
+                on_service_state(telemetry["state"])
+                # 控制循环在子进程中，历史按状态线程的周期记录
+                if not stale_attitude:
+                    history.record(telemetry["time"], (telemetry["current_az"], telemetry["current_alt"],
+                                                       telemetry["target_az"], telemetry["target_alt"]))
+            elif telescope and telescope.gyro and hasattr(telescope, "target_azimuth"):
                 status["target_az"] = round(telescope.target_azimuth, 2)
                 status["target_alt"] = round(telescope.target_altitude, 2)
-            
+                try:
+                    current_az, current_alt = telescope.get_current_attitude()
+                except (StaleSampleError, IOError):
+                    # 陀螺仪尚无有效数据或读取失败：显示为过期，状态线程继续运行
+                    status["current_az"] = status["current_alt"] = None
+                    status["stale"] = True
+                else:
+                    status["current_az"] = round(current_az, 2)
+                    status["current_alt"] = round(current_alt, 2)
+                    is_stale = getattr(telescope.gyro, 'is_stale', None)
+                    status["stale"] = bool(is_stale and is_stale())
+                    # 运动中由控制周期记录
+                    if service and service.state != ControllerService.SLEWING:
+                        telescope.record_history(current_az, current_alt)
+
             status["current_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            history.save_if_due()
         except Exception as e:
             logging.error(f"更新状态时出错: {e}")
         
         time.sleep(0.5)
 
-def telescope_control():
-    """望远镜控制线程"""
-    global telescope, running, status
-    
-    if telescope:
-        status["status"] = "控制中..."
+STATE_TEXT = {
+    ControllerService.SLEWING: "控制中...",
+    ControllerService.ARRIVED: "已到达目标",
+    ControllerService.STOPPED: "已停止",
+    ControllerService.ERROR: "控制失败",
+}
+
+def on_service_state(state):
+    """常驻控制线程状态变化回调"""
+    # 观测计划执行期间由计划线程负责更新状态文字
+    if control_thread and control_thread.is_alive() and state != ControllerService.ERROR:
+        return
+    text = STATE_TEXT.get(state, state)
+    if state == ControllerService.ERROR and service and service.error:
+        text = f"错误: {service.error}"
+    status["status"] = text
+
+def plan_control(plan, lat, lon):
+    """观测计划执行线程，通过常驻控制线程依次执行各目标"""
+    global status
+
+    if service:
+        total = len(plan.visits)
+
+        def on_visit(index, visit):
+            status["status"] = f"观测计划执行中 {index + 1}/{total}: {visit.target.name}"
+
         try:
-            result = telescope.control_loop()
-            if result == 0:
-                status["status"] = "已到达目标"
-            else:
-                status["status"] = "控制失败"
+            reached = execute_plan(service, plan, lat, lon,
+                                   stop_event=plan_stop_event, on_visit=on_visit)
+            status["status"] = f"观测计划完成 {reached}/{total}"
         except Exception as e:
             status["status"] = f"错误: {str(e)}"
-            logging.error(f"控制异常: {e}")
-        
-        running = False
+            logging.error(f"观测计划执行异常: {e}")
+
+def load_cable_wrap(mode, mount_id=None):
+    """
+    线缆缠绕状态：只有真实模式保存和恢复（仿真的陀螺仪每次从头开始）；注册表中的各望远镜分别保存
+
+    :param mount_id: 注册表中的望远镜编号，None表示主望远镜
+    """
+    path = CABLE_WRAP_PATH if mode == 'real' else None
+    if path and mount_id is not None:
+        root, ext = os.path.splitext(path)
+        path = f"{root}_{re.sub(r'[^0-9A-Za-z_-]', '_', str(mount_id))}{ext}"
+    return CableWrap.load(path, *CABLE_WRAP_LIMITS)
+
+def create_telescope(mode, control_port, gyro_port, pointing_model=None, async_gyro=False, mount_id=None):
+    """
+    根据运行模式创建陀螺仪和望远镜控制器
+
+    :param async_gyro: 是否使用异步陀螺仪；只有交给异步控制引擎的控制器才能使用，
+                       多望远镜注册表在读取线程中同步读取陀螺仪
+    :param mount_id: 注册表中的望远镜编号（决定线缆缠绕状态的保存文件），None表示主望远镜
+    :return: (TelescopeController, None) 或 (None, 错误信息)
+    """
+    try:
+        return create_controller(mode, control_port, gyro_port, async_gyro=async_gyro,
+                                 pointing_model=pointing_model, refraction=refraction,
+                                 lead_solver=LeadTargetSolver(), braking=BRAKING,
+                                 timed_pulses=TIMED_PULSES, gyro_baudrate=GYRO_BAUDRATE,
+                                 horizon=horizon, shared_bus=SHARED_BUS,
+                                 cable_wrap=load_cable_wrap(mode, mount_id)), None
+    except (ValueError, ConnectionError) as e:
+        return None, str(e)
+
+def ensure_service(mode, control_port, gyro_port):
+    """
+    确保常驻控制线程可用：配置不变时复用现有控制器和串口，否则重新创建
+
+    :return: 错误信息，成功时为None
+    """
+    global telescope, service, telescope_config, running
+
+    config = (mode, control_port, gyro_port)
+    if service and service.is_alive() and telescope_config == config:
+        return None
+
+    if service:
+        service.shutdown()
+    if telescope:
+        telescope.close()
+        telescope = None
+
+    if CONTROL_ENGINE == 'process':
+        # 控制器在子进程中创建，这里只检查参数
+        if mode in ('real', 'hybrid') and not control_port:
+            return "请选择控制器串口"
+        if mode == 'real' and not gyro_port:
+            return "请选择陀螺仪串口"
+        service = ProcessControllerHost(mode, control_port, gyro_port,
+                                        pointing_model=pointing.model, refraction=refraction,
+                                        lead_solver=LeadTargetSolver(), braking=BRAKING,
+                                        timed_pulses=TIMED_PULSES, gyro_baudrate=GYRO_BAUDRATE,
+                                        horizon=horizon, shared_bus=SHARED_BUS,
+                                        cable_wrap=load_cable_wrap(mode),
+                                        watchdog_deadline=WATCHDOG_DEADLINE)
+        try:
+            service.start()
+        except RuntimeError as e:
+            service.shutdown()
+            service = None
+            return f"控制进程启动失败: {e}"
+        telescope_config = config
+        start_status_thread()
+        return None
+
+    new_telescope, error = create_telescope(mode, control_port, gyro_port, pointing.model, async_gyro=bool(async_host))
+    if error:
+        return error
+    telescope = new_telescope
+    telescope.history = history
+    telescope_config = config
+    if async_host:
+        service = async_host.add(telescope, on_state_change=on_service_state,
+                                 watchdog_deadline=WATCHDOG_DEADLINE)
+    else:
+        service = ControllerService(telescope, on_state_change=on_service_state,
+                                    watchdog_deadline=WATCHDOG_DEADLINE)
+        service.start()
+
+    start_status_thread()
+    return None
+
+def current_attitude():
+    """
+    望远镜当前真实指向 (方位角, 高度角)
+
+    :raises StaleSampleError: 陀螺仪尚无有效数据或读取失败
+    """
+    if isinstance(service, ProcessControllerHost):
+        telemetry = service.telemetry()
+        if telemetry["current_az"] is None:
+            raise StaleSampleError("陀螺仪没有有效数据")
+        return telemetry["current_az"], telemetry["current_alt"]
+    return telescope.get_current_attitude()
+
+def start_status_thread():
+    """启动状态更新线程（只启动一次）"""
+    global running
+
+    if not running:
+        running = True
+        status_thread = threading.Thread(target=update_status)
+        status_thread.daemon = True
+        status_thread.start()
+        logging.info("状态更新线程已启动")
+
+def stop_plan():
+    """结束正在执行的观测计划"""
+    if control_thread and control_thread.is_alive():
+        plan_stop_event.set()
+        service.stop()
+        control_thread.join(1.0)
 
 @app.route('/')
 def index():
@@ -98,11 +329,8 @@ def get_status():
 
 @app.route('/start', methods=['POST'])
 def start_telescope():
-    """启动望远镜"""
-    global telescope, control_thread, running, status
-    
-    if running:
-        return jsonify({"success": False, "message": "望远镜已在运行中"})
+    """启动望远镜；运行中再次提交则直接切换到新目标"""
+    global status
     
     # 获取表单数据
     try:
@@ -113,73 +341,46 @@ def start_telescope():
         
         logging.info(f"启动参数 - 模式: {mode}, 控制器串口: {control_port}, 陀螺仪串口: {gyro_port}, 坐标类型: {coordinate_type}")
         
-        # 创建陀螺仪
-        gyro = None
-        if mode == 'simulation' or mode == 'hybrid':
-            gyro = VirtualGyroscope()
-            logging.info("已创建虚拟陀螺仪")
-        elif mode == 'real':
-            if not gyro_port:
-                return jsonify({"success": False, "message": "请选择陀螺仪串口"})
-            try:
-                gyro = RealGyroscope(port=gyro_port)
-                logging.info(f"已创建真实陀螺仪，使用串口 {gyro_port}")
-            except Exception as e:
-                return jsonify({"success": False, "message": f"连接陀螺仪失败: {str(e)}"})
-
-        # 创建望远镜控制器
-        simulation = (mode == 'simulation')
-        hybrid_sim = (mode == 'hybrid')
-        
-        if mode == 'real' or mode == 'hybrid':
-            if not control_port:
-                return jsonify({"success": False, "message": "请选择控制器串口"})
-            
-            logging.info(f"创建望远镜控制器 - 串口: {control_port}")
-            telescope = TelescopeController(
-                port=control_port,
-                baudrate=115200,
-                gyro=gyro,
-                simulation=simulation,
-                hybrid_sim=hybrid_sim
-            )
-        else:  # 纯模拟模式
-            logging.info("创建望远镜控制器 - 纯模拟模式")
-            telescope = TelescopeController(
-                gyro=gyro,
-                simulation=True
-            )
+        error = ensure_service(mode, control_port, gyro_port)
+        if error:
+            return jsonify({"success": False, "message": error})
+        stop_plan()
         
-        # 设置目标
-        if coordinate_type == 'equatorial':
+        # 设置目标，由常驻控制线程在下一个控制周期应用
+        if coordinate_type == 'object':
+            # 按天体名称从星表中查询赤道坐标
+            name = request.form.get('object', '')
+            target = catalog.lookup(name)
+            if target is None:
+                return jsonify({"success": False, "message": f"星表中没有找到天体: {name}"})
+            lat = float(request.form.get('lat'))
+            lon = float(request.form.get('lon'))
+
+            check_sun(lat, lon, *equatorial_to_horizontal_batch(target.ra, target.dec, lat, lon, datetime.now()))
+            logging.info(f"设置天体目标 - {target.name}: 赤经: {target.ra}h, 赤纬: {target.dec}°")
+            service.set_target(target.ra, target.dec, lat, lon, datetime.now())
+
+        elif coordinate_type == 'equatorial':
             ra = float(request.form.get('ra'))
             dec = float(request.form.get('dec'))
             lat = float(request.form.get('lat'))
             lon = float(request.form.get('lon'))
             current_time = datetime.now()
+            check_sun(lat, lon, *equatorial_to_horizontal_batch(ra, dec, lat, lon, current_time))
             
             logging.info(f"设置赤道坐标 - 赤经: {ra}h, 赤纬: {dec}°, 纬度: {lat}°, 经度: {lon}°")
-            telescope.set_target(ra, dec, lat, lon, current_time)
+            service.set_target(ra, dec, lat, lon, current_time)
             
         else:  # 地平坐标
             az = float(request.form.get('az'))
             alt = float(request.form.get('alt'))
+            if horizon and not horizon.is_visible(az % 360, alt):
+                return jsonify({"success": False, "message": f"目标 ({az}°, {alt}°) 被地平遮挡"})
+            # 地平坐标目标只有在表单带有经纬度时才能检查太阳避让
+            check_sun(optional_float(request.form, 'lat'), optional_float(request.form, 'lon'), az, alt)
             
             logging.info(f"设置地平坐标 - 方位角: {az}°, 高度角: {alt}°")
-            telescope.set_target(az, alt, coordinate_type='horizontal')
-        
-        # 启动状态更新线程
-        running = True
-        status_thread = threading.Thread(target=update_status)
-        status_thread.daemon = True
-        status_thread.start()
-        logging.info("状态更新线程已启动")
-        
-        # 启动控制线程
-        control_thread = threading.Thread(target=telescope_control)
-        control_thread.daemon = True
-        control_thread.start()
-        logging.info("控制线程已启动")
+            service.set_target(az, alt, coordinate_type='horizontal')
         
         return jsonify({"success": True, "message": "望远镜已启动"})
         
@@ -187,26 +388,626 @@ def start_telescope():
         logging.error(f"启动错误: {e}")
         return jsonify({"success": False, "message": f"错误: {str(e)}"})
 
+@app.route('/plan', methods=['POST'])
+def start_plan():
+    """提交观测计划：对目标列表按转动耗时排序后依次执行"""
+    global control_thread, status
+
+    try:
+        data = request.get_json(force=True)
+        lat = float(data.get('lat'))
+        lon = float(data.get('lon'))
+        targets = [ObservationTarget.from_dict(item) for item in data.get('targets', [])]
+        if not targets:
+            return jsonify({"success": False, "message": "观测计划中没有目标"})
+
+        error = ensure_service(data.get('mode'), data.get('control_port'), data.get('gyro_port'))
+        if error:
+            return jsonify({"success": False, "message": error})
+        stop_plan()
+
+        current_az, current_alt = current_attitude()
+        planner = ObservationPlanner(lat, lon, refraction=refraction, horizon=horizon)
+        plan = planner.plan(targets, current_az, current_alt, datetime.now())
+        if not plan.visits:
+            return jsonify({"success": False, "message": "计划时段内没有可观测的目标", "plan": plan.to_dict()})
+        # 太阳避让：检查每个目标在预测到达时刻的位置
+        check_sun(lat, lon, np.array([visit.azimuth for visit in plan.visits]),
+                  np.array([visit.altitude for visit in plan.visits]),
+                  time.time() + np.array([visit.arrival_offset for visit in plan.visits]))
+
+        # 启动计划执行线程
+        plan_stop_event.clear()
+        control_thread = threading.Thread(target=plan_control, args=(plan, lat, lon))
+        control_thread.daemon = True
+        control_thread.start()
+        logging.info("观测计划执行线程已启动")
+
+        return jsonify({"success": True, "message": "观测计划已启动", "plan": plan.to_dict()})
+
+    except Exception as e:
+        logging.error(f"观测计划启动错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/scan', methods=['POST'])
+def start_scan():
+    """提交天区扫描：蛇形网格一次批量转换后作为一个目标连续执行，网格点之间不重新设置目标"""
+    try:
+        data = request.get_json(force=True)
+        pattern = ScanPattern.from_dict(data)
+        error = ensure_service(data.get('mode'), data.get('control_port'), data.get('gyro_port'))
+        if error:
+            return jsonify({"success": False, "message": error})
+        stop_plan()
+
+        scan = pattern.plan(optional_float(data, 'lat'), optional_float(data, 'lon'), datetime.now(),
+                            refraction=refraction, horizon=horizon)
+        if not len(scan):
+            return jsonify({"success": False, "message": "扫描区域内没有可观测的网格点", "scan": scan.to_dict()})
+        check_sun(optional_float(data, 'lat'), optional_float(data, 'lon'), scan.azimuth, scan.altitude,
+                  time.time() + scan.arrival_offsets)
+        service.set_target(scan, coordinate_type='scan')
+        return jsonify({"success": True, "message": f"扫描已启动: {len(scan)} 个网格点", "scan": scan.to_dict()})
+
+    except Exception as e:
+        logging.error(f"扫描启动错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+def check_sun(lat, lon, az, alt, unix_times=None):
+    """
+    太阳避让检查：未启用或不知道观测地点时跳过
+
+    :raises ValueError: 目标或路径进入避让区
+    """
+    if SUN_AVOIDANCE > 0 and lat is not None and lon is not None:
+        SunAvoidance(get_solar_system_predictor(lat, lon, refraction), SUN_AVOIDANCE).check(az, alt, unix_times)
+
+def load_satellites():
+    """读取TLE文件（每次请求重新读取，文件更新后立即生效）"""
+    if not os.path.exists(TLE_PATH):
+        raise ValueError(f"没有找到卫星轨道文件: {TLE_PATH}")
+    return load_tles(TLE_PATH)
+
+@app.route('/satellites')
+def satellite_passes():
+    """TLE文件中各卫星的下一次过境（一次批量外推和转换）"""
+    try:
+        args = request.args
+        predictor = SatellitePredictor(float(args.get('lat')), float(args.get('lon')),
+                                       min_altitude=optional_float(args, 'min_alt', 20.0), refraction=refraction)
+        tles = load_satellites()
+        passes = predictor.passes(tles, duration=optional_float(args, 'hours', 24.0) * 3600.0)
+        satellites = []
+        for tle, found in zip(tles, passes):
+            item = {"name": tle.name, "rise": None, "set": None, "max_altitude": None}
+            if found:
+                _, rise, set_time, max_altitude = found
+                item.update(rise=datetime.fromtimestamp(rise, timezone.utc).isoformat(timespec='seconds'),
+                            set=datetime.fromtimestamp(set_time, timezone.utc).isoformat(timespec='seconds'),
+                            max_altitude=round(max_altitude, 2))
+            satellites.append(item)
+        satellites.sort(key=lambda item: item["rise"] or "~")
+        return jsonify({"success": True, "satellites": satellites})
+    except Exception as e:
+        logging.error(f"卫星过境预报错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/track', methods=['POST'])
+def start_track():
+    """跟踪卫星的下一次过境：过境星历一次批量计算，控制周期中插值"""
+    try:
+        data = request.get_json(force=True)
+        name = data.get('name', '')
+        tle = next((t for t in load_satellites() if t.name == name), None)
+        if tle is None:
+            return jsonify({"success": False, "message": f"轨道文件中没有找到卫星: {name}"})
+        predictor = SatellitePredictor(float(data.get('lat')), float(data.get('lon')),
+                                       min_altitude=optional_float(data, 'min_alt', 20.0), refraction=refraction)
+        ephemeris = predictor.next_pass(tle)
+        if ephemeris is None:
+            return jsonify({"success": False, "message": f"{name} 在24小时内没有过境"})
+        if horizon:
+            # 只跟踪地平遮挡以上的一段，控制器按同一掩码截取
+            ephemeris = ephemeris.above_horizon(horizon, time.time())
+            if ephemeris is None:
+                return jsonify({"success": False, "message": f"{name} 的过境路径都被地平遮挡"})
+        check_sun(predictor.lat, predictor.lon, ephemeris.azimuth, ephemeris.altitude, ephemeris.times)
+
+        error = ensure_service(data.get('mode'), data.get('control_port'), data.get('gyro_port'))
+        if error:
+            return jsonify({"success": False, "message": error})
+        stop_plan()
+        service.set_target(ephemeris, coordinate_type='track')
+        return jsonify({"success": True, "message": f"开始跟踪 {name}", "pass": ephemeris.to_dict()})
+
+    except Exception as e:
+        logging.error(f"卫星跟踪启动错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/calibration', methods=['POST'])
+def start_calibration():
+    """在后台执行陀螺仪零点校准，立即返回，通过GET /calibration查询进度"""
+    global calibration_job
+    axes = (request.get_json(silent=True) or request.form).get('axes', 'xy')
+    gyro = getattr(telescope, 'gyro', None)
+    if not hasattr(gyro, 'start_calibration'):
+        return jsonify({"success": False, "message": "当前没有可校准的真实陀螺仪（进程引擎下陀螺仪在控制进程中）"})
+    if calibration_job and calibration_job.active:
+        return jsonify({"success": False, "message": "已有校准任务在进行", "job": calibration_job.to_dict()})
+    if service and service.is_alive() and service.state == 'slewing':
+        return jsonify({"success": False, "message": "望远镜正在转动，请先停止再校准"})
+    try:
+        calibration_job = gyro.start_calibration(axes, on_success=partial(z_calibrated, telescope))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)})
+    return jsonify({"success": True, "message": "校准已开始", "job": calibration_job.to_dict()})
+
+def z_calibrated(controller, job):
+    """
+    Z轴校准改变了方位零点（在恢复采样之前调用）：线缆缠绕的展开方位角随读数平移；
+    已拟合的指向模型和已记录的观测都基于校准前的方位零点，提示重新拟合
+    """
+    if job.axes != 'z':
+        return
+    controller.cable_wrap.shift(job.offset)
+    if pointing.fitted_at is not None or pointing.samples:
+        job.message += "；方位零点已改变，请清除指向观测并重新拟合指向模型"
+        logging.warning(f"Z轴校准使方位读数变化 {job.offset:.2f}°，现有指向模型需要重新拟合")
+
+@app.route('/calibration')
+def calibration_status():
+    """最近一次校准任务的状态和进度"""
+    return jsonify({"success": True, "job": calibration_job.to_dict() if calibration_job else None})
+
+@app.route('/bus')
+def bus_status():
+    """共用RS485总线上各设备的轮询情况（线程/异步引擎；进程引擎的总线在控制进程中）"""
+    bus = getattr(getattr(telescope, 'gyro', None), 'bus', None)
+    if bus is None:
+        return jsonify({"success": False, "message": "当前没有使用共用总线"})
+    return jsonify({"success": True, "bus": bus.status()})
+
+@app.route('/watchdog')
+def watchdog_status():
+    """控制看门狗的期限和最近一次触发（线程/异步引擎；进程引擎的看门狗在控制进程中）"""
+    watchdog = getattr(service, 'watchdog', None)
+    if watchdog is None:
+        return jsonify({"success": False, "message": "当前没有启用看门狗"})
+    return jsonify({"success": True, "watchdog": watchdog.status()})
+
+@app.route('/history')
+def telemetry_history():
+    """
+    一段时间的指向和目标历史，按列组织。
+
+    参数：start、end（unix时间，默认最近10分钟）、resolution（秒）、channels（逗号分隔）。
+    time为各桶起始时刻，count为桶内样本数，min/max/mean每个通道一列，没有数据的桶不返回。
+    """
+    try:
+        args = request.args
+        channels = [name for name in args.get('channels', '').split(',') if name] or None
+        data = history.query(optional_float(args, 'start'), optional_float(args, 'end'),
+                             optional_float(args, 'resolution'), channels)
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+    return Response(json.dumps(dict(success=True, **data), separators=(',', ':')), mimetype='application/json')
+
+@app.route('/bodies')
+def solar_system_bodies():
+    """太阳系天体的当前位置和与太阳的角距离（按夜缓存的网格上插值）"""
+    try:
+        args = request.args
+        lat, lon = float(args.get('lat')), float(args.get('lon'))
+        predictor = get_solar_system_predictor(lat, lon, refraction)
+        sun = SunAvoidance(predictor, SUN_AVOIDANCE)
+        bodies = []
+        for body, name in BODY_NAMES.items():
+            az, alt = predictor.position(body)
+            bodies.append({"body": body, "name": name, "az": round(float(az), 3), "alt": round(float(alt), 3),
+                           "sun_separation": round(float(sun.separation(az, alt)), 2),
+                           "safe": body != 'sun' and (SUN_AVOIDANCE <= 0 or bool(sun.is_safe(az, alt)))})
+        return jsonify({"success": True, "sun_avoidance": SUN_AVOIDANCE, "bodies": bodies})
+    except Exception as e:
+        logging.error(f"太阳系天体位置计算错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/body', methods=['POST'])
+def start_body():
+    """跟踪月球或行星到当夜结束：星历取自按夜缓存的网格，控制周期中插值"""
+    try:
+        data = request.get_json(force=True)
+        body = parse_body(data.get('name'))
+        lat, lon = float(data.get('lat')), float(data.get('lon'))
+        hours = optional_float(data, 'hours')
+        ephemeris = get_solar_system_predictor(lat, lon, refraction).ephemeris(
+            body, duration=hours * 3600.0 if hours else None, min_altitude=optional_float(data, 'min_alt', 20.0))
+        if horizon:
+            # 只跟踪地平遮挡以上的一段，控制器按同一掩码截取
+            clipped = ephemeris.above_horizon(horizon, time.time())
+            if clipped is None:
+                return jsonify({"success": False, "message": f"{ephemeris.name} 的路径都被地平遮挡"})
+            ephemeris = clipped
+        check_sun(lat, lon, ephemeris.azimuth, ephemeris.altitude, ephemeris.times)
+
+        error = ensure_service(data.get('mode'), data.get('control_port'), data.get('gyro_port'))
+        if error:
+            return jsonify({"success": False, "message": error})
+        stop_plan()
+        service.set_target(ephemeris, coordinate_type='track')
+        return jsonify({"success": True, "message": f"开始跟踪 {ephemeris.name}", "ephemeris": ephemeris.to_dict()})
+
+    except Exception as e:
+        logging.error(f"太阳系天体跟踪启动错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
 @app.route('/stop', methods=['POST'])
 def stop_telescope():
-    """停止望远镜"""
-    global telescope, running, status
+    """停止望远镜运动（控制器和串口保持连接，可直接再次启动）"""
+    global status, service, telescope_config
     
-    if not running:
+    if not service or not service.is_alive():
         return jsonify({"success": False, "message": "望远镜未运行"})
     
     logging.info("停止望远镜")
-    running = False
+    plan_stop_event.set()
+    latency = service.stop()
+    if latency is None:
+        # 控制进程未确认停止（卡住或已失去响应）：结束控制进程，下次启动时重新创建
+        logging.error("控制进程未确认停止，终止控制进程")
+        service.shutdown(timeout=0.5)
+        service = None
+        telescope_config = None
+        status["status"] = "停止未确认"
+        return jsonify({"success": False, "message": "控制进程未确认停止，已终止控制进程",
+                        "stop_latency_ms": None})
     status["status"] = "已停止"
     
-    if telescope:
-        try:
-            telescope.close()
-            logging.info("望远镜控制器已关闭")
-        except Exception as e:
-            logging.error(f"关闭错误: {e}")
-    
-    return jsonify({"success": True, "message": "望远镜已停止"})
+    return jsonify({"success": True, "message": "望远镜已停止",
+                    "stop_latency_ms": round(latency * 1000, 2)})
+
+def optional_float(data, key, default=None):
+    """读取可选的数值参数，缺省或为空时返回默认值"""
+    value = data.get(key)
+    return default if value is None or value == '' else float(value)
+
+@app.route('/catalog/search')
+def catalog_search():
+    """按名称或别名查询星表"""
+    limit = int(request.args.get('limit', 10))
+    objects = catalog.search(request.args.get('q', ''), limit)
+    return jsonify({"success": True, "objects": [obj.to_dict() for obj in objects]})
+
+@app.route('/catalog/visible')
+def catalog_visible():
+    """查询当前高度角以上的天体，按星等由亮到暗排序"""
+    try:
+        args = request.args
+        limit = args.get('limit')
+        results = catalog.visible(float(args.get('lat')), float(args.get('lon')),
+                                  min_alt=optional_float(args, 'min_alt', 20.0),
+                                  max_mag=optional_float(args, 'max_mag'),
+                                  kind=args.get('type') or None,
+                                  limit=int(limit) if limit else None,
+                                  horizon=horizon)
+        objects = []
+        for obj, az, alt in results:
+            item = obj.to_dict()
+            item.update(az=round(az, 3), alt=round(alt, 3))
+            objects.append(item)
+        return jsonify({"success": True, "objects": objects})
+    except Exception as e:
+        logging.error(f"星表查询错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/catalog/visibility')
+def catalog_visibility():
+    """整夜可见时段：星表天体的升起、中天、落下时刻 (UTC)，按中天时刻排序"""
+    try:
+        args = request.args
+        planner = get_visibility_planner(round(float(args.get('lat')), 4), round(float(args.get('lon')), 4),
+                                         horizon)
+        night = parse_night(args.get('date'))
+        min_alt = optional_float(args, 'min_alt', 20.0)
+        # 整个星表按 (地点, 日期, 最低高度角) 只计算一次，筛选在缓存结果上进行
+        windows = planner.windows(catalog.objects, night, min_alt)
+        max_mag = optional_float(args, 'max_mag')
+        kind = args.get('type') or None
+        selected = [(obj, window) for obj, window in zip(catalog.objects, windows)
+                    if not window.never_up
+                    and (max_mag is None or obj.mag <= max_mag)
+                    and (kind is None or obj.kind == kind)]
+        selected.sort(key=lambda item: item[1].transit or datetime.max)
+        objects = []
+        for obj, window in selected:
+            item = window.to_dict()
+            item.update(type=obj.kind, mag=obj.mag)
+            objects.append(item)
+        start, end = planner.night_span(night)
+        return jsonify({"success": True, "date": night.isoformat(), "min_alt": min_alt,
+                        "start": start.isoformat(timespec='seconds'), "end": end.isoformat(timespec='seconds'),
+                        "objects": objects})
+    except Exception as e:
+        logging.error(f"可见时段计算错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/catalog/nearest')
+def catalog_nearest():
+    """查询距给定位置最近的天体：提供ra/dec按赤道坐标查询，否则按az/alt/lat/lon地平坐标查询"""
+    try:
+        args = request.args
+        k = int(args.get('k', 1))
+        ra = optional_float(args, 'ra')
+        dec = optional_float(args, 'dec')
+        objects = []
+        if ra is not None and dec is not None:
+            for obj, separation in catalog.nearest(ra, dec, k):
+                item = obj.to_dict()
+                item.update(separation=round(separation, 4))
+                objects.append(item)
+        else:
+            results = catalog.nearest_horizontal(float(args.get('az')), float(args.get('alt')),
+                                                 float(args.get('lat')), float(args.get('lon')), k=k)
+            for obj, separation, az, alt in results:
+                item = obj.to_dict()
+                item.update(separation=round(separation, 4), az=round(az, 3), alt=round(alt, 3))
+                objects.append(item)
+        return jsonify({"success": True, "objects": objects})
+    except Exception as e:
+        logging.error(f"星表查询错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/pointing')
+def pointing_status():
+    """指向模型参数、拟合残差和已记录的观测"""
+    return jsonify({"success": True, **pointing.to_dict()})
+
+@app.route('/pointing/sample', methods=['POST'])
+def pointing_sample():
+    """
+    记录一次对准观测：手动将星体移到视场中心后提交星体名称（或赤经赤纬）和观测地点，
+    记录星体的真实地平坐标和此时的陀螺仪读数
+    """
+    if not service or not service.is_alive():
+        return jsonify({"success": False, "message": "望远镜未运行"})
+    try:
+        data = request_data()
+        name = data.get('object', '')
+        if name:
+            target = catalog.lookup(name)
+            if target is None:
+                return jsonify({"success": False, "message": f"星表中没有找到天体: {name}"})
+            ra, dec, name = target.ra, target.dec, target.name
+        else:
+            ra, dec = float(data.get('ra')), float(data.get('dec'))
+        lat, lon = float(data.get('lat')), float(data.get('lon'))
+
+        sky_az, sky_alt = equatorial_to_horizontal_batch(ra, dec, lat, lon, datetime.now(), refraction=refraction)
+        # 当前指向经当前模型换算回陀螺仪读数（独立进程模式下Web进程不直接访问陀螺仪）
+        raw_az, raw_alt = pointing.model.to_mount(*current_attitude())
+        pointing.add_sample(float(sky_az) % 360, float(sky_alt), float(raw_az), float(raw_alt), name)
+        return jsonify({"success": True, "message": f"已记录第 {len(pointing.samples)} 组观测",
+                        "sample": pointing.samples[-1]})
+    except Exception as e:
+        logging.error(f"记录指向观测错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/pointing/fit', methods=['POST'])
+def pointing_fit():
+    """拟合指向模型并应用到当前控制器（从下一次设置目标起生效）"""
+    try:
+        data = request_data()
+        terms = data.get('terms')
+        if isinstance(terms, str):
+            terms = [term.strip() for term in terms.split(',') if term.strip()]
+        model = pointing.fit(terms) if terms else pointing.fit()
+    except Exception as e:
+        logging.error(f"拟合指向模型错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+    if isinstance(service, ProcessControllerHost):
+        service.set_pointing_model(model)
+    elif telescope:
+        telescope.pointing_model = model
+    return jsonify({"success": True, "message": f"指向模型已更新，残差 {pointing.rms:.1f}″",
+                    **pointing.to_dict()})
+
+@app.route('/pointing/clear', methods=['POST'])
+def pointing_clear():
+    """清除已记录的观测（模型参数保留）"""
+    pointing.clear()
+    return jsonify({"success": True, "message": "已清除指向观测"})
+
+@app.route('/weather', methods=['GET'])
+def get_weather():
+    """当前使用的气象参数（未设置时不做折射修正）"""
+    return jsonify({"success": True, "refraction": refraction.to_dict() if refraction else None})
+
+@app.route('/weather', methods=['POST'])
+def set_weather():
+    """
+    设置观测点气象参数：pressure（hPa）、temperature（摄氏度）。
+    参数变化时重新生成折射表，pressure为0表示关闭折射修正；从下一次设置目标起生效
+    """
+    global refraction
+    try:
+        data = request_data()
+        refraction = get_refraction_table(optional_float(data, 'pressure', 1010.0),
+                                          optional_float(data, 'temperature', 10.0))
+    except Exception as e:
+        logging.error(f"设置气象参数错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+    if isinstance(service, ProcessControllerHost):
+        service.set_refraction(refraction)
+    elif telescope:
+        telescope.refraction = refraction
+    message = "已关闭大气折射修正" if refraction is None else "大气折射表已更新"
+    return jsonify({"success": True, "message": message,
+                    "refraction": refraction.to_dict() if refraction else None})
+
+def current_pointing():
+    """望远镜当前指向和目标（来自状态更新线程）"""
+    return {
+        "active": bool(service and service.is_alive()),
+        "az": status["current_az"],
+        "alt": status["current_alt"],
+        "target_az": status["target_az"],
+        "target_alt": status["target_alt"],
+    }
+
+def sky_data(lat, lon, min_alt, max_mag, kind, fmt):
+    """
+    天空图数据，按 (查询参数, 时间桶) 缓存序列化结果。
+
+    同一时间桶内所有客户端共用一次批量坐标转换和一次序列化。
+    :return: (时间桶编号, 天体数量, 序列化数据)
+    """
+    bucket = catalog.time_bucket_index()
+    key = (lat, lon, min_alt, max_mag, kind, fmt, bucket)
+    with sky_cache_lock:
+        if key in sky_cache:
+            sky_cache.move_to_end(key)
+            return sky_cache[key]
+
+    bucket, columns = catalog.sky(lat, lon, min_alt=min_alt, max_mag=max_mag, kind=kind)
+    count = len(columns["name"])
+    if fmt == 'binary':
+        # 小端float32，依次为az、alt、mag三列，每列count个值
+        body = np.stack([columns["az"], columns["alt"], columns["mag"]]).astype('<f4').tobytes()
+    else:
+        body = json.dumps({
+            "bucket": bucket,
+            "bucket_seconds": catalog.time_bucket,
+            "count": count,
+            "name": columns["name"],
+            "type": columns["type"].tolist(),
+            "mag": columns["mag"].tolist(),
+            "az": np.round(columns["az"], 2).tolist(),
+            "alt": np.round(columns["alt"], 2).tolist(),
+        }, ensure_ascii=False, separators=(',', ':'))
+
+    with sky_cache_lock:
+        sky_cache[key] = (bucket, count, body)
+        while len(sky_cache) > SKY_CACHE_SIZE:
+            sky_cache.popitem(last=False)
+    return bucket, count, body
+
+@app.route('/sky')
+def sky_chart():
+    """
+    天空图数据：星表子集的地平坐标（按列组织）和望远镜当前指向。
+
+    参数：lat、lon、min_alt（默认0）、max_mag、type、format（json或binary）。
+    format=binary 时返回float32数组 (az、alt、mag三列)，天体名称需用json格式获取一次，
+    同一参数下天体顺序不变；指向和时间桶编号放在响应头中。
+    """
+    try:
+        args = request.args
+        lat = float(args.get('lat'))
+        lon = float(args.get('lon'))
+        min_alt = optional_float(args, 'min_alt', 0.0)
+        max_mag = optional_float(args, 'max_mag')
+        kind = args.get('type') or None
+        fmt = args.get('format', 'json')
+        bucket, count, body = sky_data(lat, lon, min_alt, max_mag, kind, fmt)
+    except Exception as e:
+        logging.error(f"天空图数据错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+    pointing = json.dumps(current_pointing(), separators=(',', ':'))
+    if fmt == 'binary':
+        return Response(body, mimetype='application/octet-stream',
+                        headers={"X-Sky-Count": str(count),
+                                 "X-Sky-Bucket": str(bucket),
+                                 "X-Sky-Pointing": pointing})
+    return Response('{"success":true,"pointing":%s,"sky":%s}' % (pointing, body),
+                    mimetype='application/json')
+
+def request_data():
+    """同时支持JSON和表单提交"""
+    return request.get_json(silent=True) or request.form
+
+@app.route('/mounts', methods=['GET'])
+def list_mounts():
+    """列出所有已注册望远镜的状态"""
+    return jsonify(registry.status())
+
+@app.route('/mounts', methods=['POST'])
+def add_mount():
+    """注册一台望远镜（各自使用独立的控制器串口和陀螺仪）"""
+    try:
+        data = request_data()
+        mount_id = data.get('id')
+        if not mount_id:
+            return jsonify({"success": False, "message": "请提供望远镜编号"})
+        if mount_id in registry.mounts:
+            return jsonify({"success": False, "message": f"望远镜 {mount_id} 已存在"})
+
+        controller, error = create_telescope(data.get('mode'), data.get('control_port'), data.get('gyro_port'),
+                                             async_gyro=False, mount_id=mount_id)
+        if error:
+            return jsonify({"success": False, "message": error})
+        lat = data.get('lat')
+        lon = data.get('lon')
+        registry.add(mount_id, controller,
+                     lat=float(lat) if lat not in (None, '') else None,
+                     lon=float(lon) if lon not in (None, '') else None,
+                     description=data.get('description', ''))
+        return jsonify({"success": True, "message": f"望远镜 {mount_id} 已注册"})
+    except Exception as e:
+        logging.error(f"注册望远镜错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/mounts/<mount_id>', methods=['DELETE'])
+def remove_mount(mount_id):
+    """移除一台望远镜"""
+    if mount_id not in registry.mounts:
+        return jsonify({"success": False, "message": f"望远镜 {mount_id} 不存在"}), 404
+    registry.remove(mount_id)
+    return jsonify({"success": True, "message": f"望远镜 {mount_id} 已移除"})
+
+@app.route('/mounts/<mount_id>/status')
+def mount_status(mount_id):
+    """获取单台望远镜状态"""
+    mount = registry.mounts.get(mount_id)
+    if mount is None:
+        return jsonify({"success": False, "message": f"望远镜 {mount_id} 不存在"}), 404
+    return jsonify(mount.to_dict())
+
+@app.route('/mounts/<mount_id>/start', methods=['POST'])
+def start_mount(mount_id):
+    """为单台望远镜设置目标，参数与/start相同；纬度经度缺省时使用注册时的观测地点"""
+    mount = registry.mounts.get(mount_id)
+    if mount is None:
+        return jsonify({"success": False, "message": f"望远镜 {mount_id} 不存在"}), 404
+    try:
+        data = request_data()
+        if data.get('coordinate_type') == 'equatorial':
+            ra = float(data.get('ra'))
+            dec = float(data.get('dec'))
+            lat = float(data.get('lat') or mount.lat)
+            lon = float(data.get('lon') or mount.lon)
+            current_time = datetime.now()
+            check_sun(lat, lon, *equatorial_to_horizontal_batch(ra, dec, lat, lon, current_time))
+            registry.set_target(mount_id, ra, dec, lat, lon, current_time)
+        else:
+            az = float(data.get('az'))
+            alt = float(data.get('alt'))
+            check_sun(optional_float(data, 'lat', mount.lat), optional_float(data, 'lon', mount.lon), az, alt)
+            registry.set_target(mount_id, az, alt, coordinate_type='horizontal')
+        return jsonify({"success": True, "message": f"望远镜 {mount_id} 已启动"})
+    except Exception as e:
+        logging.error(f"望远镜 {mount_id} 启动错误: {e}")
+        return jsonify({"success": False, "message": f"错误: {str(e)}"})
+
+@app.route('/mounts/<mount_id>/stop', methods=['POST'])
+def stop_mount(mount_id):
+    """停止单台望远镜"""
+    if mount_id not in registry.mounts:
+        return jsonify({"success": False, "message": f"望远镜 {mount_id} 不存在"}), 404
+    latency = registry.stop(mount_id)
+    return jsonify({"success": True, "message": f"望远镜 {mount_id} 已停止",
+                    "stop_latency_ms": round(latency * 1000, 2)})
 
 if __name__ == '__main__':
     try:
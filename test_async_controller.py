@@ -0,0 +1,171 @@
+import io
+import asyncio
+import threading
+import unittest
+import contextlib
+from axis_control import AxisController
+from gyroscope import VirtualGyroscope
+from transform_control import TelescopeController
+from async_controller import AsyncTelescopeEngine, AsyncEngineHost
+
+
+class TestAsyncController(unittest.TestCase):
+    def _controller(self):
+        return TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+
+    def test_many_engines_one_loop(self):
+        """一个事件循环同时驱动多台设备到达各自目标"""
+        async def run():
+            controllers = [self._controller() for _ in range(3)]
+            engines = [AsyncTelescopeEngine(c) for c in controllers]
+            for engine in engines:
+                await engine.start()
+            telemetry = engines[0].subscribe()
+            for i, engine in enumerate(engines):
+                await engine.set_target(3 + i, 22 + i, coordinate_type='horizontal')
+            for _ in range(400):
+                if all(e.state == AsyncTelescopeEngine.ARRIVED for e in engines):
+                    break
+                await asyncio.sleep(0.01)
+            states = [e.state for e in engines]
+            positions = [c.gyro.get_current_attitude() for c in controllers]
+            samples = telemetry.qsize()
+            for engine in engines:
+                await engine.shutdown()
+            return states, positions, samples
+
+        states, positions, samples = asyncio.run(run())
+        self.assertEqual(states, [AsyncTelescopeEngine.ARRIVED] * 3)
+        for i, (az, alt) in enumerate(positions):
+            self.assertAlmostEqual(az, 3 + i, delta=1.5)
+            self.assertAlmostEqual(alt, 22 + i, delta=1.5)
+        self.assertGreater(samples, 0)
+
+    def test_host_handle(self):
+        """同步句柄：运动中切换目标与停止"""
+        host = AsyncEngineHost()
+        controller = self._controller()
+        handle = host.add(controller)
+        try:
+            handle.set_target(180, 80, coordinate_type='horizontal')
+            self.assertFalse(handle.wait(0.1))
+            self.assertEqual(handle.state, AsyncTelescopeEngine.SLEWING)
+            latency = handle.stop()
+            self.assertLess(latency, 0.05)
+            self.assertEqual(handle.control_loop(), 2)
+            # 停止后各轴状态机复位，不保留转动方向和脉冲状态
+            for axis in controller.axes.values():
+                self.assertNotIn(axis.state, (AxisController.SLEWING, AxisController.PULSING))
+
+            handle.set_target(4, 24, coordinate_type='horizontal')
+            self.assertTrue(handle.wait(10))
+            self.assertEqual(handle.control_loop(), 0)
+        finally:
+            handle.shutdown()
+            host.close()
+
+    def test_stop_with_stuck_write(self):
+        """I/O线程阻塞在串口写入中时，停止请求在stop_deadline后由调用线程绕过写入锁发出"""
+        host = AsyncEngineHost()
+        controller = self._controller()
+        handle = host.add(controller, stop_deadline=0.02)
+        handle.engine.blocking_writes = True
+        stuck = threading.Event()
+        release = threading.Event()
+        sent = []
+        original = controller._transmit
+
+        def transmit(cmd):
+            sent.append(cmd)
+            original(cmd)
+        controller._transmit = transmit
+
+        def hang(cmd):
+            with controller._send_lock:
+                stuck.set()
+                release.wait()
+                controller._transmit(cmd)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                handle.set_target(180, 80, coordinate_type='horizontal')
+                controller.send_command = hang
+                self.assertTrue(stuck.wait(1.0))
+                latency = handle.stop()
+                self.assertLess(latency, 0.2)
+                self.assertEqual(sent[-1], "\nAZ0EL0\n")
+                self.assertEqual(handle.state, AsyncTelescopeEngine.STOPPED)
+                self.assertEqual(handle.control_loop(), 2)
+                release.set()
+        finally:
+            release.set()
+            handle.shutdown()
+            host.close()
+
+    def test_stale_samples_and_errors(self):
+        """姿态过期时只发送一次停止命令；控制异常时以错误结束（control_loop返回1）"""
+        async def run():
+            controller = self._controller()
+            engine = AsyncTelescopeEngine(controller, max_sample_age=0.05)
+            sent = []
+            original = controller.send_command
+
+            def record(cmd):
+                sent.append(cmd)
+                original(cmd)
+            controller.send_command = record
+            await engine.start()
+            await engine.set_target(180, 80, coordinate_type='horizontal')
+            await asyncio.sleep(0.1)
+            # 传感器停止更新
+            engine._tasks[0].cancel()
+            await asyncio.sleep(0.2)
+            stale_stops = sent[-1], sent.count("AZ0EL0\n")
+            await asyncio.sleep(0.1)
+            stale_stops += (sent.count("AZ0EL0\n"),)
+
+            def fail(*args, **kwargs):
+                raise RuntimeError("模拟控制异常")
+            controller.compute_command = fail
+            # 采样时刻设为无穷大，使采样一直有效，控制周期进入compute_command
+            engine.sample_time = float('inf')
+            engine.attitude = (0.0, 45.0)
+            await asyncio.sleep(0.05)
+            result = engine.state, engine.error
+            await engine.shutdown()
+            return stale_stops, result
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            (last, count, later), (state, error) = asyncio.run(run())
+        self.assertEqual(last, "AZ0EL0\n")
+        self.assertEqual(count, later)
+        self.assertEqual(state, AsyncTelescopeEngine.ERROR)
+        self.assertIn("模拟控制异常", error)
+
+    def test_stale_flag_keeps_sample_time(self):
+        """阻塞式陀螺仪返回带过期标志的旧角度时不刷新采样时刻"""
+        class StaleGyroscope(VirtualGyroscope):
+            stale = False
+
+            def is_stale(self):
+                return self.stale
+
+        async def run():
+            gyro = StaleGyroscope()
+            engine = AsyncTelescopeEngine(TelescopeController(gyro=gyro, simulation=True), blocking_sensor=True)
+            await engine.start()
+            await asyncio.sleep(0.05)
+            fresh = engine.sample_time
+            gyro.stale = True
+            await asyncio.sleep(0.05)
+            frozen = engine.sample_time
+            await engine.shutdown()
+            return fresh, frozen
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            fresh, frozen = asyncio.run(run())
+        self.assertGreater(fresh, 0.0)
+        self.assertLess(frozen - fresh, 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
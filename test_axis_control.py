@@ -0,0 +1,124 @@
+import io
+import time
+import unittest
+import contextlib
+from axis_control import CoastEstimator, AxisController, AxisFault
+from gyroscope import InertialVirtualGyroscope, VirtualGyroscope, parse_relay_command
+from transform_control import TelescopeController
+
+
+class TestAxisControl(unittest.TestCase):
+    def test_coast_estimator(self):
+        """整速停止只能估计合计刹车距离；不同转速的样本可以区分延迟和滑行距离"""
+        estimator = CoastEstimator(latency=0.05)
+        for _ in range(3):
+            estimator.observe(30.0, 2.4)
+        self.assertAlmostEqual(estimator.predict(30.0), 2.4)
+
+        estimator = CoastEstimator(latency=0.0)
+        for speed in (5.0, 10.0, 20.0, 30.0):
+            estimator.observe(speed, 0.03 * speed + 0.5)
+        self.assertAlmostEqual(estimator.latency, 0.03)
+        self.assertAlmostEqual(estimator.coast, 0.5)
+
+    def test_braking_reaches_target_in_one_approach(self):
+        """学习刹车距离后，一次接近即停在容差内，每轴只动作一次继电器"""
+        gyro = InertialVirtualGyroscope(speed=30.0, latency=0.03, acceleration=300.0, deceleration=300.0)
+        controller = TelescopeController(gyro=gyro, simulation=True, braking=True)
+        targets = [(40.0, 50.0), (10.0, 30.0), (60.0, 70.0)]
+        for i, (az, alt) in enumerate(targets):
+            toggles = controller.relay_toggles()
+            controller.set_target(az, alt, coordinate_type='horizontal')
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(controller.control_loop(), 0)
+            time.sleep(0.2)
+            current_az, current_alt = gyro.get_current_attitude()
+            self.assertLess(abs(current_az - az), 0.5)
+            self.assertLess(abs(current_alt - alt), 0.5)
+            if i > 0:
+                # 每轴：启动 + 提前松开
+                self.assertLessEqual(controller.relay_toggles() - toggles, 4)
+        # 惯性仿真的合计刹车距离：延迟 0.03s×30°/s + 滑行 30²/(2×300)
+        coast = controller.axes['az'].coast
+        self.assertAlmostEqual(coast.predict(30.0), 2.4, delta=0.3)
+
+
+    def test_axis_holds_independently(self):
+        """到位的轴自行停止并保持，保持带内的漂移不会重新启动，且只按保持周期检查"""
+        az = AxisController('方位', tolerance=1.0, braking=False, hold_period=0.1)
+        alt = AxisController('高度', tolerance=1.0, braking=False)
+        az.set_goal(10.0)
+        alt.set_goal(60.0)
+        self.assertEqual(az.update(0.0, 0.0), 1)
+        self.assertEqual(alt.update(20.0, 0.0), 1)
+        self.assertEqual(az.update(9.5, 1.0), 0)
+        self.assertTrue(az.is_holding())
+        self.assertEqual(alt.update(30.0, 1.0), 1)
+        # 保持带（2倍容差）内漂移：不动作
+        self.assertEqual(az.update(11.5, 1.2), 0)
+        # 超出保持带，但未到检查时刻
+        self.assertEqual(az.update(13.0, 1.25), 0)
+        self.assertEqual(az.update(13.0, 1.31), -1)
+        self.assertEqual(az.state, AxisController.SLEWING)
+
+    def test_faults_are_reported(self):
+        """目标超限和转动停滞以AxisFault报告，控制循环返回失败而不是退出进程"""
+        axis = AxisController('高度', limits=(20.0, 90.0))
+        with self.assertRaises(AxisFault):
+            axis.set_goal(95.0)
+        self.assertTrue(axis.is_fault())
+        axis.set_goal(90.3)  # 容差内的越限按限位处理
+        self.assertEqual(axis.goal, 90.0)
+
+        class StuckGyroscope(VirtualGyroscope):
+            def process_command(self, cmd):
+                pass
+
+        axes = {'az': AxisController('方位', braking=False, stall_timeout=0.2),
+                'alt': AxisController('高度', braking=False, limits=(20.0, 90.0), stall_timeout=0.2)}
+        controller = TelescopeController(gyro=StuckGyroscope(), simulation=True, axes=axes)
+        controller.set_target(30.0, 40.0, coordinate_type='horizontal')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(controller.control_loop(), 1)
+        status = controller.axis_status()
+        self.assertEqual(status['az']['state'], AxisController.FAULT)
+        self.assertIn('方位轴故障', status['az']['fault'])
+        self.assertEqual(status['alt']['direction'], 0)
+
+
+    def test_timed_pulse_commands(self):
+        """定时脉冲一次发送，执行期间命令省略该轴，由仿真固件按时长自动停止"""
+        self.assertEqual(parse_relay_command("AZ1T120EL0\n"), {'AZ': (1, 0.12), 'EL': (0, None)})
+        self.assertEqual(parse_relay_command("EL2\n"), {'EL': (-1, None)})
+
+        gyro = InertialVirtualGyroscope(speed=30.0, latency=0.03, acceleration=300.0, deceleration=300.0)
+        gyro.process_command("AZ1T100EL0\n")
+        time.sleep(0.3)
+        # 延迟后以300°/s²加速0.1秒：约1.5°，松开后再滑行约1.5°
+        az, _ = gyro.get_current_attitude()
+        self.assertAlmostEqual(az, 3.0, delta=0.3)
+
+        controller = TelescopeController(gyro=gyro, simulation=True, braking=True, timed_pulses=True)
+        sent = []
+        send = controller.send_command
+        controller.send_command = lambda cmd: (sent.append(cmd), send(cmd))
+        for az, alt in [(40.0, 50.0), (20.0, 35.0)]:
+            controller.set_target(az, alt, coordinate_type='horizontal')
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(controller.control_loop(), 0)
+            time.sleep(0.2)
+            current_az, current_alt = gyro.get_current_attitude()
+            self.assertLess(abs(current_az - az), 0.5)
+            self.assertLess(abs(current_alt - alt), 0.5)
+        pulses = [cmd for cmd in sent if 'T' in cmd]
+        self.assertTrue(pulses)
+        for cmd in pulses:
+            index = sent.index(cmd)
+            axis = 'AZ' if 'AZ' in cmd and 'T' in cmd.split('EL')[0] else 'EL'
+            # 脉冲之后的下一条命令不包含该轴
+            if index + 1 < len(sent):
+                self.assertNotIn(axis, sent[index + 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_all_cases_run(self):
+        """所有用例都能离线运行"""
+        results = benchmark.run(repeat=1)
+        self.assertEqual(set(results), set(benchmark.BENCHMARKS))
+        for result in results.values():
+            self.assertGreater(result["seconds"], 0)
+
+    def test_regression_detected(self):
+        """比基准慢超过阈值时报告退化，基准文件可以保存和读取"""
+        results = {"decode_angles": {"seconds": 2e-6, "ops_per_second": 5e5},
+                   "new_case": {"seconds": 1e-3, "ops_per_second": 1e3}}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            benchmark.save_baseline({"decode_angles": {"seconds": 1e-6, "ops_per_second": 1e6}}, path)
+            baseline = benchmark.load_baseline(path)
+        report = {name: (ratio, regressed) for name, ratio, regressed in benchmark.compare(results, baseline, 0.5)}
+        self.assertAlmostEqual(report["decode_angles"][0], 2.0)
+        self.assertTrue(report["decode_angles"][1])
+        self.assertEqual(report["new_case"], (None, False))
+        report = benchmark.compare(results, baseline, 1.5)
+        self.assertFalse(report[0][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from slew_planner import CableWrap
+from transform_control import TelescopeController
+from gyroscope import VirtualGyroscope
+
+
+class TestCableWrap(unittest.TestCase):
+    def test_unwrap_tracking(self):
+        """跨越0°/360°时展开方位角连续变化"""
+        wrap = CableWrap()
+        self.assertAlmostEqual(wrap.update(350.0), -10.0)
+        self.assertAlmostEqual(wrap.update(5.0), 5.0)
+        for az in (100.0, 200.0, 300.0, 40.0):
+            wrap.update(az)
+        self.assertAlmostEqual(wrap.unwrapped, 400.0)
+
+    def test_plan_prefers_shortest_within_limits(self):
+        """最短方向优先，超出限位时反向退缠"""
+        wrap = CableWrap(-270.0, 270.0, start=0.0)
+        self.assertAlmostEqual(wrap.plan(350.0), -10.0)
+        self.assertAlmostEqual(wrap.plan(90.0), 90.0)
+
+        wrap = CableWrap(-270.0, 270.0, start=250.0)
+        # 最短方向需要到290°，超过上限，改为逆时针转到-70°
+        self.assertAlmostEqual(wrap.plan(290.0), -70.0)
+
+        with self.assertRaises(ValueError):
+            CableWrap(-90.0, 90.0, start=0.0).plan(180.0)
+
+    def test_restore_after_restart(self):
+        """展开方位角保存到文件，重新创建后按保存的圈数接续，不再换算到 (-180, 180]"""
+        path = os.path.join(tempfile.mkdtemp(), 'cable_wrap.json')
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+        wrap = CableWrap.load(path)
+        self.assertIsNone(wrap.unwrapped)
+        for az in (0.0, 90.0, 180.0, 250.0):
+            wrap.update(az)
+        self.assertAlmostEqual(wrap.unwrapped, 250.0)
+
+        restored = CableWrap.load(path, -270.0, 270.0)
+        self.assertAlmostEqual(restored.unwrapped, 250.0)
+        self.assertAlmostEqual(restored.update(252.0), 252.0)
+        # 最短方向会超过上限：反向退缠
+        self.assertAlmostEqual(restored.plan(300.0), -60.0)
+
+        # 小于save_step的变化不写文件；控制器关闭时保存最终状态
+        restored.update(254.0)
+        self.assertAlmostEqual(CableWrap.load(path).unwrapped, 250.0)
+        restored.save()
+        self.assertAlmostEqual(CableWrap.load(path).unwrapped, 254.0)
+
+    def test_controller_turns_short_way(self):
+        """目标在当前方位的逆时针方向附近时逆时针转动，不再绕一整圈"""
+        gyro = VirtualGyroscope()
+        gyro.current_az = 10.0
+        commands = []
+        controller = TelescopeController(gyro=gyro, simulation=True)
+        original = controller.send_command
+
+        def record(cmd):
+            commands.append(cmd)
+            original(cmd)
+
+        controller.send_command = record
+        controller.set_target(345.5, 20.0, coordinate_type='horizontal')
+        self.assertEqual(controller.control_loop(), 0)
+        self.assertTrue(commands[0].startswith("AZ2"))
+        self.assertFalse(any(cmd.startswith("AZ1") for cmd in commands))
+        self.assertAlmostEqual(controller.cable_wrap.unwrapped, -14.5, delta=1.5)
+        az, _ = gyro.get_current_attitude()
+        self.assertAlmostEqual(az, 345.5, delta=1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
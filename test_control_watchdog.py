@@ -0,0 +1,112 @@
+import io
+import time
+import threading
+import unittest
+import contextlib
+from gyroscope import VirtualGyroscope
+from transform_control import TelescopeController
+from controller_service import ControllerService
+from control_watchdog import ControlWatchdog
+from axis_control import AxisController
+
+
+class HangingGyroscope(VirtualGyroscope):
+    """hang置位后读取一直阻塞到release置位，模拟卡住的传感器读取"""
+    def __init__(self):
+        super().__init__()
+        self.hang = threading.Event()
+        self.release = threading.Event()
+
+    def get_current_attitude(self):
+        if self.hang.is_set():
+            self.release.wait()
+        return super().get_current_attitude()
+
+
+class TestControlWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.gyro = HangingGyroscope()
+        self.controller = TelescopeController(gyro=self.gyro, simulation=True)
+        # 记录每条命令实际写出的时刻（包括看门狗绕过写入锁的停止命令）
+        self.writes = []
+        transmit = self.controller._transmit
+
+        def record(cmd):
+            transmit(cmd)
+            self.writes.append((time.monotonic(), cmd))
+        self.controller._transmit = record
+        self.addCleanup(self.gyro.release.set)
+
+    def test_stop_latency_when_sensor_hangs(self):
+        """运动中传感器读取卡住：看门狗在期限内发出停止命令，控制线程恢复后不再发出运动命令"""
+        deadline = 0.1
+        service = ControllerService(self.controller, watchdog_deadline=deadline)
+        service.start()
+        self.addCleanup(service.shutdown)
+        with contextlib.redirect_stdout(io.StringIO()):
+            service.set_target(180, 80, coordinate_type='horizontal')
+            time.sleep(0.1)
+            self.assertEqual(service.state, ControllerService.SLEWING)
+            self.assertTrue(self.controller.relays_active)
+
+            self.gyro.hang.set()
+            self.assertTrue(service.wait(2.0))
+            heartbeat = self.controller.last_heartbeat
+            stop_time = next(t for t, cmd in self.writes if t > heartbeat and cmd.strip() == "AZ0EL0")
+            # 端到端：最后一次控制决策到停止命令写出
+            latency = stop_time - heartbeat
+            self.assertLess(latency, deadline + 0.05)
+            self.assertGreater(latency, deadline / 2)
+            self.assertEqual(service.state, ControllerService.ERROR)
+            self.assertIn("看门狗", service.error)
+            self.assertFalse(self.controller.relays_active)
+            trip = service.watchdog.trips[-1]
+            self.assertAlmostEqual(trip['latency'], latency, delta=0.01)
+
+            self.gyro.release.set()
+            self.gyro.hang.clear()
+            time.sleep(0.05)
+            moves = [cmd for t, cmd in self.writes if t > stop_time and cmd.strip() != "AZ0EL0"]
+            self.assertEqual(moves, [])
+            # 各轴状态机由恢复后的控制线程复位，看门狗线程不修改
+            for axis in self.controller.axes.values():
+                self.assertNotIn(axis.state, (AxisController.SLEWING, AxisController.PULSING))
+
+            # 新目标照常执行
+            service.set_target(5, 23, coordinate_type='horizontal')
+            self.assertTrue(service.wait(10))
+        self.assertEqual(service.state, ControllerService.ARRIVED)
+
+    def test_trip_conditions(self):
+        """只在继电器吸合时检查；心跳或姿态超时都会触发，写入锁被占用时不等待"""
+        watchdog = ControlWatchdog(self.controller, deadline=0.1, max_attitude_age=0.3)
+        now = time.monotonic()
+        self.controller.last_heartbeat = self.controller.last_attitude_time = now - 1.0
+        self.assertIsNone(watchdog.check(now))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.controller.send_command("AZ1EL0\n")
+            self.controller.last_heartbeat = self.controller.last_attitude_time = now
+            self.assertIsNone(watchdog.check(now + 0.05))
+            self.assertIn("心跳", watchdog.check(now + 0.08))
+            self.assertTrue(self.controller.stop_requested.is_set())
+            self.assertEqual(self.controller.relay_state, {'AZ': 0, 'EL': 0})
+
+            self.controller.send_command("EL1T120\n")
+            self.controller.last_heartbeat = now + 0.25
+            self.assertIn("姿态", watchdog.check(now + 0.3))
+
+            # 控制线程卡在串口写入中（持有写入锁）
+            self.controller.send_command("AZ2\n")
+            holder = threading.Thread(target=self.controller._send_lock.acquire)
+            holder.start()
+            holder.join()
+            start = time.monotonic()
+            self.assertIsNotNone(watchdog.check(now + 10.0))
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(self.writes[-1][1], "\nAZ0EL0\n")
+        self.assertEqual(len(watchdog.trips), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
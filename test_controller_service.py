@@ -0,0 +1,117 @@
+import io
+import time
+import threading
+import unittest
+import contextlib
+from gyroscope import VirtualGyroscope
+from transform_control import TelescopeController
+from controller_service import ControllerService
+
+
+class SlowGyroscope(VirtualGyroscope):
+    """读取姿态很慢的虚拟陀螺仪，模拟阻塞的传感器读取"""
+    def get_current_attitude(self):
+        time.sleep(0.2)
+        return super().get_current_attitude()
+
+
+class TestControllerService(unittest.TestCase):
+    def setUp(self):
+        self.gyro = VirtualGyroscope()
+        self.controller = TelescopeController(gyro=self.gyro, simulation=True)
+        self.commands = []
+        original = self.controller.send_command
+
+        def record(cmd):
+            self.commands.append(cmd)
+            original(cmd)
+        self.controller.send_command = record
+
+        self.service = ControllerService(self.controller)
+        self.service.start()
+
+    def tearDown(self):
+        self.service.shutdown()
+
+    def test_reach_target(self):
+        """常驻线程驱动到达目标"""
+        self.service.set_target(5, 23, coordinate_type='horizontal')
+        self.assertTrue(self.service.wait(10))
+        self.assertEqual(self.service.state, ControllerService.ARRIVED)
+        self.assertEqual(self.service.control_loop(), 0)
+        az, alt = self.gyro.get_current_attitude()
+        self.assertAlmostEqual(az, 5, delta=1.5)
+        self.assertAlmostEqual(alt, 23, delta=1.5)
+
+    def test_retarget_in_flight(self):
+        """运动中切换目标无需重建控制器"""
+        self.service.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.1)
+        self.assertEqual(self.service.state, ControllerService.SLEWING)
+        self.service.set_target(3, 22, coordinate_type='horizontal')
+        self.assertTrue(self.service.wait(10))
+        self.assertEqual(self.controller.target_azimuth, 3)
+        self.assertEqual(self.service.state, ControllerService.ARRIVED)
+
+    def test_stop_latency(self):
+        """停止请求在下一个周期前发出，并记录延迟"""
+        self.service.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.1)
+        latency = self.service.stop()
+        self.assertLess(latency, 0.05)
+        self.assertEqual(self.service.state, ControllerService.STOPPED)
+        self.assertEqual(self.commands[-1], "AZ0EL0\n")
+
+        # 停止后不再发出运动命令
+        count = len(self.commands)
+        time.sleep(0.05)
+        self.assertEqual(len(self.commands), count)
+
+    def test_stop_during_blocking_read(self):
+        """控制线程阻塞在传感器读取时，停止延迟仍受stop_deadline约束"""
+        self.service.shutdown()
+        self.gyro = SlowGyroscope()
+        self.controller.gyro = self.gyro
+        self.service = ControllerService(self.controller, stop_deadline=0.02)
+        self.service.start()
+        self.service.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.05)
+        latency = self.service.stop()
+        self.assertLess(latency, 0.1)
+        # 读取完成后控制线程也不会重新发出运动命令
+        time.sleep(0.3)
+        self.assertEqual(self.commands[-1], "AZ0EL0\n")
+
+    def test_stop_during_stuck_write(self):
+        """控制线程卡在串口写入中（持有写入锁）时，停止请求仍在有限时间内返回并绕过写入锁发出停止命令"""
+        writes = []
+        transmit = self.controller._transmit
+
+        def record(cmd):
+            transmit(cmd)
+            writes.append(cmd)
+        self.controller._transmit = record
+
+        locked, release = threading.Event(), threading.Event()
+
+        def stuck_write():
+            with self.controller._send_lock:
+                locked.set()
+                release.wait()
+        holder = threading.Thread(target=stuck_write)
+        holder.start()
+        self.addCleanup(holder.join)
+        self.addCleanup(release.set)
+        locked.wait()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.monotonic()
+            latency = self.service.stop()
+        self.assertLess(time.monotonic() - start, 0.2)
+        self.assertLess(latency, 0.2)
+        self.assertEqual(writes[-1], "\nAZ0EL0\n")
+        self.assertEqual(self.service.state, ControllerService.STOPPED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import io
+import time
+import unittest
+import contextlib
+from unittest import mock
+import gyroscope
+from gyroscope import (RealGyroscope, RoundTripTimer, StaleSampleError, VirtualGyroscope, BAUD_REGISTER, BAUD_CODES,
+                       CALIBRATION_COMMANDS, CalibrationJob)
+from transform_control import TelescopeController
+from slew_planner import CableWrap
+
+
+class FakeDevice:
+    """模拟陀螺仪：按脚本返回结果，波特率与客户端一致时才应答；写入校准命令若干次读取后读数归零"""
+    def __init__(self, baudrate=4800, accepts_baudrate=True, calibrates=True, calibration_reads=3):
+        self.baudrate = baudrate
+        self.accepts_baudrate = accepts_baudrate
+        self.calibrates = calibrates
+        self.calibration_reads = calibration_reads
+        self.script = []        # 依次返回的读取结果：寄存器列表或异常
+        self.registers = [10, 455, 1200]
+        self.reads = 0
+        self.writes = []
+
+    def client(self, port, baudrate, timeout, retries, **kwargs):
+        device = self
+
+        class Response:
+            def __init__(self, registers):
+                self.registers = registers
+
+            def isError(self):
+                return False
+
+        class Client:
+            def __init__(self):
+                self.baudrate = baudrate
+                self.comm_params = mock.Mock(timeout_connect=timeout)
+
+            def connect(self):
+                return True
+
+            def close(self):
+                pass
+
+            def read_holding_registers(self, address, *, count=1, device_id=1, no_response_expected=False):
+                if self.baudrate != device.baudrate:
+                    raise IOError("无应答")
+                device.reads += 1
+                result = device.script.pop(0) if device.script else device.registers
+                if isinstance(result, Exception):
+                    raise result
+                return Response(result)
+
+            def write_register(self, address, value, *, device_id=1, no_response_expected=False):
+                device.writes.append((address, value))
+                if (address, value) in CALIBRATION_COMMANDS.values():
+                    if device.calibrates:
+                        # 读数在若干次读取后才回到零点
+                        device.script = [list(device.registers)] * device.calibration_reads
+                        if (address, value) == CALIBRATION_COMMANDS['xy']:
+                            device.registers = [0, 0, device.registers[2]]
+                        else:
+                            device.registers = device.registers[:2] + [0]
+                    return Response([])
+                if address == BAUD_REGISTER and device.accepts_baudrate:
+                    device.baudrate = {code: rate for rate, code in BAUD_CODES.items()}[value]
+                raise IOError("切换波特率后无应答")
+
+        return Client()
+
+
+class TestRealGyroscope(unittest.TestCase):
+    def create(self, device, **kwargs):
+        # 协商波特率时会重新创建客户端，测试期间保持替换
+        patcher = mock.patch.object(gyroscope, 'ModbusSerialClient', device.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return RealGyroscope(port='/dev/null', **kwargs)
+
+    def test_retry_and_stale_flag(self):
+        """读取失败时重试；重试仍失败则沿用上次有效数据并标记过期，不返回0值"""
+        device = FakeDevice()
+        gyro = self.create(device, retries=2)
+        device.script = [IOError("CRC错误"), IOError("CRC错误")]
+        self.assertEqual(gyro.get_current_attitude(), (120.0, 45.5))
+        self.assertFalse(gyro.is_stale())
+        self.assertEqual(gyro.error_count, 2)
+
+        device.script = [IOError("超时")] * 3
+        self.assertEqual(gyro.get_current_attitude(), (120.0, 45.5))
+        self.assertTrue(gyro.is_stale())
+
+        device = FakeDevice()
+        gyro = self.create(device, retries=1)
+        device.script = [IOError("超时")] * 2
+        with self.assertRaises(StaleSampleError):
+            gyro.read_angles()
+
+        # 程序错误（如客户端参数不匹配）不当作读取失败重试，直接抛出
+        device.script = [TypeError("unexpected keyword argument")]
+        with self.assertRaises(TypeError):
+            gyro.read_angles()
+        self.assertEqual(gyro.read_count, 3)
+
+    def test_round_trip_timeout(self):
+        """超时按往返时间收紧，超时后加倍退避"""
+        timer = RoundTripTimer(initial=1.0, minimum=0.05, maximum=1.0)
+        for _ in range(20):
+            timer.observe(0.03)
+        self.assertLess(timer.timeout, 0.1)
+        self.assertGreaterEqual(timer.timeout, 0.05)
+        previous = timer.timeout
+        self.assertAlmostEqual(timer.backoff(), 2 * previous)
+
+    def test_negotiate_baudrate(self):
+        """写入波特率寄存器后以新波特率读回验证，失败时恢复原波特率"""
+        device = FakeDevice()
+        gyro = self.create(device, target_baudrate=115200)
+        self.assertEqual(gyro.baudrate, 115200)
+        self.assertEqual(gyro.client.baudrate, 115200)
+        self.assertEqual(gyro.read_angles(), (1.0, 45.5, 120.0))
+
+        device = FakeDevice(accepts_baudrate=False)
+        gyro = self.create(device)
+        self.assertFalse(gyro.negotiate_baudrate(115200))
+        self.assertEqual(gyro.baudrate, 4800)
+        with self.assertRaises(ValueError):
+            gyro.negotiate_baudrate(12345)
+
+    def test_background_calibration(self):
+        """校准在后台执行：写入说明书规定的命令后读回确认，期间暂停采样且不阻塞调用方"""
+        device = FakeDevice()
+        gyro = self.create(device)
+        self.assertEqual(gyro.get_current_attitude(), (120.0, 45.5))
+        start = time.monotonic()
+        job = gyro.start_calibration('xy', interval=0.02, timeout=2.0)
+        self.assertLess(time.monotonic() - start, 0.02)
+        self.assertTrue(job.active)
+        # 校准期间沿用校准前的数据，不访问总线
+        reads = device.reads
+        self.assertEqual(gyro.get_current_attitude(), (120.0, 45.5))
+        self.assertTrue(gyro.is_stale())
+        self.assertTrue(job.wait(2.0))
+        self.assertEqual(job.state, CalibrationJob.SUCCEEDED)
+        self.assertEqual(device.writes, [(0x0053, 0x0067)])
+        # 读数回到零点之前不确认
+        self.assertGreaterEqual(device.reads - reads, device.calibration_reads + 3)
+        self.assertEqual(job.to_dict()["progress"], 1.0)
+        self.assertEqual(gyro.get_current_attitude(), (120.0, 0.0))
+        self.assertFalse(gyro.is_stale())
+
+        self.assertTrue(gyro.calibrate_z())
+        self.assertEqual(device.writes[-1], (0x0054, 0x0052))
+        self.assertEqual(gyro.get_current_attitude(), (0.0, 0.0))
+
+        # 读数始终没有回到零点：超时失败并恢复采样
+        device = FakeDevice(calibrates=False)
+        gyro = self.create(device)
+        job = CalibrationJob(gyro, 'xy', timeout=0.1, interval=0.02)
+        self.assertFalse(job.run())
+        self.assertEqual(job.state, CalibrationJob.FAILED)
+        self.assertIn("未确认", job.message)
+        self.assertFalse(gyro.calibrating)
+        with self.assertRaises(ValueError):
+            gyro.start_calibration('yz')
+
+    def test_z_calibration_shifts_cable_wrap(self):
+        """Z轴校准成功后在恢复采样之前按方位读数的跳变量平移展开方位角；读不到校准前读数时不校准"""
+        device = FakeDevice()
+        gyro = self.create(device)
+        cable_wrap = CableWrap(start=120.0 - 360.0)
+        job = CalibrationJob(gyro, 'z', interval=0.02, timeout=2.0,
+                             on_success=lambda job: cable_wrap.shift(job.offset))
+        self.assertTrue(job.run())
+        self.assertEqual(job.before[2], 120.0)
+        self.assertEqual(job.offset, -120.0)
+        self.assertEqual(cable_wrap.unwrapped, -360.0)
+        self.assertEqual(cable_wrap.update(gyro.get_current_attitude()[0]), -360.0)
+
+        device = FakeDevice()
+        device.script = [IOError("无应答")]
+        gyro = self.create(device)
+        job = CalibrationJob(gyro, 'z', interval=0.02, timeout=2.0)
+        self.assertFalse(job.run())
+        self.assertIn("校准前", job.message)
+        self.assertEqual(device.writes, [])
+
+    def test_controller_stops_on_stale_samples(self):
+        """数据过期时控制器松开继电器等待，过期时间过长则控制失败"""
+        class StaleGyroscope(VirtualGyroscope):
+            def is_stale(self):
+                return True
+
+        controller = TelescopeController(gyro=StaleGyroscope(), simulation=True)
+        controller.max_stale_time = 0.1
+        sent = []
+        controller.send_command = sent.append
+        controller.set_target(30.0, 40.0, coordinate_type='horizontal')
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(controller.control_loop(), 1)
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertTrue(sent)
+        self.assertTrue(all(cmd == "AZ0EL0\n" for cmd in sent))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import time
+import tempfile
+import unittest
+from datetime import date
+import numpy as np
+from horizon_mask import HorizonMask
+from gyroscope import VirtualGyroscope, parse_relay_command
+from transform_control import TelescopeController
+from satellite import SatelliteEphemeris
+from axis_control import AxisFault
+from visibility import VisibilityPlanner
+
+MASK_TEXT = """# 地平轮廓：北方低、南方有一排树
+0, 20
+180, 30
+# 东侧建筑 方位30~60° 遮挡到45°
+30 60 0 45
+# 跨越0°的屋檐，遮挡高度60~70°
+350 10 60 70
+"""
+
+
+class TestHorizonMask(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(MASK_TEXT)
+        self.addCleanup(os.remove, self.path)
+        self.mask = HorizonMask.load(self.path)
+
+    def test_lookup(self):
+        """轮廓、矩形区域和下限都写入网格，单点与批量查询一致"""
+        mask = self.mask
+        self.assertTrue(mask.is_visible(90.0, 30.0))
+        self.assertFalse(mask.is_visible(45.0, 40.0))
+        self.assertTrue(mask.is_visible(45.0, 46.0))
+        self.assertFalse(mask.is_visible(180.0, 29.0))
+        self.assertFalse(mask.is_visible(270.0, 15.0))
+        self.assertFalse(mask.is_visible(355.0, 65.0))
+        self.assertFalse(mask.is_visible(365.0, 65.0))
+        self.assertTrue(mask.is_visible(355.0, 75.0))
+        self.assertTrue(mask.is_visible(355.0, 30.0))
+
+        az = np.random.default_rng(0).uniform(0, 360, 500)
+        alt = np.random.default_rng(1).uniform(-5, 90, 500)
+        expected = [mask.is_visible(a, h) for a, h in zip(az, alt)]
+        np.testing.assert_array_equal(mask.visible(az, alt), expected)
+
+        self.assertAlmostEqual(float(mask.horizon(45.0)), 45.0)
+        self.assertAlmostEqual(float(mask.horizon(355.0)), 20.5, delta=0.5)
+        # 绕行高度：越过建筑顶部并留出余量；从屋檐下出发时先升出屋檐
+        self.assertAlmostEqual(mask.detour_altitude(0.0, 25.0, 90.0, 30.0), 46.75)
+        self.assertAlmostEqual(mask.detour_altitude(340.0, 25.0, 380.0, 25.0), 25.25)
+        self.assertAlmostEqual(mask.detour_altitude(0.0, 65.0, 90.0, 30.0), 71.75)
+        wall = HorizonMask()
+        wall.add_region(100.0, 110.0, 50.0, 90.0)
+        self.assertEqual(wall.detour_altitude(90.0, 60.0, 120.0, 60.0), float('inf'))
+        self.assertEqual(wall.detour_altitude(90.0, 30.0, 120.0, 60.0), float('inf'))
+
+    def test_controller_refuses_and_reroutes(self):
+        """被遮挡的目标拒绝设置；直线路径穿过建筑时先升高绕行"""
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True, horizon=self.mask)
+        with self.assertRaises(ValueError):
+            controller.set_target(45.0, 30.0, coordinate_type='horizontal')
+        with self.assertRaises(ValueError):
+            controller.set_target(90.0, 10.0, coordinate_type='horizontal')
+
+        controller.gyro.current_az, controller.gyro.current_alt = 0.0, 25.0
+        controller.set_target(90.0, 30.0, coordinate_type='horizontal')
+        self.assertEqual(len(controller.route), 3)
+
+        # 按命令积分位置，检查实际经过的位置都可见
+        az, alt, now = 0.0, 25.0, 0.0
+        for _ in range(2000):
+            reached, cmd = controller.compute_command(az, alt, now)
+            if reached:
+                break
+            fields = parse_relay_command(cmd)
+            az += fields.get('AZ', (0, None))[0] * 0.5
+            alt += fields.get('EL', (0, None))[0] * 0.5
+            now += 0.05
+            self.assertTrue(self.mask.is_visible(az % 360, alt), (az, alt))
+        self.assertTrue(reached)
+        self.assertAlmostEqual(az, 90.0, delta=1.0)
+        self.assertAlmostEqual(alt, 30.0, delta=1.0)
+
+        # 不穿过遮挡时直接转动
+        controller.gyro.current_az, controller.gyro.current_alt = az, alt
+        controller.set_target(120.0, 35.0, coordinate_type='horizontal')
+        self.assertEqual(len(controller.route), 1)
+
+    def test_track_clipped_by_mask(self):
+        """跟踪只使用遮挡以上的一段星历；全部被遮挡或转到起点的路径被遮挡时拒绝；跟踪中仍逐周期检查"""
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True, horizon=self.mask)
+        start = time.time()
+        times = start + np.arange(0.0, 30.5, 0.5)
+        # 方位角70°->40°、高度角40°：第10秒进入东侧建筑
+        ephemeris = SatelliteEphemeris("test", times, 70.0 - (times - start), np.full(len(times), 40.0))
+        controller.gyro.current_az, controller.gyro.current_alt = 70.0, 40.0
+        controller.set_target(ephemeris, coordinate_type='track')
+        self.assertAlmostEqual(controller._track.end - start, 9.5, delta=0.6)
+        self.assertTrue(self.mask.visible(controller._track.azimuth, controller._track.altitude).all())
+
+        behind = SatelliteEphemeris("behind", times, np.full(len(times), 45.0), np.full(len(times), 40.0))
+        with self.assertRaises(ValueError):
+            controller.set_target(behind, coordinate_type='track')
+        # 从北方直接转到东南方会穿过建筑
+        controller.gyro.current_az, controller.gyro.current_alt = 20.0, 40.0
+        east = SatelliteEphemeris("east", times, 90.0 + (times - start), np.full(len(times), 40.0))
+        with self.assertRaises(ValueError):
+            controller.set_target(east, coordinate_type='track')
+
+        controller.gyro.current_az, controller.gyro.current_alt = 90.0, 40.0
+        controller.set_target(east, coordinate_type='track')
+        self.assertTrue(controller._guard_route)
+        controller.compute_command(90.0, 40.0)
+        with self.assertRaises(AxisFault):
+            controller.compute_command(45.0, 40.0)
+
+    def test_visibility_uses_horizon(self):
+        """整夜可见时段按各方位实际地平计算，升起晚于只按最低高度角的结果"""
+        targets = np.array([6.0, 12.0, 18.0]), np.array([20.0, 0.0, -10.0])
+        night = date(2024, 3, 15)
+        plain = VisibilityPlanner(40.0, 116.0, grid_step=300.0).compute(*targets, night)
+        masked = VisibilityPlanner(40.0, 116.0, grid_step=300.0, horizon=self.mask).compute(*targets, night)
+        both = np.isfinite(plain["rise"]) & np.isfinite(masked["rise"])
+        self.assertTrue(both.any())
+        self.assertTrue(np.all(masked["rise"][both] >= plain["rise"][both] - 1.0))
+        np.testing.assert_allclose(masked["transit_altitude"], plain["transit_altitude"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import time
+import unittest
+from pymodbus.client import ModbusSerialClient, AsyncModbusSerialClient
+from gyroscope import RealGyroscope, StaleSampleError, unit_argument
+from modbus_bus import ModbusBus, merge_ranges
+
+
+class FakeBusClient:
+    """模拟总线上的多个从站：按从站地址保存寄存器，记录每次事务"""
+    def __init__(self, memory):
+        self.memory = memory     # {从站: {地址: 值}}
+        self.offline = set()     # 不应答的从站
+        self.reads = []
+        self.writes = []
+
+    def connect(self):
+        return True
+
+    def close(self):
+        pass
+
+    # 与pymodbus 3.10+的签名一致：从站地址为仅限关键字的device_id
+    def read_holding_registers(self, address, *, count=1, device_id=1, no_response_expected=False):
+        self.reads.append((device_id, address, count))
+        if device_id in self.offline:
+            raise IOError("无应答")
+        registers = [self.memory[device_id].get(a, 0) for a in range(address, address + count)]
+
+        class Response:
+            def isError(self):
+                return False
+        response = Response()
+        response.registers = registers
+        return response
+
+    def write_register(self, address, value, *, device_id=1, no_response_expected=False):
+        self.writes.append((device_id, address, value))
+        self.memory[device_id][address] = value
+
+        class Response:
+            def isError(self):
+                return False
+        return Response()
+
+
+class TestModbusBus(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeBusClient({1: {3: 10, 4: 455, 5: 1200}, 2: {0: 1, 1: 2, 2: 3, 3: 4, 0x20: 250}, 3: {}})
+        self.bus = ModbusBus('/dev/null', client=self.client, retries=0)
+        self.addCleanup(self.bus.close)
+
+    def test_merge_ranges(self):
+        """重叠、相邻和小间隔的区段合并为一次读取，超过单次读取上限时分块"""
+        self.assertEqual(merge_ranges([(6, 2), (3, 3), (0x40, 1)]), [(3, 5), (0x40, 1)])
+        self.assertEqual(merge_ranges([(0, 2), (4, 2)], max_gap=2), [(0, 6)])
+        self.assertEqual(merge_ranges([(0, 2), (5, 2)], max_gap=2), [(0, 2), (5, 2)])
+        self.assertEqual(merge_ranges([(0, 100), (100, 50)]), [(0, 100), (100, 50)])
+
+    def test_unit_argument(self):
+        """从站地址参数名按客户端方法签名选择，兼容pymodbus 3.10前后的版本"""
+        client = ModbusSerialClient(port='/dev/null')
+        self.assertEqual(unit_argument(client.read_holding_registers, 2), {'device_id': 2})
+        self.assertEqual(unit_argument(AsyncModbusSerialClient.read_holding_registers, 2), {'device_id': 2})
+
+        class OldClient:
+            def read_holding_registers(self, address, count, slave):
+                pass
+        self.assertEqual(unit_argument(OldClient().read_holding_registers, 2), {'slave': 2})
+
+    def test_priority_schedule(self):
+        """同时到期时姿态传感器先读；其他设备按各自周期使用空闲时间，每个设备每次轮询一个连续块"""
+        # 时间取2的幂分数，避免浮点误差影响到期判断
+        gyro = self.bus.add_device('陀螺仪', 1, [(3, 3)], period=4 / 128, priority=10)
+        env = self.bus.add_device('环境', 2, [(0, 2), (2, 2)], period=1.0)
+        tilt = self.bus.add_device('倾角仪', 3, [(0, 2)], period=16 / 128)
+        self.assertEqual(env.blocks, [(0, 4)])
+        order = []
+        for k in range(256):
+            device = self.bus.poll_once(now=k / 128)
+            order.append(device.name if device else None)
+        self.assertEqual(order[:3], ['陀螺仪', '环境', '倾角仪'])
+        self.assertEqual(order.count('陀螺仪'), 64)
+        self.assertEqual(order.count('环境'), 2)
+        self.assertEqual(order.count('倾角仪'), 16)
+        self.assertEqual(set(self.client.reads), {(1, 3, 3), (2, 0, 4), (3, 0, 2)})
+        _, values = env.registers(0, 4)
+        self.assertEqual(values, [1, 2, 3, 4])
+
+        # 读取失败的设备标记过期，保留上一次的采样
+        self.client.offline.add(3)
+        self.bus.poll_device(tilt)
+        self.assertTrue(tilt.is_stale())
+        self.assertEqual(tilt.error_count, 1)
+        self.assertIsNotNone(tilt.sample)
+        self.assertFalse(gyro.failed)
+
+        # 暂停的设备（例如校准中）不占用轮询
+        gyro.paused = True
+        self.assertNotEqual(self.bus.next_device(10.0), gyro)
+
+    def test_gyroscope_on_shared_bus(self):
+        """轮询线程运行时陀螺仪只读采样缓存；未启动时通过总线同步读取"""
+        gyro = RealGyroscope(port='/dev/null', bus=self.bus, poll_period=0.005)
+        self.bus.add_device('环境', 2, [(0x20, 1)], period=0.05)
+        self.assertEqual(gyro.get_current_attitude(), (120.0, 45.5))
+        with self.assertRaises(ValueError):
+            gyro.negotiate_baudrate(115200)
+
+        self.client.memory[1][5] = 1300
+        self.bus.start()
+        deadline = time.monotonic() + 2.0
+        while gyro.get_current_attitude() != (130.0, 45.5) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(gyro.get_current_attitude(), (130.0, 45.5))
+        self.assertFalse(gyro.is_stale())
+        self.assertEqual(self.bus.device('环境').registers(0x20, 1)[1], [250])
+
+        self.client.offline.add(1)
+        deadline = time.monotonic() + 2.0
+        while not gyro.is_stale() and time.monotonic() < deadline:
+            gyro.get_current_attitude()
+            time.sleep(0.01)
+        self.assertTrue(gyro.is_stale())
+        self.assertEqual(gyro.get_current_attitude(), (130.0, 45.5))
+        self.bus.stop()
+
+        other = ModbusBus('/dev/null', client=FakeBusClient({1: {}}))
+        with self.assertRaises(StaleSampleError):
+            other.add_device('陀螺仪', 1, [(3, 3)]).registers(3, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import time
+import threading
+import unittest
+from datetime import datetime
+from unittest import mock
+import mount_registry
+from gyroscope import VirtualGyroscope
+from transform_control import TelescopeController
+from controller_service import ControllerService
+from mount_registry import MountRegistry, Mount
+from axis_control import AxisController
+
+
+class HangingGyroscope(VirtualGyroscope):
+    """hang置位后读取一直阻塞到release置位，模拟卡住的串口读取"""
+    def __init__(self):
+        super().__init__()
+        self.hang = threading.Event()
+        self.release = threading.Event()
+
+    def get_current_attitude(self):
+        if self.hang.is_set():
+            self.release.wait()
+        return super().get_current_attitude()
+
+
+class TestMountRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MountRegistry()
+
+    def tearDown(self):
+        self.registry.shutdown()
+
+    def _add(self, mount_id):
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        return self.registry.add(mount_id, controller, lat=40.0, lon=116.0)
+
+    def test_many_mounts_one_scheduler(self):
+        """多台望远镜共用一个调度线程，各自到达目标"""
+        handles = [self._add(f"m{i}") for i in range(4)]
+        for i, handle in enumerate(handles):
+            handle.set_target(3 + i, 23 + i, coordinate_type='horizontal')
+        for handle in handles:
+            self.assertTrue(handle.wait(10))
+            self.assertEqual(handle.control_loop(), 0)
+        for i, mount in enumerate(self.registry.mounts.values()):
+            az, alt = mount.controller.gyro.get_current_attitude()
+            self.assertAlmostEqual(az, 3 + i, delta=1.5)
+            self.assertAlmostEqual(alt, 23 + i, delta=1.5)
+
+    def test_equatorial_targets_batched(self):
+        """同一批提交的赤道坐标目标只做一次批量转换"""
+        for i in range(3):
+            controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+            self.registry.mounts[f"m{i}"] = Mount(f"m{i}", controller)
+        calls = []
+        original = mount_registry.equatorial_to_horizontal_batch
+
+        def counting(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+
+        now = datetime(2024, 3, 15, 12, 0, 0)
+        commands = [(f"m{i}", (6.75, -16.72, 40.0 - 10 * i, 116.0, now), {}, 0) for i in range(3)]
+        with mock.patch.object(mount_registry, 'equatorial_to_horizontal_batch', counting):
+            self.registry._convert_batch(commands)
+        self.assertEqual(len(calls), 1)
+
+        # 转换结果以地平坐标目标交给调度线程（此处调度线程未启动，手动应用）
+        while not self.registry._commands.empty():
+            mount_id, args, kwargs, generation = self.registry._commands.get_nowait()
+            self.registry._set_mount_target(self.registry.mounts[mount_id], args, kwargs, generation)
+
+        reference = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        for i in range(3):
+            mount = self.registry.mounts[f"m{i}"]
+            self.assertEqual(mount.state, ControllerService.SLEWING)
+            az, alt = reference.equatorial_to_horizontal(6.75, -16.72, 40.0 - 10 * i, 116.0, now)
+            self.assertAlmostEqual(mount.controller.target_azimuth, az % 360, places=6)
+            self.assertAlmostEqual(mount.controller.target_altitude, max(20.0, min(90.0, alt)), places=6)
+
+    def test_status_without_sample(self):
+        """还没有读数时状态中的姿态为None并标记过期，不在调用线程中读取传感器"""
+        mount = Mount("m", TelescopeController(gyro=VirtualGyroscope(), simulation=True))
+        status = mount.to_dict()
+        self.assertIsNone(status["current_az"])
+        self.assertTrue(status["stale"])
+        mount.reader.read()
+        status = mount.to_dict()
+        self.assertIsNotNone(status["current_az"])
+        self.assertFalse(status["stale"])
+
+    def test_stop_one_mount(self):
+        """停止一台望远镜不影响其他望远镜"""
+        a = self._add("a")
+        b = self._add("b")
+        a.set_target(180, 80, coordinate_type='horizontal')
+        b.set_target(3, 22, coordinate_type='horizontal')
+        time.sleep(0.05)
+        latency = a.stop()
+        self.assertLess(latency, 0.05)
+        self.assertEqual(a.state, ControllerService.STOPPED)
+        self.assertTrue(b.wait(10))
+        self.assertEqual(b.state, ControllerService.ARRIVED)
+
+    def test_stop_cancels_queued_targets(self):
+        """停止作废排队中的目标：转换或应用之后到达的旧目标不再让望远镜运动"""
+        a = self._add("a")
+        now = datetime(2024, 3, 15, 12, 0, 0)
+        a.set_target(6.75, -16.72, 40.0, 116.0, now)
+        a.set_target(180, 80, coordinate_type='horizontal')
+        a.stop()
+        time.sleep(0.5)
+        self.assertEqual(a.state, ControllerService.STOPPED)
+        self.assertTrue(a.mount.controller.stop_requested.is_set())
+
+        # 停止之后提交的目标照常执行
+        a.set_target(3, 22, coordinate_type='horizontal')
+        self.assertTrue(a.wait(10))
+        self.assertEqual(a.state, ControllerService.ARRIVED)
+
+    def test_stop_resets_axes_in_scheduler(self):
+        """停止在调用线程中只发送停止命令，各轴状态机由调度线程复位"""
+        a = self._add("a")
+        threads = []
+        original = a.mount.controller.abort_axes
+
+        def abort_axes():
+            threads.append(threading.current_thread())
+            original()
+        a.mount.controller.abort_axes = abort_axes
+        a.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.05)
+        a.stop()
+        time.sleep(0.05)
+        self.assertEqual(threads, [self.registry._thread])
+        for axis in a.mount.controller.axes.values():
+            self.assertNotIn(axis.state, (AxisController.SLEWING, AxisController.PULSING))
+
+    def test_hanging_sensor_isolated(self):
+        """一台望远镜的传感器卡住：其他望远镜照常到达，卡住的望远镜停止运动并报错"""
+        gyro = HangingGyroscope()
+        self.addCleanup(gyro.release.set)
+        controller = TelescopeController(gyro=gyro, simulation=True)
+        controller.max_stale_time = 0.3
+        stuck = self.registry.add("stuck", controller)
+        other = self._add("other")
+        stuck.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.05)
+        gyro.hang.set()
+        other.set_target(3, 22, coordinate_type='horizontal')
+        self.assertTrue(other.wait(10))
+        self.assertEqual(other.state, ControllerService.ARRIVED)
+        self.assertTrue(stuck.wait(2))
+        self.assertEqual(stuck.state, ControllerService.ERROR)
+        self.assertFalse(controller.relays_active)
+
+    def test_watchdog_per_mount(self):
+        """每台望远镜有自己的看门狗：调度线程卡住时在期限内停止运动"""
+        registry = MountRegistry(watchdog_deadline=0.1)
+        self.addCleanup(registry.shutdown)
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        handle = registry.add("a", controller)
+        self.assertIsNotNone(registry.mounts["a"].watchdog)
+        apply_sample = controller.apply_sample
+        release = threading.Event()
+        self.addCleanup(release.set)
+        hang = threading.Event()
+
+        def stuck(*args, **kwargs):
+            if hang.is_set():
+                release.wait()
+            return apply_sample(*args, **kwargs)
+        controller.apply_sample = stuck
+        handle.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.1)
+        self.assertTrue(controller.relays_active)
+        hang.set()
+        self.assertTrue(handle.wait(1.0))
+        self.assertEqual(handle.state, ControllerService.ERROR)
+        self.assertIn("看门狗", handle.error)
+        self.assertFalse(controller.relays_active)
+        release.set()
+        time.sleep(0.05)
+        for axis in controller.axes.values():
+            self.assertNotIn(axis.state, (AxisController.SLEWING, AxisController.PULSING))
+
+
+if __name__ == '__main__':
+    unittest.main()
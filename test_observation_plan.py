@@ -0,0 +1,86 @@
+import unittest
+from datetime import datetime
+import numpy as np
+from gyroscope import VirtualGyroscope
+from transform_control import TelescopeController
+from batch_transform import equatorial_to_horizontal_batch
+from observation_plan import (ObservationTarget, SlewCostModel, ObservationPlanner,
+                              execute_plan)
+
+
+class TestObservationPlan(unittest.TestCase):
+    def setUp(self):
+        self.lat = 40.011
+        self.lon = 116.392
+        self.test_time = datetime(2024, 3, 15, 12, 0, 0)
+
+    def test_batch_matches_scalar(self):
+        """批量转换与控制器单目标转换结果一致"""
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        ra = np.array([2.53, 6.75, 18.62])
+        dec = np.array([89.26, -16.72, 38.78])
+        az, alt = equatorial_to_horizontal_batch(ra, dec, self.lat, self.lon, self.test_time)
+        for i in range(len(ra)):
+            s_az, s_alt = controller.equatorial_to_horizontal(ra[i], dec[i], self.lat, self.lon, self.test_time)
+            self.assertAlmostEqual(az[i], s_az, places=6)
+            self.assertAlmostEqual(alt[i], s_alt, places=6)
+
+    def test_slew_cost_model(self):
+        """两轴同时运动，耗时取较慢的轴"""
+        model = SlewCostModel(az_speed=10.0, alt_speed=5.0, settle_time=0.0)
+        self.assertAlmostEqual(model.slew_time(0, 20, 50, 30), 5.0)
+        self.assertAlmostEqual(model.slew_time(0, 20, 10, 70), 10.0)
+        # 默认走最短方向
+        self.assertAlmostEqual(model.azimuth_distance(10, 350), 20.0)
+        clockwise = SlewCostModel(shortest_azimuth=False)
+        self.assertAlmostEqual(clockwise.azimuth_distance(10, 350), 340.0)
+
+    def test_ordering_reduces_slew_time(self):
+        """排序后的总转动耗时不应比输入顺序更长"""
+        rng = np.random.default_rng(1)
+        targets = [ObservationTarget(f"T{i}", azimuth=float(az), altitude=float(alt), dwell=10)
+                   for i, (az, alt) in enumerate(zip(rng.uniform(0, 360, 15), rng.uniform(25, 85, 15)))]
+        planner = ObservationPlanner(self.lat, self.lon)
+        plan = planner.plan(targets, 0.0, 20.0, self.test_time)
+        self.assertEqual(len(plan.visits), len(targets))
+
+        model = planner.cost_model
+        naive = 0.0
+        cur = (0.0, 20.0)
+        for t in targets:
+            naive += float(model.slew_time(cur[0], cur[1], t.azimuth, t.altitude))
+            cur = (t.azimuth, t.altitude)
+        self.assertLessEqual(plan.total_slew_time, naive)
+
+    def test_unobservable_targets_skipped(self):
+        """低于最低高度角的目标被跳过"""
+        targets = [
+            ObservationTarget("低", azimuth=100, altitude=5, dwell=0),
+            ObservationTarget("高", azimuth=120, altitude=50, dwell=0),
+            ObservationTarget("南天极", ra=0.0, dec=-89.0, dwell=0),
+        ]
+        plan = ObservationPlanner(self.lat, self.lon).plan(targets, 0.0, 20.0, self.test_time)
+        self.assertEqual([v.target.name for v in plan.visits], ["高"])
+        self.assertEqual(sorted(t.name for t in plan.skipped), sorted(["低", "南天极"]))
+
+    def test_execute_plan(self):
+        """按计划依次驱动虚拟望远镜"""
+        gyro = VirtualGyroscope()
+        controller = TelescopeController(gyro=gyro, simulation=True)
+        targets = [
+            ObservationTarget("A", azimuth=3, altitude=22, dwell=0),
+            ObservationTarget("B", azimuth=6, altitude=24, dwell=0),
+        ]
+        plan = ObservationPlanner(self.lat, self.lon).plan(targets, 0.0, 20.0, self.test_time)
+        visited = []
+        reached = execute_plan(controller, plan, self.lat, self.lon,
+                               on_visit=lambda i, v: visited.append(v.target.name))
+        self.assertEqual(reached, 2)
+        self.assertEqual(visited, ["A", "B"])
+        az, alt = gyro.get_current_attitude()
+        self.assertAlmostEqual(az, 6, delta=1.5)
+        self.assertAlmostEqual(alt, 24, delta=1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from pointing_model import PointingModel, PointingCalibration, fit_pointing_model, TERMS
+from transform_control import TelescopeController
+from gyroscope import VirtualGyroscope
+
+
+TRUE_TERMS = {'IA': 1.2, 'IE': -0.8, 'CA': 0.3, 'NPAE': -0.15, 'AN': 0.25, 'AW': -0.4}
+
+
+class TestPointingModel(unittest.TestCase):
+    def test_fit_recovers_terms(self):
+        """由带噪声的多星观测拟合出模型参数"""
+        rng = np.random.default_rng(1)
+        sky_az = rng.uniform(0, 360, 30)
+        sky_alt = rng.uniform(20, 80, 30)
+        raw_az, raw_alt = PointingModel(TRUE_TERMS).to_mount(sky_az, sky_alt)
+        noise = 5.0 / 3600
+        raw_az = raw_az + rng.normal(0, noise, 30) / np.cos(np.radians(sky_alt))
+        raw_alt = raw_alt + rng.normal(0, noise, 30)
+
+        model, rms = fit_pointing_model(sky_az, sky_alt, raw_az, raw_alt)
+        for term in TERMS:
+            self.assertAlmostEqual(model.coefficients[term], TRUE_TERMS[term], delta=0.02, msg=term)
+        self.assertLess(rms, 10.0)
+        with self.assertRaises(ValueError):
+            fit_pointing_model(sky_az[:2], sky_alt[:2], raw_az[:2], raw_alt[:2])
+
+    def test_inverse(self):
+        """to_sky是to_mount的逆变换，支持数组，跨越0°方位"""
+        model = PointingModel(TRUE_TERMS)
+        az = np.array([0.2, 90.0, 180.0, 359.5])
+        alt = np.array([20.0, 45.0, 70.0, 85.0])
+        raw_az, raw_alt = model.to_mount(az, alt)
+        back_az, back_alt = model.to_sky(raw_az, raw_alt)
+        np.testing.assert_allclose((back_az - az + 180) % 360 - 180, 0, atol=1e-6)
+        np.testing.assert_allclose(back_alt, alt, atol=1e-6)
+        self.assertTrue(PointingModel().is_identity())
+
+    def test_controller_applies_model(self):
+        """设置目标时换算为传感器读数，对外报告的姿态换算回真实指向"""
+        model = PointingModel({'IA': 3.3, 'IE': -2.4})
+        gyro = VirtualGyroscope()
+        controller = TelescopeController(gyro=gyro, simulation=True, pointing_model=model)
+        controller.set_target(20.5, 35.5, coordinate_type='horizontal')
+        self.assertEqual(controller.control_loop(), 0)
+
+        raw_az, raw_alt = gyro.get_current_attitude()
+        self.assertAlmostEqual(raw_az, 20.5 - 3.3, delta=1.5)
+        self.assertAlmostEqual(raw_alt, 35.5 - 2.4, delta=1.5)
+        az, alt = controller.get_current_attitude()
+        self.assertAlmostEqual(az, 20.5, delta=1.5)
+        self.assertAlmostEqual(alt, 35.5, delta=1.5)
+        self.assertEqual(controller.last_attitude, controller.sky_attitude(raw_az, raw_alt))
+
+    def test_calibration_persistence(self):
+        """观测和拟合结果保存到文件，重新加载后一致"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pointing_model.json')
+            calibration = PointingCalibration.load(path)
+            self.assertTrue(calibration.model.is_identity())
+            truth = PointingModel({'IA': 0.5, 'IE': 0.7})
+            for i, (az, alt) in enumerate([(10, 30), (120, 50), (250, 70), (300, 25)]):
+                raw_az, raw_alt = truth.to_mount(az, alt)
+                calibration.add_sample(az, alt, raw_az, raw_alt, f"star{i}")
+            calibration.fit(['IA', 'IE'])
+
+            loaded = PointingCalibration.load(path)
+            self.assertEqual(len(loaded.samples), 4)
+            self.assertAlmostEqual(loaded.model.coefficients['IA'], 0.5, places=6)
+            self.assertAlmostEqual(loaded.model.coefficients['IE'], 0.7, places=6)
+            self.assertEqual(loaded.model.coefficients['CA'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import time
+import unittest
+import numpy as np
+from process_controller import ProcessControllerHost, TELEMETRY_DTYPE, _publish
+from gyroscope import VirtualGyroscope
+from transform_control import TelescopeController, create_controller
+
+
+class TestProcessController(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.host = ProcessControllerHost('simulation')
+        cls.host.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.host.shutdown()
+
+    def test_telemetry_layout(self):
+        """遥测记录固定大小，放在共享内存中"""
+        self.assertGreaterEqual(self.host._shm.size, TELEMETRY_DTYPE.itemsize)
+        telemetry = self.host.telemetry()
+        self.assertIn(telemetry["state"], ('idle', 'arrived', 'stopped', 'slewing'))
+        self.assertTrue(np.isfinite(telemetry["current_az"]))
+
+    def test_reach_target_and_stop(self):
+        """命令经队列送入控制进程，状态经共享内存读回"""
+        self.host.set_target(4, 24, coordinate_type='horizontal')
+        self.assertTrue(self.host.wait(15))
+        self.assertEqual(self.host.control_loop(), 0)
+        telemetry = self.host.telemetry()
+        self.assertAlmostEqual(telemetry["target_az"], 4)
+        self.assertAlmostEqual(telemetry["current_az"], 4, delta=1.5)
+        self.assertAlmostEqual(telemetry["current_alt"], 24, delta=1.5)
+
+        self.host.set_target(180, 80, coordinate_type='horizontal')
+        time.sleep(0.2)
+        self.assertEqual(self.host.state, 'slewing')
+        latency = self.host.stop()
+        self.assertIsNotNone(latency)
+        self.assertLess(latency, 0.05)
+        self.assertTrue(self.host.wait(2))
+        self.assertEqual(self.host.control_loop(), 2)
+
+
+    def test_publish_stale_attitude(self):
+        """陀螺仪没有有效数据时发布NaN姿态和过期标志"""
+        record = np.zeros((1,), dtype=TELEMETRY_DTYPE)[0]
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        counters = {'target_id': 0, 'stop_count': 0, 'stop_latency': 0.0}
+        _publish(record, controller, 'idle', None, None, counters)
+        self.assertTrue(record['stale'])
+        self.assertTrue(np.isnan(record['current_az']))
+        _publish(record, controller, 'idle', None, (1.0, 2.0), counters)
+        self.assertFalse(record['stale'])
+        self.assertEqual(record['current_alt'], 2.0)
+        self.assertEqual(record['seq'] % 2, 0)
+
+    def test_read_after_child_died_mid_write(self):
+        """控制进程在写入遥测中途退出（seq停在奇数）时读取不再等待，返回最近的完整快照并报告错误"""
+        host = ProcessControllerHost('simulation')
+        self.addCleanup(host.shutdown)
+        record = host._telemetry[0]
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        counters = {'target_id': 1, 'stop_count': 0, 'stop_latency': 0.0}
+        _publish(record, controller, 'slewing', None, (1.0, 2.0), counters)
+        self.assertEqual(host.state, 'slewing')
+
+        record['seq'] += 1
+        record['current_az'] = np.nan
+        start = time.monotonic()
+        telemetry = host.telemetry()
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertEqual(telemetry["state"], 'error')
+        self.assertIn("控制进程已退出", telemetry["error"])
+        self.assertEqual(telemetry["current_az"], 1.0)
+        self.assertEqual(host.control_loop(), 1)
+
+    def test_async_gyro_options(self):
+        """异步陀螺仪不支持波特率协商和共用总线"""
+        with self.assertRaises(ValueError):
+            create_controller('real', 'COM1', 'COM2', async_gyro=True, gyro_baudrate=9600)
+        with self.assertRaises(ValueError):
+            create_controller('real', 'COM1', 'COM2', async_gyro=True, shared_bus=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from datetime import datetime
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import SkyCoord, AltAz
+from refraction import RefractionTable, saemundsson, get_refraction_table
+from batch_transform import equatorial_to_horizontal_batch, horizontal_to_equatorial_batch, get_location
+from transform_control import TelescopeController
+from gyroscope import VirtualGyroscope
+
+
+class TestRefraction(unittest.TestCase):
+    def setUp(self):
+        self.table = RefractionTable(pressure=1000.0, temperature=5.0)
+
+    def test_table_matches_formula(self):
+        """查表结果与公式一致，天顶处为0"""
+        alt = np.linspace(5, 85, 50)
+        expected = saemundsson(alt, 1000.0, 5.0) - saemundsson(90.0, 1000.0, 5.0)
+        np.testing.assert_allclose(self.table.correction(alt), expected, atol=1 / 3600)
+        self.assertAlmostEqual(float(self.table.correction(90.0)), 0.0, places=9)
+        # 20°附近约2.6角分
+        self.assertAlmostEqual(float(self.table.correction(20.0)) * 60, 2.6, delta=0.2)
+        np.testing.assert_allclose(self.table.true(self.table.apparent(alt)), alt, atol=1e-6)
+        self.assertIsNone(get_refraction_table(0.0, 10.0))
+        self.assertIs(get_refraction_table(1000.0, 5.0), get_refraction_table(1000.0, 5.0))
+
+    def test_close_to_astropy(self):
+        """与astropy带气象参数的折射计算相差在10角秒以内（约为折射量的2%）"""
+        now = datetime(2024, 3, 15, 12, 0, 0)
+        ra = np.linspace(0, 24, 48, endpoint=False)
+        dec = np.full(48, 30.0)
+        az, alt = equatorial_to_horizontal_batch(ra, dec, 40.0, 116.0, now, refraction=self.table)
+        frame = AltAz(obstime=now, location=get_location(40.0, 116.0),
+                      pressure=1000.0 * u.hPa, temperature=5.0 * u.deg_C,
+                      relative_humidity=0.0, obswl=0.55 * u.micron)
+        reference = SkyCoord(ra=ra * 15 * u.deg, dec=dec * u.deg).transform_to(frame)
+        visible = reference.alt.deg > 15
+        self.assertTrue(np.any(visible))
+        np.testing.assert_allclose(alt[visible], reference.alt.deg[visible], atol=10 / 3600)
+
+        back_ra, back_dec = horizontal_to_equatorial_batch(az, alt, 40.0, 116.0, now, refraction=self.table)
+        np.testing.assert_allclose(back_dec[visible], dec[visible], atol=1e-4)
+
+    def test_controller_target(self):
+        """设置折射表后赤道坐标目标使用视高度角"""
+        now = datetime(2024, 3, 15, 12, 0, 0)
+        plain = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        corrected = TelescopeController(gyro=VirtualGyroscope(), simulation=True, refraction=self.table)
+        _, geometric = plain.equatorial_to_horizontal(14.26, 19.18, 40.0, 116.0, now)
+        _, apparent = corrected.equatorial_to_horizontal(14.26, 19.18, 40.0, 116.0, now)
+        self.assertAlmostEqual(apparent - geometric, float(self.table.correction(geometric)), places=9)
+        self.assertGreater(apparent, geometric)
+
+
+if __name__ == '__main__':
+    unittest.main()
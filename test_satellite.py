@@ -0,0 +1,104 @@
+import os
+import time
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+from astropy.time import Time
+from gyroscope import VirtualGyroscope, parse_relay_command
+from satellite import Satrec, TLE, SatelliteEphemeris, SatellitePredictor, load_tles
+from transform_control import TelescopeController
+
+ISS_LINES = ("ISS (ZARYA)",
+             "1 25544U 98067A   24075.50000000  .00016717  00000+0  30000-3 0  9991",
+             "2 25544  51.6416 200.0000 0004000  90.0000 270.0000 15.49500000440000")
+
+
+class TestSatellite(unittest.TestCase):
+    def test_load_tles(self):
+        """三行格式（可带 "0 " 前缀）和两行格式混合"""
+        fd, path = tempfile.mkstemp(suffix='.tle')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write("\n".join(ISS_LINES) + "\n")
+            f.write("0 " + ISS_LINES[0] + " COPY\n" + "\n".join(ISS_LINES[1:]) + "\n\n")
+            f.write("\n".join(ISS_LINES[1:]) + "\n")
+        self.addCleanup(os.remove, path)
+        tles = load_tles(path)
+        self.assertEqual([t.name for t in tles], ["ISS (ZARYA)", "ISS (ZARYA) COPY", "25544"])
+
+    @unittest.skipIf(Satrec is None, "需要sgp4")
+    def test_pass_ephemeris(self):
+        """过境星历与直接计算一致，与按GMST旋转的独立估算相差很小，插值误差远小于控制容差"""
+        iss = TLE(*ISS_LINES)
+        predictor = SatellitePredictor(40.0, 116.0)
+        ephemeris = predictor.next_pass(iss, datetime(2024, 3, 15, 12, 0, 0))
+        self.assertIsNotNone(ephemeris)
+        self.assertGreater(ephemeris.max_altitude, 20.0)
+        self.assertLess(ephemeris.altitude[0], 20.0)
+        self.assertLess(ephemeris.altitude[-1], 20.0)
+
+        # 星历点之间的时刻
+        t = ephemeris.times[:-1:37] + 0.25
+        az, alt = predictor.horizontal([iss], t)
+        for i, ti in enumerate(t):
+            a, h = ephemeris.position(ti)
+            self.assertLess(abs((a - az[0, i] + 180) % 360 - 180), 0.05)
+            self.assertLess(abs(h - alt[0, i]), 0.05)
+
+        # 独立估算：TEME绕GMST旋转到地固系，减去观测点位置后转为站心坐标
+        times = Time(t, format='unix')
+        _, r, _ = iss.satrec.sgp4_array(times.jd1, times.jd2)
+        gmst = times.sidereal_time('mean', 'greenwich').rad
+        x = np.cos(gmst) * r[:, 0] + np.sin(gmst) * r[:, 1]
+        y = -np.sin(gmst) * r[:, 0] + np.cos(gmst) * r[:, 1]
+        lat, lon = np.radians(40.0), np.radians(116.0)
+        e2 = 0.00669437999014
+        n = 6378.137 / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+        dx = x - n * np.cos(lat) * np.cos(lon)
+        dy = y - n * np.cos(lat) * np.sin(lon)
+        dz = r[:, 2] - n * (1 - e2) * np.sin(lat)
+        east = -np.sin(lon) * dx + np.cos(lon) * dy
+        north = -np.sin(lat) * np.cos(lon) * dx - np.sin(lat) * np.sin(lon) * dy + np.cos(lat) * dz
+        up = np.cos(lat) * np.cos(lon) * dx + np.cos(lat) * np.sin(lon) * dy + np.sin(lat) * dz
+        np.testing.assert_allclose(np.degrees(np.arctan2(up, np.hypot(east, north))), alt[0], atol=0.1)
+        d_az = (np.degrees(np.arctan2(east, north)) - az[0] + 180) % 360 - 180
+        np.testing.assert_allclose(d_az, 0.0, atol=0.1)
+
+    def test_controller_tracks_ephemeris(self):
+        """控制周期按时刻插值星历跟踪移动目标，星历结束时到达"""
+        start = time.time()
+        times = start + np.arange(0.0, 30.5, 0.5)
+        # 方位角跨越0°，1°/s
+        ephemeris = SatelliteEphemeris("test", times, (345.0 + (times - start)) % 360, 40.0 + (times - start) / 3)
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        controller.gyro.current_az, controller.gyro.current_alt = 345.0, 40.0
+        controller.set_target(ephemeris, coordinate_type='track')
+
+        az, alt = -15.0, 40.0
+        base = time.monotonic()
+        errors = []
+        for k in range(700):
+            now = base + k * 0.05
+            reached, cmd = controller.compute_command(az % 360, alt, now)
+            if reached:
+                break
+            # 保持带内已停止时不重复发送停止命令
+            fields = parse_relay_command(cmd) if cmd else {}
+            az += fields.get('AZ', (0, None))[0] * 0.5
+            alt += fields.get('EL', (0, None))[0] * 0.5
+            target_az, target_alt = ephemeris.position(now - base + start)
+            errors.append(max(abs((az - target_az + 180) % 360 - 180), abs(alt - target_alt)))
+        self.assertTrue(reached)
+        self.assertGreater(k * 0.05, 29.0)
+        # 继电器只有全速和停止两档：误差保持在保持带附近
+        self.assertLess(max(errors[20:]), 3.0)
+        # 经过0°时展开方位角连续，没有反向绕一圈
+        self.assertLess(abs(controller.cable_wrap.unwrapped - 15.0), 3.0)
+
+        with self.assertRaises(ValueError):
+            controller.set_target(SatelliteEphemeris("old", times - 100, ephemeris.azimuth, ephemeris.altitude),
+                                  coordinate_type='track')
+
+
+if __name__ == '__main__':
+    unittest.main()
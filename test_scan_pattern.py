@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+from batch_transform import equatorial_to_horizontal_batch
+from gyroscope import VirtualGyroscope, parse_relay_command
+from scan_pattern import ScanPattern, ScanPlan, serpentine_grid
+from transform_control import TelescopeController
+
+
+class TestScanPattern(unittest.TestCase):
+    def test_serpentine_grid(self):
+        """相邻网格点只差一个步长（行内或换行），圆形区域只保留半径以内的点"""
+        dx, dy = serpentine_grid(4.0, 2.0, 1.0)
+        self.assertEqual(len(dx), 15)
+        steps = np.hypot(np.diff(dx), np.diff(dy))
+        np.testing.assert_allclose(steps, 1.0)
+        np.testing.assert_array_equal(dx[:5], [-2, -1, 0, 1, 2])
+        np.testing.assert_array_equal(dx[5:10], [2, 1, 0, -1, -2])
+
+        dx, dy = serpentine_grid(4.0, None, 1.0, circular=True)
+        self.assertTrue(np.all(np.hypot(dx, dy) <= 2.0))
+        self.assertEqual(len(dx), 13)
+        # 每行内单调，行号不减
+        self.assertTrue(np.all(np.diff(dy) >= 0))
+
+    def test_equatorial_plan(self):
+        """赤道坐标网格按各点预计到达时刻批量转换"""
+        start = datetime(2024, 3, 15, 14, 0, 0)
+        pattern = ScanPattern(5.5, 20.0, 3.0, 2.0, step=1.0, coordinate_type='equatorial', dwell=10.0)
+        plan = pattern.plan(40.0, 116.0, start)
+        self.assertEqual(len(plan), 9)
+        self.assertEqual(plan.skipped, 0)
+        self.assertTrue(np.all(np.diff(plan.arrival_offsets) >= 10.0))
+        ra, dec = pattern.points()
+        i = len(plan) - 1
+        az, alt = equatorial_to_horizontal_batch(ra[i], dec[i], 40.0, 116.0,
+                                                 start + timedelta(seconds=float(plan.arrival_offsets[i])))
+        self.assertAlmostEqual(plan.azimuth[i], float(az), places=6)
+        self.assertAlmostEqual(plan.altitude[i], float(alt), places=6)
+
+        # 低于最低高度角的网格点被跳过
+        low = ScanPattern(180.0, 21.0, 2.0, 4.0, step=1.0).plan()
+        self.assertEqual(low.skipped, 3)
+        self.assertTrue(np.all(low.altitude >= 20.0))
+
+    def test_controller_runs_scan_as_one_target(self):
+        """扫描作为一个目标连续执行：依次到达各网格点并驻留，最后一点驻留结束才到达"""
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        controller.gyro.current_az, controller.gyro.current_alt = 100.0, 40.0
+        plan = ScanPlan([100.0, 105.0, 110.0, 110.0], [40.0, 40.0, 40.0, 45.0], dwell=1.0, start_time=datetime.now())
+        controller.set_target(plan, coordinate_type='scan')
+        self.assertEqual(len(controller.route), 4)
+
+        az, alt, now = 100.0, 40.0, 0.0
+        visited = []
+        stops = 0
+        for _ in range(2000):
+            reached, cmd = controller.compute_command(az, alt, now)
+            if reached:
+                break
+            if not visited or visited[-1][0] != controller.target_index:
+                visited.append((controller.target_index, now))
+            fields = parse_relay_command(cmd)
+            stops += cmd == "AZ0EL0\n"
+            az += fields.get('AZ', (0, None))[0] * 0.5
+            alt += fields.get('EL', (0, None))[0] * 0.5
+            now += 0.05
+        self.assertTrue(reached)
+        self.assertEqual([index for index, _ in visited], [0, 1, 2, 3])
+        # 每个网格点至少驻留dwell
+        self.assertGreaterEqual(visited[1][1] - visited[0][1], 1.0)
+        self.assertGreaterEqual(now - visited[3][1], 1.0)
+        self.assertAlmostEqual(az, 110.0, delta=1.0)
+        self.assertAlmostEqual(alt, 45.0, delta=1.0)
+        self.assertEqual(stops, 0)
+
+        with self.assertRaises(ValueError):
+            controller.set_target(ScanPlan([], [], 1.0, datetime.now()), coordinate_type='scan')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from datetime import datetime, timedelta
+from observation_plan import SlewCostModel
+from slew_planner import LeadTargetSolver
+from transform_control import TelescopeController
+from gyroscope import VirtualGyroscope
+
+
+class TestLeadTargetSolver(unittest.TestCase):
+    def setUp(self):
+        self.lat, self.lon = 40.0, 116.0
+        self.time = datetime(2024, 3, 15, 17, 0, 0)
+        # Arcturus
+        self.ra, self.dec = 14.26, 19.18
+        self.reference = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+
+    def test_aims_at_arrival_position(self):
+        """解算结果是到达时刻的目标位置，且转到该位置的耗时与提前量一致"""
+        model = SlewCostModel(az_speed=2.0, alt_speed=2.0, settle_time=1.0)
+        solver = LeadTargetSolver(model, grid_points=16)
+        az, alt, lead = solver.solve(self.ra, self.dec, self.lat, self.lon, self.time, 0.0, 20.0)
+
+        self.assertGreater(lead, 10.0)
+        self.assertAlmostEqual(lead, solver.motion_time(0.0, 20.0, az, alt), delta=solver.tolerance)
+        arrival = self.time + timedelta(seconds=lead)
+        expected_az, expected_alt = self.reference.equatorial_to_horizontal(self.ra, self.dec, self.lat, self.lon, arrival)
+        self.assertAlmostEqual(az, expected_az % 360, delta=0.002)
+        self.assertAlmostEqual(alt, expected_alt, delta=0.002)
+
+        # 与请求时刻的位置相比有可测的差异
+        now_az, now_alt = self.reference.equatorial_to_horizontal(self.ra, self.dec, self.lat, self.lon, self.time)
+        self.assertGreater(abs(az - now_az) + abs(alt - now_alt), 0.05)
+
+    def test_controller_uses_solver(self):
+        """控制器设置赤道坐标目标时使用提前量解算"""
+        solver = LeadTargetSolver()
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True, lead_solver=solver)
+        controller.set_target(self.ra, self.dec, self.lat, self.lon, self.time)
+        az, alt, lead = solver.solve(self.ra, self.dec, self.lat, self.lon, self.time, 0.0, 20.0)
+        self.assertAlmostEqual(controller.lead_time, lead)
+        self.assertAlmostEqual(controller.target_azimuth, az % 360, places=9)
+        self.assertAlmostEqual(controller.target_altitude, max(20.0, min(90.0, alt)), places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
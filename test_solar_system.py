@@ -0,0 +1,62 @@
+import unittest
+from datetime import date
+import numpy as np
+from astropy.coordinates import AltAz, get_body, solar_system_ephemeris
+from astropy.time import Time
+from solar_system import SolarSystemPredictor, SunAvoidance, parse_body
+
+
+class TestSolarSystem(unittest.TestCase):
+    def setUp(self):
+        self.predictor = SolarSystemPredictor(40.0, 116.0, step=300.0)
+        self.night = date(2024, 3, 15)
+        self.start = Time(self.predictor.night_span(self.night)[0]).unix
+
+    def test_position_matches_direct_calculation(self):
+        """网格插值与直接计算一致（含月球的周日视差），每夜只计算一次"""
+        t = self.start + np.array([130.0, 5 * 3600.0 + 17.0, 40000.3])
+        az, alt = self.predictor.position('moon', t)
+        obstime = Time(t, format='unix')
+        location = self.predictor.location
+        with solar_system_ephemeris.set('builtin'):
+            direct = get_body('moon', obstime, location).transform_to(AltAz(obstime=obstime, location=location))
+        np.testing.assert_allclose((az - direct.az.deg + 180) % 360 - 180, 0.0, atol=0.01)
+        np.testing.assert_allclose(alt, direct.alt.deg, atol=0.01)
+        self.assertIs(self.predictor.grid('moon', self.night), self.predictor.grid('moon', self.night))
+        self.assertEqual(parse_body('月球'), 'moon')
+        with self.assertRaises(ValueError):
+            parse_body('pluto')
+
+    def test_ephemeris(self):
+        """星历跨夜拼接时间连续，设置最低高度角时在天体降到其下时结束"""
+        ephemeris = self.predictor.ephemeris('jupiter', self.start + 80000.0, duration=20000.0)
+        self.assertLessEqual(ephemeris.start, self.start + 80000.0)
+        self.assertGreaterEqual(ephemeris.end, self.start + 100000.0)
+        np.testing.assert_allclose(np.diff(ephemeris.times), 300.0)
+
+        # 当晚木星在日落后西沉
+        _, alt = self.predictor.position('jupiter', self.start + 6 * 3600.0)
+        self.assertGreater(alt, 20.0)
+        ephemeris = self.predictor.ephemeris('jupiter', self.start + 6 * 3600.0, min_altitude=20.0)
+        self.assertLess(ephemeris.altitude[-1], 20.0)
+        self.assertTrue(np.all(ephemeris.altitude[1:-1] >= 20.0))
+        with self.assertRaises(ValueError):
+            self.predictor.ephemeris('jupiter', ephemeris.end + 600.0, min_altitude=20.0)
+
+    def test_sun_avoidance(self):
+        """目标与太阳的夹角按点积判断，路径上各点按各自的时刻检查"""
+        sun = SunAvoidance(self.predictor, radius=30.0)
+        t = self.start + np.array([3600.0, 7200.0])
+        sun_az, sun_alt = self.predictor.position('sun', t)
+        self.assertGreater(sun_alt[0], 0.0)
+        np.testing.assert_allclose(sun.separation(sun_az, sun_alt, t), 0.0, atol=0.05)
+        np.testing.assert_allclose(sun.separation(sun_az, sun_alt + 25.0, t), 25.0, atol=0.05)
+        np.testing.assert_array_equal(sun.is_safe(sun_az, sun_alt + np.array([25.0, 35.0]), t), [False, True])
+        # 太阳对面
+        sun.check((sun_az + 180.0) % 360, 30.0, t)
+        with self.assertRaises(ValueError):
+            sun.check(sun_az, sun_alt + np.array([35.0, 10.0]), t)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+import numpy as np
+import star_catalog
+from star_catalog import StarCatalog, SkyIndex, unit_vectors
+from transform_control import TelescopeController
+from gyroscope import VirtualGyroscope
+
+
+class TestStarCatalog(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = StarCatalog.load()
+        cls.lat, cls.lon = 40.011, 116.392
+        cls.time = datetime(2024, 3, 15, 12, 0, 0)
+
+    def test_lookup(self):
+        """名称、别名、中文名和编号都能查询，忽略大小写和空格"""
+        self.assertEqual(self.catalog.lookup('m 31').name, 'M31')
+        self.assertEqual(self.catalog.lookup('NGC224').name, 'M31')
+        self.assertEqual(self.catalog.lookup('天狼星').name, 'Sirius')
+        self.assertEqual(self.catalog.lookup('vega').name, 'Vega')
+        self.assertIsNone(self.catalog.lookup('no such star'))
+        self.assertEqual(self.catalog.search('m4')[0].name, 'M4')
+
+    def test_index_matches_brute_force(self):
+        """网格索引的锥形检索和最近邻结果与逐个计算一致"""
+        rng = np.random.default_rng(0)
+        ra = rng.uniform(0, 24, 2000)
+        dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 2000)))
+        index = SkyIndex(ra, dec, cell_size=10.0)
+        vectors = unit_vectors(ra, dec)
+        for _ in range(100):
+            center_ra, center_dec, radius = rng.uniform(0, 24), rng.uniform(-90, 90), rng.uniform(0.5, 40)
+            separation = np.degrees(np.arccos(np.clip(vectors @ unit_vectors(center_ra, center_dec), -1, 1)))
+            indices, _ = index.cone(center_ra, center_dec, radius)
+            self.assertEqual(set(indices), set(np.flatnonzero(separation <= radius)))
+            _, nearest = index.nearest(center_ra, center_dec, k=3)
+            np.testing.assert_allclose(nearest, np.sort(separation)[:3])
+
+    def test_visible_matches_scalar_transform(self):
+        """可见天体的地平坐标与逐个转换一致，同一时间桶只转换一次"""
+        calls = []
+        original = star_catalog.equatorial_to_horizontal_batch
+
+        def counting(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+
+        catalog = StarCatalog(self.catalog.objects)
+        with mock.patch.object(star_catalog, 'equatorial_to_horizontal_batch', counting):
+            visible = catalog.visible(self.lat, self.lon, self.time, min_alt=20.0)
+            catalog.visible(self.lat, self.lon, self.time.replace(second=20), min_alt=10.0, max_mag=2.0)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(visible)
+
+        # 缓存使用时间桶中间时刻，与请求时间相差不超过半个时间桶
+        controller = TelescopeController(gyro=VirtualGyroscope(), simulation=True)
+        bucket_time = self.time.replace(second=30)
+        for obj, az, alt in visible[:5]:
+            self.assertGreaterEqual(alt, 20.0)
+            expected_az, expected_alt = controller.equatorial_to_horizontal(obj.ra, obj.dec, self.lat, self.lon, bucket_time)
+            self.assertAlmostEqual(az, expected_az % 360, places=6)
+            self.assertAlmostEqual(alt, expected_alt, places=6)
+        mags = [obj.mag for obj, _, _ in visible]
+        self.assertEqual(mags, sorted(mags))
+
+    def test_nearest_horizontal(self):
+        """按望远镜指向查询最近天体"""
+        az, alt = self.catalog.horizontal(self.lat, self.lon, self.time)
+        i = int(np.argmax(alt))
+        results = self.catalog.nearest_horizontal(az[i], alt[i], self.lat, self.lon, self.time, k=2)
+        self.assertIs(results[0][0], self.catalog.objects[i])
+        self.assertLess(results[0][1], 0.01)
+        self.assertLessEqual(results[0][1], results[1][1])
+
+    def test_sky_columns(self):
+        """天空图数据按列组织，与可见天体查询一致"""
+        bucket, columns = self.catalog.sky(self.lat, self.lon, self.time, min_alt=0.0, max_mag=3.0)
+        self.assertEqual(bucket, self.catalog.time_bucket_index(self.time))
+        count = len(columns["name"])
+        self.assertGreater(count, 0)
+        for key in ("type", "mag", "az", "alt"):
+            self.assertEqual(len(columns[key]), count)
+        visible = self.catalog.visible(self.lat, self.lon, self.time, min_alt=0.0, max_mag=3.0)
+        self.assertEqual(sorted(columns["name"]), sorted(obj.name for obj, _, _ in visible))
+        self.assertTrue(np.all(columns["mag"] <= 3.0))
+        self.assertTrue(np.all(columns["alt"] >= 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
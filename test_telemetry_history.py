@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from telemetry_history import TelemetryHistory
+
+T0 = 1700000040.0   # 60秒的整数倍
+
+
+class TestTelemetryHistory(unittest.TestCase):
+    def create(self, **kwargs):
+        # 8 次/秒：采样时刻是2的幂分数，落在桶边界上的样本不受浮点误差影响
+        options = dict(channels=('az', 'alt'), rate=8, recent=10.0, tiers=((1.0, 30.0), (5.0, 600.0)))
+        options.update(kwargs)
+        return TelemetryHistory(**options)
+
+    def feed(self, history, seconds):
+        t = T0 + np.arange(int(seconds * 8)) / 8
+        values = np.stack((np.sin(t / 7.0) * 100, np.arange(len(t)) % 13), axis=1).astype(np.float32)
+        for ti, row in zip(t, values):
+            history.record(ti, row)
+        return t, values
+
+    def test_bounded_tiers(self):
+        """各级容量固定，写满后覆盖最旧的数据；降采样桶的最小/最大/平均值与原始数据一致"""
+        history = self.create()
+        size = history.status()["bytes"]
+        t, values = self.feed(history, 300)
+        self.assertEqual(history.status()["bytes"], size)
+        raw, seconds, fives = history.levels
+        self.assertEqual(len(raw), 80)
+        self.assertEqual(len(seconds), 30)
+        self.assertEqual(len(fives), 59)     # 最后一个5秒桶仍在累积
+        self.assertEqual(raw.oldest(), t[-80])
+
+        times, count, low, high, mean = fives.select(T0, T0 + 5.0)
+        np.testing.assert_array_equal(count, [40])
+        np.testing.assert_allclose(low[0], values[:40].min(axis=0))
+        np.testing.assert_allclose(high[0], values[:40].max(axis=0))
+        np.testing.assert_allclose(mean[0], values[:40].mean(axis=0), rtol=1e-5)
+        # 旧数据被丢弃，早于保留时长的样本不再接受
+        history.record(T0, (0.0, 0.0))
+        self.assertEqual(raw.written, len(t))
+
+    def test_query_across_tiers(self):
+        """查询跨越各级时按分辨率拼接，衔接处不重复也不遗漏"""
+        history = self.create()
+        t, values = self.feed(history, 300)
+        data = history.query(T0, T0 + 300.0, resolution=5.0)
+        self.assertEqual(data["time"], list(T0 + np.arange(60) * 5.0))
+        self.assertEqual(data["count"], [40] * 60)
+        expected = values.reshape(60, 40, 2)
+        np.testing.assert_allclose(data["mean"][0], expected[:, :, 0].mean(axis=1), atol=1e-3)
+        np.testing.assert_allclose(data["min"][1], expected[:, :, 1].min(axis=1))
+        np.testing.assert_allclose(data["max"][0], expected[:, :, 0].max(axis=1), atol=1e-4)
+
+        # 最近的数据按原始速率返回；分辨率细于来源桶宽的一段按来源桶宽返回
+        data = history.query(T0 + 295.0, T0 + 300.0, resolution=0.125, channels=['alt'])
+        self.assertEqual(data["count"], [1] * 40)
+        self.assertEqual(data["mean"], [values[-40:, 1].tolist()])
+        data = history.query(T0 + 200.0, T0 + 300.0, resolution=0.125)
+        self.assertEqual(sum(data["count"]), 800)
+        # 原始样本 [290, 300)，1秒桶 [270, 290)，5秒桶 [200, 270)
+        self.assertEqual(len(data["time"]), 80 + 20 + 14)
+        self.assertEqual(data["time"][14:16], [T0 + 270.0, T0 + 271.0])
+
+        # 点数超过上限时放宽分辨率
+        data = history.query(T0, T0 + 300.0, resolution=0.001, max_points=100)
+        self.assertEqual(data["resolution"], 3.0)
+        with self.assertRaises(ValueError):
+            history.query(T0, T0 + 10.0, channels=['ra'])
+
+    def test_missing_values(self):
+        """缺失的通道（nan）不参与统计，输出为null"""
+        history = self.create()
+        for k in range(40):
+            history.record(T0 + k / 8, (float(k), np.nan if k < 24 else 1.0))
+        data = history.query(T0, T0 + 5.0, resolution=1.0)
+        self.assertEqual(data["mean"][1], [None, None, None, 1.0, 1.0])
+        self.assertEqual(data["mean"][0], [3.5, 11.5, 19.5, 27.5, 35.5])
+
+    def test_circular_channels(self):
+        """方位角在0°/360°附近来回时平均值接近0°而不是180°，最小/最大值与平均值连续表示"""
+        history = self.create(circular=('az',))
+        t = T0 + np.arange(8 * 30) / 8
+        unwrapped = np.where(np.arange(len(t)) % 2, -1.0, 1.0) + (t - T0) / 10   # 在0°两侧来回，慢慢转离
+        for ti, a in zip(t, unwrapped % 360.0):
+            history.record(ti, (a, 45.0))
+
+        times, count, low, high, mean = history.levels[1].select(T0, T0 + 1.0)
+        np.testing.assert_allclose(mean[0], [unwrapped[:8].mean(), 45.0], atol=1e-4)
+        np.testing.assert_allclose(low[0], [unwrapped[:8].min(), 45.0], atol=1e-4)
+        np.testing.assert_allclose(high[0], [unwrapped[:8].max(), 45.0], atol=1e-4)
+        times, count, low, high, mean = history.levels[2].select(T0, T0 + 5.0)
+        np.testing.assert_allclose(mean[0], [unwrapped[:40].mean(), 45.0], atol=1e-4)
+        np.testing.assert_allclose(low[0], [unwrapped[:40].min(), 45.0], atol=1e-4)
+
+        data = history.query(T0, T0 + 30.0, resolution=15.0, channels=['az'])
+        expected = unwrapped.reshape(2, -1)
+        np.testing.assert_allclose(data["mean"][0], expected.mean(axis=1), atol=1e-3)
+        np.testing.assert_allclose(data["min"][0], expected.min(axis=1), atol=1e-3)
+        np.testing.assert_allclose(data["max"][0], expected.max(axis=1), atol=1e-3)
+        # 原始样本按原值返回
+        data = history.query(T0 + 29.75, T0 + 30.0, resolution=0.125, channels=['az'])
+        np.testing.assert_allclose(data["mean"][0], unwrapped[-2:] % 360.0, atol=1e-4)
+
+    def test_persistence(self):
+        """保存后重新创建时恢复各级数据；层级配置不同的文件不加载"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.npz')
+            history = self.create(path=path)
+            self.feed(history, 120)
+            history.save()
+            expected = history.query(T0, T0 + 120.0, resolution=2.0)
+
+            restored = self.create(path=path)
+            self.assertEqual(restored.query(T0, T0 + 120.0, resolution=2.0), expected)
+            restored.record(T0 + 100.0, (0.0, 0.0))
+            self.assertEqual(restored.levels[0].written, history.levels[0].written)
+
+            other = self.create(path=path, tiers=((1.0, 30.0),))
+            self.assertEqual(other.levels[0].written, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+import numpy as np
+import visibility
+from visibility import VisibilityPlanner
+from star_catalog import StarCatalog
+from batch_transform import equatorial_to_horizontal_batch
+
+
+class TestVisibility(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = StarCatalog.load()
+        cls.lat, cls.lon = 40.0, 116.4
+        cls.night = date(2024, 3, 15)
+
+    def test_rise_set_transit(self):
+        """升起/落下时刻高度角等于下限，中天时刻与逐分钟计算的最大值一致"""
+        planner = VisibilityPlanner(self.lat, self.lon)
+        targets = [self.catalog.lookup(name) for name in ('Sirius', 'Arcturus', 'Vega')]
+        windows = planner.windows(targets, self.night)
+        start, end = planner.night_span(self.night)
+        minutes = [start + timedelta(minutes=m) for m in range(24 * 60 + 1)]
+        for obj, window in zip(targets, windows):
+            self.assertFalse(window.never_up)
+            for moment, rising in ((window.rise, True), (window.set, False)):
+                self.assertIsNotNone(moment)
+                _, alt = equatorial_to_horizontal_batch(obj.ra, obj.dec, self.lat, self.lon,
+                                                        [moment, moment + timedelta(minutes=5)])
+                self.assertAlmostEqual(alt[0], 20.0, places=2)
+                self.assertEqual(alt[1] > alt[0], rising)
+            _, curve = equatorial_to_horizontal_batch(obj.ra, obj.dec, self.lat, self.lon, minutes)
+            best = minutes[int(np.argmax(curve))]
+            self.assertLess(abs((window.transit - best).total_seconds()), 90)
+            self.assertAlmostEqual(window.transit_altitude, float(np.max(curve)), places=2)
+
+    def test_flags_and_cache(self):
+        """拱极星整夜可见，南天星整夜不可见；同一日期只计算一次"""
+        planner = VisibilityPlanner(self.lat, self.lon)
+        targets = [self.catalog.lookup('Polaris'), self.catalog.lookup('Canopus')]
+        calls = []
+        original = visibility.equatorial_to_horizontal_batch
+
+        def counting(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(visibility, 'equatorial_to_horizontal_batch', counting):
+            polaris, canopus = planner.windows(targets, self.night)
+            count = len(calls)
+            planner.windows(targets, datetime(2024, 3, 15, 20, 0))
+        self.assertEqual(len(calls), count)
+        self.assertTrue(polaris.always_up)
+        self.assertIsNone(polaris.rise)
+        self.assertTrue(canopus.never_up)
+        self.assertLess(canopus.transit_altitude, 20.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,28 @@
 import time
+import threading
 import serial
 from datetime import datetime
 import logging
-import sys
 import numpy as np
-from astropy import units as u
-from astropy.coordinates import EarthLocation, SkyCoord, AltAz
-from astropy.time import Time
 # from gyroscope_adapter import GyroscopeBase, VirtualGyroscope, RealGyroscope
-from gyroscope import Gyroscope
+from gyroscope import (GyroscopeBase, VirtualGyroscope, RealGyroscope, AsyncRealGyroscope, StaleSampleError,
+                       parse_relay_command)
+from modbus_bus import ModbusBus
+from batch_transform import equatorial_to_horizontal_batch
+from pointing_model import PointingModel
+from refraction import RefractionTable
+from slew_planner import LeadTargetSolver, CableWrap
+from axis_control import AxisController, AxisFault
+from horizon_mask import HorizonMask
 from typing import Optional
 
 
 class TelescopeController:
-    def __init__(self, port='/dev/tty.usbmodem1201', baudrate=115200, gyro: Gyroscope = None, simulation=False, hybrid_sim=False):
+    def __init__(self, port='/dev/tty.usbmodem1201', baudrate=115200, gyro: GyroscopeBase = None, simulation=False, hybrid_sim=False,
+                 pointing_model: Optional[PointingModel] = None, refraction: Optional[RefractionTable] = None,
+                 lead_solver: Optional[LeadTargetSolver] = None, cable_wrap: Optional[CableWrap] = None,
+                 braking=False, axes: Optional[dict] = None, timed_pulses=False,
+                 horizon: Optional[HorizonMask] = None):
         """
         初始化望远镜控制器
         
@@ -22,10 +31,48 @@ class TelescopeController:
         :param gyro: 陀螺仪对象，如果为None且非仿真模式则报错
         :param simulation: 完全仿真模式（不连接真实串口，使用虚拟陀螺仪）
         :param hybrid_sim: 半实物仿真模式（连接真实串口，使用虚拟陀螺仪）
+        :param pointing_model: 指向模型，None表示传感器读数即真实指向
+        :param refraction: 大气折射表，None表示不做折射修正
+        :param lead_solver: 提前量目标解算器，赤道坐标目标按预计到达时刻的位置设置；None表示使用请求时刻的位置
+        :param cable_wrap: 方位轴线缆缠绕跟踪，None时使用默认限位 ±270°
+        :param braking: 是否使用学习刹车距离的控制模式（提前松开继电器，最后用短脉冲修正）
+        :param timed_pulses: 短脉冲使用定时脉冲命令（如 "AZ1T120"），由继电器固件计时，
+                             需要relay_control.cpp支持该协议
+        :param axes: 自定义各轴控制器 {'az': AxisController, 'alt': AxisController}，None时按braking创建
+        :param horizon: 地平遮挡掩码，被遮挡的目标拒绝设置，穿过遮挡的转动改为绕行；
+                        None时只按高度角20~90°限制目标
         """
         # 初始化陀螺仪
         self.gyro = gyro
         logging.info("使用外部提供的陀螺仪")
+        # 指向模型：目标（真实天空位置）在set_target中换算为传感器读数，
+        # 控制周期直接比较传感器读数；对外报告的姿态换算回真实位置
+        self.pointing_model = pointing_model
+        # 大气折射：赤道坐标目标转换为视高度角（查表修正，随气象参数更新）
+        self.refraction = refraction
+        self.lead_solver = lead_solver
+        self.lead_time = 0.0  # 最近一次赤道坐标目标的预计转动时间 (秒)
+        # 方位轴走最短方向，同时跟踪展开方位角，避免线缆缠绕超限
+        self.cable_wrap = cable_wrap or CableWrap()
+        # 两轴各自的控制状态机：独立决策、独立到位，刹车模式下的学习结果跨目标保留
+        self.axes = axes or {
+            'az': AxisController('方位', tolerance=0.5 if braking else 1.0, braking=braking,
+                                 timed_pulses=timed_pulses),
+            'alt': AxisController('高度', tolerance=0.5 if braking else 1.0, braking=braking,
+                                  limits=(20.0, 90.0), timed_pulses=timed_pulses),
+        }
+        self.horizon = horizon
+        # 依次到达的路径点 (展开方位角, 高度角, 驻留时间, 目标编号)，均为传感器读数；
+        # 目标编号对应扫描网格点（单个目标为0），绕开遮挡的路径点为None
+        self.route = []
+        self.target_index = 0
+        self._targets = None
+        self._dwell_until = None
+        # 移动目标（卫星）的稠密星历，None表示固定目标
+        self._track = None
+        # 直接转动时逐周期检查是否进入遮挡区域；离开起始位置的遮挡之后才开始检查
+        self._guard_route = False
+        self._left_obstruction = False
 
         self.simulation = simulation
         self.hybrid_sim = hybrid_sim
@@ -34,6 +81,23 @@ class TelescopeController:
         # 半实物仿真模式：连接串口但使用虚拟陀螺仪
         # 正常模式：连接串口并使用真实陀螺仪
         
+        # 串口写入锁：控制线程与停止请求可能从不同线程发送命令
+        self._send_lock = threading.RLock()
+        # 停止请求标志：置位后控制周期不再发出运动命令
+        self.stop_requested = threading.Event()
+        self.last_attitude = None
+        self.last_tick_time = 0.0
+        # 陀螺仪数据过期时停止运动等待新数据，持续超过max_stale_time则控制失败
+        self.max_stale_time = 2.0
+        self.stale_since = None
+        # 看门狗使用的时间戳 (time.monotonic)：最近一次控制决策和最近一次有效姿态
+        self.last_heartbeat = 0.0
+        self.last_attitude_time = 0.0
+        # 最近发出的命令中各继电器的方向（0表示松开），用于判断电机是否可能在转动
+        self.relay_state = {'AZ': 0, 'EL': 0}
+        # 遥测历史 (TelemetryHistory)，设置后每个控制周期记录一次指向和目标
+        self.history = None
+
         if not simulation or hybrid_sim:
             try:
                 self.ser = serial.Serial(port, baudrate, timeout=0.1)
@@ -62,20 +126,34 @@ class TelescopeController:
         :param lat: 观测点纬度 (度)
         :param lon: 观测点经度 (度)
         :param time: 观测时间 (datetime对象)
-        :return: 方位角 (度), 高度角 (度)
+        :return: 方位角 (度), 高度角 (度)；设置了折射表时为视高度角
+        """
+        # 与批量转换共用同一实现（观测地点对象按经纬度缓存）
+        azimuth, altitude = equatorial_to_horizontal_batch(ra, dec, lat, lon, time, refraction=self.refraction)
+        return float(azimuth), float(altitude)
+
+    def equatorial_target(self, ra, dec, lat, lon, time, raw_attitude=None, geometric=None):
+        """
+        赤道坐标目标 -> 地平坐标目标（折射修正、提前量解算），set_target和多望远镜注册表共用
+
+        :param raw_attitude: 当前传感器读数；配置了提前量解算器时按预计到达时刻的目标位置解算
+        :param geometric: 已批量算好的几何地平坐标 (方位角, 高度角)，不解算提前量时只需查折射表
+        :return: (方位角, 高度角, 预计转动时间 (秒)，未解算提前量时为None)
         """
-        # 定义观测地点
-        location = EarthLocation(lat=lat*u.deg, lon=lon*u.deg)
-        # 定义观测时间
-        astropy_time = Time(time)
-        # 定义赤道坐标
-        equatorial_coord = SkyCoord(ra=ra*15*u.deg, dec=dec*u.deg)
-        # 定义地平坐标系
-        altaz_frame = AltAz(obstime=astropy_time, location=location)
-        # 转换为地平坐标
-        altaz_coord = equatorial_coord.transform_to(altaz_frame)
-
-        return altaz_coord.az.deg, altaz_coord.alt.deg
+        if self.lead_solver and raw_attitude:
+            # 按预计到达时刻的目标位置设置，转动结束时正好对准目标
+            current_az, current_alt = self.sky_attitude(*raw_attitude)
+            azimuth, altitude, lead_time = self.lead_solver.solve(
+                ra, dec, lat, lon, time, current_az, current_alt, refraction=self.refraction)
+            logging.info(f"提前量目标：预计 {lead_time:.1f} 秒后到达")
+            return azimuth, altitude, lead_time
+        if geometric is None:
+            azimuth, altitude = self.equatorial_to_horizontal(ra, dec, lat, lon, time)
+            return azimuth, altitude, None
+        azimuth, altitude = geometric
+        if self.refraction is not None:
+            altitude = self.refraction.apparent(altitude)
+        return float(azimuth), float(altitude), None
 
     def set_target(self, *args, **kwargs):
         """
@@ -91,9 +169,35 @@ class TelescopeController:
            - azimuth: 方位角 (度)
            - altitude: 高度角 (度)
            - coordinate_type: 必须设为'horizontal'
+
+        3. 扫描：set_target(scan, coordinate_type='scan')
+           - scan: ScanPlan，依次到达各网格点并驻留，全部完成后才算到达目标
+
+        4. 跟踪：set_target(ephemeris, coordinate_type='track')
+           - ephemeris: SatelliteEphemeris等带times/azimuth/altitude/position的稠密星历，
+             控制周期中按当前时刻插值，星历结束时才算到达目标
+
+        可选关键字参数 raw_attitude：调用方已读到的传感器读数 (方位角, 高度角)，不再读取陀螺仪
         """
+        # 当前传感器读数：用于更新线缆缠绕状态和提前量解算；调用方已在其他线程读到时可直接传入
+        raw_attitude = kwargs.pop('raw_attitude', None)
+        if raw_attitude is None and self.gyro:
+            raw_attitude = self.gyro.get_current_attitude()
+
+        if kwargs.get('coordinate_type') == 'track':
+            self._set_track(args[0] if args else None, raw_attitude)
+            return
+        self._track = None
+
         # 检查参数来确定是哪种坐标系
-        if 'coordinate_type' in kwargs and kwargs['coordinate_type'] == 'horizontal':
+        scan = None
+        if kwargs.get('coordinate_type') == 'scan':
+            # 扫描：网格点已批量转换为地平坐标，整个扫描作为一个目标连续执行
+            scan = args[0] if args else None
+            if not scan:
+                raise ValueError("扫描路径中没有网格点")
+            azimuths, altitudes, dwell = scan.azimuth % 360, scan.altitude.copy(), scan.dwell
+        elif 'coordinate_type' in kwargs and kwargs['coordinate_type'] == 'horizontal':
             # 地平坐标系输入
             if len(args) >= 2:
                 azimuth, altitude = args[0], args[1]
@@ -102,18 +206,206 @@ class TelescopeController:
         else:
             # 赤道坐标系输入
             if len(args) >= 5:
-                ra, dec, lat, lon, time = args
-                azimuth, altitude = self.equatorial_to_horizontal(ra, dec, lat, lon, time)
+                azimuth, altitude, lead_time = self.equatorial_target(*args[:5], raw_attitude=raw_attitude)
+                if lead_time is not None:
+                    self.lead_time = lead_time
             else:
                 raise ValueError("使用赤道坐标系时，必须提供赤经、赤纬、纬度、经度和时间")
+        if scan is None:
+            azimuths, altitudes, dwell = np.array([azimuth % 360]), np.array([float(altitude)]), 0.0
+
+        if self.horizon:
+            # 按实际地平判断，被遮挡的目标直接拒绝，不截断到别的位置
+            blocked = np.flatnonzero(~self.horizon.visible(azimuths, altitudes))
+            if len(blocked):
+                i = blocked[0]
+                raise ValueError(f"目标 ({azimuths[i]:.2f}°, {altitudes[i]:.2f}°) 被地平遮挡")
+            altitudes = np.minimum(90.0, altitudes)
+        else:
+            altitudes = np.clip(altitudes, 20.0, 90.0)
+
+        # 控制使用的目标：经指向模型换算为对准目标时的传感器读数
+        if self.pointing_model:
+            command_az, command_alt = self.pointing_model.to_mount(azimuths, altitudes)
+        else:
+            command_az, command_alt = azimuths, altitudes
+        # 方位轴转动方向：最短方向优先，超出线缆缠绕限位时反向；扫描的各网格点依次规划
+        if raw_attitude:
+            self.cable_wrap.update(raw_attitude[0])
+        unwrapped = []
+        for az in np.atleast_1d(command_az):
+            unwrapped.append(self.cable_wrap.plan(float(az), unwrapped[-1] if unwrapped else None))
+        self._targets = (azimuths, altitudes, np.atleast_1d(command_az), np.atleast_1d(command_alt))
+        self.route = [(unwrapped[i], float(self._targets[3][i]), dwell, i) for i in range(len(unwrapped))]
+        self._select_target(0)
+
+        waypoints = []
+        if self.horizon and raw_attitude:
+            current_az, current_alt = self.sky_attitude(*raw_attitude)
+            delta = self.command_unwrapped - self.cable_wrap.unwrapped
+            path_az, path_alt = self.horizon.slew_path(current_az, current_alt,
+                                                       current_az + delta, self.target_altitude)
+            if not self.horizon.visible(path_az, path_alt).all():
+                waypoints = self._detour(current_az, current_alt, self.cable_wrap.unwrapped)
+        self.route = waypoints + self.route
+        self._guard_route = self.horizon is not None and not waypoints
+        self._left_obstruction = False
+        self._dwell_until = None
+        self._set_goals(self.route[0])
+        # 新目标意味着允许再次运动
+        self.stop_requested.clear()
+        if len(unwrapped) > 1:
+            logging.info(f"设置扫描: {len(unwrapped)} 个网格点, 每点驻留 {dwell:g} 秒")
+        else:
+            logging.info(f"设置目标: 方位角={self.target_azimuth:.2f}°, 高度角={self.target_altitude:.2f}°")
+
+    def _set_track(self, ephemeris, raw_attitude):
+        """
+        设置移动目标：整段星历一次换算为传感器读数并展开方位角，控制周期中只做插值
+
+        设置了地平遮挡掩码时只跟踪当前时刻之后第一段可见的星历：升出遮挡前在升出点等待，
+        再次进入遮挡时结束跟踪；控制周期中仍逐周期检查实际指向。
+
+        :raises ValueError: 没有星历、星历已结束、剩余路径都被遮挡、转到起点的路径被遮挡
+                            或过境路径超出线缆缠绕范围
+        """
+        if ephemeris is None or not len(ephemeris.times):
+            raise ValueError("跟踪目标没有星历")
+        now = time.time()
+        if now >= ephemeris.end:
+            raise ValueError(f"{ephemeris.name} 的星历已结束")
+        if self.horizon:
+            clipped = ephemeris.above_horizon(self.horizon, now)
+            if clipped is None:
+                raise ValueError(f"{ephemeris.name} 的剩余路径都被地平遮挡")
+            ephemeris = clipped
+        if self.pointing_model:
+            command_az, command_alt = self.pointing_model.to_mount(ephemeris.azimuth, ephemeris.altitude)
+        else:
+            command_az, command_alt = ephemeris.azimuth, ephemeris.altitude
+        command_az = np.unwrap(np.asarray(command_az, dtype=float), period=360.0)
+        if raw_attitude:
+            self.cable_wrap.update(raw_attitude[0])
+        # 从当前时刻对应的星历点开始规划方向，剩余路径整体超出缠绕限位时换另一圈
+        k = min(int(np.searchsorted(ephemeris.times, now)), len(ephemeris.times) - 1)
+        first = self.cable_wrap.plan(command_az[k] % 360.0)
+        remaining = command_az[k:] - command_az[k]
+        for start in (first, first - 360.0, first + 360.0):
+            if (self.cable_wrap.min_azimuth <= start + remaining.min()
+                    and start + remaining.max() <= self.cable_wrap.max_azimuth):
+                break
+        else:
+            raise ValueError(f"{ephemeris.name} 的过境路径超出线缆缠绕范围")
+        track_path = (command_az - command_az[k] + start, np.asarray(command_alt, dtype=float))
+
+        if self.horizon and raw_attitude:
+            # 跟踪中不绕行：转到当前跟踪位置的直接路径穿过遮挡时拒绝（起点所在的遮挡区域除外）
+            current_az, current_alt = self.sky_attitude(*raw_attitude)
+            delta = float(np.interp(now, ephemeris.times, track_path[0])) - self.cable_wrap.unwrapped
+            path_az, path_alt = self.horizon.slew_path(current_az, current_alt,
+                                                       current_az + delta, ephemeris.position(now)[1])
+            visible = self.horizon.visible(path_az, path_alt)
+            if visible.any() and not visible[int(np.argmax(visible)):].all():
+                raise ValueError(f"转到 {ephemeris.name} 的路径被地平遮挡")
+
+        self._track = ephemeris
+        self._track_path = track_path
+        # 控制周期使用time.monotonic，星历使用unix时间
+        self._clock_offset = now - time.monotonic()
+        self._track_idle = False
+        self.route = []
+        self._guard_route = self.horizon is not None
+        self._left_obstruction = False
+        self._track_position(time.monotonic())
+        # 星历开头可能低于高度轴下限（如升起前），先转到下限等待，之后由track_goal按限位跟踪
+        low, high = self.axes['alt'].limits or (-90.0, 90.0)
+        self._set_goals((self.command_unwrapped, min(high, max(low, self.command_altitude))))
+        self.stop_requested.clear()
+        logging.info(f"跟踪 {ephemeris.name}: 星历 {len(ephemeris.times)} 点, "
+                     f"剩余 {ephemeris.end - now:.0f} 秒")
+
+    def _track_position(self, now):
+        """插值得到当前时刻的跟踪目标，返回对应的unix时间"""
+        t = now + self._clock_offset
+        unwrapped, altitude = self._track_path
+        self.target_azimuth, self.target_altitude = self._track.position(t)
+        self.command_unwrapped = float(np.interp(t, self._track.times, unwrapped))
+        self.command_altitude = float(np.interp(t, self._track.times, altitude))
+        self.command_azimuth = self.command_unwrapped % 360.0
+        return t
+
+    def _select_target(self, index):
+        """切换当前目标（扫描时为当前网格点）"""
+        azimuths, altitudes, command_az, command_alt = self._targets
+        self.target_index = index
+        self.target_azimuth, self.target_altitude = float(azimuths[index]), float(altitudes[index])
+        self.command_azimuth, self.command_altitude = float(command_az[index]), float(command_alt[index])
+        self.command_unwrapped = next(entry[0] for entry in self.route if entry[3] == index)
+
+    def _set_goals(self, goal):
+        self.axes['az'].set_goal(goal[0])
+        self.axes['alt'].set_goal(goal[1])
+
+    def _advance_route(self):
+        """当前路径点（及驻留）完成，转向下一个"""
+        self.route.pop(0)
+        self._dwell_until = None
+        index = self.route[0][3]
+        if index is not None and index != self.target_index:
+            self._select_target(index)
+            # 扫描网格点之间相距很近，绕行结束后恢复逐周期检查
+            self._guard_route = self.horizon is not None
+        self._set_goals(self.route[0])
+
+    def _detour(self, current_az, current_alt, current_unwrapped):
+        """
+        绕开遮挡的路径点：先在当前方位升到扫过方位范围内都无遮挡的高度，转方位后再降到当前目标
+
+        掩码按真实指向判断，路径点换算为传感器读数时沿用目标处的指向修正量（遮挡网格远比修正量粗）。
+
+        :param current_az: 当前真实方位角
+        :param current_alt: 当前真实高度角
+        :param current_unwrapped: 当前展开方位角（传感器读数）
+        :return: [(展开方位角, 高度角, 驻留时间, None), ...]
+        :raises ValueError: 最高也无法越过遮挡
+        """
+        delta = self.command_unwrapped - current_unwrapped
+        via = self.horizon.detour_altitude(current_az, current_alt, current_az + delta, self.target_altitude,
+                                           margin=self.axes['alt'].tolerance)
+        if via > 90.0:
+            raise ValueError("转动路径上的遮挡无法绕开")
+        via_command = min(90.0, via + self.command_altitude - self.target_altitude)
+        waypoints = []
+        if current_alt < via - self.axes['alt'].tolerance:
+            waypoints.append((current_unwrapped, via_command, 0.0, None))
+        waypoints.append((self.command_unwrapped, via_command, 0.0, None))
+        logging.info(f"转动路径穿过遮挡区域，升到 {via:.1f}° 后绕行")
+        return waypoints
+
+    def sky_attitude(self, raw_az, raw_alt):
+        """传感器读数经指向模型换算为真实指向"""
+        if not self.pointing_model:
+            return raw_az, raw_alt
+        az, alt = self.pointing_model.to_sky(raw_az, raw_alt)
+        return float(az), float(alt)
+
+    def get_current_attitude(self):
+        """读取陀螺仪并返回真实指向 (方位角, 高度角)"""
+        return self.sky_attitude(*self.gyro.get_current_attitude())
         
-        # 设置目标坐标
-        self.target_azimuth = azimuth % 360
-        self.target_altitude = max(20.0, min(90.0, altitude))
-        logging.info(f"设置目标: 方位角={self.target_azimuth:.2f}°, 高度角={self.target_altitude:.2f}°")
-        
+    @property
+    def relays_active(self):
+        """最近发出的命令是否让任一继电器保持吸合（包括固件计时的脉冲）"""
+        return any(self.relay_state.values())
+
     def send_command(self, cmd):
         """发送命令，根据模式选择发送到串口或模拟"""
+        with self._send_lock:
+            self._transmit(cmd)
+        print(cmd, end="")
+
+    def _transmit(self, cmd):
+        """写出命令并记录继电器状态（调用方负责加锁）"""
         # 在完全仿真模式下不发送串口命令，在半实物仿真和正常模式下发送
         if not self.simulation or self.hybrid_sim:
             try:
@@ -121,98 +413,259 @@ class TelescopeController:
                 logging.debug(f"串口命令已发送: {cmd.strip()}")
             except Exception as e:
                 logging.error(f"串口命令发送失败: {e}")
-        
+
         # 在仿真和半实物仿真模式下使用虚拟陀螺仪，在正常模式下不使用
         if self.gyro and (self.simulation or self.hybrid_sim):
             self.gyro.process_command(cmd)
-            
-        print(cmd, end="")
+
+        for name, (direction, _) in parse_relay_command(cmd).items():
+            self.relay_state[name] = direction
         
+    def compute_command(self, current_az, current_alt, sample_time=None):
+        """
+        根据当前姿态计算控制命令（不进行任何I/O，供线程和异步引擎共用）
+
+        :param current_az: 当前方位角传感器读数 (度)
+        :param current_alt: 当前高度角传感器读数 (度)
+        :param sample_time: 读数时刻 (time.monotonic)，用于估计转速和各轴决策周期；None表示当前时刻
+        :return: (是否到达目标, 命令字符串)，两轴都进入保持状态时到达目标，命令为停止命令
+        :raises AxisFault: 任一轴故障（目标超限、读数无效、转动停滞）
+        """
+        now = time.monotonic() if sample_time is None else sample_time
+        self.last_heartbeat = time.monotonic()
+        self.last_attitude_time = now
+        if self._track is not None:
+            track_time = self._track_position(now)
+            self.axes['az'].track_goal(self.command_unwrapped)
+            self.axes['alt'].track_goal(self.command_altitude)
+        unwrapped = self.cable_wrap.update(current_az)
+        # 两轴独立更新：一轴故障时先让另一轴也停下，再向上报告
+        try:
+            if self._guard_route:
+                self._check_obstruction(current_az, current_alt, unwrapped)
+            az_dir = self.axes['az'].update(unwrapped, now)
+            alt_dir = self.axes['alt'].update(current_alt, now)
+        except AxisFault:
+            for axis in self.axes.values():
+                axis.abort()
+            raise
+        if self._track is not None:
+            if track_time > self._track.end:
+                return True, "AZ0EL0\n"
+            # 两轴都静止时只发送一次停止命令
+            idle = az_dir == 0 and alt_dir == 0
+            if idle and self._track_idle:
+                return False, ""
+            self._track_idle = idle
+            return False, self._generate_control_command(az_dir, alt_dir)
+        if self.axes['az'].is_holding() and self.axes['alt'].is_holding():
+            # 扫描网格点在保持状态下驻留，继电器已松开，不需要发送停止命令
+            if self._dwell_until is None:
+                self._dwell_until = now + self.route[0][2]
+            if now < self._dwell_until:
+                return False, ""
+            if len(self.route) > 1:
+                # 转向下一个绕行路径点或扫描网格点
+                self._advance_route()
+                return False, ""
+            return True, "AZ0EL0\n"
+        return False, self._generate_control_command(az_dir, alt_dir)
+
+    def _check_obstruction(self, raw_az, raw_alt, unwrapped):
+        """
+        直接转动途中进入遮挡区域（实际两轴转速与路径估计不同）时改为绕行；跟踪时直接停止
+
+        :raises AxisFault: 无法绕开，或跟踪中进入遮挡区域
+        """
+        sky_az, sky_alt = self.sky_attitude(raw_az, raw_alt)
+        if self.horizon.is_visible(sky_az, sky_alt):
+            self._left_obstruction = True
+            return
+        if not self._left_obstruction:
+            # 仍在起始位置所在的遮挡区域内
+            return
+        logging.warning(f"转动途中进入遮挡区域 ({sky_az:.2f}°, {sky_alt:.2f}°)")
+        if self._track is not None:
+            # 跟踪路径已按掩码截取，实际指向仍进入遮挡时停止，不绕行
+            raise AxisFault(f"跟踪途中进入遮挡区域 ({sky_az:.2f}°, {sky_alt:.2f}°)")
+        try:
+            waypoints = self._detour(sky_az, sky_alt, unwrapped)
+        except ValueError as e:
+            raise AxisFault(str(e))
+        self.route = waypoints + self.route
+        self._guard_route = False
+        self._set_goals(self.route[0])
+
+    def control_step(self):
+        """
+        执行一个控制周期：读取姿态、计算控制信号并发送命令
+
+        :return: True 表示已到达目标（已发送停止命令），False 表示仍在运动
+        """
+        raw_az, raw_alt = self.gyro.get_current_attitude()
+        # 只有真实陀螺仪提供过期标志，其他陀螺仪对象按鸭子类型使用
+        is_stale = getattr(self.gyro, 'is_stale', None)
+        return self.apply_sample(raw_az, raw_alt, stale=bool(is_stale and is_stale()))
+
+    def apply_sample(self, raw_az, raw_alt, sample_time=None, stale=False):
+        """
+        用一次已读到的姿态执行控制周期的其余部分（不访问传感器），供由其他线程读取传感器的调用方使用
+
+        :param raw_az: 方位角传感器读数 (度)
+        :param raw_alt: 高度角传感器读数 (度)
+        :param sample_time: 读数时刻 (time.monotonic)，None表示当前时刻
+        :param stale: 读数是否过期
+        :return: 与control_step相同
+        """
+        if stale:
+            self._wait_for_fresh_sample()
+            return False
+        self.stale_since = None
+        current_az, current_alt = self.sky_attitude(raw_az, raw_alt)
+        # 最近一次控制周期读到的姿态，供遥测发布使用，避免其他线程再次访问传感器
+        self.last_attitude = (current_az, current_alt)
+        self.last_tick_time = time.time()
+        print(f"当前角度: ({current_az:.2f}°, {current_alt:.2f}°)")
+        
+        reached, cmd = self.compute_command(raw_az, raw_alt, sample_time)
+        self.record_history(current_az, current_alt)
+
+        # 打印当前状态
+        print(f"目标角度: ({self.target_azimuth:.2f}°, {self.target_altitude:.2f}°)")
+        
+        # 检查是否到达目标
+        if reached:
+            logging.info("到达目标位置，停止所有运动")
+            self.stop_motion()
+            return True
+            
+        # 读取姿态期间若收到停止请求，则不再发出运动命令
+        with self._send_lock:
+            # 两轴都在执行固件脉冲时本周期无需发送
+            if not self.stop_requested.is_set() and cmd.strip():
+                self.send_command(cmd)
+        return False
+
+    def record_history(self, current_az, current_alt):
+        """把当前指向和目标写入遥测历史（未设置历史时不做任何事）"""
+        if self.history is not None:
+            self.history.record(time.time(), (current_az, current_alt, self.target_azimuth, self.target_altitude))
+
+    def _wait_for_fresh_sample(self):
+        """
+        陀螺仪数据过期：松开继电器，不按旧数据决策
+
+        :raises StaleSampleError: 过期时间超过max_stale_time
+        """
+        now = time.monotonic()
+        if self.stale_since is None:
+            self.stale_since = now
+            logging.warning("陀螺仪数据过期，停止运动等待新数据")
+            with self._send_lock:
+                self.send_command("AZ0EL0\n")
+            for axis in self.axes.values():
+                axis.abort()
+        elif now - self.stale_since > self.max_stale_time:
+            raise StaleSampleError(f"陀螺仪数据过期超过 {self.max_stale_time:g} 秒")
+
+    def stop_motion(self, repeat=10):
+        """发送停止命令（默认重复多次以确保继电器收到）"""
+        for i in range(repeat):
+            self.send_command("AZ0EL0\n")  # 停止所有运动 
+            if i < repeat - 1:
+                time.sleep(0.005)
+
+    def request_stop(self):
+        """请求立即停止运动，可从任意线程调用"""
+        self.stop_requested.set()
+        self.send_command("AZ0EL0\n")
+        self.abort_axes()
+
+    def abort_axes(self):
+        """松开两轴继电器后复位各轴状态机（清除转动方向和脉冲状态）"""
+        for axis in self.axes.values():
+            axis.abort()
+
+    def emergency_stop(self, lock_timeout=0.02):
+        """
+        看门狗使用的停止：不依赖可能已卡住的控制线程。
+
+        控制线程阻塞在串口写入中（持有写入锁超过lock_timeout）时不再等待，直接写出停止命令，
+        并在前面加一个换行，结束可能只写了一半的命令行（继电器固件按行解析）。
+        各轴状态机由控制线程在停止后复位（abort_axes），这里不在调用线程中修改。
+
+        :param lock_timeout: 等待串口写入锁的最长时间 (秒)
+        """
+        self.stop_requested.set()
+        if self._send_lock.acquire(timeout=lock_timeout):
+            try:
+                self.send_command("AZ0EL0\n")
+            finally:
+                self._send_lock.release()
+        else:
+            self._transmit("\nAZ0EL0\n")
+
     def control_loop(self):
-        """控制循环，驱动望远镜移动到目标位置"""
+        """
+        控制循环，驱动望远镜移动到目标位置
+
+        :return: 0 到达目标，1 控制失败，2 被停止请求中断
+        """
         while True:
             # 获取当前姿态
             if not self.gyro and (self.simulation or self.hybrid_sim):
                 logging.error("仿真或半实物仿真模式下未设置虚拟陀螺仪")
                 return 1
-                
-            current_az, current_alt = self.gyro.get_current_attitude()
-            print(f"当前角度: ({current_az:.2f}°, {current_alt:.2f}°)")
-            
-            # 计算方位角和高度角的控制信号
-            az_cw, az_ccw = self._calculate_azimuth_control(current_az)
-            alt_up, alt_down = self._calculate_altitude_control(current_alt)
 
-            # 打印当前状态
-            print(f"目标角度: ({self.target_azimuth:.2f}°, {self.target_altitude:.2f}°)")
-            
-            # 检查是否到达目标
-            if self._reached_target(az_cw, az_ccw, alt_up, alt_down):
-                logging.info("到达目标位置，停止所有运动")
-                for i in range(10):
-                    self.send_command("AZ0EL0\n")  # 停止所有运动 
-                    time.sleep(0.005)
-                return 0  # 退出循环
+            if self.stop_requested.is_set():
+                logging.info("收到停止请求，退出控制循环")
+                return 2
                 
-            # 生成控制命令
-            cmd = self._generate_control_command(az_cw, az_ccw, alt_up, alt_down)
-            self.send_command(cmd)
+            try:
+                if self.control_step():
+                    return 0  # 退出循环
+            except (AxisFault, StaleSampleError) as e:
+                logging.error(f"控制失败: {e}")
+                self.stop_motion()
+                return 1
             
             # 等待下一个控制周期
             time.sleep(0.005)  # 10ms控制周期
     
-    def _reached_target(self, az_cw, az_ccw, alt_up, alt_down):
-        """检查是否到达目标位置"""
-        return az_cw and az_ccw and alt_up and alt_down
-    
-    def _generate_control_command(self, az_cw, az_ccw, alt_up, alt_down):
-        """根据控制信号生成控制命令"""
-        # 方位角控制
-        if az_cw and not az_ccw:
-            az_cmd = "1"  # 顺时针
-        elif not az_cw and az_ccw:
-            az_cmd = "2"  # 逆时针
-        else:
-            az_cmd = "0"  # 停止
-        
-        # 高度角控制
-        if alt_up and not alt_down:
-            el_cmd = "1"  # 升高
-        elif not alt_up and alt_down:
-            el_cmd = "2"  # 降低
-        else:
-            el_cmd = "0"  # 停止
-        
-        return f"AZ{az_cmd}EL{el_cmd}\n"
-            
-    def _calculate_azimuth_control(self, current_az):
-        error = (self.target_azimuth - current_az) % 360
-        if abs(error) < 1:  # 使用绝对值函数简化判断逻辑，当误差绝对值小于0.5时认为到达目标
-            return 1, 1  # 停止信号
-                
-        # 不使用最短旋转方向，根据误差正负判断旋转方向
-        if error > 1:
-            return 1, 0  # 顺时针旋转
-        else:
-            return 0, 1  # 逆时针旋转
-                    
-    def _calculate_altitude_control(self, current_alt):
-        # 检查目标高度角是否在20-90度范围内
-        if self.target_altitude < 20 or self.target_altitude > 90:
-            logging.error(f"目标高度角 {self.target_altitude} 不在20-90度的有效范围内，请检查输入。")
-            sys.exit(1)
-        
-        error = self.target_altitude - current_alt
-        if abs(error) < 1:  # 到达目标
-            return 1, 1  # 停止信号
-            
-        if error > 1:
-            return 1, 0  # 升高
-        else:
-            return 0, 1  # 降低
+    def relay_toggles(self):
+        """两轴继电器累计动作次数"""
+        return sum(axis.toggles for axis in self.axes.values())
+
+    def axis_status(self):
+        """各轴控制状态，供状态查询使用"""
+        return {name: axis.to_dict() for name, axis in self.axes.items()}
+
+    def _generate_control_command(self, az_dir, alt_dir):
+        """
+        根据两轴输出方向生成控制命令：1 顺时针/升高，2 逆时针/降低，0 停止
+
+        固件计时的脉冲只在开始时发送一次 "AZ1T120"，执行期间命令中省略该轴，
+        固件对省略的轴保持当前输出
+        """
+        codes = {1: "1", -1: "2", 0: "0"}
+        fields = []
+        for prefix, axis, direction in (("AZ", self.axes['az'], az_dir), ("EL", self.axes['alt'], alt_dir)):
+            if axis.timed_pulses and axis.state == AxisController.PULSING:
+                duration = axis.take_pulse()
+                if duration is not None:
+                    fields.append(f"{prefix}{codes[direction]}T{duration}")
+            else:
+                fields.append(f"{prefix}{codes[direction]}")
+        return "".join(fields) + "\n"
 
     def close(self):
         """关闭控制器，释放资源"""
+        # 保存最终的线缆缠绕状态，下一个控制器从这里接续
+        self.cable_wrap.save()
+        # 共用总线随控制器一起关闭，释放串口
+        bus = getattr(self.gyro, 'bus', None)
+        if bus is not None:
+            bus.close()
         if hasattr(self, 'ser') and self.ser:
             try:
                 self.send_command("AZ0EL0\n")  # 确保停止所有运动
@@ -220,7 +673,92 @@ class TelescopeController:
                 logging.info("串口已关闭")
             except Exception as e:
                 logging.error(f"关闭串口时出错: {e}")
-        
+
+
+def create_controller(mode, control_port=None, gyro_port=None, async_gyro=False, pointing_model=None, refraction=None,
+                      lead_solver=None, braking=False, timed_pulses=False, gyro_baudrate=None, horizon=None,
+                      shared_bus=False, cable_wrap=None):
+    """
+    根据运行模式创建陀螺仪和望远镜控制器
+
+    :param mode: 运行模式 'simulation'（纯模拟）、'hybrid'（半实物仿真）或 'real'（真实）
+    :param control_port: 控制器串口，hybrid和real模式必需
+    :param gyro_port: 陀螺仪串口，real模式必需
+    :param async_gyro: real模式下是否使用异步Modbus陀螺仪（供异步控制引擎使用）
+    :param pointing_model: 指向模型 (PointingModel)
+    :param refraction: 大气折射表 (RefractionTable)
+    :param lead_solver: 提前量目标解算器 (LeadTargetSolver)
+    :param braking: 是否使用学习刹车距离的控制模式
+    :param timed_pulses: 短脉冲是否由继电器固件计时
+    :param gyro_baudrate: real模式下与陀螺仪协商的波特率，None表示使用出厂默认4800
+    :param horizon: 地平遮挡掩码 (HorizonMask)
+    :param cable_wrap: 方位轴线缆缠绕跟踪 (CableWrap)，None时使用默认限位且不保存
+    :param shared_bus: real模式下陀螺仪串口作为多个传感器共用的RS485总线（ModbusBus），
+                       其他传感器通过 controller.gyro.bus.add_device 添加；此时gyro_baudrate为总线波特率
+    :return: TelescopeController对象
+    :raises ValueError: 缺少必需的串口参数，或异步陀螺仪与gyro_baudrate/shared_bus同时使用
+    :raises ConnectionError: 连接陀螺仪失败
+    """
+    if mode == 'real' and async_gyro and (gyro_baudrate or shared_bus):
+        # 异步Modbus陀螺仪使用出厂波特率独占串口，不支持波特率协商和共用总线
+        raise ValueError("异步陀螺仪不支持设置波特率或共用RS485总线")
+
+    # 创建陀螺仪
+    gyro = None
+    if mode == 'simulation' or mode == 'hybrid':
+        gyro = VirtualGyroscope()
+        logging.info("已创建虚拟陀螺仪")
+    elif mode == 'real':
+        if not gyro_port:
+            raise ValueError("请选择陀螺仪串口")
+        try:
+            if async_gyro:
+                gyro = AsyncRealGyroscope(port=gyro_port)
+            elif shared_bus:
+                bus = ModbusBus(gyro_port, baudrate=gyro_baudrate or 4800)
+                gyro = RealGyroscope(port=gyro_port, bus=bus)
+                bus.start()
+            else:
+                gyro = RealGyroscope(port=gyro_port, target_baudrate=gyro_baudrate)
+        except Exception as e:
+            raise ConnectionError(f"连接陀螺仪失败: {str(e)}")
+        logging.info(f"已创建真实陀螺仪，使用串口 {gyro_port}")
+
+    # 创建望远镜控制器
+    if mode == 'real' or mode == 'hybrid':
+        if not control_port:
+            raise ValueError("请选择控制器串口")
+
+        logging.info(f"创建望远镜控制器 - 串口: {control_port}")
+        return TelescopeController(
+            port=control_port,
+            baudrate=115200,
+            gyro=gyro,
+            simulation=(mode == 'simulation'),
+            hybrid_sim=(mode == 'hybrid'),
+            pointing_model=pointing_model,
+            refraction=refraction,
+            lead_solver=lead_solver,
+            braking=braking,
+            timed_pulses=timed_pulses,
+            horizon=horizon,
+            cable_wrap=cable_wrap
+        )
+
+    # 纯模拟模式
+    logging.info("创建望远镜控制器 - 纯模拟模式")
+    return TelescopeController(
+        gyro=gyro,
+        simulation=True,
+        pointing_model=pointing_model,
+        refraction=refraction,
+        lead_solver=lead_solver,
+        braking=braking,
+        timed_pulses=timed_pulses,
+        horizon=horizon,
+        cable_wrap=cable_wrap
+    )
+
 # 使用示例
 if __name__ == "__main__":
     # 配置日志
@@ -1,7 +1,8 @@
 import time
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from transform_control import TelescopeController
+from gyroscope import parse_relay_command
 
 class VirtualGyro:
     def __init__(self):
@@ -13,6 +14,8 @@ class VirtualGyro:
         self.last_cmd_time = datetime.now()
         self.az_speed = 30  # 方位角每秒旋转角度
         self.alt_speed = 50  # 高度角每秒旋转角度
+        self.az_pulse_end = None   # 定时脉冲结束时刻，到时自动停止
+        self.alt_pulse_end = None
         
     def get_current_attitude(self):
         """仅获取当前角度，不做任何计算"""
@@ -21,44 +24,52 @@ class VirtualGyro:
     def update_attitude(self):
         """更新虚拟陀螺仪的角度"""
         now = datetime.now()
-        delta = (now - self.last_update).total_seconds()
+        last_update = self.last_update
         self.last_update = now
+
+        # 定时脉冲只计算到脉冲结束时刻
+        az_end = min(now, self.az_pulse_end) if self.az_pulse_end else now
+        alt_end = min(now, self.alt_pulse_end) if self.alt_pulse_end else now
+        az_delta = max(0.0, (az_end - last_update).total_seconds())
+        alt_delta = max(0.0, (alt_end - last_update).total_seconds())
         
         # 更新方位角
         if self.az_direction == 1:  # 顺时针
-            self.azimuth = (self.azimuth + delta * self.az_speed) % 360
+            self.azimuth = (self.azimuth + az_delta * self.az_speed) % 360
         elif self.az_direction == 2:  # 逆时针
-            self.azimuth = (self.azimuth - delta * self.az_speed) % 360
+            self.azimuth = (self.azimuth - az_delta * self.az_speed) % 360
             
         # 更新高度角
         if self.alt_direction == 1:  # 升高
-            self.altitude = min(90.0, self.altitude + delta * self.alt_speed)
+            self.altitude = min(90.0, self.altitude + alt_delta * self.alt_speed)
         elif self.alt_direction == 2:  # 降低
-            self.altitude = max(20.0, self.altitude - delta * self.alt_speed)
+            self.altitude = max(20.0, self.altitude - alt_delta * self.alt_speed)
+
+        if self.az_pulse_end and now >= self.az_pulse_end:
+            self.az_direction, self.az_pulse_end = 0, None
+        if self.alt_pulse_end and now >= self.alt_pulse_end:
+            self.alt_direction, self.alt_pulse_end = 0, None
         
     def parse_command(self, cmd):
-        """解析控制命令"""
-        # 解析方位角控制部分
-        if "AZ1" in cmd:  # 顺时针
-            self.az_direction = 1
-        elif "AZ2" in cmd:  # 逆时针
-            self.az_direction = 2
-        elif "AZ0" in cmd:  # 停止
-            self.az_direction = 0
-            
-        # 解析高度角控制部分
-        if "EL1" in cmd:  # 升高
-            self.alt_direction = 1
-        elif "EL2" in cmd:  # 降低
-            self.alt_direction = 2
-        elif "EL0" in cmd:  # 停止
-            self.alt_direction = 0
+        """解析控制命令（与relay_control.cpp一致，支持 AZ1T120 形式的定时脉冲，省略的轴保持不变）"""
+        codes = {1: 1, -1: 2, 0: 0}
+        fields = parse_relay_command(cmd)
+        now = datetime.now()
+        if 'AZ' in fields:
+            direction, duration = fields['AZ']
+            self.az_direction = codes[direction]
+            self.az_pulse_end = now + timedelta(seconds=duration) if duration else None
+        if 'EL' in fields:
+            direction, duration = fields['EL']
+            self.alt_direction = codes[direction]
+            self.alt_pulse_end = now + timedelta(seconds=duration) if duration else None
             
     def process_command(self, cmd):
         """处理控制命令并更新状态"""
         self.last_cmd_time = datetime.now()
-        self.parse_command(cmd)
+        # 先按原命令积分到当前时刻，再应用新命令
         self.update_attitude()
+        self.parse_command(cmd)
 
 def test_virtual_gyro():
     """测试虚拟陀螺仪单独工作"""
@@ -0,0 +1,229 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, date as Date, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+from astropy.time import Time
+from batch_transform import equatorial_to_horizontal_batch
+
+
+def _to_datetime(unix_time):
+    """unix时间戳 -> UTC datetime（不带时区，与项目中的时间约定一致）；NaN返回None"""
+    if unix_time is None or not np.isfinite(unix_time):
+        return None
+    return datetime.fromtimestamp(float(unix_time), tz=timezone.utc).replace(tzinfo=None)
+
+
+class VisibilityWindow:
+    """单个目标在一夜中高于最低高度角的时段"""
+    def __init__(self, name, rise, set_time, transit, transit_altitude, always_up=False, never_up=False):
+        """
+        :param name: 目标名称
+        :param rise: 升到最低高度角以上的时刻 (UTC datetime)，开始时已在其上则为None
+        :param set_time: 降到最低高度角以下的时刻，结束时仍在其上则为None
+        :param transit: 中天（高度角最大）时刻，最大值出现在时段边界时为None
+        :param transit_altitude: 时段内的最大高度角 (度)
+        :param always_up: 整个时段都在最低高度角以上
+        :param never_up: 整个时段都在最低高度角以下
+        """
+        self.name = name
+        self.rise = rise
+        self.set = set_time
+        self.transit = transit
+        self.transit_altitude = transit_altitude
+        self.always_up = always_up
+        self.never_up = never_up
+
+    def to_dict(self):
+        def fmt(value):
+            return value.isoformat(timespec='seconds') if value else None
+        return {
+            "name": self.name,
+            "rise": fmt(self.rise),
+            "set": fmt(self.set),
+            "transit": fmt(self.transit),
+            "transit_altitude": round(self.transit_altitude, 3),
+            "always_up": self.always_up,
+            "never_up": self.never_up,
+        }
+
+
+class VisibilityPlanner:
+    """
+    整夜可见时段计算。
+
+    一次批量转换得到所有目标在整夜时间网格上的高度角曲线，
+    升起/落下时刻在网格上找到变号区间后用试位法（regula falsi）求根，
+    中天时刻用最大值附近三点的抛物线顶点估计；每次迭代对所有目标只做一次批量转换。
+    设置地平遮挡掩码时，升起/落下按各方位的实际地平（不低于最低高度角）计算。
+    结果按 (日期, 最低高度角, 目标) 缓存。
+    """
+    def __init__(self, lat, lon, min_altitude=20.0, grid_step=600.0, refraction=None, iterations=2,
+                 cache_size=16, horizon=None):
+        """
+        :param lat: 观测点纬度 (度)
+        :param lon: 观测点经度 (度)
+        :param min_altitude: 最低高度角 (度)，默认与set_target的下限一致
+        :param grid_step: 时间网格步长 (秒)
+        :param refraction: 大气折射表，None表示使用几何高度角
+        :param iterations: 求根迭代次数
+        :param cache_size: 最多缓存的计算结果数
+        :param horizon: 地平遮挡掩码 (HorizonMask)，None表示只按最低高度角判断
+        """
+        self.lat = float(lat)
+        self.lon = float(lon)
+        self.min_altitude = min_altitude
+        self.grid_step = float(grid_step)
+        self.refraction = refraction
+        self.iterations = iterations
+        self.cache_size = cache_size
+        self.horizon = horizon
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def night_span(self, night):
+        """
+        一夜的时间范围：当地平太阳时中午到次日中午 (UTC)
+
+        :param night: 当晚的日期 (date或datetime)
+        :return: (开始时刻, 结束时刻)
+        """
+        if isinstance(night, datetime):
+            night = night.date()
+        start = datetime(night.year, night.month, night.day, 12) - timedelta(hours=self.lon / 15.0)
+        return start, start + timedelta(days=1)
+
+    def _horizontal(self, ra, dec, unix_times):
+        """目标与时刻逐元素对应的 (方位角, 高度角)（一次批量转换）"""
+        az, alt = equatorial_to_horizontal_batch(ra, dec, self.lat, self.lon, Time(unix_times, format='unix'),
+                                                 refraction=self.refraction)
+        return np.asarray(az, dtype=float), np.asarray(alt, dtype=float)
+
+    def _height(self, az, alt, min_altitude):
+        """高出可见下限的高度 (度)：下限为最低高度角，有遮挡掩码时取该方位实际地平的较高者"""
+        if self.horizon is None:
+            return alt - min_altitude
+        # 整列遮挡的方位下限为inf，限制为略高于天顶，保证求根时数值有限
+        return alt - np.maximum(min_altitude, np.minimum(self.horizon.horizon(az), 91.0))
+
+    def compute(self, ra, dec, night, min_altitude=None):
+        """
+        计算一组目标的升起、落下和中天时刻
+
+        :param ra: 赤经数组 (小时)
+        :param dec: 赤纬数组 (度)
+        :param night: 当晚的日期
+        :param min_altitude: 最低高度角，None表示使用构造时的值
+        :return: {"rise", "set", "transit", "transit_altitude"}：unix时间戳数组（无则为NaN）和最大高度角数组，
+                 以及 "always_up"、"never_up" 布尔数组
+        """
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        min_altitude = self.min_altitude if min_altitude is None else float(min_altitude)
+        if isinstance(night, datetime):
+            night = night.date()
+        key = (night, min_altitude, ra.tobytes(), dec.tobytes())
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        start, end = self.night_span(night)
+        start_unix = Time(start).unix
+        steps = int(np.ceil((end - start).total_seconds() / self.grid_step)) + 1
+        grid = start_unix + np.arange(steps) * self.grid_step
+        az, alt = equatorial_to_horizontal_batch(ra[:, None], dec[:, None], self.lat, self.lon,
+                                                 Time(grid, format='unix'), refraction=self.refraction)
+        alt = np.asarray(alt, dtype=float)
+        height = self._height(np.asarray(az, dtype=float), alt, min_altitude)
+
+        result = {
+            "rise": self._crossings(ra, dec, grid, height, min_altitude, rising=True),
+            "set": self._crossings(ra, dec, grid, height, min_altitude, rising=False),
+            "always_up": np.all(height >= 0, axis=1),
+            "never_up": np.all(height < 0, axis=1),
+        }
+        result["transit"], result["transit_altitude"] = self._transit(ra, dec, grid, alt)
+        with self._cache_lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _crossings(self, ra, dec, grid, height, min_altitude, rising):
+        """在网格变号区间内用试位法求高度角等于可见下限的时刻；每个目标取第一个交点"""
+        below = height < 0
+        if rising:
+            edges = below[:, :-1] & ~below[:, 1:]
+        else:
+            edges = ~below[:, :-1] & below[:, 1:]
+        times = np.full(len(ra), np.nan)
+        has_edge = edges.any(axis=1)
+        if not has_edge.any():
+            return times
+        targets = np.flatnonzero(has_edge)
+        k = np.argmax(edges[targets], axis=1)
+        t0, t1 = grid[k], grid[k + 1]
+        f0, f1 = height[targets, k], height[targets, k + 1]
+        t = t0 + (t1 - t0) * f0 / (f0 - f1)
+        for _ in range(self.iterations):
+            f = self._height(*self._horizontal(ra[targets], dec[targets], t), min_altitude)
+            # 保留与新点异号的一端
+            same_as_start = np.sign(f) == np.sign(f0)
+            t0, f0 = np.where(same_as_start, t, t0), np.where(same_as_start, f, f0)
+            t1, f1 = np.where(same_as_start, t1, t), np.where(same_as_start, f1, f)
+            t = t0 + (t1 - t0) * f0 / (f0 - f1)
+        times[targets] = t
+        return times
+
+    def _transit(self, ra, dec, grid, alt):
+        """网格最大值附近三点抛物线插值得到中天时刻，再批量计算该时刻的高度角"""
+        k = np.argmax(alt, axis=1)
+        rows = np.arange(len(ra))
+        transit_altitude = alt[rows, k]
+        interior = (k > 0) & (k < len(grid) - 1)
+        transit = np.full(len(ra), np.nan)
+        if interior.any():
+            i, j = rows[interior], k[interior]
+            a, b, c = alt[i, j - 1], alt[i, j], alt[i, j + 1]
+            curvature = a - 2 * b + c
+            # 抛物线顶点相对中间点的偏移（网格步数）
+            safe = np.where(curvature < 0, curvature, -1.0)
+            delta = np.where(curvature < 0, 0.5 * (a - c) / safe, 0.0)
+            transit[i] = grid[j] + np.clip(delta, -1.0, 1.0) * self.grid_step
+            transit_altitude[i] = np.maximum(self._horizontal(ra[i], dec[i], transit[i])[1], b)
+        return transit, transit_altitude
+
+    def windows(self, targets, night, min_altitude=None):
+        """
+        :param targets: 带name、ra、dec属性的目标列表（CatalogObject、ObservationTarget等）
+        :param night: 当晚的日期
+        :param min_altitude: 最低高度角，None表示使用构造时的值
+        :return: [VisibilityWindow, ...]，与targets一一对应
+        """
+        if not targets:
+            return []
+        result = self.compute([t.ra for t in targets], [t.dec for t in targets], night, min_altitude)
+        return [
+            VisibilityWindow(
+                target.name,
+                _to_datetime(result["rise"][i]),
+                _to_datetime(result["set"][i]),
+                _to_datetime(result["transit"][i]),
+                float(result["transit_altitude"][i]),
+                always_up=bool(result["always_up"][i]),
+                never_up=bool(result["never_up"][i]),
+            )
+            for i, target in enumerate(targets)
+        ]
+
+
+@lru_cache(maxsize=8)
+def get_visibility_planner(lat, lon, horizon=None):
+    """按观测地点（和遮挡掩码）缓存计算器（各自缓存多个日期的结果）"""
+    return VisibilityPlanner(lat, lon, horizon=horizon)
+
+
+def parse_night(text=None):
+    """解析 YYYY-MM-DD 日期，缺省为今天"""
+    return Date.fromisoformat(text) if text else datetime.now().date()